@@ -1,30 +1,234 @@
 # type: ignore
-from django.contrib import admin
+import json
 
-from .models import Artist, AssetSource, AudioAsset, Collection, LicenseType
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .archive import restore_assets, retire_assets
+from .models import (
+    ArchivedAudioAsset,
+    Artist,
+    AssetSource,
+    AssetUpload,
+    AssetUsage,
+    AudioAsset,
+    Collection,
+    Job,
+    LicenseType,
+    Production,
+    ScanIndexEntry,
+)
+
+
+def estimated_count(queryset):
+    """
+    Ask the database for an estimate of how many rows a queryset would return.
+
+    Only PostgreSQL keeps statistics that make this cheap: the table's
+    ``reltuples`` for an unfiltered queryset, or the planner's row estimate
+    otherwise.
+
+    Args:
+        queryset: Queryset to estimate the size of.
+
+    Returns:
+        The estimated number of rows, or ``None`` if the backend can't tell.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 until the table is first vacuumed or analyzed.
+        return row[0] if row and row[0] >= 0 else None
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the database's row estimate for large result sets.
+
+    Counting every row of a large table on each changelist page load is slow
+    on PostgreSQL. When the estimate is above
+    ``AUDIO_ASSET_MANAGER_ADMIN_ESTIMATED_COUNT_THRESHOLD`` it's used as the
+    count, which only affects how many pages are offered. Smaller results and
+    other backends get an exact count.
+    """
+
+    @cached_property
+    def count(self):
+        threshold = getattr(
+            settings, "AUDIO_ASSET_MANAGER_ADMIN_ESTIMATED_COUNT_THRESHOLD", 100000
+        )
+        if hasattr(self.object_list, "query"):
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate > threshold:
+                return estimate
+        return super().count
+
+
+class OwnedModelAdmin(admin.ModelAdmin):
+    """
+    Admin for owned models that limits non-superusers to their own records,
+    both in listings and in the choices for related owned records.
+    """
+
+    list_select_related = ["owner"]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.for_user(request.user)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        related_queryset = db_field.remote_field.model._default_manager.all()
+        if not request.user.is_superuser and hasattr(related_queryset, "for_user"):
+            kwargs.setdefault("queryset", related_queryset.for_user(request.user))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 class LicenseTypeAdmin(admin.ModelAdmin):
     ordering = ["name"]
+    search_fields = ["name"]
 
 
-class AssetSourceAdmin(admin.ModelAdmin):
+class AssetSourceAdmin(OwnedModelAdmin):
     ordering = ["name", "owner"]
     list_display = ["name", "owner"]
+    search_fields = ["name"]
+    autocomplete_fields = ["license_type"]
 
 
-class ArtistAdmin(admin.ModelAdmin):
+class ArtistAdmin(OwnedModelAdmin):
     ordering = ["name"]
+    list_display = ["name", "asset_count", "total_duration", "owner"]
+    search_fields = ["name"]
 
 
-class CollectionAdmin(admin.ModelAdmin):
+class CollectionAdmin(OwnedModelAdmin):
     ordering = ["album_artist__name", "title", "owner"]
-    list_display = ["title", "album_artist", "owner"]
+    list_display = ["title", "album_artist", "asset_count", "total_duration", "owner"]
+    list_select_related = ["album_artist", "owner"]
+    search_fields = ["title"]
+    autocomplete_fields = ["album_artist"]
 
 
-class AudioAssetAdmin(admin.ModelAdmin):
+class AudioAssetAdmin(OwnedModelAdmin):
     ordering = ["owner", "artist", "collection", "title"]
     list_display = ["owner", "artist", "title", "source", "collection"]
+    list_select_related = ["owner", "artist", "source", "collection"]
+    autocomplete_fields = ["artist", "collection", "source"]
+    exclude = ["retired_at"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["retire_selected"]
+
+    @admin.action(description="Retire selected audio assets")
+    def retire_selected(self, request, queryset):
+        retired = retire_assets(queryset)
+        self.message_user(request, f"Retired {retired} audio assets.")
+
+
+class ArchivedAudioAssetAdmin(OwnedModelAdmin):
+    ordering = ["-archived_at"]
+    list_display = ["title", "artist", "owner", "retired_at", "archived_at"]
+    list_select_related = ["owner", "artist"]
+    search_fields = ["title", "digest"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["restore_selected"]
+
+    @admin.action(description="Restore selected archived audio assets")
+    def restore_selected(self, request, queryset):
+        result = restore_assets(queryset.values_list("pk", flat=True))
+        self.message_user(request, f"Restored {result.restored} audio assets.")
+        if result.conflicts:
+            self.message_user(
+                request,
+                f"{len(result.conflicts)} audio assets weren't restored, because "
+                "their digest is in use.",
+                messages.WARNING,
+            )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        # Archived assets are changed by restoring them.
+        return False
+
+
+class ScanIndexEntryAdmin(OwnedModelAdmin):
+    ordering = ["owner", "path"]
+    list_display = ["path", "owner", "size", "digest"]
+    raw_id_fields = ["asset"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class AssetUploadAdmin(OwnedModelAdmin):
+    ordering = ["-created"]
+    list_display = ["filename", "owner", "size", "offset", "created", "completed"]
+    raw_id_fields = ["asset"]
+    # Chunks are only received through the API.
+    readonly_fields = ["size", "offset", "completed"]
+
+
+class AssetUsageInline(admin.TabularInline):
+    model = AssetUsage
+    fields = ["position", "asset", "used_on", "seconds"]
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        # Prefetched rather than joined, so cues of archived assets still show.
+        return super().get_queryset(request).prefetch_related("asset__artist")
+
+    def has_add_permission(self, request, obj=None):
+        # Cues are recorded in bulk so the usage rollups stay current.
+        return False
+
+
+class ProductionAdmin(OwnedModelAdmin):
+    ordering = ["-air_date", "title"]
+    list_display = ["title", "air_date", "owner"]
+    inlines = [AssetUsageInline]
+
+
+class JobAdmin(OwnedModelAdmin):
+    ordering = ["-created"]
+    list_display = [
+        "kind",
+        "status",
+        "progress_current",
+        "progress_total",
+        "owner",
+        "created",
+    ]
+    list_filter = ["status", "kind"]
+    readonly_fields = [
+        "status",
+        "progress_current",
+        "progress_total",
+        "result",
+        "error",
+        "attempts",
+        "worker",
+        "started_at",
+        "heartbeat_at",
+        "finished_at",
+    ]
 
 
 admin.site.register(LicenseType, LicenseTypeAdmin)
@@ -32,3 +236,8 @@ admin.site.register(AssetSource, AssetSourceAdmin)
 admin.site.register(Artist, ArtistAdmin)
 admin.site.register(Collection, CollectionAdmin)
 admin.site.register(AudioAsset, AudioAssetAdmin)
+admin.site.register(ArchivedAudioAsset, ArchivedAudioAssetAdmin)
+admin.site.register(AssetUpload, AssetUploadAdmin)
+admin.site.register(ScanIndexEntry, ScanIndexEntryAdmin)
+admin.site.register(Production, ProductionAdmin)
+admin.site.register(Job, JobAdmin)
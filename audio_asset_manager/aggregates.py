@@ -0,0 +1,297 @@
+"""
+Asset totals stored on artists and collections.
+
+`Artist` and `Collection` keep the number of their assets, the assets' total
+duration, and the sum and count of their measured loudness, so listings can
+show them without reading a single asset.
+
+Saving or deleting an asset applies the difference it makes to the totals,
+from receivers in `receivers`, as an ``UPDATE`` of ``F`` expressions so that
+concurrent saves don't lose each other's changes. Saving an artist or
+collection never writes its totals. Bulk writes send no
+signals: creating assets in bulk adds them with `assets_created`, and
+changing them in bulk recomputes the totals of the records they touched with
+`refresh_asset_aggregates`. `rebuild_aggregates` recomputes everything from
+the assets, e.g. after ``loaddata`` or a `QuerySet.update` of assets.
+
+Retired assets aren't counted.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import models, router, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .instrumentation import instrumented
+from .managers import query_param_chunk_size
+from .models import Artist, AudioAsset, Collection
+
+DEFAULT_BATCH_SIZE = 1000
+AGGREGATE_FIELDS = list(Artist.AGGREGATE_FIELDS)
+# Foreign key on `AudioAsset` for each model with aggregates.
+ASSET_KEYS: Dict[Type[models.Model], str] = {
+    Artist: "artist_id",
+    Collection: "collection_id",
+}
+
+# Values of `AudioAsset.AGGREGATED_FIELDS`.
+AggregatedValues = Tuple[
+    Optional[int], Optional[int], int, Optional[float], Optional[datetime.datetime]
+]
+
+
+def _contributions(
+    values: AggregatedValues,
+) -> Iterable[Tuple[Type[models.Model], int, Tuple[int, int, float, int]]]:
+    artist_id, collection_id, duration, loudness, retired_at = values
+    if retired_at is not None:
+        return
+    totals = (
+        1,
+        duration or 0,
+        loudness if loudness is not None else 0.0,
+        0 if loudness is None else 1,
+    )
+    for model, pk in ((Artist, artist_id), (Collection, collection_id)):
+        if pk is not None:
+            yield model, pk, totals
+
+
+class AggregateChanges:
+    """
+    Collects changes to assets and applies them to the totals together.
+
+    Applying them takes one ``UPDATE`` per model and chunk of changed records.
+    """
+
+    def __init__(self):
+        self.deltas: Dict[Tuple[Type[models.Model], int], List[Any]] = defaultdict(
+            lambda: [0, 0, 0.0, 0]
+        )
+
+    def add(
+        self, before: Optional[AggregatedValues], after: Optional[AggregatedValues]
+    ) -> None:
+        """
+        Add a change to an asset.
+
+        Args:
+            before: The asset's aggregated values before the change, or
+                ``None`` if it was created.
+            after: Its values after the change, or ``None`` if it was deleted.
+        """
+        for sign, values in ((-1, before), (1, after)):
+            if values is None:
+                continue
+            for model, pk, totals in _contributions(values):
+                delta = self.deltas[(model, pk)]
+                for i, value in enumerate(totals):
+                    delta[i] += sign * value
+
+    def apply(self) -> None:
+        """
+        Write the collected changes and start over.
+        """
+        deltas, self.deltas = self.deltas, defaultdict(lambda: [0, 0, 0.0, 0])
+        for model in ASSET_KEYS:
+            changed = sorted(
+                pk for (key, pk), delta in deltas.items() if key is model and any(delta)
+            )
+            # Each record needs a parameter for its key and one per total.
+            chunk_size = max(
+                query_param_chunk_size(router.db_for_write(model))
+                // (2 * len(AGGREGATE_FIELDS) + 1),
+                1,
+            )
+            for start in range(0, len(changed), chunk_size):
+                chunk = changed[start : start + chunk_size]
+                model.objects.filter(pk__in=chunk).update(
+                    **{
+                        name: F(name)
+                        + Case(
+                            *(
+                                When(pk=pk, then=Value(deltas[(model, pk)][i]))
+                                for pk in chunk
+                            ),
+                            default=Value(0),
+                            output_field=model._meta.get_field(name),
+                        )
+                        for i, name in enumerate(AGGREGATE_FIELDS)
+                    }
+                )
+
+
+def saved_aggregated_values(asset: AudioAsset) -> Optional[AggregatedValues]:
+    """
+    An asset's aggregated values as they are in the database, before saving.
+
+    Assets loaded from the database remember them. Others are read back.
+    """
+    if asset.pk is None:
+        return None
+    if not asset._state.adding:
+        values = getattr(asset, "_aggregated_values", None)
+        if values is not None:
+            return values
+    return (
+        AudioAsset.all_objects.filter(pk=asset.pk)
+        .values_list(*AudioAsset.AGGREGATED_FIELDS)
+        .first()
+    )
+
+
+def asset_saved(
+    asset: AudioAsset,
+    before: Optional[AggregatedValues],
+    update_fields: Optional[Iterable[str]] = None,
+) -> None:
+    """
+    Update the totals after an asset was saved.
+
+    Args:
+        asset: The saved asset.
+        before: Its `saved_aggregated_values` from before saving.
+        update_fields: The ``update_fields`` it was saved with, if any.
+    """
+    after = asset.aggregated_values()
+    if after is None:
+        after = saved_aggregated_values(asset)
+    elif before is not None and update_fields is not None:
+        saved = {AudioAsset._meta.get_field(name).attname for name in update_fields}
+        after = tuple(
+            new if name in saved else old
+            for name, old, new in zip(AudioAsset.AGGREGATED_FIELDS, before, after)
+        )
+    changes = AggregateChanges()
+    changes.add(before, after)
+    changes.apply()
+    asset._aggregated_values = after
+
+
+def asset_deleted(asset: AudioAsset) -> None:
+    """
+    Update the totals after an asset was deleted.
+    """
+    changes = AggregateChanges()
+    changes.add(
+        getattr(asset, "_aggregated_values", None) or asset.aggregated_values(), None
+    )
+    changes.apply()
+
+
+def assets_created(assets: Iterable[AudioAsset]) -> None:
+    """
+    Add assets created in bulk to their artists' and collections' totals.
+    """
+    changes = AggregateChanges()
+    for asset in assets:
+        changes.add(None, asset.aggregated_values())
+    changes.apply()
+
+
+def recompute_aggregates(
+    model: Type[models.Model],
+    pks: Iterable[Optional[int]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Recompute the totals of artists or collections from their assets.
+
+    Args:
+        model: `Artist` or `Collection`.
+        pks: Primary keys of the records to recompute. ``None`` is ignored.
+        batch_size: Number of records to recompute per query.
+
+    Returns:
+        The number of records recomputed.
+    """
+    key = ASSET_KEYS[model]
+    wanted: Sequence[int] = sorted({pk for pk in pks if pk is not None})
+    chunk_size = min(batch_size, query_param_chunk_size(router.db_for_read(AudioAsset)))
+    for start in range(0, len(wanted), chunk_size):
+        chunk = wanted[start : start + chunk_size]
+        # Records without assets keep the defaults of zero.
+        records = {pk: model(pk=pk) for pk in chunk}
+        rows = (
+            AudioAsset.objects.filter(**{f"{key}__in": chunk})
+            .order_by()
+            .values(key)
+            .annotate(
+                asset_count=Count("pk"),
+                total_duration=Sum("duration"),
+                loudness_sum=Coalesce(Sum("loudness"), 0.0),
+                loudness_count=Count("loudness"),
+            )
+        )
+        for row in rows:
+            record = records[row.pop(key)]
+            for name, value in row.items():
+                setattr(record, name, value)
+        with transaction.atomic():
+            model.objects.bulk_update(records.values(), AGGREGATE_FIELDS)
+    return len(wanted)
+
+
+def refresh_asset_aggregates(
+    asset_ids: Iterable[int], batch_size: int = DEFAULT_BATCH_SIZE
+) -> None:
+    """
+    Recompute the totals of the artists and collections of some assets.
+
+    Call it after changing assets in bulk, which doesn't send signals.
+
+    Args:
+        asset_ids: Primary keys of the changed assets.
+        batch_size: Number of records to recompute per query.
+    """
+    asset_ids = list(asset_ids)
+    artist_ids, collection_ids = set(), set()
+    chunk_size = query_param_chunk_size(router.db_for_read(AudioAsset))
+    for start in range(0, len(asset_ids), chunk_size):
+        for artist_id, collection_id in AudioAsset.all_objects.filter(
+            pk__in=asset_ids[start : start + chunk_size]
+        ).values_list("artist_id", "collection_id"):
+            artist_ids.add(artist_id)
+            collection_ids.add(collection_id)
+    recompute_aggregates(Artist, artist_ids, batch_size)
+    recompute_aggregates(Collection, collection_ids, batch_size)
+
+
+@dataclass
+class RebuildResult:
+    """
+    Number of records whose totals were recomputed.
+    """
+
+    artists: int = 0
+    collections: int = 0
+
+
+@instrumented
+def rebuild_aggregates(
+    owner_ids: Optional[Iterable[int]] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> RebuildResult:
+    """
+    Recompute the totals of every artist and collection.
+
+    Args:
+        owner_ids: Only recompute these users' records. Defaults to everyone's.
+        batch_size: Number of records to recompute per query.
+
+    Returns:
+        A `RebuildResult`.
+    """
+    result = RebuildResult()
+    if owner_ids is not None:
+        owner_ids = list(owner_ids)
+    for model, attribute in ((Artist, "artists"), (Collection, "collections")):
+        queryset = model.objects.order_by("pk")
+        if owner_ids is not None:
+            queryset = queryset.filter(owner_id__in=owner_ids)
+        pks = list(queryset.values_list("pk", flat=True))
+        setattr(result, attribute, recompute_aggregates(model, pks, batch_size))
+    return result
@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class AudioAssetManagerConfig(AppConfig):
     name = "audio_asset_manager"
+
+    def ready(self):
+        from . import receivers  # noqa: F401
+        from .storage import check_asset_storage
+
+        checks.register(check_asset_storage, checks.Tags.security)
@@ -0,0 +1,314 @@
+"""
+Retiring assets and moving them out of the asset table.
+
+Catalogs mostly grow. Assets fall out of use but are still needed for old
+cue sheets, credits, and usage reports, and every listing, search, and facet
+count pays for the rows nobody looks at anymore. Assets that are no longer in
+use go through two tiers:
+
+* `retire_assets` marks assets retired. They drop out of ``AudioAsset.objects``,
+  and so out of the API, the admin, search, facets, and the artist and
+  collection totals, but stay in the table. ``AudioAsset.all_objects`` still
+  includes them.
+* `archive_retired_assets` moves retired assets into `ArchivedAudioAsset`,
+  with their tags, in batches of one transaction each. The rows derived from
+  them, like tag links, scan index entries, search documents, and
+  fingerprints, are deleted. Usage history is kept.
+
+Archived assets keep their primary keys and digests, so they're still
+credited on the cue sheets that used them, and can be looked up by id or
+digest. `restore_assets` brings assets back from either tier in bulk.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import router, transaction
+from django.db.models import ManyToOneRel, QuerySet
+from django.utils import timezone
+from taggit.models import Tag
+
+from .aggregates import assets_created, refresh_asset_aggregates
+from .facets import invalidate_facets
+from .instrumentation import instrumented
+from .managers import query_param_chunk_size
+from .models import (
+    ArchivedAudioAsset,
+    AssetSearchDocument,
+    AudioAsset,
+    TaggedAudioAsset,
+)
+from .search import update_search_documents
+from .similarity import update_feature_vectors
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _batch_size(batch_size: int) -> int:
+    return max(
+        min(batch_size, query_param_chunk_size(router.db_for_write(AudioAsset))), 1
+    )
+
+
+@instrumented
+def retire_assets(
+    queryset: "QuerySet[AudioAsset]", batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """
+    Retire assets, hiding them from the catalog.
+
+    Their search documents are deleted, and they're taken out of their
+    artists' and collections' totals.
+
+    Args:
+        queryset: Assets to retire. Ones already retired are left alone.
+        batch_size: Number of assets to update per query.
+
+    Returns:
+        The number of assets retired.
+    """
+    rows = list(
+        queryset.filter(retired_at__isnull=True)
+        .order_by("pk")
+        .values_list("pk", "owner_id")
+    )
+    ids = [pk for pk, _owner_id in rows]
+    batch_size = _batch_size(batch_size)
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start : start + batch_size]
+            AudioAsset.all_objects.filter(pk__in=chunk).update(retired_at=now)
+            AssetSearchDocument.objects.filter(asset_id__in=chunk).delete()
+        refresh_asset_aggregates(ids, batch_size)
+    invalidate_facets(owner_id for _pk, owner_id in rows)
+    return len(ids)
+
+
+def _derived_relations() -> List[ManyToOneRel]:
+    # Everything that refers to assets with a database constraint. Usage
+    # history refers to them without one, and outlives them.
+    return [
+        relation
+        for relation in AudioAsset._meta.related_objects
+        if relation.field.db_constraint
+    ]
+
+
+def _archive_batch(ids: Sequence[int]) -> int:
+    db = router.db_for_write(AudioAsset)
+    with transaction.atomic(using=db):
+        # Assets restored since the batch was picked are left alone.
+        assets = list(
+            AudioAsset.all_objects.using(db)
+            .filter(pk__in=ids, retired_at__isnull=False)
+            .select_for_update()
+        )
+        ids = [asset.pk for asset in assets]
+        tags: Dict[int, List[str]] = defaultdict(list)
+        for asset_id, name in (
+            TaggedAudioAsset.objects.using(db)
+            .filter(content_object_id__in=ids)
+            .values_list("content_object_id", "tag__name")
+        ):
+            tags[asset_id].append(name)
+        ArchivedAudioAsset.objects.using(db).bulk_create(
+            [ArchivedAudioAsset.from_asset(asset, tags[asset.pk]) for asset in assets]
+        )
+        for relation in _derived_relations():
+            relation.related_model._base_manager.using(db).filter(
+                **{f"{relation.field.name}__in": ids}
+            ).delete()
+        # A single DELETE, without collecting related rows or sending
+        # signals. delete() would cascade to the usage history, whose
+        # foreign keys have no database constraint but still cascade in
+        # Django, and the pre_delete receiver would take it out of the
+        # rollups. Everything with a constraint was deleted just above, and
+        # the post_delete receivers' work was done when the assets were
+        # retired: their search documents, aggregates, and facets.
+        AudioAsset.all_objects.using(db).filter(pk__in=ids)._raw_delete(db)
+    return len(ids)
+
+
+@instrumented
+def archive_retired_assets(
+    owner_ids: Optional[Iterable[int]] = None,
+    retired_before: Optional[datetime.datetime] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Move retired assets into the archive.
+
+    Each batch is archived in its own transaction, so a large archive run
+    doesn't hold locks on the asset table for long.
+
+    Args:
+        owner_ids: Only archive these users' assets. Defaults to everyone's.
+        retired_before: Only archive assets retired before this time.
+        batch_size: Number of assets to archive per transaction.
+
+    Returns:
+        The number of assets archived.
+    """
+    queryset = AudioAsset.all_objects.filter(retired_at__isnull=False)
+    if owner_ids is not None:
+        queryset = queryset.filter(owner_id__in=list(owner_ids))
+    if retired_before is not None:
+        queryset = queryset.filter(retired_at__lt=retired_before)
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    batch_size = _batch_size(batch_size)
+    archived = 0
+    for start in range(0, len(ids), batch_size):
+        archived += _archive_batch(ids[start : start + batch_size])
+    return archived
+
+
+@dataclass
+class RestoreResult:
+    """
+    Summary of a restore.
+
+    Attributes:
+        unretired: Number of retired assets put back in the catalog.
+        unarchived: Number of assets moved back from the archive.
+        conflicts: Primary keys of archived assets that weren't restored
+            because their owner has an asset with the same digest, or
+            another of the restored assets has it.
+    """
+
+    unretired: int = 0
+    unarchived: int = 0
+    conflicts: List[int] = field(default_factory=list)
+
+    @property
+    def restored(self) -> int:
+        return self.unretired + self.unarchived
+
+
+def _selected_ids(
+    queryset: QuerySet, asset_ids: Optional[Sequence[int]], chunk_size: int
+) -> List[int]:
+    if asset_ids is None:
+        return list(queryset.order_by("pk").values_list("pk", flat=True))
+    found: List[int] = []
+    for start in range(0, len(asset_ids), chunk_size):
+        found.extend(
+            queryset.filter(pk__in=asset_ids[start : start + chunk_size])
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+    return found
+
+
+def _tag_ids(names: Iterable[str]) -> Dict[str, int]:
+    wanted = set(names)
+    found = dict(Tag.objects.filter(name__in=wanted).values_list("name", "pk"))
+    for name in sorted(wanted - set(found)):
+        found[name] = Tag.objects.get_or_create(name=name)[0].pk
+    return found
+
+
+def _unarchive_batch(ids: Sequence[int], result: RestoreResult) -> Set[int]:
+    db = router.db_for_write(AudioAsset)
+    with transaction.atomic(using=db):
+        records = list(
+            ArchivedAudioAsset.objects.using(db)
+            .filter(pk__in=ids)
+            .order_by("pk")
+            .select_for_update()
+        )
+        taken: Set[Tuple[int, str]] = set(
+            AudioAsset.all_objects.using(db)
+            .filter(
+                owner_id__in={record.owner_id for record in records},
+                digest__in={record.digest for record in records if record.digest},
+            )
+            .values_list("owner_id", "digest")
+        )
+        assets = []
+        restored = []
+        for record in records:
+            if (record.owner_id, record.digest) in taken:
+                result.conflicts.append(record.pk)
+                continue
+            if record.digest:
+                # Only the oldest of the batch's archived copies comes back.
+                taken.add((record.owner_id, record.digest))
+            asset = record.to_asset()
+            asset.retired_at = None
+            assets.append(asset)
+            restored.append(record)
+        AudioAsset.all_objects.using(db).bulk_create(assets)
+        tag_ids = _tag_ids(name for record in restored for name in record.tags)
+        TaggedAudioAsset.objects.using(db).bulk_create(
+            [
+                TaggedAudioAsset(content_object_id=record.pk, tag_id=tag_ids[name])
+                for record in restored
+                for name in record.tags
+            ]
+        )
+        ArchivedAudioAsset.objects.using(db).filter(
+            pk__in=[record.pk for record in restored]
+        ).delete()
+        assets_created(assets)
+        update_search_documents([asset.pk for asset in assets])
+        update_feature_vectors([asset.pk for asset in assets])
+    result.unarchived += len(assets)
+    return {asset.owner_id for asset in assets}
+
+
+@instrumented
+def restore_assets(
+    asset_ids: Optional[Iterable[int]] = None,
+    owner_ids: Optional[Iterable[int]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> RestoreResult:
+    """
+    Put retired and archived assets back in the catalog.
+
+    Archived assets get their primary keys and tags back. Ones whose owner
+    has since added an asset with the same digest are left in the archive,
+    and reported in `RestoreResult.conflicts`, as are all but the oldest of
+    archived assets that share a digest.
+
+    Args:
+        asset_ids: Primary keys of the assets to restore. Defaults to every
+            retired and archived asset.
+        owner_ids: Only restore these users' assets. Defaults to everyone's.
+        batch_size: Number of assets to restore per transaction.
+
+    Returns:
+        A `RestoreResult`.
+    """
+    result = RestoreResult()
+    retired = AudioAsset.all_objects.filter(retired_at__isnull=False)
+    archived = ArchivedAudioAsset.objects.all()
+    if owner_ids is not None:
+        owner_ids = list(owner_ids)
+        retired = retired.filter(owner_id__in=owner_ids)
+        archived = archived.filter(owner_id__in=owner_ids)
+    wanted = None if asset_ids is None else sorted(set(asset_ids))
+    batch_size = _batch_size(batch_size)
+    owners: Set[int] = set()
+
+    ids = _selected_ids(retired, wanted, batch_size)
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start : start + batch_size]
+        with transaction.atomic():
+            AudioAsset.all_objects.filter(pk__in=chunk).update(retired_at=None)
+            refresh_asset_aggregates(chunk, batch_size)
+            update_search_documents(chunk, batch_size)
+            update_feature_vectors(chunk, batch_size)
+        owners.update(
+            AudioAsset.objects.filter(pk__in=chunk).values_list("owner_id", flat=True)
+        )
+        result.unretired += len(chunk)
+
+    ids = _selected_ids(archived, wanted, batch_size)
+    for start in range(0, len(ids), batch_size):
+        owners.update(_unarchive_batch(ids[start : start + batch_size], result))
+
+    invalidate_facets(owners)
+    return result
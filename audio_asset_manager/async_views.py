@@ -0,0 +1,257 @@
+"""
+Async views for the catalog's hot read paths.
+
+Playout and editing clients make many small concurrent lookups: an asset by id
+or digest, a search, or the credits for a cue sheet. Under ASGI these views
+wait on the database without holding a thread, reading through the async ORM
+(`aget`, `aiterator`) and cache API. They return the same JSON as the REST
+API's views, and are mounted under ``async/``.
+
+Ownership is part of every query, as in `OwnedQuerySet.for_user`, so other
+users' records are simply not found. Requests are authenticated with the REST
+framework's authentication classes. Django has no async API for those, for
+raw SQL, or for the lookup cache's misses, so they run in `sync_to_async`,
+along with search ranking. Session users come from ``request.auser()`` where
+Django provides it.
+"""
+from typing import Any, Dict, List
+
+import functools
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.http import HttpRequest, JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .credits import abuild_credits
+from .lookups import attach_sources
+from .managers import query_param_chunk_size
+from .models import Artist, AudioAsset, Collection, TaggedAudioAsset
+from .search import search_assets
+from .serializers import (
+    ArtistSerializer,
+    AudioAssetReadSerializer,
+    CollectionSerializer,
+)
+from .views import SearchPagination
+
+NOT_FOUND = {"detail": "Not found."}
+
+
+def _authenticate(request: HttpRequest) -> Any:
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    return Request(request, authenticators=authenticators).user
+
+
+async def aget_user(request: HttpRequest) -> Any:
+    """
+    The user making a request, authenticated without blocking the event loop.
+
+    Args:
+        request: The request to authenticate.
+
+    Returns:
+        The authenticated user, or an anonymous user if the request has no
+        credentials.
+
+    Raises:
+        APIException: If the request has invalid credentials.
+
+    # noqa: DAR402 APIException
+    """
+    auser = getattr(request, "auser", None)
+    if auser is not None:
+        user = await auser()
+        if user.is_authenticated:
+            return user
+    return await sync_to_async(_authenticate)(request)
+
+
+def _denied(request: HttpRequest, detail: str) -> JsonResponse:
+    # Like the REST framework: 401 with a challenge if the first
+    # authentication class has one, 403 otherwise.
+    classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    challenge = classes[0]().authenticate_header(request) if classes else None
+    response = JsonResponse({"detail": detail}, status=401 if challenge else 403)
+    if challenge:
+        response["WWW-Authenticate"] = challenge
+    return response
+
+
+def _read_view(view):
+    """
+    Allow only ``GET`` requests from authenticated users, and pass the user to
+    the view.
+
+    Async views can't run in ``ATOMIC_REQUESTS`` transactions, and reads don't
+    need them, so the view opts out on every database.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request: HttpRequest, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return JsonResponse(
+                {"detail": f'Method "{request.method}" not allowed.'}, status=405
+            )
+        try:
+            user = await aget_user(request)
+        except APIException as e:
+            return _denied(request, str(e.detail))
+        if not user.is_authenticated:
+            return _denied(request, "Authentication credentials were not provided.")
+        return await view(request, user, *args, **kwargs)
+
+    for alias in connections:
+        wrapper = transaction.non_atomic_requests(using=alias)(wrapper)
+    return wrapper
+
+
+def _assets(user: Any) -> "QuerySet[AudioAsset]":
+    return AudioAsset.objects.for_user(user).select_related("artist", "collection")
+
+
+async def _serialize_assets(
+    request: HttpRequest, assets: List[AudioAsset]
+) -> List[Dict[str, Any]]:
+    tag_names: Dict[int, List[str]] = defaultdict(list)
+    ids = [asset.pk for asset in assets]
+    chunk_size = query_param_chunk_size(TaggedAudioAsset.objects.db)
+    for start in range(0, len(ids), chunk_size):
+        rows = (
+            TaggedAudioAsset.objects.filter(
+                content_object_id__in=ids[start : start + chunk_size]
+            ).order_by("tag_id")
+            # Not values_list(), whose aiterator() queries outside a thread
+            # before Django 5.
+            .values("content_object_id", "tag__name")
+        )
+        async for row in rows.aiterator():
+            tag_names[row["content_object_id"]].append(row["tag__name"])
+    for asset in assets:
+        asset.tag_names = tag_names[asset.pk]
+    await sync_to_async(attach_sources)(assets)
+    return AudioAssetReadSerializer(
+        assets, many=True, context={"request": request}
+    ).data
+
+
+async def _asset_response(
+    request: HttpRequest, queryset: "QuerySet[AudioAsset]", **lookup: Any
+) -> JsonResponse:
+    try:
+        asset = await queryset.aget(**lookup)
+    except AudioAsset.DoesNotExist:
+        return JsonResponse(NOT_FOUND, status=404)
+    (data,) = await _serialize_assets(request, [asset])
+    return JsonResponse(data)
+
+
+@_read_view
+async def asset_detail(request: HttpRequest, user: Any, pk: int) -> JsonResponse:
+    """
+    An asset by id.
+    """
+    return await _asset_response(request, _assets(user), pk=pk)
+
+
+@_read_view
+async def asset_by_digest(request: HttpRequest, user: Any, digest: str) -> JsonResponse:
+    """
+    An asset by the SHA1 digest of its file.
+    """
+    return await _asset_response(request, _assets(user), digest=digest)
+
+
+@_read_view
+async def asset_search(request: HttpRequest, user: Any) -> JsonResponse:
+    """
+    Search assets, paginated like the REST API's search.
+    """
+    pagination = SearchPagination
+    try:
+        page = int(request.GET.get("page", 1))
+        page_size = int(
+            request.GET.get(pagination.page_size_query_param, pagination.page_size)
+        )
+    except ValueError:
+        return JsonResponse({"detail": "Invalid page."}, status=404)
+    page_size = min(max(page_size, 1), pagination.max_page_size)
+    results = search_assets(user, request.GET.get("q", ""), _assets(user))
+    count = await sync_to_async(results.count)()
+    if page < 1 or (page > 1 and (page - 1) * page_size >= count):
+        return JsonResponse({"detail": "Invalid page."}, status=404)
+    matches = await sync_to_async(results.matches)(page_size, (page - 1) * page_size)
+    found = {}
+    queryset = _assets(user).filter(pk__in=[asset_id for asset_id, _rank in matches])
+    async for asset in queryset.aiterator():
+        found[asset.pk] = asset
+    assets = []
+    for asset_id, rank in matches:
+        asset = found.get(asset_id)
+        if asset is not None:
+            asset.search_rank = rank
+            assets.append(asset)
+    url = request.build_absolute_uri()
+    if page * page_size >= count:
+        next_url = None
+    else:
+        next_url = replace_query_param(url, "page", page + 1)
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, "page")
+    else:
+        previous_url = replace_query_param(url, "page", page - 1)
+    return JsonResponse(
+        {
+            "count": count,
+            "next": next_url,
+            "previous": previous_url,
+            "results": await _serialize_assets(request, assets),
+        }
+    )
+
+
+@_read_view
+async def asset_credits(request: HttpRequest, user: Any) -> JsonResponse:
+    """
+    Credits for a comma separated list of asset ``ids``, in cue order.
+    """
+    try:
+        ids = [int(pk) for pk in request.GET.get("ids", "").split(",") if pk]
+    except ValueError:
+        return JsonResponse(
+            {"ids": ["Must be a comma separated list of asset ids."]}, status=400
+        )
+    credits = await abuild_credits(user, ids)
+    return JsonResponse(credits.as_dict())
+
+
+@_read_view
+async def artist_detail(request: HttpRequest, user: Any, pk: int) -> JsonResponse:
+    """
+    An artist by id.
+    """
+    try:
+        artist = await Artist.objects.for_user(user).aget(pk=pk)
+    except Artist.DoesNotExist:
+        return JsonResponse(NOT_FOUND, status=404)
+    return JsonResponse(ArtistSerializer(artist).data)
+
+
+@_read_view
+async def collection_detail(request: HttpRequest, user: Any, pk: int) -> JsonResponse:
+    """
+    A collection by id.
+    """
+    queryset = Collection.objects.for_user(user).select_related("album_artist")
+    try:
+        collection = await queryset.aget(pk=pk)
+    except Collection.DoesNotExist:
+        return JsonResponse(NOT_FOUND, status=404)
+    return JsonResponse(CollectionSerializer(collection).data)
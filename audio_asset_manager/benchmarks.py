@@ -0,0 +1,683 @@
+"""
+Helpers for timing the app's hot queries and checking their query plans.
+
+`suite_scenarios` are the operations timed by the benchmark suite in
+``tests/test_benchmark_suite.py``, and `BenchmarkBaseline` keeps the results
+it compares later runs with.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import asyncio
+import json
+import os
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .credits import CREDIT_FORMATS, build_credits
+from .lookups import invalidate_lookups
+from .models import AssetSource, AudioAsset, LicenseType
+from .tagquery import (
+    And,
+    Not,
+    TagExpression,
+    TagTerm,
+    filter_by_tag_query,
+    parse_tag_query,
+)
+from .transfer import export_catalog, import_catalog
+from .views import AudioAssetViewSet
+
+# Plan lines that mean a table is read from start to end.
+SEQUENTIAL_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)"),
+    "mysql": re.compile(r"\btype\W+ALL\b"),
+}
+
+
+@dataclass
+class Timing:
+    """
+    Timings in milliseconds and the number of queries for a benchmarked call.
+    """
+
+    runs: List[float] = field(default_factory=list)
+    queries: int = 0
+
+    @property
+    def best(self) -> float:
+        return min(self.runs)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.runs)
+
+
+def measure(fn: Callable[[], Any], runs: int = 5) -> Timing:
+    """
+    Time a callable and count the queries it makes.
+
+    Args:
+        fn: Callable to benchmark.
+        runs: Number of times to call it.
+
+    Returns:
+        A `Timing` for the calls. The query count is from the last run.
+    """
+    timing = Timing()
+    for _ in range(runs):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            fn()
+            timing.runs.append((time.perf_counter() - start) * 1000)
+        timing.queries = len(context.captured_queries)
+    return timing
+
+
+@dataclass
+class CacheSavings:
+    """
+    Timings of a call with the lookup cache emptied before each run, and
+    with it warm.
+    """
+
+    cold: Timing
+    warm: Timing
+
+    @property
+    def queries_saved(self) -> int:
+        return self.cold.queries - self.warm.queries
+
+
+def measure_lookup_cache(fn: Callable[[], Any], runs: int = 5) -> CacheSavings:
+    """
+    Measure how many queries the lookup cache saves a callable.
+
+    Args:
+        fn: Callable to benchmark, e.g. a `Scenario`'s ``run``.
+        runs: Number of times to call it with a cold and with a warm cache.
+
+    Returns:
+        The `CacheSavings`.
+    """
+    cold = Timing()
+    for _ in range(runs):
+        invalidate_lookups(LicenseType)
+        invalidate_lookups(AssetSource)
+        timing = measure(fn, runs=1)
+        cold.runs.extend(timing.runs)
+        cold.queries = timing.queries
+    return CacheSavings(cold, measure(fn, runs=runs))
+
+
+def sequential_scans(plan: str, vendor: Optional[str] = None) -> List[str]:
+    """
+    Find the tables a query plan reads with a full sequential scan.
+
+    Args:
+        plan: Output of `QuerySet.explain`.
+        vendor: Database vendor the plan is from. Defaults to the connection's.
+
+    Returns:
+        The names of fully scanned tables, or the matching plan lines for
+        backends that don't name the table.
+    """
+    pattern = SEQUENTIAL_SCAN_PATTERNS.get(vendor or connection.vendor)
+    if pattern is None:  # pragma: nocover
+        return []
+    return [match.group(match.lastindex or 0) for match in pattern.finditer(plan)]
+
+
+def _request_host() -> str:
+    hosts = [host for host in settings.ALLOWED_HOSTS if host not in ("*", "")]
+    return hosts[0].lstrip(".") if hosts else "localhost"
+
+
+@dataclass
+class Scenario:
+    """
+    A benchmarked operation and the queryset that dominates it, if one does.
+    """
+
+    name: str
+    run: Callable[[], Any]
+    queryset: "Optional[QuerySet[Any]]" = None
+
+
+def admin_changelist_scenario(user: Any) -> Scenario:
+    """
+    The `AudioAsset` admin changelist as seen by ``user``.
+
+    Args:
+        user: User viewing the changelist.
+
+    Returns:
+        The `Scenario`.
+    """
+    model_admin = admin.site._registry[AudioAsset]
+    request = RequestFactory(HTTP_HOST=_request_host()).get("/")
+    request.user = user
+
+    def run() -> Any:
+        changelist = model_admin.get_changelist_instance(request)
+        return [str(obj) for obj in changelist.result_list]
+
+    queryset = model_admin.get_changelist_instance(request).queryset
+    return Scenario(
+        "admin changelist", run, queryset[: model_admin.list_per_page]  # type: ignore
+    )
+
+
+def _api_scenario(
+    name: str,
+    user: Any,
+    action: str,
+    params: Dict[str, Any],
+    queryset: "Optional[QuerySet[Any]]" = None,
+) -> Scenario:
+    # Extra actions' options, like their pagination class.
+    initkwargs = getattr(getattr(AudioAssetViewSet, action), "kwargs", {})
+    view = AudioAssetViewSet.as_view({"get": action}, **initkwargs)
+    factory = APIRequestFactory(HTTP_HOST=_request_host())
+
+    def run() -> Any:
+        request = factory.get("/", params)
+        force_authenticate(request, user)
+        response = view(request)
+        response.render()
+        return response
+
+    return Scenario(name, run, queryset)
+
+
+def api_listing_scenario(user: Any, page_size: int = 100) -> Scenario:
+    """
+    The first page of the `AudioAsset` API listing for ``user``.
+
+    Args:
+        user: User requesting the listing.
+        page_size: Number of results per page.
+
+    Returns:
+        The `Scenario`.
+    """
+    queryset = AudioAssetViewSet.queryset.for_user(user).order_by("-created")
+    return _api_scenario(
+        "API listing",
+        user,
+        "list",
+        {"page_size": page_size},
+        queryset[:page_size],  # type: ignore
+    )
+
+
+def api_filtering_scenario(user: Any) -> Scenario:
+    """
+    The first page of ``user``'s music in a BPM range, tagged ``ambient``
+    but not ``vocals``.
+    """
+    return _api_scenario(
+        "API filtering",
+        user,
+        "list",
+        {
+            "asset_type": AudioAsset.AssetTypes.MUSIC,
+            "bpm_min": 100,
+            "bpm_max": 130,
+            "tag_query": "ambient AND NOT vocals",
+        },
+    )
+
+
+def api_search_scenario(user: Any, query: str = "night") -> Scenario:
+    """
+    The first page of ``user``'s search results for ``query``.
+    """
+    return _api_scenario("search", user, "search", {"q": query})
+
+
+def credits_scenario(user: Any, cues: int = 50) -> Scenario:
+    """
+    Rendering the credits of a cue sheet of ``user``'s first assets in every
+    format.
+    """
+    ids = list(
+        AudioAsset.objects.for_user(user)
+        .order_by("pk")
+        .values_list("pk", flat=True)[:cues]
+    )
+
+    def run() -> Any:
+        credits = build_credits(user, ids)
+        return [credits.render(credit_format) for credit_format in CREDIT_FORMATS]
+
+    return Scenario("credits", run)
+
+
+def export_scenario(user: Any) -> Scenario:
+    """
+    Exporting all of ``user``'s assets as CSV.
+    """
+    queryset = AudioAsset.objects.for_user(user)
+
+    def run() -> Any:
+        return sum(len(chunk) for chunk in export_catalog(queryset, "csv"))
+
+    return Scenario("export", run)
+
+
+def import_scenario(user: Any, rows: int = 1000) -> Scenario:
+    """
+    Importing ``rows`` new assets for ``user``, rolled back afterwards so the
+    catalog doesn't grow between runs.
+    """
+    catalog = [
+        {
+            "title": f"Imported {i}",
+            "artist": f"Imported Artist {i % 20}",
+            "collection": f"Imported Album {i % 50}",
+            "source": "Imported Source",
+            "license_type": "Imported License",
+            "duration": 120,
+            "bpm": 90 + i % 60,
+            "tags": ["ambient", f"imported-{i % 10}"],
+        }
+        for i in range(rows)
+    ]
+
+    def run() -> Any:
+        with transaction.atomic():
+            result = import_catalog(user, catalog)
+            transaction.set_rollback(True)
+        return result
+
+    return Scenario("import", run)
+
+
+def asset_type_scenario(user: Any, asset_type: str = "SFX") -> Scenario:
+    """
+    One page of a user's assets of a single type, ordered by title.
+
+    Args:
+        user: User whose assets are listed.
+        asset_type: Asset type to filter on.
+
+    Returns:
+        The `Scenario`.
+    """
+    queryset = (
+        AudioAsset.objects.for_user(user)
+        .filter(asset_type=asset_type)
+        .order_by("title")[:100]
+    )
+    return Scenario("assets by type", lambda: list(queryset.all()), queryset)
+
+
+def taggit_filter(
+    queryset: "QuerySet[AudioAsset]", expression: TagExpression
+) -> "QuerySet[AudioAsset]":
+    """
+    Apply a tag expression the way it's usually written with taggit's
+    manager: a ``tags__name`` join per ANDed tag, ``exclude`` for NOT, and
+    ``tags__name__in`` with ``distinct`` for OR.
+
+    Only for comparison with `filter_by_tag_query`.
+    """
+    if isinstance(expression, TagTerm):
+        return queryset.filter(tags__name=expression.name)
+    if isinstance(expression, Not):
+        if isinstance(expression.operand, TagTerm):
+            return queryset.exclude(tags__name=expression.operand.name)
+        matching = taggit_filter(AudioAsset.objects.all(), expression.operand)
+        return queryset.exclude(pk__in=matching.values("pk"))
+    if isinstance(expression, And):
+        for operand in expression.operands:
+            queryset = taggit_filter(queryset, operand)
+        return queryset
+    if all(isinstance(operand, TagTerm) for operand in expression.operands):
+        names = [operand.name for operand in expression.operands]  # type: ignore
+        return queryset.filter(tags__name__in=names).distinct()
+    condition = Q()
+    for operand in expression.operands:
+        matching = taggit_filter(AudioAsset.objects.all(), operand)
+        condition |= Q(pk__in=matching.values("pk"))
+    return queryset.filter(condition)
+
+
+def tag_query_scenarios(user: Any, query: str) -> Tuple[Scenario, Scenario]:
+    """
+    Counting a user's assets that match a tag query, with `filter_by_tag_query`
+    and with `taggit_filter`.
+
+    Args:
+        user: User whose assets are queried.
+        query: A boolean tag query.
+
+    Returns:
+        The two `Scenario`s, the tag query engine's first.
+    """
+    assets = AudioAsset.objects.for_user(user)
+    expression = parse_tag_query(query)
+    scenarios = []
+    for name, apply in (
+        ("tag query", filter_by_tag_query),
+        ("tag query (taggit filters)", taggit_filter),
+    ):
+        queryset = apply(assets, expression)
+        scenarios.append(Scenario(name, queryset.count, queryset))
+    return scenarios[0], scenarios[1]
+
+
+def default_scenarios(user: Any) -> Dict[str, Scenario]:
+    """
+    The scenarios run by the ``benchmark_asset_queries`` command.
+
+    Args:
+        user: User to run them as.
+
+    Returns:
+        A dict of scenario name to `Scenario`.
+    """
+    scenarios = [
+        admin_changelist_scenario(user),
+        api_listing_scenario(user),
+        asset_type_scenario(user),
+    ]
+    return {scenario.name: scenario for scenario in scenarios}
+
+
+def suite_scenarios(user: Any) -> Dict[str, Scenario]:
+    """
+    The scenarios timed by the benchmark suite.
+
+    Args:
+        user: User to run them as.
+
+    Returns:
+        A dict of scenario name to `Scenario`.
+    """
+    scenarios = [
+        admin_changelist_scenario(user),
+        api_listing_scenario(user),
+        api_filtering_scenario(user),
+        api_search_scenario(user),
+        credits_scenario(user),
+        export_scenario(user),
+        import_scenario(user),
+    ]
+    return {scenario.name: scenario for scenario in scenarios}
+
+
+@dataclass
+class BenchmarkResult:
+    """
+    A scenario's timing at one catalog size.
+    """
+
+    name: str
+    size: int
+    median: float
+    best: float
+    queries: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.name} @ {self.size}"
+
+
+class BenchmarkBaseline:
+    """
+    Saved benchmark results, keyed by scenario and catalog size, to compare
+    later runs with.
+
+    A result regresses if it makes more queries than its baseline, or if its
+    median is more than ``tolerance`` slower, plus `TIMING_SLACK` to allow
+    for noise in very fast scenarios.
+    """
+
+    TIMING_SLACK = 2.0
+
+    def __init__(self, results: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.results = results or {}
+
+    @classmethod
+    def load(cls, path: str) -> "BenchmarkBaseline":
+        """
+        Read a baseline saved with `save`, or start an empty one.
+        """
+        try:
+            with open(path) as file:
+                return cls(json.load(file))
+        except FileNotFoundError:
+            return cls()
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.results, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+    def update(self, result: BenchmarkResult) -> None:
+        self.results[result.key] = {
+            "median": round(result.median, 3),
+            "best": round(result.best, 3),
+            "queries": result.queries,
+        }
+
+    def regressions(self, result: BenchmarkResult, tolerance: float = 0.5) -> List[str]:
+        """
+        How a result is worse than its baseline.
+
+        Args:
+            result: The new result.
+            tolerance: Share by which the median may be slower.
+
+        Returns:
+            A message per regression. Empty if there's none, or no baseline
+            for the result.
+        """
+        saved = self.results.get(result.key)
+        if saved is None:
+            return []
+        problems = []
+        if result.queries > saved["queries"]:
+            problems.append(
+                f"{result.key}: {result.queries} queries, "
+                f"baseline {saved['queries']}"
+            )
+        allowed = saved["median"] * (1 + tolerance) + self.TIMING_SLACK
+        if result.median > allowed:
+            problems.append(
+                f"{result.key}: median {result.median:.2f} ms, baseline "
+                f"{saved['median']:.2f} ms (allowed {allowed:.2f} ms)"
+            )
+        return problems
+
+
+@dataclass
+class Throughput:
+    """
+    Requests served by a view under ASGI.
+    """
+
+    requests: int
+    seconds: float
+    failures: int = 0
+
+    @property
+    def per_second(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class ReadEndpoint:
+    """
+    A read served by both a REST API view and an async view.
+    """
+
+    name: str
+    sync_path: str
+    async_path: str
+    query: str = ""
+
+
+def asgi_read_endpoints(user: Any) -> List[ReadEndpoint]:
+    """
+    The hot read paths of ``user``'s catalog, in both their sync and async
+    versions.
+
+    Args:
+        user: User with at least one asset with a digest, artist, and
+            collection.
+
+    Returns:
+        The `ReadEndpoint`s.
+    """
+    assets = AudioAsset.objects.for_user(user).order_by("pk")
+    asset = assets.exclude(digest=None).exclude(artist=None).exclude(collection=None)[0]
+    cue_sheet = ",".join(str(pk) for pk in assets.values_list("pk", flat=True)[:20])
+
+    def paths(name: str, async_name: str, **kwargs: Any) -> Tuple[str, str]:
+        return (
+            reverse(f"audio_asset_manager:{name}", kwargs=kwargs),
+            reverse(f"audio_asset_manager:{async_name}", kwargs=kwargs),
+        )
+
+    return [
+        ReadEndpoint(
+            "asset by id",
+            *paths("audioasset-detail", "async-asset-detail", pk=asset.pk),
+        ),
+        ReadEndpoint(
+            "asset by digest",
+            *paths(
+                "audioasset-by-digest", "async-asset-by-digest", digest=asset.digest
+            ),
+        ),
+        ReadEndpoint(
+            "search",
+            *paths("audioasset-search", "async-asset-search"),
+            urlencode({"q": asset.title.split()[0]}),
+        ),
+        ReadEndpoint(
+            "credits",
+            *paths("audioasset-credits", "async-asset-credits"),
+            urlencode({"ids": cue_sheet}),
+        ),
+        ReadEndpoint(
+            "artist", *paths("artist-detail", "async-artist-detail", pk=asset.artist_id)
+        ),
+        ReadEndpoint(
+            "collection",
+            *paths(
+                "collection-detail", "async-collection-detail", pk=asset.collection_id
+            ),
+        ),
+    ]
+
+
+def session_cookie(user: Any) -> str:
+    """
+    A ``Cookie`` header value logging requests in as ``user``.
+    """
+    client = Client()
+    client.force_login(user)
+    name = settings.SESSION_COOKIE_NAME
+    return f"{name}={client.cookies[name].value}"
+
+
+async def _asgi_get(application: Any, path: str, query: str, cookie: str) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", _request_host().encode()),
+            (b"cookie", cookie.encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": (_request_host(), 80),
+    }
+    received = False
+    status = 0
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client never disconnects; the handler stops listening when done.
+        await asyncio.Future()
+        return {}  # pragma: nocover
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await application(scope, receive, send)
+    return status
+
+
+def measure_asgi_throughput(
+    path: str,
+    cookie: str,
+    query: str = "",
+    requests: int = 200,
+    concurrency: int = 20,
+) -> Throughput:
+    """
+    Send ``GET`` requests to a URL through Django's ASGI handler, in process,
+    keeping ``concurrency`` of them in flight.
+
+    Like under an ASGI server, each request's sync code, such as a sync view,
+    runs in a thread of its own, with its own database connection.
+
+    Args:
+        path: Path of the URL.
+        cookie: ``Cookie`` header to send, e.g. from `session_cookie`.
+        query: Query string of the URL.
+        requests: Number of requests to send.
+        concurrency: Number of requests in flight at once.
+
+    Returns:
+        The `Throughput`. Responses other than 200 count as failures.
+    """
+    application = ASGIHandler()
+    remaining = requests
+    failures = 0
+
+    async def client() -> None:
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            if await _asgi_get(application, path, query, cookie) != 200:
+                failures += 1
+
+    async def run() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+    return Throughput(requests, asyncio.run(run()), failures)
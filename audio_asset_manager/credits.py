@@ -0,0 +1,353 @@
+"""
+Assemble the credits for a set of assets, e.g. an episode's cue sheet.
+
+Assets that require explicit credit get a line each. The rest are grouped by
+source, listing their artists. Credits are rendered as plain text, Markdown,
+and HTML.
+
+All the records involved are fetched with one query per few hundred assets,
+and the rendered fragment for each asset, source, and license type is cached.
+Cache keys include the record's ``modified`` time, so saving a record makes
+its cached fragments unreachable without any explicit invalidation.
+
+Retired and archived assets are credited like any other, so credits for old
+cue sheets don't change when their assets leave the catalog.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import re
+from dataclasses import dataclass, field
+from functools import partial
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from .managers import query_param_chunk_size
+from .models import ArchivedAudioAsset, Artist, AssetSource, AudioAsset, LicenseType
+
+CREDIT_FORMATS = ("text", "markdown", "html")
+# Bumped when fragments are rendered differently, so old ones aren't reused.
+CACHE_PREFIX = "audio_asset_manager:credits:2"
+LINK_SCHEMES = ("http", "https")
+
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+!|<>])")
+
+
+@dataclass(frozen=True)
+class Fragment:
+    """
+    A piece of credits rendered in every format.
+    """
+
+    text: str = ""
+    markdown: str = ""
+    html: str = ""
+
+    def __bool__(self) -> bool:
+        return bool(self.text)
+
+    def render(self, credit_format: str) -> str:
+        return getattr(self, credit_format)
+
+
+EMPTY = Fragment()
+
+
+def _markdown_escape(value: str) -> str:
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", value)
+
+
+def _plain(value: str) -> Fragment:
+    return Fragment(value, _markdown_escape(value), escape(value))
+
+
+def _markdown_url(url: str) -> str:
+    # Parentheses and spaces would end the link destination early.
+    return url.replace("(", "%28").replace(")", "%29").replace(" ", "%20")
+
+
+def _link(label: str, url: Optional[str]) -> Fragment:
+    # Other schemes, like javascript:, are never linked.
+    if not url or urlsplit(url).scheme.lower() not in LINK_SCHEMES:
+        return _plain(label)
+    return Fragment(
+        f"{label} ({url})",
+        f"[{_markdown_escape(label)}]({_markdown_url(url)})",
+        # format_html escapes both the href and the label.
+        format_html('<a href="{}">{}</a>', url, label),
+    )
+
+
+def _join(fragments: Iterable[Fragment], separator: str = " ") -> Fragment:
+    parts = [fragment for fragment in fragments if fragment]
+    return Fragment(
+        separator.join(part.text for part in parts),
+        separator.join(part.markdown for part in parts),
+        escape(separator).join(part.html for part in parts),
+    )
+
+
+def _sentence(fragment: Fragment) -> Fragment:
+    if not fragment:
+        return fragment
+    return _join([fragment, _plain(".")], "")
+
+
+def _stamp(obj: Any) -> str:
+    if obj is None:
+        return "-"
+    return f"{obj.pk}.{obj.modified.timestamp()}"
+
+
+def _key(kind: str, obj: Any) -> str:
+    return f"{CACHE_PREFIX}:{kind}:{_stamp(obj)}"
+
+
+def _asset_key(asset: AudioAsset) -> str:
+    # The asset's fragment includes its artist's name.
+    return f"{_key('asset', asset)}:{_stamp(asset.artist)}"
+
+
+def asset_fragment(asset: AudioAsset) -> Fragment:
+    """
+    Credit the asset's title and artist, linking to its credit link.
+    """
+    title = _link(asset.title, asset.credit_link)
+    quoted = Fragment(
+        f'"{title.text}"', f'"{title.markdown}"', f"&ldquo;{title.html}&rdquo;"
+    )
+    if asset.artist is None:
+        return quoted
+    return _join([quoted, _plain("by"), _plain(asset.artist.name)])
+
+
+def source_fragment(source: AssetSource) -> Fragment:
+    """
+    The source's extra credit text, e.g. ``/ via Audiio``.
+    """
+    return _plain(source.source_credit_text or "")
+
+
+def license_fragment(license_type: LicenseType) -> Fragment:
+    """
+    The license terms, if the license type has to be included in credits.
+    """
+    if not license_type.include_license_in_credits:
+        return EMPTY
+    name = _link(license_type.name, license_type.url)
+    return _join([_plain("Licensed under"), name])
+
+
+def _cache_timeout() -> int:
+    return getattr(settings, "AUDIO_ASSET_MANAGER_CREDITS_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def _pack(fragments: Dict[str, Fragment]) -> Dict[str, Any]:
+    return {
+        key: (fragment.text, fragment.markdown, fragment.html)
+        for key, fragment in fragments.items()
+    }
+
+
+def _memoize(builders: Dict[str, Callable[[], Fragment]]) -> Dict[str, Fragment]:
+    cached = cache.get_many(list(builders))
+    fragments = {key: Fragment(*value) for key, value in cached.items()}
+    missing = {key: build() for key, build in builders.items() if key not in cached}
+    if missing:
+        cache.set_many(_pack(missing), _cache_timeout())
+    fragments.update(missing)
+    return fragments
+
+
+async def _amemoize(builders: Dict[str, Callable[[], Fragment]]) -> Dict[str, Fragment]:
+    cached = await cache.aget_many(list(builders))
+    fragments = {key: Fragment(*value) for key, value in cached.items()}
+    missing = {key: build() for key, build in builders.items() if key not in cached}
+    if missing:
+        await cache.aset_many(_pack(missing), _cache_timeout())
+    fragments.update(missing)
+    return fragments
+
+
+@dataclass
+class _Group:
+    source: Optional[AssetSource]
+    artists: List[Artist] = field(default_factory=list)
+
+
+@dataclass
+class Credits:
+    """
+    Credits for a set of assets.
+
+    Attributes:
+        explicit: A line per asset that requires explicit credit, in cue order.
+        grouped: A line per source of the remaining assets, in order of first
+            appearance.
+    """
+
+    explicit: List[Fragment] = field(default_factory=list)
+    grouped: List[Fragment] = field(default_factory=list)
+
+    def render(self, credit_format: str = "text") -> str:
+        """
+        Render the credits in one of `CREDIT_FORMATS`.
+
+        Text and Markdown have a line per credit with a blank line between the
+        explicit and grouped credits. HTML has a list for each.
+        """
+        if credit_format not in CREDIT_FORMATS:
+            raise ValueError(f"Unknown credit format {credit_format!r}.")
+        sections = [lines for lines in (self.explicit, self.grouped) if lines]
+        if credit_format == "html":
+            return mark_safe(  # nosec - fragments are escaped when built
+                "".join(
+                    "<ul>"
+                    + "".join(f"<li>{line.html}</li>" for line in lines)
+                    + "</ul>"
+                    for lines in sections
+                )
+            )
+        prefix = "- " if credit_format == "markdown" else ""
+        return "\n\n".join(
+            "\n".join(prefix + line.render(credit_format) for line in lines)
+            for lines in sections
+        )
+
+    def as_dict(self) -> Dict[str, str]:
+        return {
+            credit_format: self.render(credit_format)
+            for credit_format in CREDIT_FORMATS
+        }
+
+
+def _assets_queryset(user: Any) -> "QuerySet[AudioAsset]":
+    return AudioAsset.all_objects.for_user(user).select_related(
+        "artist", "source__license_type"
+    )
+
+
+def _archived_queryset(user: Any) -> "QuerySet[ArchivedAudioAsset]":
+    return ArchivedAudioAsset.objects.for_user(user).select_related(
+        "artist", "source__license_type"
+    )
+
+
+def _fetch_assets(user: Any, asset_ids: Sequence[int]) -> List[AudioAsset]:
+    wanted = list(dict.fromkeys(asset_ids))
+    found: Dict[int, AudioAsset] = {}
+    queryset = _assets_queryset(user)
+    chunk_size = query_param_chunk_size(queryset.db)
+    for start in range(0, len(wanted), chunk_size):
+        found.update(queryset.in_bulk(wanted[start : start + chunk_size]))
+    # Assets that aren't in the catalog anymore may be archived.
+    missing = [pk for pk in wanted if pk not in found]
+    archived = _archived_queryset(user)
+    for start in range(0, len(missing), chunk_size):
+        for record in archived.filter(pk__in=missing[start : start + chunk_size]):
+            found[record.pk] = record.to_asset()
+    return [found[pk] for pk in wanted if pk in found]
+
+
+async def _afetch_assets(user: Any, asset_ids: Sequence[int]) -> List[AudioAsset]:
+    wanted = list(dict.fromkeys(asset_ids))
+    found: Dict[int, AudioAsset] = {}
+    queryset = _assets_queryset(user)
+    chunk_size = query_param_chunk_size(queryset.db)
+    for start in range(0, len(wanted), chunk_size):
+        chunk = queryset.filter(pk__in=wanted[start : start + chunk_size])
+        async for asset in chunk.aiterator():
+            found[asset.pk] = asset
+    missing = [pk for pk in wanted if pk not in found]
+    archived = _archived_queryset(user)
+    for start in range(0, len(missing), chunk_size):
+        chunk = archived.filter(pk__in=missing[start : start + chunk_size])
+        async for record in chunk.aiterator():
+            found[record.pk] = record.to_asset()
+    return [found[pk] for pk in wanted if pk in found]
+
+
+def _fragment_builders(
+    assets: Sequence[AudioAsset],
+) -> Dict[str, Callable[[], Fragment]]:
+    builders: Dict[str, Callable[[], Fragment]] = {}
+    for asset in assets:
+        if asset.explicit_credit_required:
+            builders[_asset_key(asset)] = partial(asset_fragment, asset)
+        source = asset.source
+        if source is not None:
+            builders[_key("source", source)] = partial(source_fragment, source)
+            if source.license_type is not None:
+                license_type = source.license_type
+                builders[_key("license", license_type)] = partial(
+                    license_fragment, license_type
+                )
+    return builders
+
+
+def _assemble(assets: Sequence[AudioAsset], fragments: Dict[str, Fragment]) -> Credits:
+    def source_credit(source: Optional[AssetSource]) -> Fragment:
+        if source is None:
+            return EMPTY
+        return fragments[_key("source", source)]
+
+    def license_credit(source: Optional[AssetSource]) -> Fragment:
+        if source is None or source.license_type is None:
+            return EMPTY
+        return fragments[_key("license", source.license_type)]
+
+    credits = Credits()
+    groups: Dict[Optional[int], _Group] = {}
+    for asset in assets:
+        if asset.explicit_credit_required:
+            line = _join([fragments[_asset_key(asset)], source_credit(asset.source)])
+            credits.explicit.append(
+                _join([_sentence(line), _sentence(license_credit(asset.source))])
+            )
+            continue
+        group = groups.setdefault(asset.source_id, _Group(asset.source))
+        if asset.artist is not None and asset.artist not in group.artists:
+            group.artists.append(asset.artist)
+    for group in groups.values():
+        artists = _join((_plain(artist.name) for artist in group.artists), ", ")
+        if group.source is None:
+            heading = _plain("Additional audio")
+        else:
+            heading = _join(
+                [_plain("Additional audio from"), _plain(group.source.name)]
+            )
+        if artists:
+            heading = _join([heading, _plain("by"), artists])
+        heading = _join([heading, source_credit(group.source)])
+        credits.grouped.append(
+            _join([_sentence(heading), _sentence(license_credit(group.source))])
+        )
+    return credits
+
+
+def build_credits(user: Any, asset_ids: Sequence[int]) -> Credits:
+    """
+    Build the credits for a list of a user's assets.
+
+    Args:
+        user: User who owns the assets. Ids of anyone else's assets are ignored.
+        asset_ids: Primary keys of the assets, in cue order. Repeats are
+            credited once.
+
+    Returns:
+        The `Credits`.
+    """
+    assets = _fetch_assets(user, asset_ids)
+    return _assemble(assets, _memoize(_fragment_builders(assets)))
+
+
+async def abuild_credits(user: Any, asset_ids: Sequence[int]) -> Credits:
+    """
+    Async version of `build_credits`, using the async ORM and cache API.
+    """
+    assets = await _afetch_assets(user, asset_ids)
+    return _assemble(assets, await _amemoize(_fragment_builders(assets)))
@@ -0,0 +1,52 @@
+"""
+Reports for finding duplicated audio in the catalog.
+"""
+from typing import Dict, List, Optional
+
+from itertools import groupby
+
+from django.db.models import Count, QuerySet
+
+from .instrumentation import instrumented
+from .models import AudioAsset
+
+
+@instrumented
+def find_duplicate_assets(
+    queryset: "Optional[QuerySet[AudioAsset]]" = None,
+) -> Dict[str, List[AudioAsset]]:
+    """
+    Group assets of different owners that share a digest.
+
+    Digests are unique per owner, so a file can only be duplicated by being
+    imported by more than one owner. The grouping is done by the database in
+    a single query.
+
+    Args:
+        queryset: Assets to report on. Defaults to every asset. The assets of
+            other owners sharing their digests are included in the groups.
+
+    Returns:
+        A dict of digest to the assets sharing it, oldest first, for every
+        digest of ``queryset`` used by more than one owner.
+    """
+    if queryset is None:
+        queryset = AudioAsset.objects.all()
+    shared = (
+        AudioAsset.objects.filter(
+            digest__in=queryset.filter(digest__isnull=False).values("digest")
+        )
+        .values("digest")
+        .annotate(owner_count=Count("owner", distinct=True))
+        .filter(owner_count__gt=1)
+        .values("digest")
+    )
+    assets = (
+        AudioAsset.objects.filter(digest__in=shared)
+        .select_related("owner")
+        .order_by("digest", "created", "pk")
+    )
+    return {
+        digest: list(group)
+        for digest, group in groupby(assets.iterator(), key=lambda a: a.digest)
+    }
@@ -0,0 +1,276 @@
+"""
+Faceted filtering of assets by type, BPM, loudness, duration, and tags.
+
+Facet counts are computed with one ``GROUP BY`` query per facet rather than
+one ``COUNT`` per facet value, and cached per owner. Each owner has a version
+number in the cache that is bumped whenever their assets change, which makes
+every cached facet result for that owner stale at once.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    QuerySet,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Floor
+
+from .models import AudioAsset, TaggedAudioAsset
+from .tagquery import filter_by_tag_query
+
+BPM_BUCKET_SIZE = 10
+LOUDNESS_BUCKET_SIZE = 1
+# Upper bounds in seconds of the duration facet's buckets. The last bucket
+# holds everything longer.
+DURATION_BUCKETS = (30, 60, 120, 180, 300, 600)
+DEFAULT_TAG_LIMIT = 50
+DEFAULT_LOUDNESS_TOLERANCE = 1.0
+
+CACHE_PREFIX = "audio_asset_manager:facets"
+
+
+@dataclass
+class AssetFilter:
+    """
+    Criteria to narrow down a set of assets.
+
+    Ranges are inclusive and any criterion left as ``None`` or empty is not
+    applied. A loudness target selects assets within the tolerance of it and
+    takes precedence over the loudness range. Assets must have every tag in
+    ``tags`` and match ``tag_query``, a boolean tag query (see `tagquery`).
+    """
+
+    asset_types: List[str] = field(default_factory=list)
+    bpm_min: Optional[int] = None
+    bpm_max: Optional[int] = None
+    loudness_min: Optional[float] = None
+    loudness_max: Optional[float] = None
+    loudness_target: Optional[float] = None
+    loudness_tolerance: float = DEFAULT_LOUDNESS_TOLERANCE
+    duration_min: Optional[int] = None
+    duration_max: Optional[int] = None
+    tags: List[str] = field(default_factory=list)
+    tag_query: Optional[str] = None
+
+    def loudness_range(self) -> Tuple[Optional[float], Optional[float]]:
+        if self.loudness_target is not None:
+            return (
+                self.loudness_target - self.loudness_tolerance,
+                self.loudness_target + self.loudness_tolerance,
+            )
+        return self.loudness_min, self.loudness_max
+
+    def cache_key(self) -> str:
+        """
+        A short, stable key identifying this filter's criteria.
+        """
+        data = asdict(self)
+        data["asset_types"] = sorted(set(self.asset_types))
+        data["tags"] = sorted(set(self.tags))
+        encoded = json.dumps(data, sort_keys=True).encode()
+        return hashlib.sha1(encoded).hexdigest()  # nosec - not used for security
+
+
+def filter_assets(
+    queryset: "QuerySet[AudioAsset]", asset_filter: Optional[AssetFilter]
+) -> "QuerySet[AudioAsset]":
+    """
+    Apply an `AssetFilter` to a queryset of assets.
+
+    Args:
+        queryset: Assets to filter.
+        asset_filter: Criteria to apply. ``None`` returns the queryset as is.
+
+    Returns:
+        The filtered queryset. Assets must have every tag in the filter.
+    """
+    if asset_filter is None:
+        return queryset
+    lookups: Dict[str, Any] = {}
+    if asset_filter.asset_types:
+        lookups["asset_type__in"] = asset_filter.asset_types
+    loudness_min, loudness_max = asset_filter.loudness_range()
+    for name, value in (
+        ("bpm__gte", asset_filter.bpm_min),
+        ("bpm__lte", asset_filter.bpm_max),
+        ("loudness__gte", loudness_min),
+        ("loudness__lte", loudness_max),
+        ("duration__gte", asset_filter.duration_min),
+        ("duration__lte", asset_filter.duration_max),
+    ):
+        if value is not None:
+            lookups[name] = value
+    queryset = queryset.filter(**lookups)
+    if asset_filter.tags:
+        for tag in sorted(set(asset_filter.tags)):
+            queryset = queryset.filter(
+                Exists(
+                    TaggedAudioAsset.objects.filter(
+                        content_object=OuterRef("pk"), tag__name=tag
+                    )
+                )
+            )
+    if asset_filter.tag_query:
+        queryset = filter_by_tag_query(queryset, asset_filter.tag_query)
+    return queryset
+
+
+def _bucket_counts(
+    queryset: "QuerySet[AudioAsset]", field_name: str, size: int
+) -> List[Dict[str, Any]]:
+    bucket = Floor(Cast(field_name, FloatField()) / size)
+    rows = (
+        queryset.filter(**{f"{field_name}__isnull": False})
+        .annotate(bucket=bucket)
+        .order_by()
+        .values("bucket")
+        .annotate(count=Count("pk"))
+        .order_by("bucket")
+    )
+    return [
+        {
+            "min": int(row["bucket"]) * size,
+            "max": (int(row["bucket"]) + 1) * size,
+            "count": row["count"],
+        }
+        for row in rows
+    ]
+
+
+def _duration_counts(queryset: "QuerySet[AudioAsset]") -> List[Dict[str, Any]]:
+    bounds = [0, *DURATION_BUCKETS]
+    bucket = Case(
+        *(
+            When(duration__lt=upper, then=Value(i))
+            for i, upper in enumerate(DURATION_BUCKETS)
+        ),
+        default=Value(len(DURATION_BUCKETS)),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.annotate(bucket=bucket)
+        .order_by()
+        .values("bucket")
+        .annotate(count=Count("pk"))
+        .order_by("bucket")
+    )
+    return [
+        {
+            "min": bounds[row["bucket"]],
+            "max": DURATION_BUCKETS[row["bucket"]]
+            if row["bucket"] < len(DURATION_BUCKETS)
+            else None,
+            "count": row["count"],
+        }
+        for row in rows
+    ]
+
+
+def _tag_counts(queryset: "QuerySet[AudioAsset]", limit: int) -> List[Dict[str, Any]]:
+    rows = (
+        TaggedAudioAsset.objects.filter(
+            content_object__in=queryset.order_by().values("pk")
+        )
+        .values("tag__name")
+        .annotate(count=Count("pk"))
+        .order_by("-count", "tag__name")[:limit]
+    )
+    return [{"value": row["tag__name"], "count": row["count"]} for row in rows]
+
+
+def compute_facets(
+    queryset: "QuerySet[AudioAsset]", tag_limit: int = DEFAULT_TAG_LIMIT
+) -> Dict[str, Any]:
+    """
+    Count assets per facet value with one aggregate query per facet.
+
+    Args:
+        queryset: Assets to count, usually already filtered.
+        tag_limit: Number of most used tags to include.
+
+    Returns:
+        A dict with the total ``count`` and lists of buckets for
+        ``asset_type``, ``bpm``, ``loudness``, ``duration``, and ``tags``.
+    """
+    type_rows = (
+        queryset.order_by()
+        .values("asset_type")
+        .annotate(count=Count("pk"))
+        .order_by("asset_type")
+    )
+    asset_types = [
+        {"value": row["asset_type"], "count": row["count"]} for row in type_rows
+    ]
+    return {
+        "count": sum(row["count"] for row in asset_types),
+        "asset_type": asset_types,
+        "bpm": _bucket_counts(queryset, "bpm", BPM_BUCKET_SIZE),
+        "loudness": _bucket_counts(queryset, "loudness", LOUDNESS_BUCKET_SIZE),
+        "duration": _duration_counts(queryset),
+        "tags": _tag_counts(queryset, tag_limit),
+    }
+
+
+def _version_key(owner_id: int) -> str:
+    return f"{CACHE_PREFIX}:{owner_id}:version"
+
+
+def invalidate_facets(owner_ids: Iterable[int]) -> None:
+    """
+    Mark the cached facet counts of owners as stale.
+
+    Args:
+        owner_ids: Primary keys of the owners whose assets changed.
+    """
+    for owner_id in set(owner_ids):
+        key = _version_key(owner_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not cached yet, or evicted. Start from a version nothing used.
+            cache.set(key, 2, None)
+
+
+def asset_facets(
+    user: Any,
+    asset_filter: Optional[AssetFilter] = None,
+    tag_limit: int = DEFAULT_TAG_LIMIT,
+) -> Dict[str, Any]:
+    """
+    Get a user's facet counts, from the cache if they're still current.
+
+    Args:
+        user: User whose assets to count.
+        asset_filter: Criteria to narrow the assets down by first.
+        tag_limit: Number of most used tags to include.
+
+    Returns:
+        The facet counts as returned by `compute_facets`.
+    """
+    queryset = filter_assets(AudioAsset.objects.for_user(user), asset_filter)
+    if not user.is_authenticated:
+        return compute_facets(queryset, tag_limit)
+    version = cache.get_or_set(_version_key(user.pk), 1, None)
+    criteria = (asset_filter or AssetFilter()).cache_key()
+    key = f"{CACHE_PREFIX}:{user.pk}:{version}:{criteria}:{tag_limit}"
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset, tag_limit)
+        cache.set(
+            key,
+            facets,
+            getattr(settings, "AUDIO_ASSET_MANAGER_FACET_CACHE_TIMEOUT", 60 * 60),
+        )
+    return facets
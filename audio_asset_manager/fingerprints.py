@@ -0,0 +1,463 @@
+"""
+Acoustic fingerprints for finding the same recording in different files.
+
+A SHA1 digest only matches byte-identical files. A fingerprint describes the
+audio itself, so the same track re-encoded in another format, at another
+sample rate or level, or with a different tail still matches.
+
+Fingerprints are built from peaks in the file's spectrogram, limited to
+4 kHz and sampled on a fixed frequency grid so the sample rate doesn't
+matter. Pairs of nearby peaks are hashed from their frequencies and the time
+between them, which doesn't depend on where in the file they are. Only the
+``FINGERPRINT_SIZE`` smallest distinct hashes of each file are kept (a
+bottom-k sketch), so the number of hashes two files share estimates how
+similar their sets of peak pairs are.
+
+Hashes are stored one per row in `FingerprintHash`, which is indexed by
+value. Finding an asset's near duplicates is then one indexed query, and
+clustering the whole catalog is a single ordered scan of that index.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Count, F, Q, QuerySet
+
+from .analysis import (
+    DECODE_ERRORS,
+    DEFAULT_BLOCK_FRAMES,
+    _Framer,
+    iter_asset_paths,
+    iter_audio_blocks,
+    require_numpy,
+)
+from .instrumentation import instrumented
+from .managers import query_param_chunk_size
+from .models import AssetFingerprint, AudioAsset, FingerprintHash
+from .scanner import ProgressCallback, StrPath, bounded_map
+
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None
+
+DEFAULT_BATCH_SIZE = 200
+FINGERPRINT_SIZE = 128
+DEFAULT_MIN_SIMILARITY = 0.3
+# Hash values shared by more assets than this are too common to tell
+# anything apart, and are ignored when clustering.
+DEFAULT_MAX_BUCKET = 50
+
+WINDOW_SECONDS = 0.064
+MAX_FREQUENCY = 4000
+FREQUENCY_BINS = 256
+# Peaks must be the loudest point within this many frames and bins.
+PEAK_FRAMES = 3
+PEAK_BINS = 7
+MIN_PEAK_MAGNITUDE = 1e-4
+# Peaks must also be within 20 dB of the loudest bin in those frames, so
+# noise and resampling artifacts in quiet bins don't add peaks.
+PEAK_RELATIVE_LEVEL = 0.1
+# Each peak is paired with the next few peaks up to 2 seconds after it.
+FAN_OUT = 5
+MAX_PAIR_FRAMES = 63
+MAX_SECONDS = 600
+# An odd multiplier permutes 31 bit values, spreading hashes evenly before
+# the smallest are picked.
+_HASH_MULTIPLIER = 0x9E3779B1
+_HASH_MASK = 0x7FFFFFFF
+
+
+class _Spectrogram:
+    """
+    Magnitude spectrogram on a fixed frequency grid, with half overlapping
+    Hann windows.
+    """
+
+    def __init__(self, samplerate: int):
+        self.hop = max(int(round(samplerate * WINDOW_SECONDS / 2)), 1)
+        self.framer = _Framer(self.hop)
+        self.window = np.hanning(2 * self.hop)
+        # Linear interpolation from the FFT bins onto the grid.
+        freqs = np.fft.rfftfreq(2 * self.hop, d=1 / samplerate)
+        grid = np.linspace(0, MAX_FREQUENCY, FREQUENCY_BINS + 1)[1:]
+        grid = np.minimum(grid, freqs[-1])
+        self.upper = np.clip(np.searchsorted(freqs, grid), 1, len(freqs) - 1)
+        self.weight = (grid - freqs[self.upper - 1]) / (
+            freqs[self.upper] - freqs[self.upper - 1]
+        )
+        self.previous: Any = None
+        self.columns: List[Any] = []
+
+    def feed(self, block: Any) -> None:
+        hops = self.framer.feed(block.mean(axis=1))
+        if not len(hops):
+            return
+        if self.previous is not None:
+            hops = np.vstack([self.previous, hops])
+        self.previous = hops[-1:]
+        if len(hops) < 2:
+            return
+        frames = np.hstack([hops[:-1], hops[1:]]) * self.window
+        magnitude = np.abs(np.fft.rfft(frames, axis=1)) / self.hop
+        self.columns.append(
+            magnitude[:, self.upper - 1] * (1 - self.weight)
+            + magnitude[:, self.upper] * self.weight
+        )
+
+    def result(self) -> Any:
+        if not self.columns:
+            return np.zeros((0, FREQUENCY_BINS))
+        return np.concatenate(self.columns)
+
+
+def _max_filter(values: Any, size: int, axis: int) -> Any:
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size, size)
+    padded = np.pad(values, pad, constant_values=-np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * size + 1, axis=axis)
+    return windows.max(axis=-1)
+
+
+def find_peaks(spectrogram: Any) -> Any:
+    """
+    Find local maxima in a spectrogram.
+
+    Args:
+        spectrogram: Magnitudes shaped ``(frames, bins)``.
+
+    Returns:
+        An array of ``(frame, bin)`` rows in time order.
+    """
+    if not len(spectrogram):
+        return np.zeros((0, 2), dtype=np.int64)
+    # Max filters over a rectangle are separable.
+    neighbourhood = _max_filter(
+        _max_filter(spectrogram, PEAK_BINS, axis=1), PEAK_FRAMES, axis=0
+    )
+    loudest = _max_filter(spectrogram.max(axis=1), PEAK_FRAMES, axis=0)
+    peaks = (
+        (spectrogram >= neighbourhood)
+        & (spectrogram > MIN_PEAK_MAGNITUDE)
+        & (spectrogram >= PEAK_RELATIVE_LEVEL * loudest[:, None])
+    )
+    return np.argwhere(peaks)
+
+
+def peak_hashes(peaks: Any) -> Any:
+    """
+    Hash each peak with the next `FAN_OUT` peaks after it.
+
+    Args:
+        peaks: ``(frame, bin)`` rows in time order, as from `find_peaks`.
+
+    Returns:
+        The distinct hash values, sorted.
+    """
+    hashes = []
+    for offset in range(1, FAN_OUT + 1):
+        anchors, targets = peaks[:-offset], peaks[offset:]
+        delta = targets[:, 0] - anchors[:, 0]
+        keep = (delta > 0) & (delta <= MAX_PAIR_FRAMES)
+        hashes.append((anchors[keep, 1] << 14) | (targets[keep, 1] << 6) | delta[keep])
+    if not hashes:
+        return np.zeros(0, dtype=np.int64)
+    values = (np.concatenate(hashes).astype(np.int64) * _HASH_MULTIPLIER) & _HASH_MASK
+    return np.unique(values)
+
+
+def fingerprint_file(
+    path: StrPath,
+    size: int = FINGERPRINT_SIZE,
+    block_frames: int = DEFAULT_BLOCK_FRAMES,
+) -> List[int]:
+    """
+    Compute the fingerprint of an audio file.
+
+    Only the first `MAX_SECONDS` of the file are used.
+
+    Args:
+        path: Path to the audio file.
+        size: Number of hashes to keep.
+        block_frames: Number of frames to decode at a time.
+
+    Returns:
+        Up to ``size`` of the smallest hash values, sorted.
+    """
+    info, blocks = iter_audio_blocks(path, block_frames=block_frames)
+    spectrogram = _Spectrogram(info.samplerate)
+    frames = 0
+    limit = info.samplerate * MAX_SECONDS
+    for block in blocks:
+        spectrogram.feed(block[: limit - frames])
+        frames += len(block)
+        if frames >= limit:
+            break
+    hashes = peak_hashes(find_peaks(spectrogram.result()))
+    return [int(value) for value in hashes[:size]]
+
+
+def _fingerprint_item(item: Tuple[int, str]) -> Tuple[int, Optional[List[int]]]:
+    asset_id, path = item
+    try:
+        return asset_id, fingerprint_file(path)
+    except DECODE_ERRORS:
+        return asset_id, None
+
+
+@dataclass
+class FingerprintResult:
+    """
+    Summary of a fingerprinting run.
+    """
+
+    fingerprinted: int = 0
+    errors: int = 0
+
+
+def stale_fingerprints(
+    queryset: "QuerySet[AudioAsset]",
+) -> "QuerySet[AudioAsset]":
+    """
+    Narrow assets down to those without a fingerprint of their current digest.
+    """
+    return queryset.filter(
+        Q(fingerprint__isnull=True)
+        | ~Q(fingerprint__digest=F("digest"))
+        | Q(fingerprint__digest__isnull=True, digest__isnull=False)
+    )
+
+
+def _save_fingerprints(fingerprints: Dict[int, List[int]], batch_size: int) -> None:
+    digests = dict(
+        AudioAsset.objects.filter(pk__in=list(fingerprints)).values_list("pk", "digest")
+    )
+    with transaction.atomic():
+        FingerprintHash.objects.filter(asset_id__in=list(fingerprints)).delete()
+        FingerprintHash.objects.bulk_create(
+            (
+                FingerprintHash(asset_id=asset_id, value=value)
+                for asset_id, values in fingerprints.items()
+                for value in values
+            ),
+            batch_size=batch_size * 10,
+        )
+        AssetFingerprint.objects.bulk_create(
+            [
+                AssetFingerprint(
+                    asset_id=asset_id, digest=digests.get(asset_id), size=len(values)
+                )
+                for asset_id, values in fingerprints.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["asset"],
+            update_fields=["digest", "size", "computed"],
+            batch_size=batch_size,
+        )
+
+
+@instrumented
+def fingerprint_assets(
+    queryset: "QuerySet[AudioAsset]",
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> FingerprintResult:
+    """
+    Compute and store fingerprints for assets in a process pool.
+
+    Files are located through the scan index. Each batch replaces the stored
+    hashes of its assets in one transaction.
+
+    Args:
+        queryset: Assets to fingerprint.
+        workers: Number of processes. ``1`` works in this process and ``None``
+            uses the CPU count.
+        batch_size: Number of assets to write per batch.
+        progress: Called with the number of assets done and the total after
+            each asset.
+
+    Returns:
+        A `FingerprintResult` summarizing the run.
+    """
+    require_numpy()
+    result = FingerprintResult()
+    pending: Dict[int, List[int]] = {}
+    total = queryset.count() if progress is not None else None
+    executor = None if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    window = (workers or os.cpu_count() or 1) * 2
+    try:
+        for asset_id, values in bounded_map(
+            executor, _fingerprint_item, iter_asset_paths(queryset), window
+        ):
+            if progress is not None:
+                progress(result.fingerprinted + result.errors + 1, total)
+            if values is None:
+                result.errors += 1
+                continue
+            result.fingerprinted += 1
+            pending[asset_id] = values
+            if len(pending) >= batch_size:
+                _save_fingerprints(pending, batch_size)
+                pending.clear()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if pending:
+        _save_fingerprints(pending, batch_size)
+    return result
+
+
+def _similarity(shared: int, size: int, other_size: int) -> float:
+    smaller = min(size, other_size)
+    return shared / smaller if smaller else 0.0
+
+
+def similar_assets(
+    asset: AudioAsset,
+    queryset: "Optional[QuerySet[AudioAsset]]" = None,
+    min_similarity: float = DEFAULT_MIN_SIMILARITY,
+) -> List[Tuple[AudioAsset, float]]:
+    """
+    Find assets that are likely the same recording as an asset.
+
+    Args:
+        asset: Fingerprinted asset to match.
+        queryset: Assets to search. Defaults to the asset owner's assets.
+        min_similarity: Fraction of the smaller fingerprint's hashes two
+            assets must share.
+
+    Returns:
+        Pairs of matching asset and similarity, most similar first.
+    """
+    if queryset is None:
+        queryset = AudioAsset.objects.filter(owner_id=asset.owner_id)
+    try:
+        size = asset.fingerprint.size
+    except AssetFingerprint.DoesNotExist:
+        return []
+    rows = (
+        FingerprintHash.objects.filter(
+            value__in=FingerprintHash.objects.filter(asset=asset).values("value"),
+            asset__in=queryset.exclude(pk=asset.pk).values("pk"),
+        )
+        .values("asset_id", "asset__fingerprint__size")
+        .annotate(shared=Count("pk"))
+    )
+    scores = {
+        row["asset_id"]: _similarity(
+            row["shared"], size, row["asset__fingerprint__size"]
+        )
+        for row in rows
+    }
+    scores = {pk: score for pk, score in scores.items() if score >= min_similarity}
+    matches = queryset.select_related("owner").in_bulk(list(scores))
+    return sorted(
+        ((matches[pk], score) for pk, score in scores.items() if pk in matches),
+        key=lambda match: (-match[1], match[0].pk),
+    )
+
+
+def _iter_buckets(
+    queryset: "QuerySet[AudioAsset]",
+) -> Iterator[List[int]]:
+    rows = (
+        FingerprintHash.objects.filter(asset__in=queryset.values("pk"))
+        .order_by("value", "asset_id")
+        .values_list("value", "asset_id")
+        .iterator(chunk_size=10000)
+    )
+    value, bucket = None, []
+    for row_value, asset_id in rows:
+        if row_value != value:
+            if len(bucket) > 1:
+                yield bucket
+            value, bucket = row_value, []
+        bucket.append(asset_id)
+    if len(bucket) > 1:
+        yield bucket
+
+
+@instrumented
+def find_similar_clusters(
+    queryset: "Optional[QuerySet[AudioAsset]]" = None,
+    min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    max_bucket: int = DEFAULT_MAX_BUCKET,
+) -> List[List[AudioAsset]]:
+    """
+    Group assets that are likely the same recording.
+
+    Hashes are read in one pass over the value index. Pairs of assets that
+    share enough hashes are linked, and linked assets form a cluster.
+
+    Args:
+        queryset: Assets to consider. Defaults to every asset.
+        min_similarity: Fraction of the smaller fingerprint's hashes two
+            assets must share to be linked.
+        max_bucket: Ignore hash values shared by more assets than this.
+
+    Returns:
+        Clusters of two or more assets, oldest first, largest cluster first.
+    """
+    if queryset is None:
+        queryset = AudioAsset.objects.all()
+    shared: Counter = Counter()
+    for bucket in _iter_buckets(queryset):
+        if len(bucket) > max_bucket:
+            continue
+        for i, first in enumerate(bucket):
+            for second in bucket[i + 1 :]:
+                shared[first, second] += 1
+    if not shared:
+        return []
+    asset_ids = list({pk for pair in shared for pk in pair})
+    sizes: Dict[int, int] = {}
+    chunk_size = query_param_chunk_size(queryset.db)
+    for start in range(0, len(asset_ids), chunk_size):
+        sizes.update(
+            AssetFingerprint.objects.filter(
+                asset_id__in=asset_ids[start : start + chunk_size]
+            ).values_list("asset_id", "size")
+        )
+
+    parents: Dict[int, int] = {}
+
+    def root(pk: int) -> int:
+        parents.setdefault(pk, pk)
+        while parents[pk] != pk:
+            parents[pk] = parents[parents[pk]]
+            pk = parents[pk]
+        return pk
+
+    for (first, second), count in shared.items():
+        if _similarity(count, sizes.get(first, 0), sizes.get(second, 0)) >= (
+            min_similarity
+        ):
+            parents[root(first)] = root(second)
+    members: Dict[int, Set[int]] = defaultdict(set)
+    for pk in parents:
+        members[root(pk)].add(pk)
+    clustered = [pk for group in members.values() if len(group) > 1 for pk in group]
+    assets: Dict[int, AudioAsset] = {}
+    for start in range(0, len(clustered), chunk_size):
+        assets.update(
+            queryset.select_related("owner").in_bulk(
+                clustered[start : start + chunk_size]
+            )
+        )
+    clusters = [
+        sorted(
+            (assets[pk] for pk in group if pk in assets),
+            key=lambda asset: (asset.created, asset.pk),
+        )
+        for group in members.values()
+        if len(group) > 1
+    ]
+    return sorted(
+        (cluster for cluster in clusters if len(cluster) > 1),
+        key=lambda cluster: (-len(cluster), cluster[0].created, cluster[0].pk),
+    )
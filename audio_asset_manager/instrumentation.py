@@ -0,0 +1,384 @@
+"""
+Query count and latency of the app's entry points.
+
+Every instrumented operation records the number of queries it made, the time
+they took, and its wall time:
+
+* API and admin views, through `InstrumentationMiddleware`.
+* Management commands, which subclass `InstrumentedCommand`.
+* Bulk operations, like `scanner.scan_library` or `transfer.import_catalog`,
+  decorated with `instrumented`, and background jobs.
+* Any other block of code, with `instrument`.
+
+Queries are counted with a database execute wrapper, so nothing is collected
+unless an operation is running, and ``DEBUG`` needn't be on. Each finished
+operation is logged on the ``audio_asset_manager.instrumentation`` logger as a
+``key=value`` line, with the same values in the record's ``operation`` extra,
+and added to `metrics`, which `render_prometheus` writes in the Prometheus
+text format for `metrics_view`. Metrics are kept per process.
+
+Set ``AUDIO_ASSET_MANAGER_INSTRUMENTATION`` to ``False`` to turn it all off.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import bisect
+import functools
+import logging
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+API = "api"
+ADMIN = "admin"
+COMMAND = "command"
+BULK = "bulk"
+JOB = "job"
+
+# Upper bounds, in seconds, of the wall time histogram's buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRIC_PREFIX = "audio_asset_manager"
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def instrumentation_enabled() -> bool:
+    return getattr(settings, "AUDIO_ASSET_MANAGER_INSTRUMENTATION", True)
+
+
+@dataclass
+class OperationStats:
+    """
+    What an operation cost.
+
+    Attributes:
+        name: The operation, e.g. a view name, command, or function name.
+        kind: One of `API`, `ADMIN`, `COMMAND`, `BULK`, or `JOB`.
+        queries: Number of queries made.
+        db_time: Seconds spent executing them.
+        wall_time: Seconds the whole operation took.
+        error: Name of the exception it raised, if any.
+        statements: SQL of the queries, if asked to capture them.
+    """
+
+    name: str
+    kind: str
+    queries: int = 0
+    db_time: float = 0.0
+    wall_time: float = 0.0
+    error: str = ""
+    statements: List[str] = field(default_factory=list, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        values = asdict(self)
+        del values["statements"]
+        return values
+
+
+class _QueryRecorder:
+    def __init__(self, stats: OperationStats, capture_sql: bool):
+        self.stats = stats
+        self.capture_sql = capture_sql
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.db_time += time.perf_counter() - start
+            self.stats.queries += 1
+            if self.capture_sql:
+                self.stats.statements.append(sql)
+
+
+@contextmanager
+def measure(
+    name: str = "", kind: str = BULK, capture_sql: bool = False
+) -> Iterator[OperationStats]:
+    """
+    Measure a block of code without recording it.
+
+    Queries are counted on every database connection of the current thread.
+
+    Args:
+        name: Name for the stats.
+        kind: Kind of operation for the stats.
+        capture_sql: Keep the SQL of each query in `OperationStats.statements`.
+
+    Yields:
+        The `OperationStats`, filled in when the block exits.
+
+    Raises:
+        BaseException: Whatever the block raises, after recording its type
+            in `OperationStats.error`.
+    """
+    stats = OperationStats(name, kind)
+    recorder = _QueryRecorder(stats, capture_sql)
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        try:
+            yield stats
+        except BaseException as e:
+            stats.error = type(e).__name__
+            raise
+        finally:
+            stats.wall_time = time.perf_counter() - start
+
+
+@dataclass
+class _Series:
+    count: int = 0
+    errors: int = 0
+    queries: int = 0
+    db_time: float = 0.0
+    wall_time: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(DURATION_BUCKETS))
+
+
+class MetricsRegistry:
+    """
+    Totals of recorded operations, by kind and name.
+    """
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stats: OperationStats) -> None:
+        bucket = bisect.bisect_left(DURATION_BUCKETS, stats.wall_time)
+        with self._lock:
+            series = self._series.setdefault((stats.kind, stats.name), _Series())
+            series.count += 1
+            series.errors += bool(stats.error)
+            series.queries += stats.queries
+            series.db_time += stats.db_time
+            series.wall_time += stats.wall_time
+            if bucket < len(DURATION_BUCKETS):
+                series.buckets[bucket] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        A copy of the totals, by ``(kind, name)``.
+        """
+        with self._lock:
+            return {key: asdict(series) for key, series in self._series.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.6f}"
+    text = str(value)
+    if not text or any(c in text for c in ' ="'):
+        text = '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return text
+
+
+def record(stats: OperationStats) -> None:
+    """
+    Log a measured operation and add it to `metrics`.
+    """
+    metrics.record(stats)
+    values = stats.as_dict()
+    logger.info(
+        " ".join(f"{key}={_format_value(value)}" for key, value in values.items()),
+        extra={"operation": values},
+    )
+
+
+@contextmanager
+def instrument(name: str, kind: str = BULK) -> Iterator[OperationStats]:
+    """
+    Measure and record a block of code.
+
+    Args:
+        name: Name of the operation.
+        kind: Kind of operation.
+
+    Yields:
+        The `OperationStats`, filled in when the block exits.
+    """
+    if not instrumentation_enabled():
+        yield OperationStats(name, kind)
+        return
+    stats = None
+    try:
+        with measure(name, kind) as stats:
+            yield stats
+    finally:
+        # Operations that raise are recorded too, after `measure` has
+        # filled in their wall time.
+        if stats is not None:
+            record(stats)
+
+
+def instrumented(function: F) -> F:
+    """
+    Decorate a bulk operation to record each call, named after the function.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with instrument(function.__name__, BULK):
+            return function(*args, **kwargs)
+
+    return wrapper  # type: ignore
+
+
+class InstrumentedCommand(BaseCommand):
+    """
+    Base class for the app's management commands, recording each run.
+    """
+
+    def execute(self, *args, **options):
+        with instrument(type(self).__module__.rsplit(".", 1)[-1], COMMAND):
+            return super().execute(*args, **options)
+
+
+def request_operation(request: HttpRequest) -> Optional[Tuple[str, str]]:
+    """
+    The kind and name of the app's view that handled a request, if any.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    if "audio_asset_manager" in match.app_names:
+        return API, match.view_name
+    if "admin" in match.app_names and (match.url_name or "").startswith(
+        "audio_asset_manager_"
+    ):
+        return ADMIN, match.url_name
+    return None
+
+
+class InstrumentationMiddleware:
+    """
+    Records the requests handled by the app's API and admin views.
+
+    Other requests are measured but not recorded. Streamed responses are
+    recorded when the view returns, before their content is sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _record(self, request: HttpRequest, stats: OperationStats) -> None:
+        operation = request_operation(request)
+        if operation is not None:
+            stats.kind, stats.name = operation
+            record(stats)
+
+    def __call__(self, request: HttpRequest) -> Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not instrumentation_enabled():
+            return self.get_response(request)
+        stats = None
+        try:
+            with measure(kind=API) as stats:
+                return self.get_response(request)
+        finally:
+            if stats is not None:
+                self._record(request, stats)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not instrumentation_enabled():
+            return await self.get_response(request)
+        # The async ORM runs queries through `sync_to_async`, in one thread
+        # per request, so the query recorder is installed in that thread.
+        block = measure(kind=API)
+        stats = await sync_to_async(block.__enter__)()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(block.__exit__)(*sys.exc_info())
+            raise
+        else:
+            await sync_to_async(block.__exit__)(None, None, None)
+        finally:
+            self._record(request, stats)
+        return response
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(registry: MetricsRegistry = metrics) -> str:
+    """
+    Write the recorded totals in the Prometheus text exposition format.
+    """
+    series = sorted(registry.snapshot().items())
+    lines = []
+    counters = (
+        ("operations_total", "count", "Number of operations."),
+        ("operation_errors_total", "errors", "Number of operations that raised."),
+        ("operation_queries_total", "queries", "Database queries made."),
+        ("operation_db_seconds_total", "db_time", "Seconds spent in queries."),
+    )
+    for suffix, key, description in counters:
+        metric = f"{METRIC_PREFIX}_{suffix}"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} counter")
+        for (kind, name), values in series:
+            labels = f'kind="{_label(kind)}",operation="{_label(name)}"'
+            lines.append(f"{metric}{{{labels}}} {_number(values[key])}")
+    metric = f"{METRIC_PREFIX}_operation_duration_seconds"
+    lines.append(f"# HELP {metric} Wall time of operations.")
+    lines.append(f"# TYPE {metric} histogram")
+    for (kind, name), values in series:
+        labels = f'kind="{_label(kind)}",operation="{_label(name)}"'
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, values["buckets"]):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {values["count"]}')
+        lines.append(f"{metric}_sum{{{labels}}} {_number(values['wall_time'])}")
+        lines.append(f"{metric}_count{{{labels}}} {values['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Serve `render_prometheus` to scrapers.
+
+    If ``AUDIO_ASSET_MANAGER_METRICS_TOKEN`` is set, requests need it as a
+    bearer token. Otherwise only staff users may read the metrics.
+    """
+    token = getattr(settings, "AUDIO_ASSET_MANAGER_METRICS_TOKEN", None)
+    if token:
+        header = request.headers.get("Authorization", "")
+        allowed = constant_time_compare(header, f"Bearer {token}")
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,568 @@
+"""
+A database backed queue for running long catalog operations outside requests.
+
+Jobs are rows in the `Job` table, so no message broker is needed. Workers,
+started with the ``run_job_worker`` command, claim pending jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it, so any
+number of workers on any number of hosts can share one queue. Every claim is
+also a conditional ``UPDATE`` of the job's status, which keeps databases
+without ``SKIP LOCKED``, like SQLite, from running a job twice.
+
+Handlers report progress to the job's row, and clients poll it through the
+API. Running jobs are kept alive with a heartbeat, and jobs whose worker
+stopped responding are put back in the queue. A worker only records progress
+and results on jobs it still holds, so a job that was requeued and claimed
+elsewhere isn't overwritten.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Type
+
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models import F
+from django.db.models.sql import UpdateQuery
+from django.db.models.sql.constants import NO_RESULTS
+from django.utils import timezone
+from rest_framework import serializers
+
+from .analysis import analyze_assets
+from .fingerprints import fingerprint_assets, stale_fingerprints
+from .instrumentation import JOB, instrument
+from .models import AudioAsset, Job
+from .scanner import scan_library
+from .transfer import FORMATS, import_catalog, read_catalog
+
+POOLS = ("thread", "process")
+DEFAULT_POLL_INTERVAL = 5.0
+# Minimum number of seconds between progress updates written by a handler.
+PROGRESS_INTERVAL = 1.0
+
+
+class JobError(ValueError):
+    """
+    Raised when a job can't be queued or run.
+    """
+
+
+@dataclass(frozen=True)
+class JobHandler:
+    """
+    A registered kind of job.
+
+    Attributes:
+        kind: Name jobs are queued under.
+        run: Called with the `Job` and a `JobProgress`. Returns the job's
+            JSON serializable result.
+        staff_only: Whether only staff may queue the job, e.g. because its
+            parameters are paths on the server.
+        params: Serializer that validates the job's parameters. Without one
+            any JSON object is accepted.
+    """
+
+    kind: str
+    run: Callable[[Job, "JobProgress"], Any]
+    staff_only: bool = False
+    params: Optional[Type[serializers.Serializer]] = None
+
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def register_job(
+    kind: str,
+    staff_only: bool = False,
+    params: Optional[Type[serializers.Serializer]] = None,
+) -> Callable[
+    [Callable[[Job, "JobProgress"], Any]], Callable[[Job, "JobProgress"], Any]
+]:
+    """
+    Register a function as the handler for a kind of job.
+
+    Args:
+        kind: Name jobs are queued under.
+        staff_only: Whether only staff may queue the job.
+        params: Serializer that validates the job's parameters.
+
+    Returns:
+        A decorator that registers the function and returns it unchanged.
+    """
+
+    def decorator(
+        run: Callable[[Job, "JobProgress"], Any]
+    ) -> Callable[[Job, "JobProgress"], Any]:
+        _handlers[kind] = JobHandler(kind, run, staff_only, params)
+        return run
+
+    return decorator
+
+
+def get_handler(kind: str) -> JobHandler:
+    """
+    Look up the handler for a kind of job.
+
+    Args:
+        kind: Name the handler was registered under.
+
+    Returns:
+        The `JobHandler`.
+
+    Raises:
+        JobError: If no handler is registered for the kind.
+    """
+    try:
+        return _handlers[kind]
+    except KeyError:
+        raise JobError(f"Unknown job kind {kind!r}.")
+
+
+def job_kinds() -> List[str]:
+    return sorted(_handlers)
+
+
+def max_job_workers() -> int:
+    return getattr(settings, "AUDIO_ASSET_MANAGER_JOB_MAX_WORKERS", os.cpu_count() or 1)
+
+
+class WorkersParams(serializers.Serializer):
+    """
+    Parameters of jobs that process files in a pool of ``workers``.
+
+    The number of workers is capped by ``AUDIO_ASSET_MANAGER_JOB_MAX_WORKERS``,
+    the number of CPUs by default.
+    """
+
+    workers = serializers.IntegerField(min_value=1, default=1)
+
+    def validate_workers(self, value: int) -> int:
+        if value > max_job_workers():
+            raise serializers.ValidationError(
+                f"Ensure this value is less than or equal to {max_job_workers()}."
+            )
+        return value
+
+
+class ScanParams(WorkersParams):
+    path = serializers.CharField()
+    batch_size = serializers.IntegerField(min_value=1, required=False)
+
+
+class AssetsParams(WorkersParams):
+    force = serializers.BooleanField(default=False)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False
+    )
+
+
+class ImportParams(serializers.Serializer):
+    path = serializers.CharField()
+    file_format = serializers.ChoiceField(choices=FORMATS, required=False)
+
+
+def clean_params(kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate parameters for a kind of job, filling in defaults.
+
+    Args:
+        kind: Name of a registered handler.
+        params: Parameters to validate.
+
+    Returns:
+        The validated parameters, as given if the handler has no ``params``
+        serializer.
+
+    Raises:
+        JobError: If the kind is unknown.
+        serializers.ValidationError: If the parameters are invalid.
+
+    # noqa: DAR402 JobError serializers.ValidationError
+    """
+    handler = get_handler(kind)
+    if handler.params is None:
+        return params
+    serializer = handler.params(data=params)
+    serializer.is_valid(raise_exception=True)
+    return dict(serializer.validated_data)
+
+
+def enqueue(owner: Any, kind: str, **params: Any) -> Job:
+    """
+    Queue a job to be run by a worker.
+
+    Args:
+        owner: User the job runs for.
+        kind: Name of a registered handler.
+        **params: JSON serializable arguments for the handler.
+
+    Returns:
+        The pending `Job`.
+
+    Raises:
+        JobError: If the kind is unknown or the parameters are invalid.
+    """
+    try:
+        params = clean_params(kind, params)
+    except serializers.ValidationError as e:
+        raise JobError(f"Invalid parameters for {kind} jobs: {e.detail}")
+    return Job.objects.create(owner=owner, kind=kind, params=params)
+
+
+class JobProgress:
+    """
+    Progress callback that records a handler's progress on its job.
+
+    Writes are throttled to one per `PROGRESS_INTERVAL`, except for the
+    first and for changes to the total. Every write also refreshes the job's
+    heartbeat, as long as the job is still running for ``worker``.
+
+    Progress reported inside a transaction, like `import_catalog`'s, is
+    written on a connection of its own, so pollers see it straight away and
+    the job's row isn't locked until the transaction ends. SQLite allows only
+    one writer at a time, so there it's written in the transaction and shows
+    when it commits.
+    """
+
+    def __init__(
+        self, job_id: int, worker: str = "", interval: float = PROGRESS_INTERVAL
+    ):
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+        self._last_write: Optional[float] = None
+        self._total: Optional[int] = None
+        self._connection: Any = None
+
+    def _get_connection(self) -> Any:
+        conn = connections[router.db_for_write(Job)]
+        if not conn.in_atomic_block or conn.vendor == "sqlite":
+            return conn
+        if self._connection is None:
+            self._connection = connections.create_connection(conn.alias)
+        return self._connection
+
+    def close(self) -> None:
+        """
+        Close the connection opened for progress written in a transaction.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __call__(self, current: int, total: Optional[int] = None) -> None:
+        now = time.monotonic()
+        if (
+            self._last_write is not None
+            and total == self._total
+            and now - self._last_write < self.interval
+        ):
+            return
+        self._last_write = now
+        self._total = total
+        # The equivalent of `QuerySet.update`, run on a chosen connection.
+        query = Job.objects.filter(
+            pk=self.job_id, worker=self.worker, status=Job.Statuses.RUNNING
+        ).query.chain(UpdateQuery)
+        query.add_update_values(
+            {
+                "progress_current": current,
+                "progress_total": total,
+                "heartbeat_at": timezone.now(),
+            }
+        )
+        query.get_compiler(connection=self._get_connection()).execute_sql(NO_RESULTS)
+
+
+def claim_jobs(
+    limit: int, worker: str, kinds: Optional[Iterable[str]] = None
+) -> List[Job]:
+    """
+    Mark up to ``limit`` of the oldest pending jobs as running for a worker.
+
+    Args:
+        limit: Maximum number of jobs to claim.
+        worker: Name of the claiming worker, recorded on the jobs.
+        kinds: Only claim jobs of these kinds.
+
+    Returns:
+        The claimed jobs, oldest first.
+    """
+    queryset = Job.objects.filter(status=Job.Statuses.PENDING).order_by("created")
+    if kinds:
+        queryset = queryset.filter(kind__in=list(kinds))
+    now = timezone.now()
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        ids = list(queryset.values_list("pk", flat=True)[:limit])
+        if not ids:
+            return []
+        # Without row locks another worker may have claimed some of these
+        # jobs since they were read. The status condition leaves those out.
+        Job.objects.filter(pk__in=ids, status=Job.Statuses.PENDING).update(
+            status=Job.Statuses.RUNNING,
+            worker=worker,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            heartbeat_at=now,
+            progress_current=0,
+            progress_total=None,
+        )
+    return list(
+        Job.objects.select_related("owner")
+        .filter(pk__in=ids, worker=worker, started_at=now)
+        .order_by("created")
+    )
+
+
+def execute_job(job_id: int) -> str:
+    """
+    Run a claimed job and record its result or error.
+
+    Args:
+        job_id: Primary key of a running job.
+
+    Returns:
+        The job's final status. If the job was requeued while it ran, e.g.
+        because its heartbeats stopped, nothing is recorded and its current
+        status is returned.
+    """
+    job = Job.objects.select_related("owner").get(pk=job_id)
+    progress = JobProgress(job.pk, job.worker)
+    try:
+        with instrument(job.kind, JOB):
+            result = get_handler(job.kind).run(job, progress)
+    except Exception:
+        status = Job.Statuses.FAILED
+        updates = {"error": traceback.format_exc()}
+    else:
+        status = Job.Statuses.SUCCEEDED
+        updates = {"result": result, "error": ""}
+    finally:
+        progress.close()
+    now = timezone.now()
+    # Only record the outcome if this worker still holds the job.
+    recorded = Job.objects.filter(
+        pk=job.pk, worker=job.worker, status=Job.Statuses.RUNNING
+    ).update(status=status, finished_at=now, heartbeat_at=now, **updates)
+    if not recorded:
+        return Job.objects.values_list("status", flat=True).get(pk=job.pk)
+    return status
+
+
+def _execute_in_pool(job_id: int) -> str:
+    try:
+        return execute_job(job_id)
+    finally:
+        # Pool threads each open their own connection.
+        connections.close_all()
+
+
+def _init_process() -> None:
+    import django
+
+    django.setup()
+    # A forked process inherits the parent's connection objects. Drop them
+    # without closing, since the parent may still be using the sockets.
+    for conn in connections.all():
+        conn.connection = None
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Put back running jobs whose worker stopped sending heartbeats.
+
+    Jobs that have used up their attempts fail instead. The timeout and
+    attempts are set with ``AUDIO_ASSET_MANAGER_JOB_STALE_AFTER`` (seconds)
+    and ``AUDIO_ASSET_MANAGER_JOB_MAX_ATTEMPTS``.
+
+    Returns:
+        The number of jobs requeued or failed.
+    """
+    stale_after = getattr(settings, "AUDIO_ASSET_MANAGER_JOB_STALE_AFTER", 10 * 60)
+    max_attempts = getattr(settings, "AUDIO_ASSET_MANAGER_JOB_MAX_ATTEMPTS", 3)
+    stale = Job.objects.filter(
+        status=Job.Statuses.RUNNING,
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_after),
+    )
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=Job.Statuses.FAILED,
+        error="The job's worker stopped responding.",
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=Job.Statuses.PENDING, worker=""
+    )
+    return failed + requeued
+
+
+def _beat(job_ids: Iterable[int]) -> None:
+    Job.objects.filter(pk__in=list(job_ids), status=Job.Statuses.RUNNING).update(
+        heartbeat_at=timezone.now()
+    )
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(
+    concurrency: int = 1,
+    pool: str = "thread",
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    once: bool = False,
+    kinds: Optional[Iterable[str]] = None,
+    worker: Optional[str] = None,
+) -> int:
+    """
+    Claim and run jobs until stopped.
+
+    Args:
+        concurrency: Number of jobs to run at a time. ``1`` runs jobs in this
+            thread.
+        pool: ``"thread"`` or ``"process"``, the kind of pool to run jobs in
+            when ``concurrency`` is more than 1.
+        poll_interval: Seconds to wait for new jobs when the queue is empty.
+        once: Return when the queue is empty instead of waiting.
+        kinds: Only run jobs of these kinds.
+        worker: Name recorded on claimed jobs. Defaults to the host name and
+            process id.
+
+    Returns:
+        The number of jobs run.
+
+    Raises:
+        JobError: If ``pool`` isn't one of the supported pools.
+    """
+    if pool not in POOLS:
+        raise JobError(f"Unknown pool {pool!r}.")
+    worker = worker or default_worker_name()
+    kinds = list(kinds or [])
+    executor: Optional[Executor] = None
+    if concurrency > 1 and pool == "process":
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            max_workers=concurrency, initializer=_init_process
+        )
+    elif concurrency > 1:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+    running: Dict[Future, int] = {}
+    processed = 0
+    try:
+        while True:
+            requeue_stale_jobs()
+            if executor is None:
+                jobs = claim_jobs(1, worker, kinds)
+                for job in jobs:
+                    execute_job(job.pk)
+                    processed += 1
+            else:
+                jobs = claim_jobs(concurrency - len(running), worker, kinds)
+                for job in jobs:
+                    running[executor.submit(_execute_in_pool, job.pk)] = job.pk
+                if running:
+                    done, _ = wait(
+                        running, timeout=poll_interval, return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        del running[future]
+                        future.result()
+                        processed += 1
+                    _beat(running.values())
+            if not jobs and not running:
+                if once:
+                    return processed
+                time.sleep(poll_interval)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+@register_job("scan", staff_only=True, params=ScanParams)
+def scan_job(job: Job, progress: JobProgress) -> Dict[str, Any]:
+    """
+    Scan a directory on the server, see `scan_library`.
+
+    Params: ``path``, and optionally ``workers`` (default 1) and
+    ``batch_size``.
+    """
+    options = {k: job.params[k] for k in ("batch_size",) if k in job.params}
+    result = scan_library(
+        job.params["path"],
+        job.owner,
+        workers=job.params.get("workers", 1),
+        progress=progress,
+        **options,
+    )
+    return asdict(result)
+
+
+@register_job("analyze", params=AssetsParams)
+def analyze_job(job: Job, progress: JobProgress) -> Dict[str, Any]:
+    """
+    Analyze the owner's assets, see `analyze_assets`.
+
+    Params: optionally ``force`` to re-analyze measured assets, ``ids`` to
+    limit the assets, and ``workers`` (default 1).
+    """
+    queryset = AudioAsset.objects.filter(owner=job.owner)
+    if "ids" in job.params:
+        queryset = queryset.filter(pk__in=job.params["ids"])
+    if not job.params.get("force"):
+        queryset = queryset.filter(loudness__isnull=True)
+    result = analyze_assets(
+        queryset, workers=job.params.get("workers", 1), progress=progress
+    )
+    return asdict(result)
+
+
+@register_job("fingerprint", params=AssetsParams)
+def fingerprint_job(job: Job, progress: JobProgress) -> Dict[str, Any]:
+    """
+    Fingerprint the owner's assets, see `fingerprint_assets`.
+
+    Params: optionally ``force`` to recompute current fingerprints, ``ids``
+    to limit the assets, and ``workers`` (default 1).
+    """
+    queryset = AudioAsset.objects.filter(owner=job.owner)
+    if "ids" in job.params:
+        queryset = queryset.filter(pk__in=job.params["ids"])
+    if not job.params.get("force"):
+        queryset = stale_fingerprints(queryset)
+    result = fingerprint_assets(
+        queryset, workers=job.params.get("workers", 1), progress=progress
+    )
+    return asdict(result)
+
+
+@register_job("import", staff_only=True, params=ImportParams)
+def import_job(job: Job, progress: JobProgress) -> Dict[str, Any]:
+    """
+    Import a catalog file on the server, see `import_catalog`.
+
+    Params: ``path``, and optionally ``file_format``, which defaults to the
+    file's extension.
+    """
+    path = job.params["path"]
+    file_format = job.params.get("file_format") or (
+        os.path.splitext(path)[1].lstrip(".").lower()
+    )
+    if file_format not in FORMATS:
+        raise JobError(f"Unknown catalog format {file_format!r}.")
+    with open(path, encoding="utf-8", newline="") as file:
+        result = import_catalog(
+            job.owner, read_catalog(file, file_format), progress=progress
+        )
+    return asdict(result)
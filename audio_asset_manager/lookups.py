@@ -0,0 +1,198 @@
+"""
+Read-through caches for small, rarely changing lookup tables.
+
+`LicenseType` and `AssetSource` rows are read far more often than they change,
+so instead of joining them into every asset query they're looked up by primary
+key in two cache layers:
+
+1. A process-local LRU, which costs no I/O at all.
+2. The Django cache, shared by every process.
+
+Rows missing from both are fetched with one ``IN`` query and stored in both.
+
+Each cached model has a version token in the Django cache, and every cache key
+includes it. Saving or deleting a row replaces the token (see `receivers`),
+which makes every process's cached rows of that model unreachable at once.
+Checking the token costs one Django cache read per lookup, never a query.
+Use a cache backend shared between processes, such as Redis or Memcached, so
+processes see each other's invalidations. Changes that don't send signals,
+like `QuerySet.update`, must call `invalidate_lookups` themselves.
+"""
+from typing import Any, Dict, Generic, Iterable, Optional, Type, TypeVar
+
+import copy
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+
+from .managers import query_param_chunk_size
+from .models import AssetSource, LicenseType
+
+CACHE_PREFIX = "audio_asset_manager:lookups"
+DEFAULT_LOCAL_SIZE = 1024
+
+M = TypeVar("M", bound=Model)
+
+
+class LookupCache(Generic[M]):
+    """
+    A two layer read-through cache of a model's rows by primary key.
+
+    Lookups return copies, so callers may change the objects they get.
+
+    Args:
+        model: Model to cache.
+        local_size: Number of rows to keep in the process-local LRU.
+    """
+
+    def __init__(self, model: Type[M], local_size: int = DEFAULT_LOCAL_SIZE):
+        self.model = model
+        self.local_size = local_size
+        self._local: "OrderedDict[str, M]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.label = model._meta.label_lower
+
+    def _version_key(self) -> str:
+        return f"{CACHE_PREFIX}:{self.label}:version"
+
+    def version(self) -> str:
+        version = cache.get(self._version_key())
+        if version is None:
+            # A fresh token rather than a counter, so local entries from
+            # before the cache was cleared never become reachable again.
+            version = uuid.uuid4().hex
+            if not cache.add(self._version_key(), version, None):
+                version = cache.get(self._version_key(), version)
+        return version
+
+    def invalidate(self) -> None:
+        """
+        Make every cached row of the model stale, in every process.
+        """
+        cache.set(self._version_key(), uuid.uuid4().hex, None)
+        with self._lock:
+            self._local.clear()
+
+    def _key(self, version: str, pk: Any) -> str:
+        return f"{CACHE_PREFIX}:{self.label}:{version}:{pk}"
+
+    def get_many(self, pks: Iterable[Any]) -> Dict[Any, M]:
+        """
+        Look up rows by primary key.
+
+        Args:
+            pks: Primary keys to look up. ``None`` is ignored.
+
+        Returns:
+            A dict of primary key to a copy of the row, for the rows that
+            exist.
+        """
+        wanted = {pk for pk in pks if pk is not None}
+        if not wanted:
+            return {}
+        version = self.version()
+        keys = {self._key(version, pk): pk for pk in wanted}
+        found: Dict[Any, M] = {}
+        with self._lock:
+            for key, pk in keys.items():
+                obj = self._local.get(key)
+                if obj is not None:
+                    self._local.move_to_end(key)
+                    found[pk] = obj
+        missing = [key for key, pk in keys.items() if pk not in found]
+        fetched: Dict[str, M] = {}
+        if missing:
+            fetched.update(cache.get_many(missing))
+            from_db = [keys[key] for key in missing if key not in fetched]
+            if from_db:
+                rows: Dict[str, M] = {}
+                manager = self.model._default_manager
+                chunk_size = query_param_chunk_size(manager.db)
+                for start in range(0, len(from_db), chunk_size):
+                    chunk = manager.in_bulk(from_db[start : start + chunk_size])
+                    rows.update(
+                        (self._key(version, pk), obj) for pk, obj in chunk.items()
+                    )
+                if rows:
+                    cache.set_many(
+                        rows,
+                        getattr(
+                            settings,
+                            "AUDIO_ASSET_MANAGER_LOOKUP_CACHE_TIMEOUT",
+                            60 * 60 * 24,
+                        ),
+                    )
+                fetched.update(rows)
+        if fetched:
+            with self._lock:
+                for key, obj in fetched.items():
+                    self._local[key] = obj
+                    self._local.move_to_end(key)
+                while len(self._local) > self.local_size:
+                    self._local.popitem(last=False)
+            found.update((keys[key], obj) for key, obj in fetched.items())
+        return {pk: copy.copy(obj) for pk, obj in found.items()}
+
+    def get(self, pk: Any) -> Optional[M]:
+        """
+        Look up a single row by primary key.
+
+        Args:
+            pk: Primary key of the row.
+
+        Returns:
+            A copy of the row, or ``None`` if it doesn't exist.
+        """
+        return self.get_many([pk]).get(pk)
+
+
+license_types: LookupCache[LicenseType] = LookupCache(LicenseType)
+asset_sources: LookupCache[AssetSource] = LookupCache(AssetSource)
+
+_caches = {LicenseType: license_types, AssetSource: asset_sources}
+
+
+def lookup_cache(model: Type[Model]) -> Optional[LookupCache]:
+    """
+    The lookup cache for a model, if it has one.
+    """
+    return _caches.get(model)
+
+
+def invalidate_lookups(model: Type[Model]) -> None:
+    """
+    Make a model's cached rows stale after changing them without signals.
+    """
+    _caches[model].invalidate()
+
+
+def attach_license_types(sources: Iterable[AssetSource]) -> None:
+    """
+    Set the license type of sources from the cache instead of querying it.
+    """
+    sources = list(sources)
+    found = license_types.get_many(source.license_type_id for source in sources)
+    for source in sources:
+        if source.license_type_id is not None:
+            source.license_type = found.get(source.license_type_id)
+
+
+def attach_sources(objects: Iterable[Any], field: str = "source") -> None:
+    """
+    Set the source, and its license type, of objects from the cache.
+
+    Args:
+        objects: Objects with a foreign key to `AssetSource`, e.g. assets.
+        field: Name of the foreign key.
+    """
+    objects = list(objects)
+    attname = f"{field}_id"
+    found = asset_sources.get_many(getattr(obj, attname) for obj in objects)
+    attach_license_types(found.values())
+    for obj in objects:
+        if getattr(obj, attname) is not None:
+            setattr(obj, field, found.get(getattr(obj, attname)))
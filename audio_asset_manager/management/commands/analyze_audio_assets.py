@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.analysis import DEFAULT_BATCH_SIZE, analyze_assets
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.models import AudioAsset
+
+
+class Command(InstrumentedCommand):
+    help = "Measure duration, BPM, and loudness for scanned assets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner", help="Only analyze assets belonging to this username."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of analysis processes. Defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of assets to update per query.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-analyze assets that already have a loudness measurement.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = AudioAsset.objects.all()
+        if options["owner"]:
+            user_model = get_user_model()
+            try:
+                owner = user_model.objects.get_by_natural_key(options["owner"])
+            except user_model.DoesNotExist:
+                raise CommandError(f"User {options['owner']} does not exist.")
+            queryset = queryset.filter(owner=owner)
+        if not options["force"]:
+            queryset = queryset.filter(loudness__isnull=True)
+        result = analyze_assets(
+            queryset, workers=options["workers"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Analyzed {result.analyzed} assets with {result.errors} errors."
+            )
+        )
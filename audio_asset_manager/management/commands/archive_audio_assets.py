@@ -0,0 +1,57 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from audio_asset_manager.archive import DEFAULT_BATCH_SIZE, archive_retired_assets
+from audio_asset_manager.instrumentation import InstrumentedCommand
+
+
+class Command(InstrumentedCommand):
+    help = "Move retired assets out of the asset table and into the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help="Limit archiving to these usernames. May be given more than once.",
+        )
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=0,
+            help="Only archive assets retired at least this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of assets to archive per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 0:
+            raise CommandError("--older-than can't be negative.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        owner_ids = None
+        if options["owner"]:
+            user_model = get_user_model()
+            owner_ids = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                ).values_list("pk", flat=True)
+            )
+            if len(owner_ids) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+        retired_before = None
+        if options["older_than"]:
+            retired_before = timezone.now() - datetime.timedelta(
+                days=options["older_than"]
+            )
+        archived = archive_retired_assets(
+            owner_ids, retired_before, batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} assets."))
@@ -0,0 +1,147 @@
+from django.contrib.auth import get_user_model
+
+from audio_asset_manager.benchmarks import (
+    asgi_read_endpoints,
+    default_scenarios,
+    measure,
+    measure_asgi_throughput,
+    measure_lookup_cache,
+    sequential_scans,
+    session_cookie,
+    tag_query_scenarios,
+)
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.synthetic import generate_catalog
+
+
+class Command(InstrumentedCommand):
+    help = (
+        "Seed a synthetic catalog and print timings and query plans for the "
+        "admin changelist and API listing queries, the queries the lookup cache "
+        "saves per API page, a tag query against the equivalent taggit "
+        "filters, and the requests per second of the sync and async read views "
+        "under ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--assets",
+            type=int,
+            default=10000,
+            help="Number of assets the benchmark user should have.",
+        )
+        parser.add_argument(
+            "--owner",
+            default="audio-asset-benchmark",
+            help="Username to run the benchmark as. Created if it doesn't exist.",
+        )
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Number of times to run each query."
+        )
+        parser.add_argument(
+            "--max-tags",
+            type=int,
+            default=5,
+            help="Tag each seeded asset with up to this many tags.",
+        )
+        parser.add_argument(
+            "--tag-query",
+            default="ambient AND piano AND NOT vocals",
+            help="Boolean tag query to compare with the equivalent taggit filters.",
+        )
+        parser.add_argument(
+            "--asgi-requests",
+            type=int,
+            default=200,
+            help="Requests to send to each sync and async read view. 0 skips them.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=20,
+            help="Number of ASGI requests in flight at once.",
+        )
+
+    def handle(self, *args, **options):
+        user_model = get_user_model()
+        owner, _created = user_model.objects.get_or_create(
+            **{user_model.USERNAME_FIELD: options["owner"]}
+        )
+        existing = AudioAsset.objects.for_user(owner).count()
+        if existing < options["assets"]:
+            self.stdout.write(
+                f"Seeding {options['assets'] - existing} assets for {owner}..."
+            )
+            generate_catalog(
+                owner,
+                options["assets"] - existing,
+                seed=existing,
+                max_tags=options["max_tags"],
+            )
+        failed = False
+        scenarios = default_scenarios(owner)
+        for name, scenario in scenarios.items():
+            timing = measure(scenario.run, runs=options["runs"])
+            plan = scenario.queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {name} =="))
+            self.stdout.write(
+                f"best {timing.best:.2f} ms, median {timing.median:.2f} ms over "
+                f"{len(timing.runs)} runs, {timing.queries} queries"
+            )
+            self.stdout.write(plan)
+            scans = sequential_scans(plan)
+            if scans:
+                failed = True
+                self.stdout.write(
+                    self.style.WARNING(f"Sequential scan of: {', '.join(scans)}")
+                )
+        savings = measure_lookup_cache(
+            scenarios["API listing"].run, runs=options["runs"]
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING("== lookup cache =="))
+        self.stdout.write(
+            f"API listing page: {savings.cold.queries} queries cold, "
+            f"{savings.warm.queries} warm, {savings.queries_saved} saved per page "
+            f"(median {savings.cold.median:.2f} ms cold, "
+            f"{savings.warm.median:.2f} ms warm)"
+        )
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(f"== tag query: {options['tag_query']} ==")
+        )
+        for scenario in tag_query_scenarios(owner, options["tag_query"]):
+            timing = measure(scenario.run, runs=options["runs"])
+            self.stdout.write(
+                f"{scenario.name}: {scenario.run()} assets, best {timing.best:.2f} ms, "
+                f"median {timing.median:.2f} ms"
+            )
+        if options["asgi_requests"] > 0:
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f"== ASGI reads, {options['concurrency']} concurrent =="
+                )
+            )
+            cookie = session_cookie(owner)
+            for endpoint in asgi_read_endpoints(owner):
+                results = [
+                    measure_asgi_throughput(
+                        path,
+                        cookie,
+                        endpoint.query,
+                        options["asgi_requests"],
+                        options["concurrency"],
+                    )
+                    for path in (endpoint.sync_path, endpoint.async_path)
+                ]
+                line = (
+                    f"{endpoint.name}: sync {results[0].per_second:.0f} req/s, "
+                    f"async {results[1].per_second:.0f} req/s"
+                )
+                if results[0].per_second:
+                    line += f" ({results[1].per_second / results[0].per_second:.2f}x)"
+                failures = sum(result.failures for result in results)
+                if failures:
+                    line += self.style.WARNING(f", {failures} failed")
+                self.stdout.write(line)
+        if not failed:
+            self.stdout.write(self.style.SUCCESS("No sequential scans found."))
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.transfer import DEFAULT_CHUNK_SIZE, FORMATS, export_catalog
+
+
+class Command(InstrumentedCommand):
+    help = (
+        "Export a user's assets, with their credits and tags, and their other "
+        "artists, collections, and sources as CSV or JSON Lines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            required=True,
+            help="Username of the user whose assets to export.",
+        )
+        parser.add_argument(
+            "--format", dest="file_format", choices=FORMATS, default="csv"
+        )
+        parser.add_argument(
+            "--output", "-o", help="File to write to. Defaults to standard output."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Number of assets to fetch per query.",
+        )
+
+    def handle(self, *args, **options):
+        user_model = get_user_model()
+        try:
+            owner = user_model.objects.get_by_natural_key(options["owner"])
+        except user_model.DoesNotExist:
+            raise CommandError(f"User {options['owner']} does not exist.")
+        chunks = export_catalog(
+            AudioAsset.objects.filter(owner=owner),
+            options["file_format"],
+            chunk_size=options["chunk_size"],
+            owner=owner,
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as file:
+                file.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.dedup import find_duplicate_assets
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.models import AudioAsset
+
+
+class Command(InstrumentedCommand):
+    help = "Report files that more than one owner has imported."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help=(
+                "Only report files these usernames imported, with the other owners "
+                "that imported them. May be given more than once."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        queryset = AudioAsset.objects.all()
+        if options["owner"]:
+            user_model = get_user_model()
+            owners = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                )
+            )
+            if len(owners) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+            queryset = queryset.filter(owner__in=owners)
+        duplicates = find_duplicate_assets(queryset)
+        for digest, assets in duplicates.items():
+            self.stdout.write(f"{digest}:")
+            for asset in assets:
+                self.stdout.write(
+                    f"  [{asset.pk}] {asset.owner} - {asset.title} ({asset.filename})"
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f"Found {len(duplicates)} duplicated digests.")
+        )
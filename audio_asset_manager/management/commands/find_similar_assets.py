@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.fingerprints import (
+    DEFAULT_MAX_BUCKET,
+    DEFAULT_MIN_SIMILARITY,
+    find_similar_clusters,
+)
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.models import AudioAsset
+
+
+class Command(InstrumentedCommand):
+    help = (
+        "Report clusters of assets that are likely the same recording, by "
+        "acoustic fingerprint. Run fingerprint_audio_assets first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help="Limit the report to these usernames. May be given more than once.",
+        )
+        parser.add_argument(
+            "--min-similarity",
+            type=float,
+            default=DEFAULT_MIN_SIMILARITY,
+            help="Fraction of fingerprint hashes two assets must share.",
+        )
+        parser.add_argument(
+            "--max-bucket",
+            type=int,
+            default=DEFAULT_MAX_BUCKET,
+            help="Ignore hashes shared by more than this many assets.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = AudioAsset.objects.all()
+        if options["owner"]:
+            user_model = get_user_model()
+            owners = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                )
+            )
+            if len(owners) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+            queryset = queryset.filter(owner__in=owners)
+        clusters = find_similar_clusters(
+            queryset,
+            min_similarity=options["min_similarity"],
+            max_bucket=options["max_bucket"],
+        )
+        for number, cluster in enumerate(clusters, start=1):
+            self.stdout.write(f"Cluster {number}:")
+            for asset in cluster:
+                self.stdout.write(
+                    f"  [{asset.pk}] {asset.owner} - {asset.title} ({asset.filename})"
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f"Found {len(clusters)} clusters of similar assets.")
+        )
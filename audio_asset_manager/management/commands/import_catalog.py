@@ -0,0 +1,62 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.transfer import (
+    DEFAULT_BATCH_SIZE,
+    FORMATS,
+    CatalogFormatError,
+    import_catalog,
+    read_catalog,
+)
+
+
+class Command(InstrumentedCommand):
+    help = "Import assets, with their credits and tags, from CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import.")
+        parser.add_argument(
+            "--owner", required=True, help="Username of the user who owns the assets."
+        )
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=FORMATS,
+            help="Format of the file. Defaults to its extension.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of assets to insert per batch.",
+        )
+
+    def handle(self, *args, **options):
+        user_model = get_user_model()
+        try:
+            owner = user_model.objects.get_by_natural_key(options["owner"])
+        except user_model.DoesNotExist:
+            raise CommandError(f"User {options['owner']} does not exist.")
+        file_format = options["file_format"]
+        if file_format is None:
+            file_format = os.path.splitext(options["path"])[1].lstrip(".").lower()
+            if file_format not in FORMATS:
+                raise CommandError("Can't tell the file's format, pass --format.")
+        with open(options["path"], encoding="utf-8", newline="") as file:
+            try:
+                result = import_catalog(
+                    owner,
+                    read_catalog(file, file_format),
+                    batch_size=options["batch_size"],
+                )
+            except CatalogFormatError as e:
+                raise CommandError(str(e))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.created} assets, skipped {result.skipped} "
+                "with digests that already exist."
+            )
+        )
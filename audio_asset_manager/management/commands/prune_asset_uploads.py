@@ -0,0 +1,26 @@
+import datetime
+
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.uploads import prune_uploads
+
+DEFAULT_OLDER_THAN_HOURS = 24
+
+
+class Command(InstrumentedCommand):
+    help = "Delete abandoned asset uploads and the partial files they left."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=DEFAULT_OLDER_THAN_HOURS,
+            help="Only delete uploads that received no chunk in this many hours.",
+        )
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 0:
+            raise CommandError("--older-than can't be negative.")
+        deleted = prune_uploads(datetime.timedelta(hours=options["older_than"]))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} abandoned uploads."))
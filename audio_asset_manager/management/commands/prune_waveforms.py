@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.waveforms import prune_waveforms
+
+DEFAULT_MAX_SIZE_MB = 1024
+
+
+class Command(InstrumentedCommand):
+    help = "Trim the waveform cache, removing the least recently served first."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-size",
+            type=int,
+            default=getattr(
+                settings,
+                "AUDIO_ASSET_MANAGER_WAVEFORM_CACHE_MB",
+                DEFAULT_MAX_SIZE_MB,
+            ),
+            help="Size in megabytes to trim the cache to.",
+        )
+
+    def handle(self, *args, **options):
+        if options["max_size"] < 0:
+            raise CommandError("--max-size can't be negative.")
+        result = prune_waveforms(options["max_size"] * 1024 * 1024)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Removed {result.removed} cached waveforms, freeing "
+                f"{result.freed} bytes. {result.remaining} bytes remain."
+            )
+        )
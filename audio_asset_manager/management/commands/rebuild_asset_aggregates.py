@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.aggregates import rebuild_aggregates
+from audio_asset_manager.instrumentation import InstrumentedCommand
+
+
+class Command(InstrumentedCommand):
+    help = (
+        "Recompute the asset count, total duration, and loudness totals of every "
+        "artist and collection from their assets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help="Limit the rebuild to these usernames. May be given more than once.",
+        )
+
+    def handle(self, *args, **options):
+        owner_ids = None
+        if options["owner"]:
+            user_model = get_user_model()
+            owner_ids = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                ).values_list("pk", flat=True)
+            )
+            if len(owner_ids) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+        result = rebuild_aggregates(owner_ids)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recomputed {result.artists} artists and "
+                f"{result.collections} collections."
+            )
+        )
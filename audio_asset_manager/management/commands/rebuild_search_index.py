@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.search import DEFAULT_BATCH_SIZE, rebuild_search_index
+
+
+class Command(InstrumentedCommand):
+    help = "Rebuild the full text search documents for assets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help="Limit the rebuild to these usernames. May be given more than once.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of assets to index per batch.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = AudioAsset.objects.all()
+        if options["owner"]:
+            user_model = get_user_model()
+            owners = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                )
+            )
+            if len(owners) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+            queryset = queryset.filter(owner__in=owners)
+        written = rebuild_search_index(queryset, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} assets."))
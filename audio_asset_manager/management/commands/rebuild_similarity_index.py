@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.similarity import DEFAULT_BATCH_SIZE, rebuild_similarity_index
+
+
+class Command(InstrumentedCommand):
+    help = "Recompute asset feature vectors and rewrite the similarity indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help="Limit the rebuild to these usernames. May be given more than once.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of assets to update per batch.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        owner_ids = None
+        if options["owner"]:
+            user_model = get_user_model()
+            owner_ids = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                ).values_list("pk", flat=True)
+            )
+            if len(owner_ids) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+        result = rebuild_similarity_index(owner_ids, batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Computed {result.vectors} feature vectors for {result.owners} "
+                f"owners."
+            )
+        )
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.usage import rebuild_usage_rollups
+
+
+class Command(InstrumentedCommand):
+    help = "Recompute the monthly asset and source usage rollups from the cue sheets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help="Limit the rebuild to these usernames. May be given more than once.",
+        )
+
+    def handle(self, *args, **options):
+        owner_ids = None
+        if options["owner"]:
+            user_model = get_user_model()
+            owner_ids = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                ).values_list("pk", flat=True)
+            )
+            if len(owner_ids) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+        written = rebuild_usage_rollups(owner_ids)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows."))
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.archive import DEFAULT_BATCH_SIZE, restore_assets
+from audio_asset_manager.instrumentation import InstrumentedCommand
+
+
+class Command(InstrumentedCommand):
+    help = (
+        "Put retired and archived assets back in the catalog, by id, or all of "
+        "the given owners' assets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids", nargs="*", type=int, help="Ids of assets to restore."
+        )
+        parser.add_argument(
+            "--owner",
+            action="append",
+            default=[],
+            help="Limit the restore to these usernames. May be given more than once.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of assets to restore per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["ids"] and not options["owner"]:
+            raise CommandError("Give the ids of assets to restore, or --owner.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        owner_ids = None
+        if options["owner"]:
+            user_model = get_user_model()
+            owner_ids = list(
+                user_model.objects.filter(
+                    **{f"{user_model.USERNAME_FIELD}__in": options["owner"]}
+                ).values_list("pk", flat=True)
+            )
+            if len(owner_ids) != len(set(options["owner"])):
+                raise CommandError("One or more of the given users does not exist.")
+        result = restore_assets(
+            options["ids"] or None, owner_ids, batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Restored {result.unretired} retired and {result.unarchived} "
+                f"archived assets."
+            )
+        )
+        if result.conflicts:
+            self.stderr.write(
+                "Left in the archive, because their digest is in use: "
+                + ", ".join(map(str, result.conflicts))
+            )
@@ -0,0 +1,63 @@
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.jobs import (
+    DEFAULT_POLL_INTERVAL,
+    POOLS,
+    default_worker_name,
+    job_kinds,
+    run_worker,
+)
+
+
+class Command(InstrumentedCommand):
+    help = "Run queued jobs. Start as many workers, on as many hosts, as needed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of jobs to run at a time.",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=POOLS,
+            default="thread",
+            help="Run concurrent jobs in threads or processes.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=DEFAULT_POLL_INTERVAL,
+            help="Seconds to wait between checks of an empty queue.",
+        )
+        parser.add_argument(
+            "--kind",
+            action="append",
+            dest="kinds",
+            help="Only run jobs of this kind. May be repeated.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for jobs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        unknown = set(options["kinds"] or []) - set(job_kinds())
+        if unknown:
+            raise CommandError(f"Unknown job kinds: {', '.join(sorted(unknown))}.")
+        worker = default_worker_name()
+        self.stdout.write(f"Worker {worker} waiting for jobs.")
+        processed = run_worker(
+            concurrency=options["concurrency"],
+            pool=options["pool"],
+            poll_interval=options["poll_interval"],
+            once=options["once"],
+            kinds=options["kinds"],
+            worker=worker,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {processed} jobs."))
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from audio_asset_manager.instrumentation import InstrumentedCommand
+from audio_asset_manager.scanner import (
+    AUDIO_EXTENSIONS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    scan_library,
+)
+
+
+class Command(InstrumentedCommand):
+    help = "Scan a directory of audio files and create assets for any new files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Directory to scan.")
+        parser.add_argument(
+            "--owner", required=True, help="Username of the user who owns the assets."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of hashing processes. Defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of assets to insert per query.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Number of bytes to read at a time when hashing.",
+        )
+        parser.add_argument(
+            "--extensions",
+            default=",".join(sorted(AUDIO_EXTENSIONS)),
+            help="Comma separated list of file extensions to include.",
+        )
+
+    def handle(self, *args, **options):
+        user_model = get_user_model()
+        try:
+            owner = user_model.objects.get_by_natural_key(options["owner"])
+        except user_model.DoesNotExist:
+            raise CommandError(f"User {options['owner']} does not exist.")
+        extensions = [
+            ext if ext.startswith(".") else f".{ext}"
+            for ext in options["extensions"].split(",")
+            if ext
+        ]
+        result = scan_library(
+            options["path"],
+            owner,
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            chunk_size=options["chunk_size"],
+            extensions=extensions,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Scanned {result.scanned} files: {result.unchanged} unchanged, "
+                f"{result.created} created, {result.renamed} renamed, "
+                f"{result.updated} updated, {result.skipped} duplicates, "
+                f"{result.archived} archived, {result.missing} missing, "
+                f"{result.errors} errors."
+            )
+        )
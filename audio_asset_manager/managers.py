@@ -0,0 +1,96 @@
+"""
+Custom managers and querysets for the app's models.
+"""
+from typing import Any, Dict, Iterable, List
+
+from django.db import connections, models
+
+# Leave room for any parameters used by filters already on the queryset.
+RESERVED_QUERY_PARAMS = 50
+
+
+def query_param_chunk_size(using: str, default: int = 10000) -> int:
+    """
+    Determine how many parameters can safely go into a single ``IN`` clause.
+
+    Args:
+        using: Database alias the query will run against.
+        default: Size to use when the backend has no parameter limit.
+
+    Returns:
+        The number of values to send per query.
+    """
+    limit = connections[using].features.max_query_params
+    if limit is None:
+        return default
+    return max(limit - RESERVED_QUERY_PARAMS, 1)
+
+
+class OwnedQuerySet(models.QuerySet):
+    """
+    QuerySet for models with an owner.
+    """
+
+    def for_user(self, user: Any) -> "OwnedQuerySet":
+        """
+        Limit the queryset to records the user is allowed to see.
+
+        This is the queryset equivalent of the ``is_object_owner`` rule: the
+        ownership check becomes part of the ``WHERE`` clause instead of being
+        evaluated in Python against each loaded object.
+
+        Args:
+            user: The user to filter for. Anonymous users see nothing.
+
+        Returns:
+            The filtered queryset.
+        """
+        if user is None or not user.is_authenticated:
+            return self.none()
+        return self.filter(owner_id=user.pk)
+
+
+class AudioAssetQuerySet(OwnedQuerySet):
+    """
+    QuerySet for `AudioAsset` with bulk lookup helpers.
+    """
+
+    def lookup_digests(self, digests: Iterable[str]) -> Dict[str, Any]:
+        """
+        Fetch the assets in this queryset matching any of the given digests.
+
+        Digests are sent in as few ``IN`` queries as the database's parameter
+        limit allows. Digests are unique per owner, so filter the queryset to a
+        single owner first if you need an unambiguous mapping.
+
+        Args:
+            digests: SHA1 digests to look for.
+
+        Returns:
+            A dict of digest to matching asset for every digest that was found.
+        """
+        wanted: List[str] = sorted({digest for digest in digests if digest})
+        chunk_size = query_param_chunk_size(self.db)
+        found = {}
+        for start in range(0, len(wanted), chunk_size):
+            chunk = wanted[start : start + chunk_size]
+            for asset in self.filter(digest__in=chunk):
+                found[asset.digest] = asset
+        return found
+
+
+OwnedManager = models.Manager.from_queryset(OwnedQuerySet)
+AudioAssetManager = models.Manager.from_queryset(AudioAssetQuerySet)
+
+
+class LiveAudioAssetManager(AudioAssetManager):
+    """
+    Manager for assets that haven't been retired.
+
+    This is `AudioAsset`'s default manager, so the API, admin, and bulk
+    operations only see live assets. ``AudioAsset.all_objects`` includes the
+    retired ones.
+    """
+
+    def get_queryset(self) -> AudioAssetQuerySet:
+        return super().get_queryset().filter(retired_at__isnull=True)
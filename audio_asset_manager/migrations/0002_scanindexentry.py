@@ -0,0 +1,106 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:25
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import rules.contrib.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("audio_asset_manager", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="licensetype",
+            options={"ordering": ["name"]},
+        ),
+        migrations.CreateModel(
+            name="ScanIndexEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "path",
+                    models.CharField(
+                        help_text="Absolute path of the file when last scanned.",
+                        max_length=1024,
+                    ),
+                ),
+                (
+                    "size",
+                    models.PositiveBigIntegerField(
+                        help_text="Size of the file in bytes when last hashed."
+                    ),
+                ),
+                (
+                    "mtime_ns",
+                    models.BigIntegerField(
+                        help_text="Modification time of the file in nanoseconds when last hashed."
+                    ),
+                ),
+                (
+                    "digest",
+                    models.CharField(
+                        help_text="SHA1 digest of the file when last hashed.",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "asset",
+                    models.ForeignKey(
+                        help_text="Asset this file was matched to.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scan_entries",
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        help_text="User who owns this record.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "scan index entries",
+            },
+            bases=(rules.contrib.models.RulesModelMixin, models.Model),
+        ),
+        migrations.AddConstraint(
+            model_name="scanindexentry",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "path"), name="unique_scan_path_per_owner"
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:27
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+
+def merge_duplicate_digests(apps, schema_editor):
+    """
+    Keep each digest on the owner's oldest asset so the constraint can be added.
+
+    The other assets with the digest are kept, without it, and their scan index
+    entries are pointed at the oldest asset, as a rescan would have done. Every
+    change is logged, so the digests can be put back by hand.
+    """
+    AudioAsset = apps.get_model("audio_asset_manager", "AudioAsset")
+    ScanIndexEntry = apps.get_model("audio_asset_manager", "ScanIndexEntry")
+    AudioAsset.objects.filter(digest="").update(digest=None)
+    duplicates = (
+        AudioAsset.objects.filter(digest__isnull=False)
+        .values("owner_id", "digest")
+        .annotate(asset_count=Count("pk"))
+        .filter(asset_count__gt=1)
+    )
+    for row in list(duplicates):
+        kept, *others = (
+            AudioAsset.objects.filter(owner_id=row["owner_id"], digest=row["digest"])
+            .order_by("created", "pk")
+            .values_list("pk", flat=True)
+        )
+        logger.warning(
+            "Owner %s has several assets with digest %s. Keeping it on asset %s "
+            "and clearing it from assets %s, whose scan index entries now point "
+            "to asset %s.",
+            row["owner_id"],
+            row["digest"],
+            kept,
+            ", ".join(str(pk) for pk in others),
+            kept,
+        )
+        ScanIndexEntry.objects.filter(asset_id__in=others).update(asset_id=kept)
+        AudioAsset.objects.filter(pk__in=others).update(digest=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audio_asset_manager", "0002_scanindexentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_digests, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="audioasset",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("digest__isnull", False)),
+                fields=("owner", "digest"),
+                name="unique_asset_digest_per_owner",
+            ),
+        ),
+    ]
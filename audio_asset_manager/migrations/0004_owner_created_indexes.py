@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audio_asset_manager", "0003_audioasset_unique_digest"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="artist",
+            index=models.Index(
+                fields=["owner", "created"], name="artist_owner_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="assetsource",
+            index=models.Index(
+                fields=["owner", "created"], name="asset_source_owner_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="collection",
+            index=models.Index(
+                fields=["owner", "created"], name="collection_owner_created_idx"
+            ),
+        ),
+    ]
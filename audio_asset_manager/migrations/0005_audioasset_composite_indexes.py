@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audio_asset_manager", "0004_owner_created_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="audioasset",
+            index=models.Index(
+                fields=["owner", "asset_type", "title"],
+                name="asset_owner_type_title_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="audioasset",
+            index=models.Index(
+                fields=["owner", "artist", "collection", "title"],
+                name="asset_owner_artist_coll_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="audioasset",
+            index=models.Index(
+                fields=["owner", "created"], name="asset_owner_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+DOCUMENT_TABLE = "audio_asset_manager_assetsearchdocument"
+FTS_TABLE = "audio_asset_manager_assetsearch_fts"
+
+SQLITE_FORWARDS = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, credits, tags,
+        content='{DOCUMENT_TABLE}', content_rowid='asset_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, credits, tags)
+        VALUES (new.asset_id, new.title, new.credits, new.tags);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, credits, tags)
+        VALUES ('delete', old.asset_id, old.title, old.credits, old.tags);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, credits, tags)
+        VALUES ('delete', old.asset_id, old.title, old.credits, old.tags);
+        INSERT INTO {FTS_TABLE}(rowid, title, credits, tags)
+        VALUES (new.asset_id, new.title, new.credits, new.tags);
+    END
+    """,
+]
+SQLITE_BACKWARDS = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRESQL_FORWARDS = [
+    f"""
+    ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A')
+        || setweight(to_tsvector('simple', credits), 'B')
+        || setweight(to_tsvector('simple', tags), 'C')
+    ) STORED
+    """,
+    f"""
+    CREATE INDEX audio_asset_search_vector_idx ON {DOCUMENT_TABLE}
+    USING GIN (search_vector)
+    """,
+]
+POSTGRESQL_BACKWARDS = [
+    "DROP INDEX IF EXISTS audio_asset_search_vector_idx",
+    f"ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall())
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite" and _has_fts5(schema_editor.connection):
+        statements = SQLITE_FORWARDS
+    elif vendor == "postgresql":
+        statements = POSTGRESQL_FORWARDS
+    else:
+        statements = []
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        statements = SQLITE_BACKWARDS
+    elif vendor == "postgresql":
+        statements = POSTGRESQL_BACKWARDS
+    else:
+        statements = []
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("audio_asset_manager", "0005_audioasset_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AssetSearchDocument",
+            fields=[
+                (
+                    "asset",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                ("title", models.TextField(blank=True, default="")),
+                (
+                    "credits",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        help_text="Names of the artist, collection, and source of the asset.",
+                    ),
+                ),
+                ("tags", models.TextField(blank=True, default="")),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audio_asset_manager", "0006_assetsearchdocument"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="audioasset",
+            index=models.Index(fields=["owner", "bpm"], name="asset_owner_bpm_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="audioasset",
+            index=models.Index(
+                fields=["owner", "loudness"], name="asset_owner_loudness_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="audioasset",
+            index=models.Index(
+                fields=["owner", "duration"], name="asset_owner_duration_idx"
+            ),
+        ),
+    ]
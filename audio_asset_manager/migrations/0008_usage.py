@@ -0,0 +1,264 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:43
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import rules.contrib.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("audio_asset_manager", "0007_audioasset_facet_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Production",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "title",
+                    models.CharField(
+                        help_text="Title of the production.", max_length=250
+                    ),
+                ),
+                (
+                    "air_date",
+                    models.DateField(
+                        blank=True,
+                        help_text="Date the production aired or was published, if it has.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        help_text="User who owns this record.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            bases=(rules.contrib.models.RulesModelMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name="AssetUsageMonth",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(help_text="First day of the month.")),
+                ("uses", models.IntegerField(default=0)),
+                ("seconds", models.BigIntegerField(default=0)),
+                (
+                    "asset",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_months",
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AssetUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                ("used_on", models.DateField(help_text="Date the asset was used.")),
+                (
+                    "seconds",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Length of the asset used, in seconds."
+                    ),
+                ),
+                (
+                    "position",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Position of the cue in the production."
+                    ),
+                ),
+                (
+                    "asset",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usages",
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        help_text="User who owns this record.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "production",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usages",
+                        to="audio_asset_manager.production",
+                    ),
+                ),
+                (
+                    "source",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Source the asset was licensed from when it was used.",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="audio_asset_manager.assetsource",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["production", "position"],
+            },
+            bases=(rules.contrib.models.RulesModelMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name="SourceUsageMonth",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(help_text="First day of the month.")),
+                ("uses", models.IntegerField(default=0)),
+                ("seconds", models.BigIntegerField(default=0)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "source",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_months",
+                        to="audio_asset_manager.assetsource",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "month", "source"],
+                        name="source_usage_owner_month_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="sourceusagemonth",
+            constraint=models.UniqueConstraint(
+                fields=("source", "month"), name="unique_source_usage_month"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="production",
+            index=models.Index(
+                fields=["owner", "created"], name="production_owner_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="assetusagemonth",
+            index=models.Index(
+                fields=["owner", "month", "asset"], name="asset_usage_owner_month_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="assetusagemonth",
+            constraint=models.UniqueConstraint(
+                fields=("asset", "month"), name="unique_asset_usage_month"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="assetusage",
+            index=models.Index(
+                fields=["owner", "used_on"], name="usage_owner_used_on_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="assetusage",
+            index=models.Index(
+                fields=["production", "position"], name="usage_cue_order_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audio_asset_manager", "0009_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AssetFingerprint",
+            fields=[
+                (
+                    "asset",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="fingerprint",
+                        serialize=False,
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                (
+                    "digest",
+                    models.CharField(
+                        blank=True,
+                        help_text="Digest of the asset when it was fingerprinted.",
+                        max_length=50,
+                        null=True,
+                    ),
+                ),
+                (
+                    "size",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of hashes stored for the asset."
+                    ),
+                ),
+                (
+                    "computed",
+                    models.DateTimeField(
+                        auto_now=True, help_text="When the fingerprint was computed."
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="FingerprintHash",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("value", models.PositiveIntegerField()),
+                (
+                    "asset",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fingerprint_hashes",
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["value", "asset"], name="fingerprint_value_asset_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_aggregates(apps, schema_editor):
+    AudioAsset = apps.get_model("audio_asset_manager", "AudioAsset")
+    for model_name, key in (("Artist", "artist"), ("Collection", "collection")):
+        model = apps.get_model("audio_asset_manager", model_name)
+        assets = AudioAsset.objects.filter(**{key: OuterRef("pk")}).order_by()
+        totals = assets.values(key)
+
+        def total(aggregate, default, output_field):
+            return Coalesce(
+                Subquery(totals.annotate(value=aggregate).values("value")),
+                Value(default),
+                output_field=output_field,
+            )
+
+        model.objects.using(schema_editor.connection.alias).update(
+            asset_count=total(Count("pk"), 0, models.PositiveIntegerField()),
+            total_duration=total(Sum("duration"), 0, models.BigIntegerField()),
+            loudness_sum=total(Sum("loudness"), 0.0, models.FloatField()),
+            loudness_count=total(Count("loudness"), 0, models.PositiveIntegerField()),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audio_asset_manager", "0010_fingerprints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="artist",
+            name="asset_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Number of assets."
+            ),
+        ),
+        migrations.AddField(
+            model_name="artist",
+            name="loudness_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Number of measured assets."
+            ),
+        ),
+        migrations.AddField(
+            model_name="artist",
+            name="loudness_sum",
+            field=models.FloatField(
+                default=0, editable=False, help_text="Sum of the measured assets' LUFS."
+            ),
+        ),
+        migrations.AddField(
+            model_name="artist",
+            name="total_duration",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Total length of the assets in seconds.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="collection",
+            name="asset_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Number of assets."
+            ),
+        ),
+        migrations.AddField(
+            model_name="collection",
+            name="loudness_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Number of measured assets."
+            ),
+        ),
+        migrations.AddField(
+            model_name="collection",
+            name="loudness_sum",
+            field=models.FloatField(
+                default=0, editable=False, help_text="Sum of the measured assets' LUFS."
+            ),
+        ),
+        migrations.AddField(
+            model_name="collection",
+            name="total_duration",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Total length of the assets in seconds.",
+            ),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,136 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:05
+
+import django.db.models.deletion
+import taggit.managers
+from django.db import migrations, models
+
+COPY_BATCH_SIZE = 1000
+
+
+def _bulk_copy(rows, make, manager):
+    batch = []
+    for row in rows.order_by("pk").iterator(chunk_size=COPY_BATCH_SIZE):
+        batch.append(make(*row))
+        if len(batch) >= COPY_BATCH_SIZE:
+            manager.bulk_create(batch)
+            batch = []
+    manager.bulk_create(batch)
+
+
+def _tag_tables(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+    TaggedAudioAsset = apps.get_model("audio_asset_manager", "TaggedAudioAsset")
+    alias = schema_editor.connection.alias
+    # Content types are normally created after migrating, so a fresh database
+    # doesn't have it yet. Creating it early is harmless.
+    content_type, _created = ContentType.objects.using(alias).get_or_create(
+        app_label="audio_asset_manager", model="audioasset"
+    )
+    return (
+        content_type,
+        TaggedItem,
+        TaggedItem.objects.using(alias).filter(content_type=content_type),
+        TaggedAudioAsset,
+        TaggedAudioAsset.objects.using(alias),
+    )
+
+
+def copy_tags(apps, schema_editor):
+    content_type, _, generic, TaggedAudioAsset, typed = _tag_tables(apps, schema_editor)
+    AudioAsset = apps.get_model("audio_asset_manager", "AudioAsset")
+    assets = AudioAsset.objects.using(schema_editor.connection.alias)
+    # Generic tags outlive deleted assets. Those have nothing to point the
+    # foreign key at, so they are dropped along with the rest.
+    _bulk_copy(
+        generic.filter(object_id__in=assets.values("pk")).values_list(
+            "object_id", "tag_id"
+        ),
+        lambda asset_id, tag_id: TaggedAudioAsset(
+            content_object_id=asset_id, tag_id=tag_id
+        ),
+        typed,
+    )
+    generic.delete()
+
+
+def uncopy_tags(apps, schema_editor):
+    content_type, TaggedItem, generic, _, typed = _tag_tables(apps, schema_editor)
+    _bulk_copy(
+        typed.values_list("content_object_id", "tag_id"),
+        lambda asset_id, tag_id: TaggedItem(
+            content_type=content_type, object_id=asset_id, tag_id=tag_id
+        ),
+        generic,
+    )
+    typed.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("taggit", "0005_auto_20220424_2025"),
+        ("audio_asset_manager", "0011_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaggedAudioAsset",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_object",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tagged_items",
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="%(app_label)s_%(class)s_items",
+                        to="taggit.tag",
+                    ),
+                ),
+            ],
+        ),
+        # The tags have no table of their own, only the through model does.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="audioasset",
+                    name="tags",
+                    field=taggit.managers.TaggableManager(
+                        help_text="A comma-separated list of tags.",
+                        through="audio_asset_manager.TaggedAudioAsset",
+                        to="taggit.Tag",
+                        verbose_name="Tags",
+                    ),
+                ),
+            ]
+        ),
+        migrations.AddIndex(
+            model_name="taggedaudioasset",
+            index=models.Index(
+                fields=["tag", "content_object"], name="tagged_asset_tag_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="taggedaudioasset",
+            constraint=models.UniqueConstraint(
+                fields=("content_object", "tag"), name="unique_asset_tag"
+            ),
+        ),
+        migrations.RunPython(copy_tags, uncopy_tags),
+    ]
@@ -0,0 +1,153 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:30
+
+import django.db.models.deletion
+import rules.contrib.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("audio_asset_manager", "0012_tagged_audio_asset"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedAudioAsset",
+            fields=[
+                (
+                    "id",
+                    models.BigIntegerField(
+                        help_text="Primary key of the asset that was archived.",
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "asset_type",
+                    models.CharField(
+                        choices=[
+                            ("MU", "Music"),
+                            ("SFX", "SFX"),
+                            ("AD", "Ad"),
+                            ("PR", "Promo"),
+                        ],
+                        default="MU",
+                        max_length=5,
+                    ),
+                ),
+                ("title", models.CharField(max_length=250)),
+                ("filename", models.CharField(blank=True, max_length=250, null=True)),
+                ("digest", models.CharField(blank=True, max_length=50, null=True)),
+                ("explicit_credit_required", models.BooleanField(default=True)),
+                ("credit_link", models.URLField(blank=True, null=True)),
+                ("duration", models.PositiveIntegerField(default=0)),
+                ("bpm", models.PositiveIntegerField(blank=True, null=True)),
+                ("loudness", models.FloatField(blank=True, null=True)),
+                (
+                    "tags",
+                    models.JSONField(
+                        blank=True, default=list, help_text="Names of the asset's tags."
+                    ),
+                ),
+                ("created", models.DateTimeField()),
+                ("modified", models.DateTimeField()),
+                ("retired_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            bases=(rules.contrib.models.RulesModelMixin, models.Model),
+        ),
+        migrations.AddField(
+            model_name="audioasset",
+            name="retired_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the asset was retired. Retired assets are hidden from the catalog until they're restored or archived.",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assetusage",
+            name="asset",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="usages",
+                to="audio_asset_manager.audioasset",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assetusagemonth",
+            name="asset",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="usage_months",
+                to="audio_asset_manager.audioasset",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="audioasset",
+            index=models.Index(
+                condition=models.Q(("retired_at__isnull", False)),
+                fields=["owner", "retired_at"],
+                name="asset_owner_retired_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedaudioasset",
+            name="artist",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="audio_asset_manager.artist",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedaudioasset",
+            name="collection",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="audio_asset_manager.collection",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedaudioasset",
+            name="owner",
+            field=models.ForeignKey(
+                help_text="User who owns this record.",
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedaudioasset",
+            name="source",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="audio_asset_manager.assetsource",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedaudioasset",
+            index=models.Index(
+                fields=["owner", "digest"], name="archived_owner_digest_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedaudioasset",
+            index=models.Index(
+                fields=["owner", "archived_at"], name="archived_owner_archived_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("audio_asset_manager", "0013_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AssetFeatures",
+            fields=[
+                (
+                    "asset",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="features",
+                        serialize=False,
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                (
+                    "vector",
+                    models.BinaryField(help_text="Little endian 32 bit floats."),
+                ),
+                (
+                    "modified",
+                    models.DateTimeField(
+                        auto_now=True, help_text="When the vector was computed."
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "asset features",
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "modified"], name="features_owner_mod_idx"
+                    )
+                ],
+            },
+        ),
+    ]
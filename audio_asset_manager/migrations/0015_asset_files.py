@@ -0,0 +1,132 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:47
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import rules.contrib.models
+from django.conf import settings
+from django.db import migrations, models
+
+import audio_asset_manager.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("audio_asset_manager", "0014_asset_features"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedaudioasset",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                max_length=250,
+                null=True,
+                storage=audio_asset_manager.storage.asset_storage,
+                upload_to="",
+            ),
+        ),
+        migrations.AddField(
+            model_name="audioasset",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                help_text="The uploaded audio file, stored by its digest.",
+                max_length=250,
+                null=True,
+                storage=audio_asset_manager.storage.asset_storage,
+                upload_to="",
+            ),
+        ),
+        migrations.CreateModel(
+            name="AssetUpload",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "filename",
+                    models.CharField(
+                        help_text="Name of the file on the uploader's side.",
+                        max_length=250,
+                    ),
+                ),
+                (
+                    "size",
+                    models.PositiveBigIntegerField(
+                        help_text="Size of the file in bytes."
+                    ),
+                ),
+                (
+                    "offset",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Number of bytes received so far."
+                    ),
+                ),
+                (
+                    "completed",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When the last chunk was received.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "asset",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Asset the file is for. If not given, one is created when the upload completes.",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="uploads",
+                        to="audio_asset_manager.audioasset",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        help_text="User who owns this record.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "created"], name="upload_owner_created_idx"
+                    )
+                ],
+            },
+            bases=(rules.contrib.models.RulesModelMixin, models.Model),
+        ),
+    ]
@@ -1,14 +1,28 @@
+import uuid
+
 import rules
 from django.conf import settings
 from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.utils.translation import gettext_lazy as _
 
 # Put your models here.
 from model_utils.models import TimeStampedModel
 from rules.contrib.models import RulesModelBase, RulesModelMixin
 from taggit.managers import TaggableManager
+from taggit.models import TaggedItemBase
 
+from .managers import AudioAssetManager, LiveAudioAssetManager, OwnedManager
 from .rules import is_object_owner
+from .storage import asset_storage
+
+OWNED_MODEL_PERMISSIONS = {
+    "add": rules.is_authenticated,
+    "read": is_object_owner,
+    "change": is_object_owner,
+    "delete": is_object_owner,
+    "view": is_object_owner,
+}
 
 
 class AbstractOwnedModel(RulesModelMixin, models.Model, metaclass=RulesModelBase):
@@ -18,15 +32,18 @@ class AbstractOwnedModel(RulesModelMixin, models.Model, metaclass=RulesModelBase
         help_text=_("User who owns this record."),
     )
 
+    objects = OwnedManager()
+
+    @classmethod
+    def preprocess_rules_permissions(cls, perms):
+        # rules only reads ``rules_permissions`` from the Meta declared directly
+        # on a class, so concrete models wouldn't otherwise inherit them.
+        for perm_type, predicate in OWNED_MODEL_PERMISSIONS.items():
+            perms.setdefault(perm_type, predicate)
+
     class Meta:
         abstract = True
-        rules_permissions = {
-            "add": rules.is_authenticated,
-            "read": is_object_owner,
-            "change": is_object_owner,
-            "delete": is_object_owner,
-            "view": is_object_owner,
-        }
+        rules_permissions = OWNED_MODEL_PERMISSIONS
 
 
 class LicenseType(TimeStampedModel):
@@ -79,8 +96,72 @@ class AssetSource(AbstractOwnedModel, TimeStampedModel):
     def __str__(self):  # pragma: nocover
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "created"], name="asset_source_owner_created_idx"
+            )
+        ]
+
+
+class AbstractAssetAggregates(models.Model):
+    """
+    Totals over the assets pointing at a record.
+
+    They're kept up to date by `audio_asset_manager.aggregates`, so listings
+    can show them without reading the assets.
+    """
+
+    asset_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text=_("Number of assets.")
+    )
+    total_duration = models.PositiveBigIntegerField(
+        default=0, editable=False, help_text=_("Total length of the assets in seconds.")
+    )
+    loudness_sum = models.FloatField(
+        default=0, editable=False, help_text=_("Sum of the measured assets' LUFS.")
+    )
+    loudness_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text=_("Number of measured assets.")
+    )
+
+    AGGREGATE_FIELDS = (
+        "asset_count",
+        "total_duration",
+        "loudness_sum",
+        "loudness_count",
+    )
+
+    def save(self, *args, **kwargs):
+        # The totals are updated in the database as assets change, so saving
+        # an instance loaded before then mustn't write its stale copies back.
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def average_loudness(self):
+        """
+        Mean integrated LUFS of the measured assets, or ``None``.
+        """
+        if not self.loudness_count:
+            return None
+        return self.loudness_sum / self.loudness_count
+
+    class Meta:
+        abstract = True
 
-class Artist(AbstractOwnedModel, TimeStampedModel):
+
+class Artist(AbstractOwnedModel, AbstractAssetAggregates, TimeStampedModel):
     """
     An artist that created assets, e.g. a musician, producer, or company.
     """
@@ -90,8 +171,13 @@ class Artist(AbstractOwnedModel, TimeStampedModel):
     def __str__(self):  # pragma: nocover
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "created"], name="artist_owner_created_idx")
+        ]
+
 
-class Collection(AbstractOwnedModel, TimeStampedModel):
+class Collection(AbstractOwnedModel, AbstractAssetAggregates, TimeStampedModel):
     """
     A collection or album of assets.
     """
@@ -106,6 +192,13 @@ class Collection(AbstractOwnedModel, TimeStampedModel):
     def __str__(self):  # pragma: nocover
         return self.title
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "created"], name="collection_owner_created_idx"
+            )
+        ]
+
 
 class AudioAsset(AbstractOwnedModel, TimeStampedModel):
     """
@@ -154,6 +247,14 @@ class AudioAsset(AbstractOwnedModel, TimeStampedModel):
         null=True,
         blank=True,
     )
+    file = models.FileField(
+        storage=asset_storage,
+        max_length=250,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("The uploaded audio file, stored by its digest."),
+    )
     source = models.ForeignKey(
         "AssetSource",
         null=True,
@@ -181,7 +282,588 @@ class AudioAsset(AbstractOwnedModel, TimeStampedModel):
     loudness = models.FloatField(
         null=True, blank=True, help_text=_("Integrated LUFS of the file, if measured.")
     )
-    tags = TaggableManager()
+    retired_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text=_(
+            "When the asset was retired. Retired assets are hidden from the "
+            "catalog until they're restored or archived."
+        ),
+    )
+    tags = TaggableManager(through="TaggedAudioAsset")
+
+    objects = LiveAudioAssetManager()
+    all_objects = AudioAssetManager()
+
+    # Fields the artist and collection aggregates are computed from.
+    AGGREGATED_FIELDS = (
+        "artist_id",
+        "collection_id",
+        "duration",
+        "loudness",
+        "retired_at",
+    )
 
     def __str__(self):  # pragma: nocover
         return f"{self.title} - {self.artist}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the aggregates were computed from, so saving can
+        # update them without reading the row again.
+        instance._aggregated_values = instance.aggregated_values()
+        return instance
+
+    def aggregated_values(self):
+        """
+        The values of `AGGREGATED_FIELDS`, or ``None`` if any are deferred.
+        """
+        values = self.__dict__
+        if not all(name in values for name in self.AGGREGATED_FIELDS):
+            return None
+        return tuple(values[name] for name in self.AGGREGATED_FIELDS)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "asset_type", "title"],
+                name="asset_owner_type_title_idx",
+            ),
+            # Matches the admin changelist ordering.
+            models.Index(
+                fields=["owner", "artist", "collection", "title"],
+                name="asset_owner_artist_coll_idx",
+            ),
+            models.Index(fields=["owner", "created"], name="asset_owner_created_idx"),
+            # Range filters and facet buckets.
+            models.Index(fields=["owner", "bpm"], name="asset_owner_bpm_idx"),
+            models.Index(fields=["owner", "loudness"], name="asset_owner_loudness_idx"),
+            models.Index(fields=["owner", "duration"], name="asset_owner_duration_idx"),
+            # Retired assets waiting to be archived.
+            models.Index(
+                fields=["owner", "retired_at"],
+                condition=models.Q(retired_at__isnull=False),
+                name="asset_owner_retired_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "digest"],
+                condition=models.Q(digest__isnull=False),
+                name="unique_asset_digest_per_owner",
+            )
+        ]
+
+
+class TaggedAudioAsset(TaggedItemBase):
+    """
+    A tag on an asset.
+
+    Unlike taggit's generic `TaggedItem` this has a real foreign key to the
+    asset, so tag queries join on indexed integer columns without a content
+    type, in either direction.
+    """
+
+    content_object = models.ForeignKey(
+        "AudioAsset", on_delete=models.CASCADE, related_name="tagged_items"
+    )
+
+    def __str__(self):  # pragma: nocover
+        return f"{self.content_object_id} tagged {self.tag_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_object", "tag"], name="unique_asset_tag"
+            )
+        ]
+        indexes = [
+            # Assets with a tag, without reading the table.
+            models.Index(fields=["tag", "content_object"], name="tagged_asset_tag_idx")
+        ]
+
+
+class ScanIndexEntry(AbstractOwnedModel, TimeStampedModel):
+    """
+    Stat information for a scanned file, used to skip unchanged files on rescans.
+    """
+
+    path = models.CharField(
+        max_length=1024, help_text=_("Absolute path of the file when last scanned.")
+    )
+    size = models.PositiveBigIntegerField(
+        help_text=_("Size of the file in bytes when last hashed.")
+    )
+    mtime_ns = models.BigIntegerField(
+        help_text=_("Modification time of the file in nanoseconds when last hashed.")
+    )
+    digest = models.CharField(
+        max_length=50, help_text=_("SHA1 digest of the file when last hashed.")
+    )
+    asset = models.ForeignKey(
+        "AudioAsset",
+        on_delete=models.CASCADE,
+        related_name="scan_entries",
+        help_text=_("Asset this file was matched to."),
+    )
+
+    def __str__(self):  # pragma: nocover
+        return self.path
+
+    class Meta:
+        verbose_name_plural = _("scan index entries")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "path"], name="unique_scan_path_per_owner"
+            )
+        ]
+
+
+class AssetSearchDocument(models.Model):
+    """
+    Denormalized text used to search for an asset.
+
+    Kept up to date by signal receivers. The full text index itself is
+    maintained by the database: an FTS5 table kept in sync by triggers on
+    SQLite, or a generated ``tsvector`` column with a GIN index on PostgreSQL.
+    """
+
+    asset = models.OneToOneField(
+        "AudioAsset",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="search_document",
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    title = models.TextField(blank=True, default="")
+    credits = models.TextField(
+        blank=True,
+        default="",
+        help_text=_("Names of the artist, collection, and source of the asset."),
+    )
+    tags = models.TextField(blank=True, default="")
+
+    def __str__(self):  # pragma: nocover
+        return self.title
+
+
+class AssetFingerprint(models.Model):
+    """
+    Summary of an asset's acoustic fingerprint.
+
+    The fingerprint itself is the asset's `FingerprintHash` rows.
+    """
+
+    asset = models.OneToOneField(
+        "AudioAsset",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="fingerprint",
+    )
+    digest = models.CharField(
+        max_length=50,
+        null=True,
+        blank=True,
+        help_text=_("Digest of the asset when it was fingerprinted."),
+    )
+    size = models.PositiveIntegerField(
+        default=0, help_text=_("Number of hashes stored for the asset.")
+    )
+    computed = models.DateTimeField(
+        auto_now=True, help_text=_("When the fingerprint was computed.")
+    )
+
+    def __str__(self):  # pragma: nocover
+        return f"Fingerprint of {self.asset_id}"
+
+
+class FingerprintHash(models.Model):
+    """
+    One of an asset's spectral peak hashes, indexed to look up assets by hash.
+    """
+
+    asset = models.ForeignKey(
+        "AudioAsset", on_delete=models.CASCADE, related_name="fingerprint_hashes"
+    )
+    value = models.PositiveIntegerField()
+
+    def __str__(self):  # pragma: nocover
+        return f"{self.asset_id}: {self.value}"
+
+    class Meta:
+        indexes = [
+            # Covers hash lookups without reading the table.
+            models.Index(fields=["value", "asset"], name="fingerprint_value_asset_idx"),
+        ]
+
+
+class AssetFeatures(models.Model):
+    """
+    An asset's feature vector, for finding assets like it.
+
+    See `audio_asset_manager.similarity`.
+    """
+
+    asset = models.OneToOneField(
+        "AudioAsset",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="features",
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    vector = models.BinaryField(help_text=_("Little endian 32 bit floats."))
+    modified = models.DateTimeField(
+        auto_now=True, help_text=_("When the vector was computed.")
+    )
+
+    def __str__(self):  # pragma: nocover
+        return f"Features of {self.asset_id}"
+
+    class Meta:
+        verbose_name_plural = _("asset features")
+        indexes = [
+            # Finds the vectors an owner's similarity index hasn't seen yet.
+            models.Index(fields=["owner", "modified"], name="features_owner_mod_idx"),
+        ]
+
+
+def _copied_value(obj, name):
+    value = getattr(obj, name)
+    # Files are copied by name, rather than as the other record's `FieldFile`.
+    return value.name if isinstance(value, FieldFile) else value
+
+
+class ArchivedAudioAsset(AbstractOwnedModel):
+    """
+    A retired asset moved out of the `AudioAsset` table.
+
+    It keeps the asset's primary key, so usage history and cue sheets still
+    refer to it, and its tags by name. Restoring it moves it back with the
+    same key. See `audio_asset_manager.archive`.
+    """
+
+    id = models.BigIntegerField(
+        primary_key=True, help_text=_("Primary key of the asset that was archived.")
+    )
+    asset_type = models.CharField(
+        max_length=5,
+        choices=AudioAsset.AssetTypes.choices,
+        default=AudioAsset.AssetTypes.MUSIC,
+    )
+    title = models.CharField(max_length=250)
+    artist = models.ForeignKey(
+        "Artist", null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    collection = models.ForeignKey(
+        "Collection",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    filename = models.CharField(max_length=250, null=True, blank=True)
+    digest = models.CharField(max_length=50, null=True, blank=True)
+    file = models.FileField(
+        storage=asset_storage, max_length=250, null=True, blank=True, editable=False
+    )
+    source = models.ForeignKey(
+        "AssetSource",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    explicit_credit_required = models.BooleanField(default=True)
+    credit_link = models.URLField(null=True, blank=True)
+    duration = models.PositiveIntegerField(default=0)
+    bpm = models.PositiveIntegerField(null=True, blank=True)
+    loudness = models.FloatField(null=True, blank=True)
+    tags = models.JSONField(
+        default=list, blank=True, help_text=_("Names of the asset's tags.")
+    )
+    created = models.DateTimeField()
+    modified = models.DateTimeField()
+    retired_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Fields copied from `AudioAsset` both ways.
+    ASSET_FIELDS = (
+        "id",
+        "owner_id",
+        "asset_type",
+        "title",
+        "artist_id",
+        "collection_id",
+        "filename",
+        "digest",
+        "file",
+        "source_id",
+        "explicit_credit_required",
+        "credit_link",
+        "duration",
+        "bpm",
+        "loudness",
+        "created",
+        "modified",
+        "retired_at",
+    )
+
+    def __str__(self):  # pragma: nocover
+        return self.title
+
+    @classmethod
+    def from_asset(cls, asset, tags=()):
+        """
+        An unsaved archive record of a retired asset.
+        """
+        return cls(
+            tags=sorted(tags),
+            **{name: _copied_value(asset, name) for name in cls.ASSET_FIELDS},
+        )
+
+    def to_asset(self):
+        """
+        An unsaved `AudioAsset` with the archived values, still retired.
+
+        Related records cached on this one, e.g. by ``select_related``, are
+        copied too.
+        """
+        asset = AudioAsset(
+            **{name: _copied_value(self, name) for name in self.ASSET_FIELDS}
+        )
+        for field in ("artist", "collection", "source"):
+            if self._meta.get_field(field).is_cached(self):
+                setattr(asset, field, getattr(self, field))
+        return asset
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "digest"], name="archived_owner_digest_idx"),
+            models.Index(
+                fields=["owner", "archived_at"], name="archived_owner_archived_idx"
+            ),
+        ]
+
+
+class Production(AbstractOwnedModel, TimeStampedModel):
+    """
+    A production that uses assets, e.g. an episode of a show.
+    """
+
+    title = models.CharField(max_length=250, help_text=_("Title of the production."))
+    air_date = models.DateField(
+        null=True,
+        blank=True,
+        help_text=_("Date the production aired or was published, if it has."),
+    )
+
+    def __str__(self):  # pragma: nocover
+        return self.title
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "created"], name="production_owner_created_idx"
+            )
+        ]
+
+
+class AssetUsage(AbstractOwnedModel, TimeStampedModel):
+    """
+    A cue in a production's cue sheet: one use of an asset.
+
+    Usage is recorded in bulk with `audio_asset_manager.usage.record_usage`,
+    which also maintains the monthly rollups used for reporting.
+    """
+
+    production = models.ForeignKey(
+        "Production", on_delete=models.CASCADE, related_name="usages"
+    )
+    # Without a database constraint, so usage history outlives archived assets.
+    asset = models.ForeignKey(
+        "AudioAsset",
+        on_delete=models.CASCADE,
+        related_name="usages",
+        db_constraint=False,
+    )
+    source = models.ForeignKey(
+        "AssetSource",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        help_text=_("Source the asset was licensed from when it was used."),
+    )
+    used_on = models.DateField(help_text=_("Date the asset was used."))
+    seconds = models.PositiveIntegerField(
+        default=0, help_text=_("Length of the asset used, in seconds.")
+    )
+    position = models.PositiveIntegerField(
+        default=0, help_text=_("Position of the cue in the production.")
+    )
+
+    def __str__(self):  # pragma: nocover
+        return f"{self.asset_id} in {self.production_id}"
+
+    class Meta:
+        ordering = ["production", "position"]
+        indexes = [
+            models.Index(fields=["owner", "used_on"], name="usage_owner_used_on_idx"),
+            models.Index(fields=["production", "position"], name="usage_cue_order_idx"),
+        ]
+
+
+class AssetUsageMonth(models.Model):
+    """
+    Number of uses and seconds used of an asset per calendar month.
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    asset = models.ForeignKey(
+        "AudioAsset",
+        on_delete=models.CASCADE,
+        related_name="usage_months",
+        db_constraint=False,
+    )
+    month = models.DateField(help_text=_("First day of the month."))
+    uses = models.IntegerField(default=0)
+    seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["asset", "month"], name="unique_asset_usage_month"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "month", "asset"], name="asset_usage_owner_month_idx"
+            )
+        ]
+
+
+class SourceUsageMonth(models.Model):
+    """
+    Number of uses and seconds used of a source's assets per calendar month.
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    source = models.ForeignKey(
+        "AssetSource", on_delete=models.CASCADE, related_name="usage_months"
+    )
+    month = models.DateField(help_text=_("First day of the month."))
+    uses = models.IntegerField(default=0)
+    seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "month"], name="unique_source_usage_month"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "month", "source"],
+                name="source_usage_owner_month_idx",
+            )
+        ]
+
+
+class Job(AbstractOwnedModel, TimeStampedModel):
+    """
+    A long running catalog operation, run by the ``run_job_worker`` command.
+    """
+
+    class Statuses(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        RUNNING = "running", _("Running")
+        SUCCEEDED = "succeeded", _("Succeeded")
+        FAILED = "failed", _("Failed")
+
+    kind = models.CharField(max_length=50, help_text=_("Name of the job's handler."))
+    params = models.JSONField(
+        default=dict, blank=True, help_text=_("Arguments for the handler.")
+    )
+    status = models.CharField(
+        max_length=10, choices=Statuses.choices, default=Statuses.PENDING
+    )
+    progress_current = models.PositiveBigIntegerField(default=0)
+    progress_total = models.PositiveBigIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(
+        max_length=100, blank=True, default="", help_text=_("Worker running the job.")
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        """
+        Fraction of the job that's done, if its total is known.
+        """
+        if self.status == self.Statuses.SUCCEEDED:
+            return 1.0
+        if not self.progress_total:
+            return None
+        return min(self.progress_current / self.progress_total, 1.0)
+
+    def __str__(self):  # pragma: nocover
+        return f"{self.kind} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest pending jobs.
+            models.Index(fields=["status", "created"], name="job_status_created_idx"),
+            models.Index(fields=["owner", "created"], name="job_owner_created_idx"),
+        ]
+
+
+class AssetUpload(AbstractOwnedModel, TimeStampedModel):
+    """
+    A file being uploaded in chunks, which can be resumed from `offset`.
+
+    See `audio_asset_manager.uploads`.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(
+        max_length=250, help_text=_("Name of the file on the uploader's side.")
+    )
+    size = models.PositiveBigIntegerField(help_text=_("Size of the file in bytes."))
+    offset = models.PositiveBigIntegerField(
+        default=0, help_text=_("Number of bytes received so far.")
+    )
+    asset = models.ForeignKey(
+        "AudioAsset",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="uploads",
+        help_text=_(
+            "Asset the file is for. If not given, one is created when the upload "
+            "completes."
+        ),
+    )
+    completed = models.DateTimeField(
+        null=True, blank=True, help_text=_("When the last chunk was received.")
+    )
+
+    def __str__(self):  # pragma: nocover
+        return self.filename
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "created"], name="upload_owner_created_idx"),
+        ]
@@ -1 +1,147 @@
-# Add any receivers for signals here.
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from taggit.models import Tag
+
+from .aggregates import asset_deleted, asset_saved, saved_aggregated_values
+from .facets import invalidate_facets
+from .lookups import invalidate_lookups
+from .models import (
+    Artist,
+    AssetSearchDocument,
+    AssetSource,
+    AssetUpload,
+    AssetUsage,
+    AudioAsset,
+    Collection,
+    LicenseType,
+    Production,
+)
+from .search import update_search_documents
+from .similarity import update_feature_vectors
+from .uploads import delete_partial_file
+from .usage import delete_usage
+
+
+@receiver(post_save, sender=AudioAsset)
+def index_saved_asset(sender, instance, raw=False, **kwargs):
+    if not raw:
+        if instance.retired_at is None:
+            update_search_documents([instance.pk])
+            update_feature_vectors([instance.pk])
+        else:
+            AssetSearchDocument.objects.filter(asset_id=instance.pk).delete()
+        invalidate_facets([instance.owner_id])
+
+
+@receiver(post_delete, sender=AudioAsset)
+def invalidate_deleted_asset_facets(sender, instance, **kwargs):
+    invalidate_facets([instance.owner_id])
+
+
+@receiver(post_delete, sender=AudioAsset)
+def delete_asset_search_document(sender, instance, **kwargs):
+    # The cascade deletes the document first, but a collection or source
+    # deleted along with the asset may have indexed it again since.
+    AssetSearchDocument.objects.filter(asset_id=instance.pk).delete()
+
+
+@receiver(pre_save, sender=AudioAsset)
+def remember_aggregated_values(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._aggregated_before = saved_aggregated_values(instance)
+
+
+@receiver(post_save, sender=AudioAsset)
+def update_saved_asset_aggregates(
+    sender, instance, raw=False, update_fields=None, **kwargs
+):
+    if not raw:
+        asset_saved(
+            instance, instance.__dict__.pop("_aggregated_before"), update_fields
+        )
+
+
+@receiver(post_delete, sender=AudioAsset)
+def update_deleted_asset_aggregates(sender, instance, **kwargs):
+    asset_deleted(instance)
+
+
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=AssetSource)
+def index_credited_assets(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    field = {Artist: "artist", Collection: "collection", AssetSource: "source"}[sender]
+    update_search_documents(
+        AudioAsset.objects.filter(**{field: instance}).values_list("pk", flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Collection)
+@receiver(pre_delete, sender=AssetSource)
+def remember_credited_assets(sender, instance, **kwargs):
+    # Deleting clears the relation before post_delete, when the assets to
+    # reindex can't be found any more. Deleting an artist deletes their
+    # assets, and their collections send these signals themselves.
+    field = "collection" if sender is Collection else "source"
+    instance._credited_asset_ids = list(
+        AudioAsset.objects.filter(**{field: instance}).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=AssetSource)
+def index_uncredited_assets(sender, instance, **kwargs):
+    update_search_documents(instance.__dict__.pop("_credited_asset_ids", []))
+
+
+@receiver(m2m_changed, sender=AudioAsset.tags.through)
+def index_retagged_asset(sender, instance, action, reverse, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and not reverse:
+        if isinstance(instance, AudioAsset):
+            update_search_documents([instance.pk])
+            update_feature_vectors([instance.pk])
+            invalidate_facets([instance.owner_id])
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    assets = AudioAsset.objects.filter(tags=instance)
+    update_search_documents(assets.values_list("pk", flat=True))
+    update_feature_vectors(assets.values_list("pk", flat=True))
+    invalidate_facets(assets.values_list("owner_id", flat=True))
+
+
+@receiver(pre_delete, sender=Production)
+@receiver(pre_delete, sender=AudioAsset)
+def delete_rolled_up_usage(sender, instance, **kwargs):
+    # Take the usage out of the rollups before it's deleted with its
+    # production or asset.
+    field = "production" if sender is Production else "asset"
+    delete_usage(AssetUsage.objects.filter(**{field: instance}))
+
+
+@receiver(post_save, sender=LicenseType)
+@receiver(post_delete, sender=LicenseType)
+@receiver(post_save, sender=AssetSource)
+@receiver(post_delete, sender=AssetSource)
+def invalidate_cached_lookups(sender, **kwargs):
+    invalidate_lookups(sender)
+    if sender is LicenseType:
+        # Deleting a license type clears it from sources without signals.
+        invalidate_lookups(AssetSource)
+
+
+@receiver(post_delete, sender=AssetUpload)
+def delete_upload_partial_file(sender, instance, **kwargs):
+    if instance.completed is None:
+        delete_partial_file(instance)
@@ -0,0 +1,458 @@
+"""
+Utilities for scanning a directory tree of audio files into `AudioAsset` records.
+"""
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import hashlib
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from django.db import transaction
+
+from .facets import invalidate_facets
+from .instrumentation import instrumented
+from .managers import query_param_chunk_size
+from .models import ArchivedAudioAsset, AudioAsset, ScanIndexEntry
+from .search import update_search_documents
+from .similarity import update_feature_vectors
+
+AUDIO_EXTENSIONS = frozenset(
+    {".wav", ".wave", ".flac", ".aif", ".aiff", ".mp3", ".ogg", ".m4a"}
+)
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_BATCH_SIZE = 500
+
+StrPath = Union[str, "os.PathLike[str]"]
+# Called with the number of items done so far and the total, if known.
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+@dataclass
+class ScanResult:
+    """
+    Summary of a library scan.
+    """
+
+    scanned: int = 0
+    unchanged: int = 0
+    created: int = 0
+    renamed: int = 0
+    updated: int = 0
+    skipped: int = 0
+    archived: int = 0
+    missing: int = 0
+    errors: int = 0
+
+
+@dataclass
+class _IndexedFile:
+    pk: int
+    size: int
+    mtime_ns: int
+    digest: str
+    asset_id: int
+
+
+def hash_file(path: StrPath, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """
+    Calculate the SHA1 digest of a file without loading it into memory.
+
+    The file is read into a single reusable buffer, so memory use stays at
+    ``chunk_size`` no matter how large the file is.
+
+    Args:
+        path: Path of the file to hash.
+        chunk_size: Number of bytes to read per iteration.
+
+    Returns:
+        The hex digest of the file contents.
+    """
+    digest = hashlib.sha1()  # nosec - used for content identity, not security
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+def iter_audio_files(
+    root: StrPath, extensions: Iterable[str] = AUDIO_EXTENSIONS
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Walk a directory tree yielding audio files and their stat results.
+
+    Args:
+        root: Directory to walk.
+        extensions: File extensions (including the leading dot) to include.
+
+    Yields:
+        Tuples of the absolute file path and its `os.stat_result`.
+    """
+    wanted = {ext.lower() for ext in extensions}
+    pending = [os.path.abspath(root)]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(entry.path)
+            elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in wanted:
+                try:
+                    yield entry.path, entry.stat()
+                except OSError:
+                    continue
+
+
+def _hash_path(path: str, chunk_size: int) -> Tuple[str, Optional[str]]:
+    try:
+        return path, hash_file(path, chunk_size=chunk_size)
+    except OSError:
+        return path, None
+
+
+def bounded_map(
+    executor: Optional[Executor],
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    window: int,
+) -> Iterator[Any]:
+    """
+    Map a function over items in an executor, keeping at most ``window`` tasks
+    in flight.
+
+    Unlike `Executor.map`, the input iterable is consumed lazily, so walking a
+    huge directory tree doesn't queue every file up front. Results are yielded
+    in completion order. If ``executor`` is ``None`` the work is done inline.
+
+    Args:
+        executor: Executor to submit work to, or ``None`` to run serially.
+        fn: Picklable callable to apply to each item.
+        items: Input items.
+        window: Maximum number of pending tasks.
+
+    Yields:
+        Results of ``fn`` as they complete.
+    """
+    if executor is None:
+        for item in items:
+            yield fn(item)
+        return
+    pending = set()
+    for item in items:
+        pending.add(executor.submit(fn, item))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    for future in pending:
+        yield future.result()
+
+
+def title_from_path(path: str) -> str:
+    """
+    Build a default asset title from a file path.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        The file stem, truncated to fit `AudioAsset.title`.
+    """
+    return Path(path).stem[:250]
+
+
+def _load_index(owner: Any, root: str) -> Dict[str, _IndexedFile]:
+    prefix = root.rstrip(os.sep) + os.sep
+    rows = (
+        ScanIndexEntry.objects.filter(owner=owner, path__startswith=prefix)
+        .values_list("path", "pk", "size", "mtime_ns", "digest", "asset_id")
+        .iterator()
+    )
+    return {row[0]: _IndexedFile(*row[1:]) for row in rows}
+
+
+class _ScanWriter:
+    """
+    Buffers the database writes of a scan and flushes them in batches.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.new_assets: List[AudioAsset] = []
+        self.new_entries: List[ScanIndexEntry] = []
+        self.changed_entries: List[ScanIndexEntry] = []
+        self.changed_filenames: List[AudioAsset] = []
+        self.changed_digests: List[AudioAsset] = []
+
+    def __len__(self) -> int:
+        return (
+            len(self.new_assets)
+            + len(self.new_entries)
+            + len(self.changed_entries)
+            + len(self.changed_filenames)
+            + len(self.changed_digests)
+        )
+
+    def maybe_flush(self) -> None:
+        if len(self) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        with transaction.atomic():
+            # Assets have to exist before the entries pointing at them.
+            AudioAsset.objects.bulk_create(self.new_assets, batch_size=self.batch_size)
+            ScanIndexEntry.objects.bulk_create(
+                self.new_entries, batch_size=self.batch_size
+            )
+            ScanIndexEntry.objects.bulk_update(
+                self.changed_entries,
+                ["path", "size", "mtime_ns", "digest", "asset"],
+                batch_size=self.batch_size,
+            )
+            AudioAsset.all_objects.bulk_update(
+                self.changed_filenames, ["filename"], batch_size=self.batch_size
+            )
+            AudioAsset.all_objects.bulk_update(
+                self.changed_digests, ["digest"], batch_size=self.batch_size
+            )
+            update_search_documents(
+                [asset.pk for asset in self.new_assets], batch_size=self.batch_size
+            )
+            update_feature_vectors(
+                [asset.pk for asset in self.new_assets], batch_size=self.batch_size
+            )
+        self.new_assets = []
+        self.new_entries = []
+        self.changed_entries = []
+        self.changed_filenames = []
+        self.changed_digests = []
+
+
+def _archived_digests(owner: Any, digests: Iterable[str]) -> Set[str]:
+    wanted = sorted(digests)
+    chunk_size = query_param_chunk_size(ArchivedAudioAsset.objects.db)
+    found: Set[str] = set()
+    for start in range(0, len(wanted), chunk_size):
+        found.update(
+            ArchivedAudioAsset.objects.filter(
+                owner=owner, digest__in=wanted[start : start + chunk_size]
+            ).values_list("digest", flat=True)
+        )
+    return found
+
+
+@instrumented
+def scan_library(
+    root: StrPath,
+    owner: Any,
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    extensions: Iterable[str] = AUDIO_EXTENSIONS,
+    progress: Optional[ProgressCallback] = None,
+) -> ScanResult:
+    """
+    Scan a directory tree and create `AudioAsset` records for new files.
+
+    Every hashed file is recorded in a `ScanIndexEntry`. On later scans, files
+    whose size and modification time match their index entry are skipped
+    without being read. Changed and new files are hashed in a process pool:
+
+    - A new path whose digest matches a file that disappeared since the last
+      scan is treated as a rename, and the existing asset's filename is
+      updated in place.
+    - A new path whose digest already belongs to an asset of the owner is
+      indexed against that asset instead of creating a duplicate, even if
+      the asset is retired.
+    - A new path whose digest belongs to an archived asset is skipped, and
+      hashed again on the next scan until the asset is restored.
+    - A known path whose contents changed has its asset's digest updated.
+    - Anything else creates a new asset.
+
+    Index entries for files that no longer exist are removed, but their
+    assets are left alone, as are the entries of files that can't be read.
+    Results are written in batches with `bulk_create` and `bulk_update` as
+    files are hashed, so memory use doesn't grow with the library and an
+    interrupted scan keeps its progress. Only files whose digest matches an
+    index entry not yet walked past are held until the walk ends, as they
+    might be renames.
+
+    Args:
+        root: Directory to scan.
+        owner: User who will own the created assets.
+        workers: Number of hashing processes. ``1`` hashes in this process and
+            ``None`` uses the CPU count.
+        batch_size: Number of rows to write per query.
+        chunk_size: Number of bytes read per iteration when hashing.
+        extensions: File extensions to include.
+        progress: Called with the number of files scanned as hashes complete.
+
+    Returns:
+        A `ScanResult` summarizing the scan.
+    """
+    root = os.path.abspath(root)
+    result = ScanResult()
+    index = _load_index(owner, root)
+    known_digests = dict(
+        AudioAsset.all_objects.filter(owner=owner, digest__isnull=False)
+        .values_list("digest", "pk")
+        .iterator()
+    )
+    stats: Dict[str, os.stat_result] = {}
+    # Index entries of changed files, taken out of the index when hashed.
+    existing: Dict[str, _IndexedFile] = {}
+    # Digests of index entries the walk hasn't reached yet. Only files with
+    # one of these digests can turn out to be renames.
+    unvisited = Counter(entry.digest for entry in index.values())
+
+    def changed_paths() -> Iterator[str]:
+        for path, stat in iter_audio_files(root, extensions):
+            result.scanned += 1
+            entry = index.pop(path, None)
+            if entry is not None:
+                unvisited[entry.digest] -= 1
+                if entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                    result.unchanged += 1
+                    continue
+                existing[path] = entry
+            stats[path] = stat
+            yield path
+
+    writer = _ScanWriter(batch_size)
+    stale: List[int] = []
+    new_by_digest: Dict[str, AudioAsset] = {}
+    missing_by_digest: Dict[str, List[Tuple[str, _IndexedFile]]] = {}
+
+    def resolve(hashed: List[Tuple[str, str]]) -> None:
+        archived_digests = _archived_digests(
+            owner, {digest for _path, digest in hashed if digest not in known_digests}
+        )
+        for path, digest in hashed:
+            stat = stats.pop(path)
+            entry = existing.pop(path, None)
+            relative = os.path.relpath(path, root)[:250]
+            asset: Optional[AudioAsset] = None
+            asset_id: Optional[int] = None
+            if missing_by_digest.get(digest):
+                old_path, moved = missing_by_digest[digest].pop()
+                del index[old_path]
+                asset_id = moved.asset_id
+                writer.changed_filenames.append(
+                    AudioAsset(pk=asset_id, filename=relative)
+                )
+                if entry is None:
+                    entry = moved
+                else:
+                    stale.append(moved.pk)
+                result.renamed += 1
+            elif digest in known_digests:
+                asset_id = known_digests[digest]
+                result.skipped += 1
+            elif digest in archived_digests:
+                result.archived += 1
+                continue
+            elif digest in new_by_digest:
+                asset = new_by_digest[digest]
+                result.skipped += 1
+            elif entry is not None:
+                asset_id = entry.asset_id
+                writer.changed_digests.append(AudioAsset(pk=asset_id, digest=digest))
+                if known_digests.get(entry.digest) == asset_id:
+                    del known_digests[entry.digest]
+                known_digests[digest] = asset_id
+                result.updated += 1
+            else:
+                asset = AudioAsset(
+                    owner=owner,
+                    title=title_from_path(path),
+                    filename=relative,
+                    digest=digest,
+                )
+                new_by_digest[digest] = asset
+                writer.new_assets.append(asset)
+                result.created += 1
+            fields = {
+                "path": path,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "digest": digest,
+            }
+            if asset is not None:
+                fields["asset"] = asset
+            else:
+                fields["asset_id"] = asset_id
+            if entry is None:
+                writer.new_entries.append(ScanIndexEntry(owner=owner, **fields))
+            else:
+                writer.changed_entries.append(ScanIndexEntry(pk=entry.pk, **fields))
+            if len(writer) >= writer.batch_size:
+                writer.flush()
+                known_digests.update((d, a.pk) for d, a in new_by_digest.items())
+                new_by_digest.clear()
+
+    # Files are resolved and written a batch at a time as they're hashed, so
+    # an interrupted scan keeps what it did. Files that might be renames wait
+    # until the walk is over, when every missing path is known.
+    batch: List[Tuple[str, str]] = []
+    deferred: List[Tuple[str, str]] = []
+    worker = partial(_hash_path, chunk_size=chunk_size)
+    executor = None if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    window = (workers or os.cpu_count() or 1) * 4
+    try:
+        for path, digest in bounded_map(executor, worker, changed_paths(), window):
+            if progress is not None:
+                progress(result.scanned, None)
+            if digest is None:
+                # The file is still there, so its entry isn't missing. It's
+                # hashed again on the next scan.
+                result.errors += 1
+                stats.pop(path)
+                existing.pop(path, None)
+                continue
+            if unvisited[digest] > 0:
+                deferred.append((path, digest))
+                continue
+            batch.append((path, digest))
+            if len(batch) >= batch_size:
+                resolve(batch)
+                batch = []
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    resolve(batch)
+
+    for path, entry in index.items():
+        missing_by_digest.setdefault(entry.digest, []).append((path, entry))
+    for start in range(0, len(deferred), batch_size):
+        resolve(deferred[start : start + batch_size])
+    writer.flush()
+
+    result.missing = len(index)
+    pks = stale + [entry.pk for entry in index.values()]
+    for start in range(0, len(pks), batch_size):
+        ScanIndexEntry.objects.filter(pk__in=pks[start : start + batch_size]).delete()
+    if result.created or result.updated:
+        invalidate_facets([owner.pk])
+    return result
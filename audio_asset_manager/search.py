@@ -0,0 +1,401 @@
+"""
+Ranked full text search over assets.
+
+Each asset has an `AssetSearchDocument` holding its title, the names of its
+artist, collection, and source, and its tags. On SQLite the documents are
+indexed by an FTS5 table and on PostgreSQL by a generated ``tsvector`` column
+with a GIN index, both created by the migration and kept in sync by the
+database. Other backends fall back to ``icontains`` matching.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import Q, QuerySet
+
+from .instrumentation import instrumented
+from .managers import query_param_chunk_size
+from .models import AssetSearchDocument, AudioAsset
+
+DOCUMENT_TABLE = AssetSearchDocument._meta.db_table
+FTS_TABLE = "audio_asset_manager_assetsearch_fts"
+MAX_QUERY_TERMS = 12
+DEFAULT_BATCH_SIZE = 500
+
+# Relative importance of matches in the title, credits, and tags.
+SQLITE_COLUMN_WEIGHTS = (10.0, 4.0, 2.0)
+
+_fts_tables: Dict[str, bool] = {}
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Split a search query into the terms to match.
+
+    Args:
+        query: Text typed by the user.
+
+    Returns:
+        Lower cased word tokens, without any query syntax characters.
+    """
+    return re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+
+
+def build_documents(assets: Iterable[AudioAsset]) -> List[AssetSearchDocument]:
+    """
+    Build search documents for assets.
+
+    The assets should have their artist, collection, and source selected and
+    their tags prefetched.
+
+    Args:
+        assets: Assets to build documents for.
+
+    Returns:
+        Unsaved `AssetSearchDocument` instances.
+    """
+    documents = []
+    for asset in assets:
+        credits = [
+            asset.artist.name if asset.artist else "",
+            asset.collection.title if asset.collection else "",
+            asset.source.name if asset.source else "",
+        ]
+        documents.append(
+            AssetSearchDocument(
+                asset_id=asset.pk,
+                owner_id=asset.owner_id,
+                title=asset.title,
+                credits=" ".join(filter(None, credits)),
+                tags=" ".join(sorted(tag.name for tag in asset.tags.all())),
+            )
+        )
+    return documents
+
+
+def update_search_documents(
+    asset_ids: Iterable[int], batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """
+    Create or refresh the search documents for assets.
+
+    Args:
+        asset_ids: Primary keys of the assets to index.
+        batch_size: Number of assets to index per batch.
+
+    Returns:
+        The number of documents written.
+    """
+    ids = list(asset_ids)
+    written = 0
+    db = router.db_for_write(AssetSearchDocument)
+    upsert = connections[db].features.supports_update_conflicts_with_target
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start : start + batch_size]
+        assets = (
+            AudioAsset.objects.filter(pk__in=chunk)
+            .select_related("artist", "collection", "source")
+            .prefetch_related("tags")
+        )
+        documents = build_documents(assets)
+        with transaction.atomic(using=db):
+            if upsert:
+                AssetSearchDocument.objects.bulk_create(
+                    documents,
+                    update_conflicts=True,
+                    unique_fields=["asset"],
+                    update_fields=["owner", "title", "credits", "tags"],
+                )
+            else:  # pragma: nocover
+                AssetSearchDocument.objects.filter(asset_id__in=chunk).delete()
+                AssetSearchDocument.objects.bulk_create(documents)
+        written += len(documents)
+    return written
+
+
+@instrumented
+def rebuild_search_index(
+    queryset: "Optional[QuerySet[AudioAsset]]" = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Rebuild the search documents for many assets.
+
+    Args:
+        queryset: Assets to index. Defaults to every asset.
+        batch_size: Number of assets to index per batch.
+
+    Returns:
+        The number of documents written.
+    """
+    if queryset is None:
+        queryset = AudioAsset.objects.all()
+    written = 0
+    batch: List[int] = []
+    for pk in queryset.order_by("pk").values_list("pk", flat=True).iterator():
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            written += update_search_documents(batch, batch_size=batch_size)
+            batch = []
+    if batch:
+        written += update_search_documents(batch, batch_size=batch_size)
+    return written
+
+
+def _has_fts_table(using: str) -> bool:
+    if using not in _fts_tables:
+        connection = connections[using]
+        _fts_tables[using] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[using]
+
+
+def _restriction(
+    using: str, column: str, assets: "Optional[QuerySet[AudioAsset]]"
+) -> Tuple[str, List[Any]]:
+    """
+    SQL limiting matches to the assets in a queryset, and its parameters.
+
+    Args:
+        using: Database the matches are queried on.
+        column: The matched asset id column.
+        assets: Assets to match, or ``None`` to match all of the owner's.
+
+    Returns:
+        An ``AND`` clause to add to the ``WHERE`` clause, empty if there are
+        no assets to restrict to, and its parameters.
+    """
+    if assets is None:
+        return "", []
+    sql, params = assets.order_by().values("pk").query.get_compiler(using).as_sql()
+    return f" AND {column} IN ({sql})", list(params)
+
+
+def _sqlite_matches(
+    using: str,
+    owner_id: int,
+    terms: List[str],
+    limit: int,
+    offset: int,
+    assets: "Optional[QuerySet[AudioAsset]]" = None,
+) -> List[Tuple[int, float]]:
+    weights = ", ".join(str(weight) for weight in SQLITE_COLUMN_WEIGHTS)
+    restriction, restriction_params = _restriction(using, "d.asset_id", assets)
+    sql = (
+        f"SELECT d.asset_id, bm25({FTS_TABLE}, {weights}) AS rank "  # nosec
+        f"FROM {FTS_TABLE} JOIN {DOCUMENT_TABLE} d ON d.asset_id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND d.owner_id = %s{restriction} "
+        "ORDER BY rank, d.asset_id LIMIT %s OFFSET %s"
+    )
+    match = " ".join(f'"{term}"*' for term in terms)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [match, owner_id, *restriction_params, limit, offset])
+        # bm25 scores are lower for better matches.
+        return [(asset_id, -rank) for asset_id, rank in cursor.fetchall()]
+
+
+def _sqlite_count(
+    using: str,
+    owner_id: int,
+    terms: List[str],
+    assets: "Optional[QuerySet[AudioAsset]]" = None,
+) -> int:
+    restriction, restriction_params = _restriction(using, "d.asset_id", assets)
+    sql = (
+        f"SELECT COUNT(*) FROM {FTS_TABLE} "  # nosec
+        f"JOIN {DOCUMENT_TABLE} d ON d.asset_id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND d.owner_id = %s{restriction}"
+    )
+    match = " ".join(f'"{term}"*' for term in terms)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [match, owner_id, *restriction_params])
+        return cursor.fetchone()[0]
+
+
+def _postgresql_matches(
+    using: str,
+    owner_id: int,
+    terms: List[str],
+    limit: int,
+    offset: int,
+    assets: "Optional[QuerySet[AudioAsset]]" = None,
+) -> List[Tuple[int, float]]:
+    restriction, restriction_params = _restriction(
+        using, f"{DOCUMENT_TABLE}.asset_id", assets
+    )
+    sql = (
+        f"SELECT {DOCUMENT_TABLE}.asset_id, "  # nosec
+        "ts_rank_cd(search_vector, query) AS rank "
+        f"FROM {DOCUMENT_TABLE}, to_tsquery('simple', %s) query "
+        f"WHERE search_vector @@ query AND {DOCUMENT_TABLE}.owner_id = %s"
+        f"{restriction} ORDER BY rank DESC, {DOCUMENT_TABLE}.asset_id "
+        "LIMIT %s OFFSET %s"
+    )
+    tsquery = " & ".join(f"{term}:*" for term in terms)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [tsquery, owner_id, *restriction_params, limit, offset])
+        return [(asset_id, float(rank)) for asset_id, rank in cursor.fetchall()]
+
+
+def _postgresql_count(
+    using: str,
+    owner_id: int,
+    terms: List[str],
+    assets: "Optional[QuerySet[AudioAsset]]" = None,
+) -> int:
+    restriction, restriction_params = _restriction(
+        using, f"{DOCUMENT_TABLE}.asset_id", assets
+    )
+    sql = (
+        f"SELECT COUNT(*) FROM {DOCUMENT_TABLE} "  # nosec
+        "WHERE search_vector @@ to_tsquery('simple', %s) "
+        f"AND {DOCUMENT_TABLE}.owner_id = %s{restriction}"
+    )
+    tsquery = " & ".join(f"{term}:*" for term in terms)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [tsquery, owner_id, *restriction_params])
+        return cursor.fetchone()[0]
+
+
+def _fallback_queryset(
+    using: str,
+    owner_id: int,
+    terms: List[str],
+    assets: "Optional[QuerySet[AudioAsset]]" = None,
+) -> Any:
+    queryset = AssetSearchDocument.objects.using(using).filter(owner_id=owner_id)
+    if assets is not None:
+        queryset = queryset.filter(asset__in=assets.order_by().values("pk"))
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term)
+            | Q(credits__icontains=term)
+            | Q(tags__icontains=term)
+        )
+    return queryset
+
+
+class SearchResults:
+    """
+    Lazily evaluated, ranked search results for one user.
+
+    Supports ``count()`` and slicing, so it can be handed to Django's and
+    Django REST Framework's paginators. Only the requested slice of matches is
+    ranked and fetched. Matches are restricted to the queryset's assets before
+    the slice is taken, so filtered out assets never leave a page short.
+    """
+
+    def __init__(
+        self,
+        user: Any,
+        query: str,
+        queryset: "Optional[QuerySet[AudioAsset]]" = None,
+    ):
+        self.user = user
+        self.terms = search_terms(query)
+        self.queryset = queryset if queryset is not None else AudioAsset.objects.all()
+        self.using = self.queryset.db
+        # An unfiltered queryset needs no restriction beyond the owner.
+        self.assets = self.queryset if self.queryset.query.has_filters() else None
+        self._count: Optional[int] = None
+
+    @property
+    def backend(self) -> str:
+        vendor = connections[self.using].vendor
+        if vendor == "sqlite" and _has_fts_table(self.using):
+            return "sqlite"
+        if vendor == "postgresql":
+            return "postgresql"
+        return "fallback"
+
+    def _is_empty(self) -> bool:
+        return not self.terms or not self.user.is_authenticated
+
+    def count(self) -> int:
+        if self._count is None:
+            if self._is_empty():
+                self._count = 0
+            elif self.backend == "sqlite":
+                self._count = _sqlite_count(
+                    self.using, self.user.pk, self.terms, self.assets
+                )
+            elif self.backend == "postgresql":
+                self._count = _postgresql_count(
+                    self.using, self.user.pk, self.terms, self.assets
+                )
+            else:
+                self._count = _fallback_queryset(
+                    self.using, self.user.pk, self.terms, self.assets
+                ).count()
+        return self._count
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def matches(self, limit: int, offset: int = 0) -> List[Tuple[int, float]]:
+        """
+        Rank the matching assets in the queryset.
+
+        Args:
+            limit: Maximum number of matches to return.
+            offset: Number of matches to skip.
+
+        Returns:
+            Tuples of asset id and rank, best match first.
+        """
+        if self._is_empty() or limit <= 0:
+            return []
+        if self.backend == "sqlite":
+            return _sqlite_matches(
+                self.using, self.user.pk, self.terms, limit, offset, self.assets
+            )
+        if self.backend == "postgresql":
+            return _postgresql_matches(
+                self.using, self.user.pk, self.terms, limit, offset, self.assets
+            )
+        ids = _fallback_queryset(
+            self.using, self.user.pk, self.terms, self.assets
+        ).order_by("title", "asset_id")[offset : offset + limit]
+        return [(asset_id, 0.0) for asset_id in ids.values_list("asset_id", flat=True)]
+
+    def __getitem__(self, key: slice) -> List[AudioAsset]:
+        if not isinstance(key, slice):  # pragma: nocover
+            raise TypeError("SearchResults only supports slicing.")
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        matches = self.matches(stop - start, start)
+        assets = {}
+        chunk_size = query_param_chunk_size(self.using)
+        ids = [asset_id for asset_id, _rank in matches]
+        for chunk_start in range(0, len(ids), chunk_size):
+            assets.update(
+                self.queryset.in_bulk(ids[chunk_start : chunk_start + chunk_size])
+            )
+        results = []
+        for asset_id, rank in matches:
+            asset = assets.get(asset_id)
+            if asset is not None:
+                asset.search_rank = rank
+                results.append(asset)
+        return results
+
+
+def search_assets(
+    user: Any, query: str, queryset: "Optional[QuerySet[AudioAsset]]" = None
+) -> SearchResults:
+    """
+    Search a user's assets by title, artist, collection, source, and tags.
+
+    Every term in the query must match the start of a word in the asset's
+    document, so partially typed words still find results.
+
+    Args:
+        user: User whose assets to search.
+        query: Search text.
+        queryset: Assets to match, also used to fetch them, e.g. one with a
+            filter applied or related objects selected.
+
+    Returns:
+        Lazily evaluated `SearchResults`.
+    """
+    return SearchResults(user, query, queryset=queryset)
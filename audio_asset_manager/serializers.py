@@ -0,0 +1,449 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from taggit.serializers import TaggitSerializer, TagListSerializerField
+
+from .facets import DEFAULT_LOUDNESS_TOLERANCE, AssetFilter
+from .jobs import clean_params, job_kinds
+from .lookups import lookup_cache
+from .models import (
+    ArchivedAudioAsset,
+    Artist,
+    AssetSource,
+    AssetUpload,
+    AssetUsage,
+    AudioAsset,
+    Collection,
+    Job,
+    LicenseType,
+    Production,
+)
+from .rules import is_object_owner
+from .storage import is_digest
+from .tagquery import MAX_QUERY_LENGTH, TagQueryError, parse_tag_query
+from .uploads import max_upload_size
+from .usage import Cue
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    A primary key field that looks objects up in the model's lookup cache, if
+    it has one, instead of querying for them.
+    """
+
+    def is_allowed(self, obj):
+        return True
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        cached = lookup_cache(model)
+        if cached is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        obj = cached.get(pk)
+        if obj is None or not self.is_allowed(obj):
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class OwnedPrimaryKeyRelatedField(CachedPrimaryKeyRelatedField):
+    """
+    A primary key field that only accepts objects owned by the requesting user.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get("request")
+        if request is None:  # pragma: nocover
+            return queryset.none()
+        return queryset.for_user(request.user)
+
+    def is_allowed(self, obj):
+        # The rule `for_user` applies in SQL, so cached and queried lookups
+        # accept the same objects, for superusers too.
+        request = self.context.get("request")
+        return (
+            request is not None
+            and request.user.is_authenticated
+            and is_object_owner(request.user, obj)
+        )
+
+
+class OwnedModelSerializer(serializers.ModelSerializer):
+    """
+    Base serializer for owned models that assigns the requesting user as owner.
+    """
+
+    owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
+
+class LicenseTypeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LicenseType
+        fields = [
+            "id",
+            "name",
+            "url",
+            "include_license_in_credits",
+            "created",
+            "modified",
+        ]
+
+
+class AssetSourceSerializer(OwnedModelSerializer):
+    license_type = CachedPrimaryKeyRelatedField(
+        queryset=LicenseType.objects.all(), allow_null=True, required=False
+    )
+    license_type_name = serializers.CharField(
+        source="license_type.name", read_only=True, default=None
+    )
+
+    class Meta:
+        model = AssetSource
+        fields = [
+            "id",
+            "owner",
+            "name",
+            "url",
+            "license_type",
+            "license_type_name",
+            "source_credit_text",
+            "created",
+            "modified",
+        ]
+
+
+AGGREGATE_FIELDS = ["asset_count", "total_duration", "average_loudness"]
+
+
+class ArtistSerializer(OwnedModelSerializer):
+    average_loudness = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Artist
+        fields = ["id", "owner", "name", *AGGREGATE_FIELDS, "created", "modified"]
+
+
+class CollectionSerializer(OwnedModelSerializer):
+    album_artist = OwnedPrimaryKeyRelatedField(
+        queryset=Artist.objects.all(), allow_null=True, required=False
+    )
+    album_artist_name = serializers.CharField(
+        source="album_artist.name", read_only=True, default=None
+    )
+    average_loudness = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Collection
+        fields = [
+            "id",
+            "owner",
+            "title",
+            "album_artist",
+            "album_artist_name",
+            *AGGREGATE_FIELDS,
+            "created",
+            "modified",
+        ]
+
+
+class AudioAssetSerializer(TaggitSerializer, OwnedModelSerializer):
+    artist = OwnedPrimaryKeyRelatedField(
+        queryset=Artist.objects.all(), allow_null=True, required=False
+    )
+    artist_name = serializers.CharField(
+        source="artist.name", read_only=True, default=None
+    )
+    collection = OwnedPrimaryKeyRelatedField(
+        queryset=Collection.objects.all(), allow_null=True, required=False
+    )
+    collection_title = serializers.CharField(
+        source="collection.title", read_only=True, default=None
+    )
+    source = OwnedPrimaryKeyRelatedField(
+        queryset=AssetSource.objects.all(), allow_null=True, required=False
+    )
+    source_name = serializers.CharField(
+        source="source.name", read_only=True, default=None
+    )
+    license_type_name = serializers.CharField(
+        source="source.license_type.name", read_only=True, default=None
+    )
+    tags = TagListSerializerField(required=False)
+    has_file = serializers.SerializerMethodField()
+
+    def get_has_file(self, obj) -> bool:
+        return bool(obj.file)
+
+    def validate_digest(self, value):
+        if not value:
+            return None
+        if not is_digest(value):
+            raise serializers.ValidationError(
+                _("Enter a SHA1 digest of 40 lowercase hexadecimal characters.")
+            )
+        user = self.context["request"].user
+        queryset = AudioAsset.all_objects.for_user(user).filter(digest=value)
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(
+                _("You already have an asset with this digest.")
+            )
+        if ArchivedAudioAsset.objects.for_user(user).filter(digest=value).exists():
+            raise serializers.ValidationError(
+                _("You have an archived asset with this digest. Restore it instead.")
+            )
+        return value
+
+    class Meta:
+        model = AudioAsset
+        # The conditional unique constraint on digest is checked in
+        # validate_digest so that digest stays optional.
+        validators = []
+        fields = [
+            "id",
+            "owner",
+            "asset_type",
+            "title",
+            "artist",
+            "artist_name",
+            "collection",
+            "collection_title",
+            "source",
+            "source_name",
+            "license_type_name",
+            "filename",
+            "digest",
+            "has_file",
+            "explicit_credit_required",
+            "credit_link",
+            "duration",
+            "bpm",
+            "loudness",
+            "tags",
+            "created",
+            "modified",
+        ]
+
+
+class AudioAssetReadSerializer(AudioAssetSerializer):
+    """
+    Serializes assets with their tag names set up front as ``tag_names``, for
+    async views, where reading ``tags`` can't query.
+    """
+
+    tags = TagListSerializerField(source="tag_names", read_only=True)
+
+
+class ArchivedAudioAssetSerializer(serializers.ModelSerializer):
+    artist_name = serializers.CharField(
+        source="artist.name", read_only=True, default=None
+    )
+
+    class Meta:
+        model = ArchivedAudioAsset
+        fields = [
+            "id",
+            "asset_type",
+            "title",
+            "artist",
+            "artist_name",
+            "collection",
+            "source",
+            "filename",
+            "digest",
+            "explicit_credit_required",
+            "credit_link",
+            "duration",
+            "bpm",
+            "loudness",
+            "tags",
+            "created",
+            "modified",
+            "retired_at",
+            "archived_at",
+        ]
+        read_only_fields = fields
+
+
+class AssetUploadSerializer(OwnedModelSerializer):
+    """
+    Starts a chunked upload. Send its bytes to ``uploads/<id>/chunk/``.
+    """
+
+    asset = OwnedPrimaryKeyRelatedField(
+        queryset=AudioAsset.objects.all(), allow_null=True, required=False
+    )
+
+    def validate_size(self, value):
+        if value > max_upload_size():
+            raise serializers.ValidationError(
+                _("Files can be at most %(size)d bytes.") % {"size": max_upload_size()}
+            )
+        return value
+
+    class Meta:
+        model = AssetUpload
+        fields = [
+            "id",
+            "owner",
+            "filename",
+            "size",
+            "offset",
+            "asset",
+            "completed",
+            "created",
+            "modified",
+        ]
+        read_only_fields = ["offset", "completed"]
+
+
+class AssetIdsSerializer(serializers.Serializer):
+    """
+    Primary keys of assets to change in bulk.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+
+
+class AssetFilterSerializer(serializers.Serializer):
+    """
+    Validates asset filter query parameters into an `AssetFilter`.
+
+    ``asset_type`` and ``tag`` may be given more than once. ``tag_query`` is
+    a boolean tag query like ``ambient AND NOT vocals``.
+    """
+
+    asset_type = serializers.ListField(
+        child=serializers.ChoiceField(choices=AudioAsset.AssetTypes.choices),
+        required=False,
+    )
+    bpm_min = serializers.IntegerField(min_value=0, required=False)
+    bpm_max = serializers.IntegerField(min_value=0, required=False)
+    loudness_min = serializers.FloatField(required=False)
+    loudness_max = serializers.FloatField(required=False)
+    loudness_target = serializers.FloatField(required=False)
+    loudness_tolerance = serializers.FloatField(
+        min_value=0, default=DEFAULT_LOUDNESS_TOLERANCE
+    )
+    duration_min = serializers.IntegerField(min_value=0, required=False)
+    duration_max = serializers.IntegerField(min_value=0, required=False)
+    tag = serializers.ListField(
+        child=serializers.CharField(max_length=100), required=False
+    )
+    tag_query = serializers.CharField(max_length=MAX_QUERY_LENGTH, required=False)
+
+    def validate_tag_query(self, value):
+        try:
+            parse_tag_query(value)
+        except TagQueryError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate(self, attrs):
+        for name in ("bpm", "loudness", "duration"):
+            low, high = attrs.get(f"{name}_min"), attrs.get(f"{name}_max")
+            if low is not None and high is not None and low > high:
+                raise serializers.ValidationError(
+                    {f"{name}_max": _("Must not be less than the minimum.")}
+                )
+        return attrs
+
+    def to_filter(self) -> AssetFilter:
+        data = dict(self.validated_data)
+        return AssetFilter(
+            asset_types=data.pop("asset_type", []), tags=data.pop("tag", []), **data
+        )
+
+
+class ProductionSerializer(OwnedModelSerializer):
+    class Meta:
+        model = Production
+        fields = ["id", "owner", "title", "air_date", "created", "modified"]
+
+
+class AssetUsageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AssetUsage
+        fields = ["id", "asset", "source", "used_on", "seconds", "position"]
+
+
+class CueSerializer(serializers.Serializer):
+    """
+    A cue to record. Ownership of the asset is checked when it's recorded.
+    """
+
+    asset = serializers.IntegerField(min_value=1)
+    seconds = serializers.IntegerField(min_value=0, required=False)
+    used_on = serializers.DateField(required=False)
+
+    def to_cue(self, data) -> Cue:
+        return Cue(data["asset"], data.get("seconds"), data.get("used_on"))
+
+
+class UsageReportSerializer(serializers.Serializer):
+    """
+    Validates the month range and limit of usage reports.
+    """
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=20)
+
+
+class JobSerializer(OwnedModelSerializer):
+    """
+    Queues a job. Everything but its kind and parameters is read only.
+    """
+
+    kind = serializers.ChoiceField(choices=[])
+    progress = serializers.FloatField(read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Handlers may be registered after this module is imported.
+        self.fields["kind"].choices = job_kinds()
+
+    def validate(self, attrs):
+        try:
+            attrs["params"] = clean_params(attrs["kind"], attrs.get("params", {}))
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({"params": e.detail})
+        return attrs
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "owner",
+            "kind",
+            "params",
+            "status",
+            "progress",
+            "progress_current",
+            "progress_total",
+            "result",
+            "error",
+            "attempts",
+            "created",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "status",
+            "progress_current",
+            "progress_total",
+            "result",
+            "error",
+            "attempts",
+            "started_at",
+            "finished_at",
+        ]
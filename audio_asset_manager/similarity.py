@@ -0,0 +1,527 @@
+"""
+Finding assets like another one, e.g. a replacement for a pulled track.
+
+Each asset gets a small feature vector, stored in `AssetFeatures`, from its
+BPM, loudness, duration, type, and tags. Tags are hashed into a fixed number
+of dimensions, so the vector doesn't grow with the number of tags in use.
+Each feature is scaled so that a unit of distance is a comparable difference:
+
+* BPM: half a doubling of tempo, e.g. 120 to 170 BPM.
+* Loudness: 6 dB.
+* Duration: two doublings of length.
+* Type: a different asset type is about one and a half units away.
+* Tags: sets of tags with nothing in common are about two units apart.
+
+Missing BPM and loudness count as typical values. Vectors are kept up to date
+wherever assets are saved or created in bulk, and are encoded without numpy.
+
+Searching needs numpy. Every owner's vectors are loaded into a matrix, kept
+in memory per process, and searched with one matrix-vector product and a
+partial sort, without touching the assets table. The matrix is saved as an
+``.npy`` file per owner under ``MEDIA_ROOT``, in
+``AUDIO_ASSET_MANAGER_SIMILARITY_DIR`` (``similarity`` by default), which
+later loads memory-map. Before each search
+the matrix catches up with the vectors changed since it was last updated,
+found through an index on their modification time. Deleted and retired assets
+are dropped as searches come across them, and `rebuild_similarity_index`
+recomputes everything.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import datetime
+import math
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import QuerySet
+
+from .instrumentation import instrumented
+from .models import AssetFeatures, AudioAsset
+
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_LIMIT = 20
+ASSET_TYPES = [choice for choice, _label in AudioAsset.AssetTypes.choices]
+TAG_DIMENSIONS = 32
+DIMENSIONS = 3 + len(ASSET_TYPES) + TAG_DIMENSIONS
+VECTOR_FORMAT = f"<{DIMENSIONS}f"
+VECTOR_DTYPE = "<f4"
+ROW_DTYPE = [("id", "<i8"), ("modified", "<f8")]
+# Saved rows and vectors share a record, so one file replace saves both.
+FILE_DTYPE = ROW_DTYPE + [("vector", VECTOR_DTYPE, (DIMENSIONS,))]
+
+REFERENCE_BPM = 120
+REFERENCE_LOUDNESS = -16.0
+REFERENCE_DURATION = 180
+BPM_WEIGHT = 2.0
+LOUDNESS_WEIGHT = 1 / 6
+DURATION_WEIGHT = 0.5
+TYPE_WEIGHT = 1.0
+TAG_WEIGHT = 1.5
+
+# Vectors saved while an update was in flight may become visible after
+# vectors saved later, so syncing looks back this far past the newest one.
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+# Save the matrix after this many changed vectors.
+SAVE_THRESHOLD = 1000
+
+
+def _tag_vector(tag_names: Iterable[str]) -> List[float]:
+    vector = [0.0] * TAG_DIMENSIONS
+    for name in set(tag_names):
+        value = zlib.crc32(name.lower().encode())
+        vector[value % TAG_DIMENSIONS] += 1.0 if value & 0x10000 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm:
+        vector = [value / norm for value in vector]
+    return vector
+
+
+def feature_vector(asset: AudioAsset, tag_names: Iterable[str]) -> List[float]:
+    """
+    The feature vector of an asset.
+
+    Args:
+        asset: The asset.
+        tag_names: Names of its tags.
+
+    Returns:
+        `DIMENSIONS` floats.
+    """
+    bpm = math.log2(asset.bpm / REFERENCE_BPM) if asset.bpm else 0.0
+    loudness = (
+        asset.loudness - REFERENCE_LOUDNESS if asset.loudness is not None else 0.0
+    )
+    duration = math.log2((asset.duration + 1) / REFERENCE_DURATION)
+    asset_type = [
+        TYPE_WEIGHT if choice == asset.asset_type else 0.0 for choice in ASSET_TYPES
+    ]
+    return [
+        bpm * BPM_WEIGHT,
+        loudness * LOUDNESS_WEIGHT,
+        duration * DURATION_WEIGHT,
+        *asset_type,
+        *(value * TAG_WEIGHT for value in _tag_vector(tag_names)),
+    ]
+
+
+def encode_vector(vector: Sequence[float]) -> bytes:
+    return struct.pack(VECTOR_FORMAT, *vector)
+
+
+def update_feature_vectors(
+    asset_ids: Iterable[int], batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """
+    Create or refresh the feature vectors of assets.
+
+    Args:
+        asset_ids: Primary keys of the assets.
+        batch_size: Number of assets to update per batch.
+
+    Returns:
+        The number of vectors written.
+    """
+    ids = list(asset_ids)
+    written = 0
+    db = router.db_for_write(AssetFeatures)
+    upsert = connections[db].features.supports_update_conflicts_with_target
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start : start + batch_size]
+        features = [
+            AssetFeatures(
+                asset_id=asset.pk,
+                owner_id=asset.owner_id,
+                vector=encode_vector(
+                    feature_vector(asset, (tag.name for tag in asset.tags.all()))
+                ),
+            )
+            for asset in AudioAsset.objects.filter(pk__in=chunk).prefetch_related(
+                "tags"
+            )
+        ]
+        if upsert:
+            AssetFeatures.objects.bulk_create(
+                features,
+                update_conflicts=True,
+                unique_fields=["asset"],
+                update_fields=["owner", "vector", "modified"],
+            )
+        else:  # pragma: nocover
+            with transaction.atomic(using=db):
+                AssetFeatures.objects.filter(asset_id__in=chunk).delete()
+                AssetFeatures.objects.bulk_create(features)
+        written += len(features)
+    return written
+
+
+def similarity_root() -> str:
+    return os.path.join(
+        settings.MEDIA_ROOT,
+        getattr(settings, "AUDIO_ASSET_MANAGER_SIMILARITY_DIR", "similarity"),
+    )
+
+
+def index_path(owner_id: int) -> str:
+    """
+    Path of the file an owner's matrix is saved in, with a record of the
+    asset id, modification time, and vector for each row.
+    """
+    return os.path.join(similarity_root(), f"{owner_id}.index.npy")
+
+
+def _save_atomic(path: str, array: Any) -> None:
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            np.save(file, array)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class SimilarityIndex:
+    """
+    One owner's feature vectors as a matrix, with a row per asset.
+
+    Rows are only appended or overwritten in place, with spare room kept at
+    the end so adding assets doesn't copy the matrix each time. Rows of
+    assets that are gone get an infinite norm, which keeps them out of search
+    results, and are left out when the matrix is saved.
+    """
+
+    def __init__(self, owner_id: int, rows: Any = None, vectors: Any = None):
+        self.owner_id = owner_id
+        if rows is None:
+            rows = np.zeros(0, ROW_DTYPE)
+            vectors = np.zeros((0, DIMENSIONS), VECTOR_DTYPE)
+        self.rows = rows
+        self.vectors = vectors
+        self.size = len(rows)
+        self.norms = np.einsum("ij,ij->i", vectors, vectors)
+        self.synced: Optional[datetime.datetime] = None
+        if self.size:
+            self.synced = datetime.datetime.fromtimestamp(
+                float(rows["modified"].max()), datetime.timezone.utc
+            )
+        self.unsaved = 0
+        self.lock = threading.RLock()
+        self._positions: Optional[Dict[int, int]] = None
+
+    @classmethod
+    def load(cls, owner_id: int) -> "SimilarityIndex":
+        """
+        Memory-map an owner's saved matrix, or start an empty one.
+
+        Pages are copied on write, so changes stay in this process until it
+        saves them.
+        """
+        try:
+            records = np.load(index_path(owner_id), mmap_mode="c")
+        except (OSError, ValueError):
+            return cls(owner_id)
+        # The file may have been saved with another layout.
+        if records.dtype != np.dtype(FILE_DTYPE) or records.ndim != 1:
+            return cls(owner_id)
+        # Rows are small, so they're copied into an array of their own. The
+        # vectors stay mapped.
+        rows = np.zeros(len(records), ROW_DTYPE)
+        rows["id"] = records["id"]
+        rows["modified"] = records["modified"]
+        return cls(owner_id, rows, records["vector"])
+
+    def _position_map(self) -> Dict[int, int]:
+        if self._positions is None:
+            self._positions = dict(
+                zip(self.rows["id"][: self.size].tolist(), range(self.size))
+            )
+        return self._positions
+
+    def _reserve(self, size: int) -> None:
+        if size <= len(self.rows):
+            return
+        capacity = max(size, len(self.rows) * 3 // 2, 1024)
+        rows = np.zeros(capacity, ROW_DTYPE)
+        vectors = np.zeros((capacity, DIMENSIONS), VECTOR_DTYPE)
+        norms = np.full(capacity, np.inf, VECTOR_DTYPE)
+        rows[: self.size] = self.rows[: self.size]
+        vectors[: self.size] = self.vectors[: self.size]
+        norms[: self.size] = self.norms[: self.size]
+        self.rows, self.vectors, self.norms = rows, vectors, norms
+
+    def apply(self, ids: Any, modified: Any, vectors: Any) -> int:
+        """
+        Add or overwrite the rows of some assets.
+
+        Args:
+            ids: Asset primary keys, without repeats.
+            modified: When each vector was computed, as POSIX timestamps.
+            vectors: The vectors, one per row.
+
+        Returns:
+            The number of rows added or overwritten. Rows already in the
+            matrix with the same modification time are left alone.
+        """
+        positions = self._position_map()
+        slots = np.empty(len(ids), np.int64)
+        size = self.size
+        for i, asset_id in enumerate(ids.tolist()):
+            position = positions.get(asset_id)
+            if position is None:
+                position = positions[asset_id] = size
+                size += 1
+            slots[i] = position
+        # Syncing overlaps the last one, so rows seen before come again, and
+        # may have been discarded since.
+        changed = slots >= self.size
+        changed[~changed] = self.rows["modified"][slots[~changed]] != modified[~changed]
+        ids, modified, vectors, slots = (
+            ids[changed],
+            modified[changed],
+            vectors[changed],
+            slots[changed],
+        )
+        self._reserve(size)
+        self.size = size
+        self.rows["id"][slots] = ids
+        self.rows["modified"][slots] = modified
+        self.vectors[slots] = vectors
+        self.norms[slots] = np.einsum("ij,ij->i", vectors, vectors)
+        self.unsaved += len(ids)
+        if len(modified):
+            newest = datetime.datetime.fromtimestamp(
+                float(modified.max()), datetime.timezone.utc
+            )
+            if self.synced is None or newest > self.synced:
+                self.synced = newest
+        return len(ids)
+
+    def discard(self, asset_ids: Iterable[int]) -> None:
+        """
+        Keep assets out of search results until their vectors change.
+        """
+        positions = self._position_map()
+        slots = [positions[pk] for pk in asset_ids if pk in positions]
+        self.norms[slots] = np.inf
+        self.unsaved += len(slots)
+
+    def sync(self, batch_size: int = 10000) -> int:
+        """
+        Catch up with the vectors changed since the matrix was last updated.
+
+        Args:
+            batch_size: Number of changed vectors to read and apply at a time.
+
+        Returns:
+            The number of rows added or overwritten.
+        """
+        features = AssetFeatures.objects.filter(owner_id=self.owner_id)
+        if self.synced is not None:
+            features = features.filter(modified__gte=self.synced - SYNC_OVERLAP)
+        changed = 0
+        batch: List[Tuple[int, datetime.datetime, Any]] = []
+        rows = features.order_by().values_list("asset_id", "modified", "vector")
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                changed += self._apply_rows(batch)
+                batch = []
+        changed += self._apply_rows(batch)
+        if self.unsaved >= SAVE_THRESHOLD:
+            self.save()
+        return changed
+
+    def _apply_rows(self, rows: List[Tuple[int, datetime.datetime, Any]]) -> int:
+        # Vectors computed with another layout are ignored until rebuilt.
+        rows = [row for row in rows if len(row[2]) == DIMENSIONS * 4]
+        if not rows:
+            return 0
+        return self.apply(
+            np.array([row[0] for row in rows], np.int64),
+            np.array([row[1].timestamp() for row in rows], np.float64),
+            np.frombuffer(b"".join(bytes(row[2]) for row in rows), VECTOR_DTYPE)
+            .reshape(len(rows), DIMENSIONS)
+            .copy(),
+        )
+
+    def search(
+        self, vector: Any, limit: int, exclude: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        The rows nearest to a vector.
+
+        Args:
+            vector: The vector to compare with.
+            limit: Maximum number of rows to return.
+            exclude: Primary key of an asset to leave out.
+
+        Returns:
+            Asset primary keys with their Euclidean distance, nearest first.
+        """
+        if not self.size or limit < 1:
+            return []
+        ids = self.rows["id"][: self.size]
+        distances = (
+            self.norms[: self.size]
+            - 2 * (self.vectors[: self.size] @ vector)
+            + float(vector @ vector)
+        )
+        if exclude is not None:
+            distances[ids == exclude] = np.inf
+        count = min(limit, self.size)
+        nearest = np.argpartition(distances, count - 1)[:count]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return [
+            (int(ids[i]), math.sqrt(max(float(distances[i]), 0.0)))
+            for i in nearest
+            if np.isfinite(distances[i])
+        ]
+
+    def save(self) -> None:
+        """
+        Write the matrix to its file, leaving out discarded rows.
+        """
+        keep = np.isfinite(self.norms[: self.size])
+        records = np.zeros(int(keep.sum()), FILE_DTYPE)
+        records["id"] = self.rows["id"][: self.size][keep]
+        records["modified"] = self.rows["modified"][: self.size][keep]
+        records["vector"] = self.vectors[: self.size][keep]
+        path = index_path(self.owner_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _save_atomic(path, records)
+        self.unsaved = 0
+
+
+_indexes: Dict[int, SimilarityIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(owner_id: int) -> SimilarityIndex:
+    """
+    An owner's matrix, loaded once per process and synced with the database.
+    """
+    # Imported here, as the analysis module imports the scanner, which keeps
+    # vectors up to date.
+    from .analysis import require_numpy
+
+    require_numpy()
+    with _indexes_lock:
+        index = _indexes.get(owner_id)
+        if index is None:
+            index = _indexes[owner_id] = SimilarityIndex.load(owner_id)
+    with index.lock:
+        index.sync()
+    return index
+
+
+def clear_indexes() -> None:
+    """
+    Forget the matrices loaded in this process.
+    """
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def find_alternatives(
+    asset: AudioAsset,
+    queryset: "Optional[QuerySet[AudioAsset]]" = None,
+    limit: int = DEFAULT_LIMIT,
+) -> List[Tuple[AudioAsset, float]]:
+    """
+    The assets most like an asset, by BPM, loudness, duration, type, and tags.
+
+    Args:
+        asset: The asset to find alternatives for.
+        queryset: The owner's live assets, e.g. with related records selected,
+            to load the matches from. Matches missing from it are taken out
+            of the index until their vectors change.
+        limit: Maximum number of assets to return.
+
+    Returns:
+        Tuples of asset and distance, nearest first.
+    """
+    index = get_index(asset.owner_id)
+    if queryset is None:
+        queryset = AudioAsset.objects.filter(owner_id=asset.owner_id)
+    vector = np.array(feature_vector(asset, asset.tags.names()), VECTOR_DTYPE)
+    wanted = limit
+    while True:
+        with index.lock:
+            matches = index.search(vector, wanted, exclude=asset.pk)
+        found = queryset.in_bulk([pk for pk, _distance in matches])
+        missing = [pk for pk, _distance in matches if pk not in found]
+        if missing:
+            with index.lock:
+                index.discard(missing)
+        if len(found) >= limit or len(matches) < wanted:
+            break
+        wanted *= 2
+    results = [(found[pk], distance) for pk, distance in matches if pk in found]
+    return results[:limit]
+
+
+@dataclass
+class RebuildResult:
+    """
+    Summary of a similarity index rebuild.
+    """
+
+    owners: int = 0
+    vectors: int = 0
+
+
+@instrumented
+def rebuild_similarity_index(
+    owner_ids: Optional[Iterable[int]] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> RebuildResult:
+    """
+    Recompute the feature vectors of every live asset, and save fresh
+    matrices.
+
+    Args:
+        owner_ids: Only rebuild these users' vectors. Defaults to everyone's.
+        batch_size: Number of assets to update per batch.
+
+    Returns:
+        A `RebuildResult`.
+    """
+    from .analysis import require_numpy
+
+    require_numpy()
+    result = RebuildResult()
+    queryset = AudioAsset.objects.all()
+    features = AssetFeatures.objects.all()
+    if owner_ids is not None:
+        owner_ids = list(owner_ids)
+        queryset = queryset.filter(owner_id__in=owner_ids)
+        features = features.filter(owner_id__in=owner_ids)
+    owners = set(features.order_by().values_list("owner_id", flat=True).distinct())
+    owners.update(queryset.order_by().values_list("owner_id", flat=True).distinct())
+    # Vectors of retired assets are left out of the new matrices.
+    features.exclude(asset__in=queryset.values("pk")).delete()
+    batch: List[int] = []
+    for pk in queryset.order_by("pk").values_list("pk", flat=True).iterator():
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            result.vectors += update_feature_vectors(batch, batch_size)
+            batch = []
+    result.vectors += update_feature_vectors(batch, batch_size)
+    for owner_id in sorted(owners):
+        index = SimilarityIndex(owner_id)
+        index.sync()
+        index.save()
+        with _indexes_lock:
+            _indexes[owner_id] = index
+    result.owners = len(owners)
+    return result
@@ -0,0 +1,62 @@
+"""
+Where asset audio files are stored.
+
+Files are kept in the storage named by ``AUDIO_ASSET_MANAGER_STORAGE``, one of
+the ``STORAGES`` aliases (``default`` by default), at a path derived from
+their SHA1 digest, so identical files are stored once whoever uploads them.
+
+The ``default`` storage is usually served to anyone at ``MEDIA_URL``, which
+would make every stored file downloadable without the owner's permission, so
+a system check warns until ``AUDIO_ASSET_MANAGER_STORAGE`` is set.
+"""
+import posixpath
+import re
+
+from django.conf import settings
+from django.core import checks
+from django.core.files.storage import Storage, storages
+
+FILE_DIR = "assets"
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+
+def asset_storage() -> Storage:
+    return storages[getattr(settings, "AUDIO_ASSET_MANAGER_STORAGE", "default")]
+
+
+def is_digest(value: str) -> bool:
+    """
+    Whether a value is a SHA1 digest as the scanner and uploads write them:
+    40 lowercase hexadecimal characters.
+    """
+    return isinstance(value, str) and DIGEST_PATTERN.fullmatch(value) is not None
+
+
+def content_path(digest: str) -> str:
+    """
+    The storage path of the file with a SHA1 digest.
+
+    Files are spread over two levels of directories by the digest's first
+    characters, so no directory grows too large.
+    """
+    digest = digest.lower()
+    return posixpath.join(
+        getattr(settings, "AUDIO_ASSET_MANAGER_FILE_DIR", FILE_DIR),
+        digest[:2],
+        digest[2:4],
+        digest,
+    )
+
+
+def check_asset_storage(app_configs, **kwargs):
+    if getattr(settings, "AUDIO_ASSET_MANAGER_STORAGE", None) is not None:
+        return []
+    return [
+        checks.Warning(
+            "Asset files are stored in the default storage, which is usually "
+            "served publicly at MEDIA_URL.",
+            hint="Set AUDIO_ASSET_MANAGER_STORAGE to a STORAGES alias that isn't "
+            "served, and let users download files through the API.",
+            id="audio_asset_manager.W001",
+        )
+    ]
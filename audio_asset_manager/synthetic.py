@@ -0,0 +1,232 @@
+"""
+Generates synthetic catalogs for benchmarking and load testing.
+"""
+from typing import Any, List, Optional
+
+import random
+import uuid
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from taggit.models import Tag
+
+from .aggregates import assets_created
+from .facets import invalidate_facets
+from .instrumentation import instrumented
+from .models import (
+    Artist,
+    AssetSource,
+    AudioAsset,
+    Collection,
+    LicenseType,
+    TaggedAudioAsset,
+)
+from .search import update_search_documents
+from .similarity import update_feature_vectors
+
+DEFAULT_BATCH_SIZE = 5000
+
+WORDS = (
+    "ambient amber blue breeze cinematic circuit city dawn drift dusk echo ember "
+    "falling field glass gold groove harbor horizon lantern light lofi midnight "
+    "mirror motion neon night ocean orbit pulse rain river road shadow signal "
+    "silver sky slow spark static storm summer tide velvet wave winter wire"
+).split()
+# Most used first: the n-th tag is used about 1/n as often as the first.
+TAGS = (
+    "ambient piano cinematic electronic calm upbeat strings drums guitar synth "
+    "dark happy acoustic orchestral corporate lofi vocals epic percussion bass "
+    "sad jazz rock pop folk hiphop choir whistle loop field-recording"
+).split()
+
+
+@dataclass
+class SyntheticCatalog:
+    """
+    Summary of a generated catalog.
+    """
+
+    sources: int = 0
+    artists: int = 0
+    collections: int = 0
+    assets: int = 0
+    tags: int = 0
+
+
+def _title(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def _digest() -> str:
+    # Random rather than seeded, so catalogs generated again with the same
+    # seed don't collide with each other's digests.
+    return (uuid.uuid4().hex + uuid.uuid4().hex)[:40]
+
+
+@instrumented
+def generate_catalog(
+    owner: Any,
+    assets: int,
+    sources: Optional[int] = None,
+    artists: Optional[int] = None,
+    collections: Optional[int] = None,
+    seed: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_tags: int = 0,
+) -> SyntheticCatalog:
+    """
+    Insert a realistic looking catalog for a user with `bulk_create`.
+
+    Related record counts default to ratios typical of a production music
+    library: a handful of sources, one artist per 50 assets, and one
+    collection per 12 assets.
+
+    Args:
+        owner: User who owns the generated records.
+        assets: Number of assets to create.
+        sources: Number of asset sources to create.
+        artists: Number of artists to create.
+        collections: Number of collections to create.
+        seed: Seed for the random number generator, for repeatable catalogs.
+        batch_size: Number of rows to insert per query.
+        max_tags: Tag each asset with up to this many tags from `TAGS`.
+
+    Returns:
+        A `SyntheticCatalog` with the number of records created.
+    """
+    rng = random.Random(seed)  # nosec - not used for security
+    sources = sources if sources is not None else max(assets // 10000, 3)
+    artists = artists if artists is not None else max(assets // 50, 1)
+    collections = collections if collections is not None else max(assets // 12, 1)
+    result = SyntheticCatalog()
+    license_types = list(LicenseType.objects.all()) or [
+        LicenseType.objects.create(name="Synthetic License")
+    ]
+    with transaction.atomic():
+        source_objs = AssetSource.objects.bulk_create(
+            [
+                AssetSource(
+                    owner=owner,
+                    name=f"Source {i}",
+                    license_type=rng.choice(license_types),
+                    source_credit_text=f"/ via Source {i}",
+                )
+                for i in range(sources)
+            ],
+            batch_size=batch_size,
+        )
+        result.sources = len(source_objs)
+        artist_objs: List[Artist] = []
+        for start in range(0, artists, batch_size):
+            artist_objs += Artist.objects.bulk_create(
+                Artist(owner=owner, name=_title(rng, 2))
+                for _ in range(start, min(start + batch_size, artists))
+            )
+        result.artists = len(artist_objs)
+        collection_objs: List[Collection] = []
+        for start in range(0, collections, batch_size):
+            collection_objs += Collection.objects.bulk_create(
+                Collection(
+                    owner=owner,
+                    title=_title(rng, 3),
+                    album_artist=rng.choice(artist_objs),
+                )
+                for _ in range(start, min(start + batch_size, collections))
+            )
+        result.collections = len(collection_objs)
+    asset_types = [choice for choice, _label in AudioAsset.AssetTypes.choices]
+    tag_ids = (
+        [Tag.objects.get_or_create(name=name)[0].pk for name in TAGS]
+        if max_tags
+        else []
+    )
+    tag_weights = [1 / rank for rank in range(1, len(tag_ids) + 1)]
+    for start in range(0, assets, batch_size):
+        batch = []
+        for _ in range(start, min(start + batch_size, assets)):
+            collection = rng.choice(collection_objs)
+            asset_type = rng.choices(asset_types, weights=[80, 12, 4, 4])[0]
+            is_music = asset_type == AudioAsset.AssetTypes.MUSIC
+            batch.append(
+                AudioAsset(
+                    owner=owner,
+                    asset_type=asset_type,
+                    title=_title(rng, rng.randint(1, 4)),
+                    artist_id=collection.album_artist_id,
+                    collection=collection,
+                    source=rng.choice(source_objs),
+                    explicit_credit_required=rng.random() < 0.3,
+                    duration=rng.randint(30, 420) if is_music else rng.randint(1, 30),
+                    bpm=rng.randint(60, 180) if is_music else None,
+                    loudness=round(rng.gauss(-16, 3), 1),
+                    digest=_digest(),
+                )
+            )
+        with transaction.atomic():
+            AudioAsset.objects.bulk_create(batch)
+            if tag_ids:
+                tagged = [
+                    TaggedAudioAsset(content_object_id=asset.pk, tag_id=tag_id)
+                    for asset in batch
+                    for tag_id in set(
+                        rng.choices(tag_ids, tag_weights, k=rng.randint(0, max_tags))
+                    )
+                ]
+                TaggedAudioAsset.objects.bulk_create(tagged, batch_size=batch_size)
+                result.tags += len(tagged)
+            update_search_documents([asset.pk for asset in batch], batch_size=1000)
+            update_feature_vectors([asset.pk for asset in batch], batch_size=1000)
+            assets_created(batch)
+        result.assets += len(batch)
+    invalidate_facets([owner.pk])
+    return result
+
+
+@instrumented
+def generate_owners(
+    owners: int, assets: int, prefix: str = "synthetic", seed: int = 0, **kwargs: Any
+) -> List[Any]:
+    """
+    Insert users, each with a synthetic catalog of their own.
+
+    Users are named ``<prefix>-<n>``, with unusable passwords. Ones that
+    already exist are reused, and their catalogs topped up to ``assets``.
+
+    Args:
+        owners: Number of users.
+        assets: Number of assets each user should have.
+        prefix: Start of the usernames.
+        seed: Seed of the first user's catalog. The others get the ones
+            after it.
+        **kwargs: Passed on to `generate_catalog`.
+
+    Returns:
+        The users.
+    """
+    user_model = get_user_model()
+    field = user_model.USERNAME_FIELD
+    names = [f"{prefix}-{i}" for i in range(owners)]
+    existing = set(
+        user_model.objects.filter(**{f"{field}__in": names}).values_list(
+            field, flat=True
+        )
+    )
+    missing = []
+    for name in names:
+        if name not in existing:
+            user = user_model(**{field: name})
+            user.set_unusable_password()
+            missing.append(user)
+    user_model.objects.bulk_create(missing)
+    users = sorted(
+        user_model.objects.filter(**{f"{field}__in": names}),
+        key=lambda user: names.index(getattr(user, field)),
+    )
+    for i, user in enumerate(users):
+        count = AudioAsset.objects.for_user(user).count()
+        if count < assets:
+            generate_catalog(
+                user, assets - count, seed=seed + i * assets + count, **kwargs
+            )
+    return users
@@ -0,0 +1,289 @@
+"""
+Boolean tag queries, like ``ambient AND (piano OR strings) AND NOT vocals``.
+
+A query is parsed into a small expression tree and compiled to a single
+``WHERE`` clause over `TaggedAudioAsset`, the typed through table of
+`AudioAsset.tags`. Each term becomes a ``pk IN`` subquery over tag postings:
+the asset ids for a tag, read in order from the ``(tag, asset)`` index
+without touching either table, so the database starts from the tags rather
+than testing every asset:
+
+* Tags ANDed together share one subquery that keeps the assets found for
+  all of them.
+* Tags ORed together share one subquery over all of their postings.
+* ``NOT`` becomes ``NOT IN``, and other nesting combines the subqueries of
+  its parts with ``AND`` and ``OR``.
+
+Tag names are resolved to ids with one query up front. Unknown tags match no
+assets, so they are folded away before any SQL is built.
+
+Syntax: terms are tag names, or double quoted names for tags with spaces or
+parentheses in them. ``AND``, ``OR``, and ``NOT`` (in any case) combine them,
+with ``NOT`` binding tightest and ``OR`` loosest, and parentheses group.
+Adjacent terms without an operator are ANDed.
+"""
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import re
+from dataclasses import dataclass
+
+from django.db.models import Count, Q, QuerySet
+from taggit.models import Tag
+
+from .models import AudioAsset, TaggedAudioAsset
+
+MAX_QUERY_LENGTH = 1000
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_KEYWORDS = {"AND", "OR", "NOT"}
+
+
+class TagQueryError(ValueError):
+    """
+    Raised for a tag query that can't be parsed.
+    """
+
+
+@dataclass(frozen=True)
+class TagTerm:
+    """
+    Matches assets with a tag.
+    """
+
+    name: str
+
+
+@dataclass(frozen=True)
+class Not:
+    """
+    Matches assets that don't match its operand.
+    """
+
+    operand: "TagExpression"
+
+
+@dataclass(frozen=True)
+class And:
+    """
+    Matches assets that match all of its operands.
+    """
+
+    operands: Tuple["TagExpression", ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    """
+    Matches assets that match any of its operands.
+    """
+
+    operands: Tuple["TagExpression", ...]
+
+
+TagExpression = Union[TagTerm, Not, And, Or]
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise TagQueryError(f"Unterminated quote at position {position + 1}.")
+        opening, closing, quoted, word = match.groups()
+        if opening:
+            tokens.append(("(", opening))
+        elif closing:
+            tokens.append((")", closing))
+        elif quoted is not None:
+            tokens.append(("tag", re.sub(r"\\(.)", r"\1", quoted)))
+        elif word.upper() in _KEYWORDS:
+            tokens.append((word.upper(), word))
+        else:
+            tokens.append(("tag", word))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def take(self, kind: str) -> str:
+        if self.peek() != kind:
+            found = self.tokens[self.position][1] if self.peek() else "end of query"
+            expected = "a tag" if kind == "tag" else f"'{kind}'"
+            raise TagQueryError(f"Expected {expected}, found '{found}'.")
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def parse(self) -> TagExpression:
+        expression = self.parse_or()
+        if self.peek() is not None:
+            raise TagQueryError(f"Unexpected '{self.tokens[self.position][1]}'.")
+        return expression
+
+    def parse_or(self) -> TagExpression:
+        operands = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take("OR")
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else Or(tuple(operands))
+
+    def parse_and(self) -> TagExpression:
+        operands = [self.parse_not()]
+        while self.peek() in ("AND", "NOT", "(", "tag"):
+            if self.peek() == "AND":
+                self.take("AND")
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else And(tuple(operands))
+
+    def parse_not(self) -> TagExpression:
+        if self.peek() == "NOT":
+            self.take("NOT")
+            return Not(self.parse_not())
+        if self.peek() == "(":
+            self.take("(")
+            expression = self.parse_or()
+            self.take(")")
+            return expression
+        return TagTerm(self.take("tag"))
+
+
+def parse_tag_query(text: str) -> TagExpression:
+    """
+    Parse a boolean tag query.
+
+    Args:
+        text: The query, e.g. ``ambient AND piano AND NOT vocals``.
+
+    Returns:
+        The parsed expression.
+
+    Raises:
+        TagQueryError: If the query is empty, too long, or malformed.
+    """
+    if len(text) > MAX_QUERY_LENGTH:
+        raise TagQueryError(
+            f"Tag queries can be at most {MAX_QUERY_LENGTH} characters long."
+        )
+    tokens = _tokenize(text)
+    if not tokens:
+        raise TagQueryError("The tag query is empty.")
+    return _Parser(tokens).parse()
+
+
+def expression_tags(expression: TagExpression) -> Set[str]:
+    """
+    The names of every tag in an expression.
+    """
+    if isinstance(expression, TagTerm):
+        return {expression.name}
+    if isinstance(expression, Not):
+        return expression_tags(expression.operand)
+    return set().union(*(expression_tags(operand) for operand in expression.operands))
+
+
+def _has_any(tag_ids: Set[int]) -> Q:
+    tagged = TaggedAudioAsset.objects.filter(tag_id__in=sorted(tag_ids))
+    return Q(pk__in=tagged.values("content_object"))
+
+
+def _has_all(tag_ids: Set[int]) -> Q:
+    if len(tag_ids) == 1:
+        return _has_any(tag_ids)
+    tagged = (
+        TaggedAudioAsset.objects.filter(tag_id__in=sorted(tag_ids))
+        .order_by()
+        .values("content_object")
+        .annotate(matched=Count("tag"))
+        .filter(matched=len(tag_ids))
+        .values("content_object")
+    )
+    return Q(pk__in=tagged)
+
+
+# A compiled expression, or a constant for one that matches every asset or
+# none of them.
+_Compiled = Union[Q, bool]
+
+
+def _compile(expression: TagExpression, tag_ids: Dict[str, int]) -> _Compiled:
+    if isinstance(expression, TagTerm):
+        tag_id = tag_ids.get(expression.name)
+        return False if tag_id is None else _has_all({tag_id})
+    if isinstance(expression, Not):
+        operand = _compile(expression.operand, tag_ids)
+        return (not operand) if isinstance(operand, bool) else ~operand
+    terms = [operand for operand in expression.operands if isinstance(operand, TagTerm)]
+    ids = {tag_ids.get(term.name) for term in terms}
+    parts: List[_Compiled] = [
+        _compile(operand, tag_ids)
+        for operand in expression.operands
+        if not isinstance(operand, TagTerm)
+    ]
+    if isinstance(expression, And):
+        if None in ids:
+            return False
+        if ids:
+            parts.insert(0, _has_all(ids))  # type: ignore
+        if False in parts:
+            return False
+        parts = [part for part in parts if part is not True]
+        if not parts:
+            return True
+        combined = parts[0]
+        for part in parts[1:]:
+            combined &= part  # type: ignore
+        return combined
+    ids.discard(None)
+    if ids:
+        parts.insert(0, _has_any(ids))  # type: ignore
+    if True in parts:
+        return True
+    parts = [part for part in parts if part is not False]
+    if not parts:
+        return False
+    combined = parts[0]
+    for part in parts[1:]:
+        combined |= part  # type: ignore
+    return combined
+
+
+def filter_by_tag_query(
+    queryset: "QuerySet[AudioAsset]", query: Union[str, TagExpression]
+) -> "QuerySet[AudioAsset]":
+    """
+    Narrow down assets to those matching a boolean tag query.
+
+    Args:
+        queryset: Assets to filter.
+        query: A query string, or an expression from `parse_tag_query`.
+
+    Returns:
+        The filtered queryset.
+
+    Raises:
+        TagQueryError: If the query string can't be parsed.
+
+    # noqa: DAR402 TagQueryError
+    """
+    expression = parse_tag_query(query) if isinstance(query, str) else query
+    tag_ids = dict(
+        Tag.objects.filter(name__in=expression_tags(expression)).values_list(
+            "name", "pk"
+        )
+    )
+    condition = _compile(expression, tag_ids)
+    if condition is True:
+        return queryset
+    if condition is False:
+        return queryset.none()
+    return queryset.filter(condition)
@@ -0,0 +1,48 @@
+"""
+Test helpers for projects using the app.
+"""
+from typing import Iterator
+
+from contextlib import contextmanager
+
+from .instrumentation import OperationStats, measure
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a block makes more queries than its budget.
+    """
+
+
+@contextmanager
+def query_budget(max_queries: int, name: str = "block") -> Iterator[OperationStats]:
+    """
+    Fail if a block of code makes more than ``max_queries`` queries.
+
+    Declare a budget for an endpoint with a catalog big enough to show an
+    N+1 pattern, so adding a query per row breaks the test::
+
+        with query_budget(4, "asset list"):
+            client.get("/audio/api/assets/")
+
+    Args:
+        max_queries: Number of queries the block may make.
+        name: What the block does, for the failure message.
+
+    Yields:
+        The block's `OperationStats`, filled in when it exits.
+
+    Raises:
+        QueryBudgetExceeded: If the block goes over its budget. The message
+            lists every query it made.
+    """
+    with measure(name, capture_sql=True) as stats:
+        yield stats
+    if stats.queries > max_queries:
+        statements = "\n".join(
+            f"{i}. {sql}" for i, sql in enumerate(stats.statements, 1)
+        )
+        raise QueryBudgetExceeded(
+            f"{name} made {stats.queries} queries, over its budget of "
+            f"{max_queries}:\n{statements}"
+        )
@@ -0,0 +1,632 @@
+"""
+Bulk import and export of asset catalogs as CSV or JSON Lines.
+
+Each row describes one asset along with everything it references: its
+artist, collection, source, license type, and tags, identified by name. That
+makes a file self contained, so a catalog can be moved between installations
+whose primary keys don't line up. Records that no asset references can be
+exported too, as rows without a title.
+
+Exports stream rows with `QuerySet.iterator` so memory use doesn't grow with
+the catalog. Imports resolve names through in-memory lookup maps and write
+each batch with `bulk_create`.
+"""
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import csv
+import json
+import math
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+from taggit.models import Tag
+from taggit.utils import edit_string_for_tags, parse_tags
+
+from .aggregates import AggregateChanges
+from .facets import invalidate_facets
+from .instrumentation import instrumented
+from .models import (
+    ArchivedAudioAsset,
+    Artist,
+    AssetSource,
+    AudioAsset,
+    Collection,
+    LicenseType,
+    TaggedAudioAsset,
+)
+from .scanner import ProgressCallback
+from .search import update_search_documents
+from .similarity import update_feature_vectors
+from .storage import is_digest
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_BATCH_SIZE = 1000
+
+FORMATS = ("csv", "jsonl")
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+COLUMNS = [
+    "asset_type",
+    "title",
+    "artist",
+    "collection",
+    "collection_artist",
+    "source",
+    "source_url",
+    "source_credit_text",
+    "license_type",
+    "license_url",
+    "include_license_in_credits",
+    "filename",
+    "digest",
+    "explicit_credit_required",
+    "credit_link",
+    "duration",
+    "bpm",
+    "loudness",
+    "tags",
+]
+BOOLEAN_COLUMNS = {"include_license_in_credits", "explicit_credit_required"}
+INTEGER_COLUMNS = {"duration", "bpm"}
+FLOAT_COLUMNS = {"loudness"}
+# Text columns, with the model field whose validators their values must pass.
+TEXT_COLUMNS = {
+    "title": AudioAsset._meta.get_field("title"),
+    "artist": Artist._meta.get_field("name"),
+    "collection": Collection._meta.get_field("title"),
+    "collection_artist": Artist._meta.get_field("name"),
+    "source": AssetSource._meta.get_field("name"),
+    "source_url": AssetSource._meta.get_field("url"),
+    "source_credit_text": AssetSource._meta.get_field("source_credit_text"),
+    "license_type": LicenseType._meta.get_field("name"),
+    "license_url": LicenseType._meta.get_field("url"),
+    "filename": AudioAsset._meta.get_field("filename"),
+    "digest": AudioAsset._meta.get_field("digest"),
+    "credit_link": AudioAsset._meta.get_field("credit_link"),
+}
+# Columns that describe the asset itself rather than the records it
+# references. A row with none of them only describes records.
+ASSET_COLUMNS = [
+    "asset_type",
+    "title",
+    "filename",
+    "digest",
+    "explicit_credit_required",
+    "credit_link",
+    "duration",
+    "bpm",
+    "loudness",
+    "tags",
+]
+TAG_MAX_LENGTH = Tag._meta.get_field("name").max_length
+# The largest value every supported database can store in an integer column.
+MAX_INTEGER = 2**31 - 1
+
+
+class CatalogFormatError(ValueError):
+    """
+    Raised when a row of an import file can't be understood.
+    """
+
+
+@dataclass
+class ImportResult:
+    """
+    Summary of a catalog import.
+    """
+
+    created: int = 0
+    skipped: int = 0
+
+
+def _source_values(source: Optional[AssetSource]) -> Dict[str, Any]:
+    license_type = source.license_type if source else None
+    return {
+        "source": source.name if source else None,
+        "source_url": source.url if source else None,
+        "source_credit_text": source.source_credit_text if source else None,
+        "license_type": license_type.name if license_type else None,
+        "license_url": license_type.url if license_type else None,
+        "include_license_in_credits": (
+            license_type.include_license_in_credits if license_type else None
+        ),
+    }
+
+
+def _collection_values(collection: Optional[Collection]) -> Dict[str, Any]:
+    return {
+        "collection": collection.title if collection else None,
+        "collection_artist": (
+            collection.album_artist.name
+            if collection and collection.album_artist
+            else None
+        ),
+    }
+
+
+def _record_row(**values: Any) -> Dict[str, Any]:
+    row: Dict[str, Any] = dict.fromkeys(COLUMNS)
+    row["tags"] = []
+    row.update(values)
+    return row
+
+
+def export_rows(
+    queryset: "QuerySet[AudioAsset]",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    owner: Any = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Describe assets as rows for export.
+
+    Assets are fetched ``chunk_size`` at a time with their related records
+    joined in and their tags prefetched per chunk.
+
+    Args:
+        queryset: Assets to export.
+        chunk_size: Number of assets to fetch per query.
+        owner: If given, the asset rows are followed by a row for each of the
+            owner's sources, collections, and artists that none of the assets
+            reference. Those rows have no title, and `import_catalog` creates
+            the records they describe without creating an asset.
+
+    Yields:
+        A dict per asset with a value for every name in `COLUMNS`. Tags are a
+        list of names.
+    """
+    queryset = (
+        queryset.select_related(
+            "artist", "collection__album_artist", "source__license_type"
+        )
+        .prefetch_related("tags")
+        .order_by("pk")
+    )
+    artist_ids, collection_ids, source_ids = set(), set(), set()
+    for asset in queryset.iterator(chunk_size=chunk_size):
+        artist_ids.update(
+            (asset.artist_id, asset.collection and asset.collection.album_artist_id)
+        )
+        collection_ids.add(asset.collection_id)
+        source_ids.add(asset.source_id)
+        yield {
+            "asset_type": asset.asset_type,
+            "title": asset.title,
+            "artist": asset.artist.name if asset.artist else None,
+            **_collection_values(asset.collection),
+            **_source_values(asset.source),
+            "filename": asset.filename,
+            "digest": asset.digest,
+            "explicit_credit_required": asset.explicit_credit_required,
+            "credit_link": asset.credit_link,
+            "duration": asset.duration,
+            "bpm": asset.bpm,
+            "loudness": asset.loudness,
+            "tags": sorted(tag.name for tag in asset.tags.all()),
+        }
+    if owner is None:
+        return
+    sources = (
+        AssetSource.objects.filter(owner=owner)
+        .exclude(pk__in=source_ids - {None})
+        .select_related("license_type")
+        .order_by("pk")
+    )
+    for source in sources.iterator(chunk_size=chunk_size):
+        yield _record_row(**_source_values(source))
+    collections = (
+        Collection.objects.filter(owner=owner)
+        .exclude(pk__in=collection_ids - {None})
+        .select_related("album_artist")
+        .order_by("pk")
+    )
+    for collection in collections.iterator(chunk_size=chunk_size):
+        artist_ids.add(collection.album_artist_id)
+        yield _record_row(**_collection_values(collection))
+    artists = (
+        Artist.objects.filter(owner=owner)
+        .exclude(pk__in=artist_ids - {None})
+        .order_by("pk")
+    )
+    for artist in artists.iterator(chunk_size=chunk_size):
+        yield _record_row(artist=artist.name)
+
+
+class _Echo:
+    """
+    A file-like object that hands back whatever is written to it.
+    """
+
+    def write(self, value: str) -> str:
+        """
+        Hand back a line the CSV writer wrote.
+
+        Args:
+            value: The formatted line.
+
+        Returns:
+            The line, unchanged.
+        """
+        return value
+
+
+def _csv_value(name: str, value: Any) -> str:
+    if value is None:
+        return ""
+    if name == "tags":
+        return edit_string_for_tags([Tag(name=tag) for tag in value])
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Encode rows as CSV lines, starting with a header.
+
+    Tags are written in the same comma separated format the admin uses.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([_csv_value(name, row[name]) for name in COLUMNS])
+
+
+def iter_jsonl(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Encode rows as JSON Lines.
+    """
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def export_catalog(
+    queryset: "QuerySet[AudioAsset]",
+    file_format: str = "csv",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    owner: Any = None,
+) -> Iterator[str]:
+    """
+    Export assets as a stream of CSV or JSON Lines text.
+
+    Args:
+        queryset: Assets to export.
+        file_format: ``"csv"`` or ``"jsonl"``.
+        chunk_size: Number of assets to fetch per query.
+        owner: If given, the owner's records that none of the assets
+            reference are exported too. See `export_rows`.
+
+    Returns:
+        An iterator of text chunks, suitable for a `StreamingHttpResponse` or
+        for writing to a file.
+
+    Raises:
+        ValueError: If ``file_format`` isn't one of `FORMATS`.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format {file_format!r}.")
+    rows = export_rows(queryset, chunk_size=chunk_size, owner=owner)
+    return iter_csv(rows) if file_format == "csv" else iter_jsonl(rows)
+
+
+def read_csv(file: IO[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Read import rows from a CSV file with a header row.
+    """
+    yield from csv.DictReader(file)
+
+
+def read_jsonl(file: IO[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Read import rows from a JSON Lines file.
+    """
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise CatalogFormatError(f"Line {line_number}: {e}") from e
+        if not isinstance(row, dict):
+            raise CatalogFormatError(f"Line {line_number}: expected an object.")
+        yield row
+
+
+def read_catalog(file: IO[str], file_format: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read import rows from a file in the given format.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown import format {file_format!r}.")
+    return read_csv(file) if file_format == "csv" else read_jsonl(file)
+
+
+def _clean_row(row: Dict[str, Any], number: int) -> Dict[str, Any]:
+    cleaned: Dict[str, Any] = {}
+    for name in COLUMNS:
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+            if name != "tags" and value == "":
+                value = None
+        try:
+            if value is None:
+                pass
+            elif name in TEXT_COLUMNS:
+                if not isinstance(value, str):
+                    raise ValueError("expected text")
+                TEXT_COLUMNS[name].run_validators(value)
+                if name == "digest" and not is_digest(value):
+                    raise ValueError("expected 40 lowercase hexadecimal characters")
+            elif name in BOOLEAN_COLUMNS and isinstance(value, str):
+                value = value.lower() in ("1", "true", "t", "yes", "y")
+            elif name in INTEGER_COLUMNS:
+                value = int(value)
+                if not 0 <= value <= MAX_INTEGER:
+                    raise ValueError(f"must be between 0 and {MAX_INTEGER}")
+            elif name in FLOAT_COLUMNS:
+                value = float(value)
+                if not math.isfinite(value):
+                    raise ValueError("must be a finite number")
+        except ValidationError as e:
+            raise CatalogFormatError(
+                f"Row {number}: invalid {name}: {' '.join(e.messages)}"
+            ) from e
+        except (TypeError, ValueError) as e:
+            raise CatalogFormatError(f"Row {number}: invalid {name}: {e}") from e
+        cleaned[name] = value
+    tags = cleaned["tags"]
+    if isinstance(tags, str):
+        tags = parse_tags(tags)
+    elif tags is not None and not isinstance(tags, list):
+        raise CatalogFormatError(f"Row {number}: invalid tags: expected a list.")
+    cleaned["tags"] = sorted({str(tag) for tag in tags or []})
+    for tag in cleaned["tags"]:
+        if len(tag) > TAG_MAX_LENGTH:
+            raise CatalogFormatError(
+                f"Row {number}: tag {tag[:20]!r}... is longer than "
+                f"{TAG_MAX_LENGTH} characters."
+            )
+    describes_asset = bool(cleaned["tags"]) or any(
+        cleaned[name] is not None for name in ASSET_COLUMNS if name != "tags"
+    )
+    if not describes_asset and any(
+        cleaned[name] is not None for name in COLUMNS if name != "tags"
+    ):
+        # Only describes records, as `export_rows` writes for unused ones.
+        return cleaned
+    if not cleaned["title"]:
+        raise CatalogFormatError(f"Row {number}: title is required.")
+    asset_type = cleaned["asset_type"] or AudioAsset.AssetTypes.MUSIC
+    if asset_type not in AudioAsset.AssetTypes.values:
+        raise CatalogFormatError(f"Row {number}: unknown asset_type {asset_type!r}.")
+    cleaned["asset_type"] = asset_type
+    return cleaned
+
+
+class _CatalogWriter:
+    """
+    Resolves the names in import rows to primary keys and writes batches.
+
+    Lookup maps of the owner's existing records are loaded once, and records
+    missing from them are created per batch, so each batch takes a fixed
+    number of queries however many rows reference the same records.
+    """
+
+    def __init__(self, owner: Any):
+        self.owner = owner
+        # Names aren't unique, so keep the oldest record for each name.
+        self.license_types = self._name_map(LicenseType.objects.all(), "name")
+        self.sources = self._name_map(AssetSource.objects.filter(owner=owner), "name")
+        self.artists = self._name_map(Artist.objects.filter(owner=owner), "name")
+        self.collections: Dict[Tuple[str, str], int] = {}
+        for pk, title, artist in (
+            Collection.objects.filter(owner=owner)
+            .order_by("-pk")
+            .values_list("pk", "title", "album_artist__name")
+        ):
+            self.collections[(title, artist or "")] = pk
+        # Applied once, after the last batch.
+        self.aggregate_changes = AggregateChanges()
+        self.created_ids: List[int] = []
+        self.tags: Dict[str, int] = {}
+        self.digests = set(
+            AudioAsset.all_objects.filter(owner=owner, digest__isnull=False)
+            .values_list("digest", flat=True)
+            .union(
+                ArchivedAudioAsset.objects.filter(
+                    owner=owner, digest__isnull=False
+                ).values_list("digest", flat=True),
+                all=True,
+            )
+        )
+
+    @staticmethod
+    def _name_map(queryset: "QuerySet[Any]", field: str) -> Dict[str, int]:
+        return dict(
+            (name, pk) for pk, name in queryset.order_by("-pk").values_list("pk", field)
+        )
+
+    def _create_license_types(self, rows: List[Dict[str, Any]]) -> None:
+        missing: Dict[str, LicenseType] = {}
+        for row in rows:
+            name = row["license_type"]
+            if name and name not in self.license_types and name not in missing:
+                missing[name] = LicenseType(
+                    name=name,
+                    url=row["license_url"],
+                    include_license_in_credits=bool(row["include_license_in_credits"]),
+                )
+        for obj in LicenseType.objects.bulk_create(missing.values()):
+            self.license_types[obj.name] = obj.pk
+
+    def _create_sources(self, rows: List[Dict[str, Any]]) -> None:
+        missing: Dict[str, AssetSource] = {}
+        for row in rows:
+            name = row["source"]
+            if name and name not in self.sources and name not in missing:
+                missing[name] = AssetSource(
+                    owner=self.owner,
+                    name=name,
+                    url=row["source_url"],
+                    source_credit_text=row["source_credit_text"],
+                    license_type_id=self.license_types.get(row["license_type"]),
+                )
+        for obj in AssetSource.objects.bulk_create(missing.values()):
+            self.sources[obj.name] = obj.pk
+
+    def _create_artists(self, rows: List[Dict[str, Any]]) -> None:
+        names = {row["artist"] for row in rows} | {
+            row["collection_artist"] for row in rows
+        }
+        missing = sorted(name for name in names if name and name not in self.artists)
+        for obj in Artist.objects.bulk_create(
+            Artist(owner=self.owner, name=name) for name in missing
+        ):
+            self.artists[obj.name] = obj.pk
+
+    def _create_collections(self, rows: List[Dict[str, Any]]) -> None:
+        missing: Dict[Tuple[str, str], Collection] = {}
+        for row in rows:
+            key = self._collection_key(row)
+            if key and key not in self.collections and key not in missing:
+                missing[key] = Collection(
+                    owner=self.owner,
+                    title=key[0],
+                    album_artist_id=self.artists.get(key[1]),
+                )
+        for key, obj in zip(
+            missing.keys(), Collection.objects.bulk_create(missing.values())
+        ):
+            self.collections[key] = obj.pk
+
+    @staticmethod
+    def _collection_key(row: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        if not row["collection"]:
+            return None
+        return (row["collection"], row["collection_artist"] or "")
+
+    def _resolve_tags(self, rows: List[Dict[str, Any]]) -> None:
+        wanted = {tag for row in rows for tag in row["tags"]} - self.tags.keys()
+        if not wanted:
+            return
+        self.tags.update(Tag.objects.filter(name__in=wanted).values_list("name", "pk"))
+        # There are few distinct tags compared to assets, and taggit needs
+        # `save` to pick a unique slug, so create the new ones one at a time.
+        for name in sorted(wanted - self.tags.keys()):
+            self.tags[name] = Tag.objects.get_or_create(name=name)[0].pk
+
+    def write(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Create the assets and records described by a batch of cleaned rows.
+
+        Args:
+            rows: Rows cleaned by `_clean_row`. Rows without a title only
+                create the records they name.
+
+        Returns:
+            The number of assets created.
+        """
+        self._create_license_types(rows)
+        self._create_sources(rows)
+        self._create_artists(rows)
+        self._create_collections(rows)
+        self._resolve_tags(rows)
+        rows = [row for row in rows if row["title"]]
+        assets = AudioAsset.objects.bulk_create(
+            AudioAsset(
+                owner=self.owner,
+                asset_type=row["asset_type"],
+                title=row["title"],
+                artist_id=self.artists.get(row["artist"]),
+                collection_id=self.collections.get(self._collection_key(row)),
+                source_id=self.sources.get(row["source"]),
+                filename=row["filename"],
+                digest=row["digest"],
+                explicit_credit_required=(
+                    True
+                    if row["explicit_credit_required"] is None
+                    else row["explicit_credit_required"]
+                ),
+                credit_link=row["credit_link"],
+                duration=row["duration"] or 0,
+                bpm=row["bpm"],
+                loudness=row["loudness"],
+            )
+            for row in rows
+        )
+        TaggedAudioAsset.objects.bulk_create(
+            TaggedAudioAsset(content_object_id=asset.pk, tag_id=self.tags[tag])
+            for asset, row in zip(assets, rows)
+            for tag in row["tags"]
+        )
+        update_search_documents([asset.pk for asset in assets])
+        self.created_ids.extend(asset.pk for asset in assets)
+        for asset in assets:
+            self.aggregate_changes.add(None, asset.aggregated_values())
+        return len(assets)
+
+
+@instrumented
+def import_catalog(
+    owner: Any,
+    rows: Iterable[Dict[str, Any]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> ImportResult:
+    """
+    Import assets, and the records they reference, for a user.
+
+    Related records are matched to the owner's existing ones by name and
+    created when missing. Rows whose digest the owner already has, even on a
+    retired or archived asset, are skipped, so re-running an import doesn't
+    duplicate assets that have digests. Everything is written in one
+    transaction: if any row is invalid nothing is imported.
+
+    Rows without a title that only name related records, as `export_rows`
+    writes for records no asset references, create those records alone.
+
+    Args:
+        owner: User who will own the imported records.
+        rows: Rows as produced by `export_rows`, `read_csv`, or `read_jsonl`.
+        batch_size: Number of assets to insert per batch.
+        progress: Called with the number of rows read after each batch.
+
+    Returns:
+        An `ImportResult` summarizing the import.
+
+    Raises:
+        CatalogFormatError: If a row is invalid.
+
+    # noqa: DAR402 CatalogFormatError
+    """
+    result = ImportResult()
+    with transaction.atomic():
+        writer = _CatalogWriter(owner)
+        batch: List[Dict[str, Any]] = []
+        for number, row in enumerate(rows, start=1):
+            cleaned = _clean_row(row, number)
+            digest = cleaned["digest"]
+            if digest is not None:
+                if digest in writer.digests:
+                    result.skipped += 1
+                    continue
+                writer.digests.add(digest)
+            batch.append(cleaned)
+            if len(batch) >= batch_size:
+                result.created += writer.write(batch)
+                batch = []
+                if progress is not None:
+                    progress(number, None)
+        if batch:
+            result.created += writer.write(batch)
+        writer.aggregate_changes.apply()
+        if progress is not None:
+            progress(result.created + result.skipped, None)
+    # Feature vectors are computed after the import is committed, so
+    # similarity indexes synced during a long import don't miss them.
+    update_feature_vectors(writer.created_ids, batch_size)
+    if result.created:
+        invalidate_facets([owner.pk])
+    return result
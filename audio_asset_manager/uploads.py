@@ -0,0 +1,402 @@
+"""
+Uploading asset audio files in resumable chunks, and serving them back.
+
+Stems can be hundreds of megabytes, so an upload is started with the file's
+name and size (`AssetUpload`), and its bytes are then sent in any number of
+chunks, in order. Each chunk is streamed from the request to a file of its
+own under ``MEDIA_ROOT``, in ``AUDIO_ASSET_MANAGER_UPLOAD_DIR`` (``uploads`` by
+default), a block at a time, and fed to the file's SHA1 hash as it's written.
+Only then is the upload's row locked, to check the chunk still starts at the
+upload's offset, append it to the partial file, and advance the offset, so a
+slow client doesn't hold the lock. A client that loses its connection asks
+for the upload's `offset` and carries on from there.
+
+When the last chunk arrives, the file is moved into the asset storage at a
+path derived from its digest (see `audio_asset_manager.storage`). If a file
+with that digest is stored already, the upload is discarded instead, so each
+distinct file is stored once. The upload's asset gets the file and digest,
+or, if it has none, the owner's asset with that digest does, or a new one is
+created.
+
+Hashes in progress are kept per process between chunks. A chunk handled by
+another process, e.g. after a restart, rehashes the partial file first.
+
+`file_response` serves stored files, with ``Range`` requests, or hands them to
+the web server with ``AUDIO_ASSET_MANAGER_SENDFILE_HEADER``.
+"""
+from typing import IO, Any, Optional, Tuple
+
+import datetime
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.http import FileResponse, HttpRequest, HttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from .instrumentation import instrumented
+from .models import ArchivedAudioAsset, AssetUpload, AudioAsset
+from .storage import asset_storage, content_path
+
+BLOCK_SIZE = 1024 * 1024
+DEFAULT_MAX_UPLOAD_SIZE = 4 * 1024**3
+# Number of hashes in progress each process keeps between chunks.
+MAX_CACHED_HASHES = 64
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadError(ValueError):
+    """
+    Raised when a chunk or a finished upload can't be accepted.
+    """
+
+
+class UploadOffsetMismatch(UploadError):
+    """
+    Raised when a chunk doesn't start where the upload left off.
+
+    Attributes:
+        offset: Where the next chunk has to start.
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(f"The next chunk has to start at byte {offset}.")
+        self.offset = offset
+
+
+def max_upload_size() -> int:
+    return getattr(
+        settings, "AUDIO_ASSET_MANAGER_MAX_UPLOAD_SIZE", DEFAULT_MAX_UPLOAD_SIZE
+    )
+
+
+def upload_root() -> str:
+    return os.path.join(
+        settings.MEDIA_ROOT,
+        getattr(settings, "AUDIO_ASSET_MANAGER_UPLOAD_DIR", "uploads"),
+    )
+
+
+def partial_path(upload: AssetUpload) -> str:
+    """
+    Path of the bytes of an upload received so far.
+    """
+    return os.path.join(upload_root(), f"{upload.pk}.part")
+
+
+_hashes: "OrderedDict[Any, Tuple[int, Any]]" = OrderedDict()
+_hashes_lock = threading.Lock()
+
+
+def _take_hash(upload: AssetUpload) -> Any:
+    with _hashes_lock:
+        offset, sha1 = _hashes.pop(upload.pk, (None, None))
+    if offset == upload.offset:
+        return sha1
+    sha1 = hashlib.sha1()  # nosec - content addressing, as in the scanner
+    remaining = upload.offset
+    if remaining:
+        with open(partial_path(upload), "rb") as file:
+            while remaining:
+                block = file.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    raise UploadError("The partial upload is missing. Start again.")
+                sha1.update(block)
+                remaining -= len(block)
+    return sha1
+
+
+def _keep_hash(upload: AssetUpload, sha1: Any) -> None:
+    with _hashes_lock:
+        _hashes[upload.pk] = (upload.offset, sha1)
+        while len(_hashes) > MAX_CACHED_HASHES:
+            _hashes.popitem(last=False)
+
+
+def write_chunk(upload: AssetUpload, stream: IO[bytes], start: int, length: int) -> int:
+    """
+    Append a chunk of the file to an upload, and finish it if it's complete.
+
+    The chunk is read from ``stream`` a block at a time. If the stream ends
+    early, the bytes read so far are kept, and the client can resume after
+    them.
+
+    Args:
+        upload: The upload, whose `offset` and `completed` are updated.
+        stream: The request body.
+        start: Offset of the chunk in the file.
+        length: Number of bytes in the chunk.
+
+    Returns:
+        The number of bytes received.
+
+    Raises:
+        UploadOffsetMismatch: If ``start`` isn't the upload's offset.
+        UploadError: If the upload is complete, the chunk goes past the end of
+            the file, or the finished file can't be stored.
+
+    # noqa: DAR402 UploadOffsetMismatch UploadError
+    """
+    upload.refresh_from_db(fields=["offset", "completed"])
+    _check_chunk(upload, start, length)
+    sha1 = _take_hash(upload)
+    root = upload_root()
+    os.makedirs(root, exist_ok=True)
+    handle, chunk_path = tempfile.mkstemp(
+        dir=root, prefix=f"{upload.pk}.", suffix=".chunk"
+    )
+    try:
+        received = 0
+        with os.fdopen(handle, "wb") as chunk:
+            while received < length:
+                block = stream.read(min(BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                chunk.write(block)
+                sha1.update(block)
+                received += len(block)
+        with transaction.atomic():
+            # Concurrent chunks of one upload are appended one at a time.
+            locked = AssetUpload.objects.select_for_update().get(pk=upload.pk)
+            upload.offset, upload.completed = locked.offset, locked.completed
+            _check_chunk(upload, start, length)
+            path = partial_path(upload)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as file:
+                # Drop the end of a chunk that was written but not recorded.
+                file.seek(upload.offset)
+                file.truncate()
+                with open(chunk_path, "rb") as chunk:
+                    shutil.copyfileobj(chunk, file, BLOCK_SIZE)
+            upload.offset += received
+            upload.save(update_fields=["offset", "modified"])
+    finally:
+        os.unlink(chunk_path)
+    if upload.offset == upload.size:
+        finish_upload(upload, sha1.hexdigest())
+    else:
+        _keep_hash(upload, sha1)
+    return received
+
+
+def _check_chunk(upload: AssetUpload, start: int, length: int) -> None:
+    if upload.completed is not None:
+        raise UploadError("The upload is already complete.")
+    if start != upload.offset:
+        raise UploadOffsetMismatch(upload.offset)
+    if length < 0 or start + length > upload.size:
+        raise UploadError("The chunk goes past the end of the file.")
+
+
+def store_file(path: str, digest: str) -> str:
+    """
+    Move a file into the asset storage under its digest, unless a copy is
+    stored already.
+
+    Args:
+        path: The file, which is deleted once it's stored. If storing it
+            fails, it's kept so the upload can be finished again.
+        digest: Its SHA1 digest.
+
+    Returns:
+        The file's name in the storage.
+    """
+    storage = asset_storage()
+    name = content_path(digest)
+    if not storage.exists(name):
+        with open(path, "rb") as file:
+            saved = storage.save(name, File(file))
+        if saved != name:
+            # Stored by another upload in the meantime.
+            storage.delete(saved)
+    os.unlink(path)
+    return name
+
+
+def _target_asset(upload: AssetUpload, digest: str) -> AudioAsset:
+    if ArchivedAudioAsset.objects.filter(
+        owner_id=upload.owner_id, digest=digest
+    ).exists():
+        raise UploadError(
+            "You have an archived asset with this digest. Restore it instead."
+        )
+    owned = AudioAsset.all_objects.filter(owner_id=upload.owner_id, digest=digest)
+    if upload.asset_id is not None:
+        if owned.exclude(pk=upload.asset_id).exists():
+            raise UploadError("You already have an asset with this digest.")
+        return upload.asset
+    existing = owned.first()
+    if existing is not None:
+        return existing
+    return AudioAsset(
+        owner_id=upload.owner_id,
+        title=os.path.splitext(upload.filename)[0] or upload.filename,
+        filename=upload.filename,
+    )
+
+
+@instrumented
+def finish_upload(upload: AssetUpload, digest: str) -> AudioAsset:
+    """
+    Store a fully received upload, and give its file to an asset.
+
+    Args:
+        upload: The upload.
+        digest: SHA1 digest of the file.
+
+    Returns:
+        The asset.
+
+    Raises:
+        UploadError: If the owner has another asset or an archived asset
+            with the same digest. The upload is left incomplete.
+
+    # noqa: DAR402 UploadError
+    """
+    asset = _target_asset(upload, digest)
+    name = store_file(partial_path(upload), digest)
+    with transaction.atomic():
+        asset.digest = digest
+        asset.file.name = name
+        asset.save()
+        upload.asset = asset
+        upload.completed = timezone.now()
+        upload.save(update_fields=["asset", "completed", "modified"])
+    return asset
+
+
+@instrumented
+def prune_uploads(older_than: datetime.timedelta) -> int:
+    """
+    Delete uploads that weren't completed, and their partial files.
+
+    Args:
+        older_than: Only delete uploads last added to longer ago than this.
+
+    Returns:
+        The number of uploads deleted.
+    """
+    uploads = AssetUpload.objects.filter(
+        completed__isnull=True, modified__lt=timezone.now() - older_than
+    )
+    deleted = 0
+    # One at a time, so their partial files are deleted too.
+    for upload in uploads.iterator():
+        upload.delete()
+        deleted += 1
+    return deleted
+
+
+def delete_partial_file(upload: AssetUpload) -> None:
+    """
+    Delete the bytes of an upload received so far, and its hash in progress.
+    """
+    with _hashes_lock:
+        _hashes.pop(upload.pk, None)
+    try:
+        os.unlink(partial_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # A single ``bytes=start-end`` range, as an inclusive start and end, or
+    # None if the header isn't one that can be satisfied.
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if not length:
+            return None
+        return max(size - length, 0), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first > last:
+        return None
+    return first, last
+
+
+class _FileRange:
+    # Reads ``length`` bytes of a file from ``start``.
+
+    def __init__(self, file: IO[bytes], start: int, length: int):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def file_response(request: HttpRequest, asset: AudioAsset) -> HttpResponse:
+    """
+    Serve an asset's stored file.
+
+    If ``AUDIO_ASSET_MANAGER_SENDFILE_HEADER`` is set, the response is empty,
+    with the file's location in that header for the web server to send:
+    ``X-Sendfile`` gets the file's path on disk, and ``X-Accel-Redirect`` its
+    name after ``AUDIO_ASSET_MANAGER_SENDFILE_PREFIX``. The web server handles
+    ``Range`` requests then. Otherwise the file is streamed from the storage,
+    in full or the one range asked for.
+
+    Args:
+        request: The download request.
+        asset: An asset with a stored file.
+
+    Returns:
+        The response.
+    """
+    storage = asset.file.storage
+    name = asset.file.name
+    filename = asset.filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    header = getattr(settings, "AUDIO_ASSET_MANAGER_SENDFILE_HEADER", None)
+    if header:
+        response = HttpResponse(content_type=content_type)
+        if header.lower() == "x-accel-redirect":
+            prefix = getattr(settings, "AUDIO_ASSET_MANAGER_SENDFILE_PREFIX", "")
+            response[header] = prefix + name
+        else:
+            response[header] = storage.path(name)
+    else:
+        size = storage.size(name)
+        byte_range = None
+        if "Range" in request.headers:
+            byte_range = _parse_range(request.headers["Range"], size)
+            if byte_range is None:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+        file = storage.open(name, "rb")
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+            response["Content-Length"] = size
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                _FileRange(file, start, end - start + 1), content_type=content_type
+            )
+            response.status_code = 206
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = end - start + 1
+        response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    response["ETag"] = f'"{asset.digest}"'
+    return response
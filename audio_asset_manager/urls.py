@@ -1,7 +1,48 @@
-from django.urls import path  # noqa: F401
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import async_views, instrumentation, views
 
 app_name = "audio_asset_manager"
 
-urlpatterns = [  # type: ignore
-    # Add your url paths here.
+router = DefaultRouter()
+router.register("license-types", views.LicenseTypeViewSet)
+router.register("sources", views.AssetSourceViewSet)
+router.register("artists", views.ArtistViewSet)
+router.register("collections", views.CollectionViewSet)
+router.register("assets", views.AudioAssetViewSet)
+router.register("archived-assets", views.ArchivedAudioAssetViewSet)
+router.register("uploads", views.AssetUploadViewSet)
+router.register("productions", views.ProductionViewSet)
+router.register("jobs", views.JobViewSet)
+
+urlpatterns = [
+    path("api/", include(router.urls)),
+    path(
+        "async/assets/<int:pk>/",
+        async_views.asset_detail,
+        name="async-asset-detail",
+    ),
+    path(
+        "async/assets/by-digest/<str:digest>/",
+        async_views.asset_by_digest,
+        name="async-asset-by-digest",
+    ),
+    path("async/assets/search/", async_views.asset_search, name="async-asset-search"),
+    path(
+        "async/assets/credits/",
+        async_views.asset_credits,
+        name="async-asset-credits",
+    ),
+    path(
+        "async/artists/<int:pk>/",
+        async_views.artist_detail,
+        name="async-artist-detail",
+    ),
+    path(
+        "async/collections/<int:pk>/",
+        async_views.collection_detail,
+        name="async-collection-detail",
+    ),
+    path("metrics/", instrumentation.metrics_view, name="metrics"),
 ]
@@ -0,0 +1,424 @@
+"""
+Recording asset usage and reporting on it.
+
+Cues are recorded in bulk, and every write to `AssetUsage` goes through this
+module so that the monthly rollups in `AssetUsageMonth` and
+`SourceUsageMonth` are kept up to date incrementally. Reports read only the
+rollups, so their cost depends on the number of assets and months involved
+rather than the number of cues ever recorded.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import connections, models, router, transaction
+from django.db.models import Count, Exists, Max, OuterRef, QuerySet, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .instrumentation import instrumented
+from .managers import query_param_chunk_size
+from .models import (
+    ArchivedAudioAsset,
+    AssetSource,
+    AssetUsage,
+    AssetUsageMonth,
+    AudioAsset,
+    Production,
+    SourceUsageMonth,
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# (owner id, asset or source id, month) -> [uses, seconds]
+_Deltas = Dict[Tuple[int, int, datetime.date], List[int]]
+
+
+class UsageError(ValueError):
+    """
+    Raised when usage can't be recorded, e.g. for another user's asset.
+    """
+
+
+@dataclass
+class Cue:
+    """
+    One use of an asset to record.
+
+    Attributes:
+        asset_id: Primary key of the asset used.
+        seconds: Length used. Defaults to the asset's duration.
+        used_on: Date of use. Defaults to the production's air date, or today.
+    """
+
+    asset_id: int
+    seconds: Optional[int] = None
+    used_on: Optional[datetime.date] = None
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    """
+    The first day of the month a date is in.
+    """
+    return day.replace(day=1)
+
+
+def _upsert_sql(model: Type[models.Model], key: str, rows: int, connection) -> str:
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ["owner_id", f"{key}_id", "month", "uses", "seconds"]
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * rows)
+    return (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "  # nosec
+        f"VALUES {values} ON CONFLICT ({qn(f'{key}_id')}, {qn('month')}) DO UPDATE "
+        f"SET {qn('uses')} = {table}.{qn('uses')} + excluded.{qn('uses')}, "
+        f"{qn('seconds')} = {table}.{qn('seconds')} + excluded.{qn('seconds')}"
+    )
+
+
+def _apply_deltas(model: Type[models.Model], key: str, deltas: _Deltas) -> None:
+    """
+    Add usage counts to a rollup table, creating rows as needed.
+
+    SQLite and PostgreSQL add to existing rows with a single ``INSERT ... ON
+    CONFLICT DO UPDATE`` per chunk. Other backends lock the existing rows and
+    update them with `bulk_update`.
+    """
+    if not deltas:
+        return
+    using = router.db_for_write(model)
+    connection = connections[using]
+    items = sorted(deltas.items())
+    if connection.vendor in ("sqlite", "postgresql"):
+        chunk_size = max(query_param_chunk_size(using) // 5, 1)
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), chunk_size):
+                chunk = items[start : start + chunk_size]
+                params: List[Any] = []
+                for (owner_id, key_id, month), (uses, seconds) in chunk:
+                    params += [
+                        owner_id,
+                        key_id,
+                        connection.ops.adapt_datefield_value(month),
+                        uses,
+                        seconds,
+                    ]
+                cursor.execute(_upsert_sql(model, key, len(chunk), connection), params)
+        return
+    with transaction.atomic(using=using):  # pragma: nocover
+        existing = {
+            (row.owner_id, getattr(row, f"{key}_id"), row.month): row
+            for row in model.objects.select_for_update().filter(
+                **{
+                    f"{key}_id__in": {key_id for _, key_id, _ in deltas},
+                    "month__in": {month for _, _, month in deltas},
+                }
+            )
+        }
+        changed, created = [], []
+        for (owner_id, key_id, month), (uses, seconds) in items:
+            row = existing.get((owner_id, key_id, month))
+            if row is None:
+                created.append(
+                    model(
+                        owner_id=owner_id,
+                        month=month,
+                        uses=uses,
+                        seconds=seconds,
+                        **{f"{key}_id": key_id},
+                    )
+                )
+            else:
+                row.uses += uses
+                row.seconds += seconds
+                changed.append(row)
+        model.objects.bulk_update(changed, ["uses", "seconds"])
+        model.objects.bulk_create(created)
+
+
+@instrumented
+def record_usage(
+    production: Production,
+    cues: Iterable[Cue],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[AssetUsage]:
+    """
+    Append cues to a production's cue sheet and update the usage rollups.
+
+    Args:
+        production: Production the assets were used in.
+        cues: The uses to record, in cue order.
+        batch_size: Number of usage rows to insert per query.
+
+    Returns:
+        The created `AssetUsage` records.
+
+    Raises:
+        UsageError: If a cue references an asset the production's owner
+            doesn't have.
+    """
+    cues = list(cues)
+    wanted = sorted({cue.asset_id for cue in cues})
+    assets: Dict[int, Tuple[Optional[int], int]] = {}
+    chunk_size = query_param_chunk_size(router.db_for_read(AudioAsset))
+    for start in range(0, len(wanted), chunk_size):
+        for pk, source_id, duration in AudioAsset.objects.filter(
+            owner_id=production.owner_id, pk__in=wanted[start : start + chunk_size]
+        ).values_list("pk", "source_id", "duration"):
+            assets[pk] = (source_id, duration)
+    missing = [pk for pk in wanted if pk not in assets]
+    if missing:
+        raise UsageError(f"Unknown assets: {', '.join(str(pk) for pk in missing)}.")
+    default_day = production.air_date or timezone.localdate()
+    usages = []
+    asset_deltas: _Deltas = defaultdict(lambda: [0, 0])
+    source_deltas: _Deltas = defaultdict(lambda: [0, 0])
+    with transaction.atomic():
+        # Appends to the same cue sheet wait for each other here, so each
+        # reads the last position after the one before it committed.
+        list(
+            Production.objects.select_for_update()
+            .filter(pk=production.pk)
+            .values_list("pk", flat=True)
+        )
+        position = (production.usages.aggregate(last=Max("position"))["last"] or 0) + 1
+        for offset, cue in enumerate(cues):
+            source_id, duration = assets[cue.asset_id]
+            used_on = cue.used_on or default_day
+            seconds = cue.seconds if cue.seconds is not None else duration
+            usages.append(
+                AssetUsage(
+                    owner_id=production.owner_id,
+                    production=production,
+                    asset_id=cue.asset_id,
+                    source_id=source_id,
+                    used_on=used_on,
+                    seconds=seconds,
+                    position=position + offset,
+                )
+            )
+            month = month_start(used_on)
+            for deltas, key_id in (
+                (asset_deltas, cue.asset_id),
+                (source_deltas, source_id),
+            ):
+                if key_id is not None:
+                    totals = deltas[(production.owner_id, key_id, month)]
+                    totals[0] += 1
+                    totals[1] += seconds
+        AssetUsage.objects.bulk_create(usages, batch_size=batch_size)
+        _apply_deltas(AssetUsageMonth, "asset", asset_deltas)
+        _apply_deltas(SourceUsageMonth, "source", source_deltas)
+    return usages
+
+
+def delete_usage(queryset: "QuerySet[AssetUsage]") -> int:
+    """
+    Delete usage records and subtract them from the rollups.
+
+    Args:
+        queryset: Usage records to delete.
+
+    Returns:
+        The number of records deleted.
+    """
+    asset_deltas: _Deltas = defaultdict(lambda: [0, 0])
+    source_deltas: _Deltas = defaultdict(lambda: [0, 0])
+    with transaction.atomic():
+        rows = (
+            queryset.order_by()
+            .annotate(month=TruncMonth("used_on"))
+            .values_list("owner_id", "asset_id", "source_id", "month")
+            .annotate(uses=Count("pk"), seconds_used=Sum("seconds"))
+        )
+        for owner_id, asset_id, source_id, month, uses, seconds in rows:
+            for deltas, key_id in (
+                (asset_deltas, asset_id),
+                (source_deltas, source_id),
+            ):
+                if key_id is not None:
+                    totals = deltas[(owner_id, key_id, month)]
+                    totals[0] -= uses
+                    totals[1] -= seconds or 0
+        if not asset_deltas:
+            return 0
+        deleted, _counts = queryset.delete()
+        _apply_deltas(AssetUsageMonth, "asset", asset_deltas)
+        _apply_deltas(SourceUsageMonth, "source", source_deltas)
+        AssetUsageMonth.objects.filter(
+            asset_id__in={key_id for _, key_id, _ in asset_deltas}, uses__lte=0
+        ).delete()
+        SourceUsageMonth.objects.filter(
+            source_id__in={key_id for _, key_id, _ in source_deltas}, uses__lte=0
+        ).delete()
+    return deleted
+
+
+@instrumented
+def rebuild_usage_rollups(
+    owner_ids: Optional[Iterable[int]] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """
+    Recompute the usage rollups from the usage records.
+
+    Only needed if usage records were changed without going through this
+    module.
+
+    Args:
+        owner_ids: Only rebuild the rollups of these users. Defaults to all.
+        batch_size: Number of rollup rows to insert per query.
+
+    Returns:
+        The number of rollup rows written.
+    """
+    usages = AssetUsage.objects.all()
+    if owner_ids is not None:
+        owner_ids = list(owner_ids)
+        usages = usages.filter(owner_id__in=owner_ids)
+    written = 0
+    with transaction.atomic():
+        for model, key in ((AssetUsageMonth, "asset"), (SourceUsageMonth, "source")):
+            rollups = model.objects.all()
+            if owner_ids is not None:
+                rollups = rollups.filter(owner_id__in=owner_ids)
+            rollups.delete()
+            rows = (
+                usages.filter(**{f"{key}__isnull": False})
+                .order_by()
+                .annotate(month=TruncMonth("used_on"))
+                .values_list("owner_id", f"{key}_id", "month")
+                .annotate(uses=Count("pk"), seconds_used=Sum("seconds"))
+            )
+            batch = []
+            for owner_id, key_id, month, uses, seconds in rows.iterator():
+                batch.append(
+                    model(
+                        owner_id=owner_id,
+                        month=month,
+                        uses=uses,
+                        seconds=seconds or 0,
+                        **{f"{key}_id": key_id},
+                    )
+                )
+                if len(batch) >= batch_size:
+                    written += len(model.objects.bulk_create(batch))
+                    batch = []
+            written += len(model.objects.bulk_create(batch))
+    return written
+
+
+def _month_range(
+    rollups: "QuerySet[Any]",
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+) -> "QuerySet[Any]":
+    if start is not None:
+        rollups = rollups.filter(month__gte=month_start(start))
+    if end is not None:
+        rollups = rollups.filter(month__lte=month_start(end))
+    return rollups
+
+
+def most_used_assets(
+    user: Any,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    A user's most used assets over a range of months.
+
+    Args:
+        user: User whose assets to report on.
+        start: Include uses from the month this date is in onward.
+        end: Include uses up to the end of the month this date is in.
+        limit: Maximum number of assets to return.
+
+    Returns:
+        Dicts with the ``asset``, its number of ``uses``, and ``seconds``
+        used, most used first.
+    """
+    rows = list(
+        _month_range(AssetUsageMonth.objects.filter(owner_id=user.pk), start, end)
+        .values("asset_id")
+        .annotate(total_uses=Sum("uses"), total_seconds=Sum("seconds"))
+        .filter(total_uses__gt=0)
+        .order_by("-total_uses", "-total_seconds", "asset_id")[:limit]
+    )
+    ids = [row["asset_id"] for row in rows]
+    # Including retired and archived assets.
+    assets = AudioAsset.all_objects.in_bulk(ids)
+    assets.update(
+        (record.pk, record.to_asset())
+        for record in ArchivedAudioAsset.objects.filter(
+            pk__in=[pk for pk in ids if pk not in assets]
+        )
+    )
+    return [
+        {
+            "asset": assets[row["asset_id"]],
+            "uses": row["total_uses"],
+            "seconds": row["total_seconds"],
+        }
+        for row in rows
+        if row["asset_id"] in assets
+    ]
+
+
+def source_usage(
+    user: Any,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Total uses and seconds used of each of a user's sources over a range of
+    months.
+
+    Args:
+        user: User whose sources to report on.
+        start: Include uses from the month this date is in onward.
+        end: Include uses up to the end of the month this date is in.
+
+    Returns:
+        Dicts with the ``source``, its number of ``uses``, and ``seconds``
+        used, most seconds first.
+    """
+    rows = list(
+        _month_range(SourceUsageMonth.objects.filter(owner_id=user.pk), start, end)
+        .values("source_id")
+        .annotate(total_uses=Sum("uses"), total_seconds=Sum("seconds"))
+        .filter(total_uses__gt=0)
+        .order_by("-total_seconds", "source_id")
+    )
+    sources = AssetSource.objects.in_bulk([row["source_id"] for row in rows])
+    return [
+        {
+            "source": sources[row["source_id"]],
+            "uses": row["total_uses"],
+            "seconds": row["total_seconds"],
+        }
+        for row in rows
+        if row["source_id"] in sources
+    ]
+
+
+def never_used_assets(
+    user: Any, queryset: "Optional[QuerySet[AudioAsset]]" = None
+) -> "QuerySet[AudioAsset]":
+    """
+    A user's assets that have never been used in a production.
+
+    Args:
+        user: User whose assets to report on.
+        queryset: Assets to start from. Defaults to all assets.
+
+    Returns:
+        The unused assets.
+    """
+    if queryset is None:
+        queryset = AudioAsset.objects.all()
+    return queryset.for_user(user).exclude(
+        Exists(AssetUsageMonth.objects.filter(asset_id=OuterRef("pk"), uses__gt=0))
+    )
@@ -1 +1,602 @@
-# Put your views here.
+import re
+
+from django.db.models import Model
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import mixins, permissions, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rules.contrib.rest_framework import AutoPermissionViewSetMixin
+
+from .archive import restore_assets, retire_assets
+from .credits import build_credits
+from .facets import asset_facets, filter_assets
+from .fingerprints import DEFAULT_MIN_SIMILARITY, similar_assets
+from .jobs import get_handler
+from .lookups import attach_license_types, attach_sources
+from .models import (
+    ArchivedAudioAsset,
+    Artist,
+    AssetSource,
+    AssetUpload,
+    AudioAsset,
+    Collection,
+    Job,
+    LicenseType,
+    Production,
+)
+from .search import search_assets
+from .serializers import (
+    ArchivedAudioAssetSerializer,
+    ArtistSerializer,
+    AssetFilterSerializer,
+    AssetIdsSerializer,
+    AssetSourceSerializer,
+    AssetUploadSerializer,
+    AssetUsageSerializer,
+    AudioAssetSerializer,
+    CollectionSerializer,
+    CueSerializer,
+    JobSerializer,
+    LicenseTypeSerializer,
+    ProductionSerializer,
+    UsageReportSerializer,
+)
+from .similarity import DEFAULT_LIMIT, find_alternatives
+from .transfer import CONTENT_TYPES, FORMATS, export_catalog
+from .uploads import UploadError, UploadOffsetMismatch, file_response, write_chunk
+from .usage import (
+    UsageError,
+    most_used_assets,
+    never_used_assets,
+    record_usage,
+    source_usage,
+)
+from .waveforms import LEVELS, WaveformUnavailable, get_waveform
+
+MAX_ALTERNATIVES = 100
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+class CatalogCursorPagination(CursorPagination):
+    """
+    Cursor pagination for catalog listings.
+
+    Cursors stay fast on very large tables because each page is fetched with a
+    ``WHERE created < ...`` seek instead of an ``OFFSET``.
+    """
+
+    ordering = "-created"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Page number pagination for ranked search results.
+
+    Search results are ordered by relevance rather than a unique column, so
+    cursor pagination can't be used.
+    """
+
+    page_size = 25
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class IsStaffOrReadOnly(permissions.BasePermission):
+    """
+    Allows writes only for staff users.
+    """
+
+    def has_permission(self, request, view):
+        return request.method in permissions.SAFE_METHODS or bool(
+            request.user and request.user.is_staff
+        )
+
+
+class CachedLookupsMixin:
+    """
+    Fills in related lookup rows from the lookup cache on the objects being
+    serialized, instead of joining them into the query.
+    """
+
+    def attach_lookups(self, objects):
+        """
+        Set the cached lookup rows on ``objects``. Does nothing by default.
+        """
+
+    def get_serializer(self, *args, **kwargs):
+        if args and isinstance(args[0], Model):
+            self.attach_lookups([args[0]])
+        elif args and isinstance(args[0], list):
+            self.attach_lookups(args[0])
+        return super().get_serializer(*args, **kwargs)
+
+
+class OwnedModelViewSet(AutoPermissionViewSetMixin, viewsets.ModelViewSet):
+    """
+    Base viewset for owned models, limited to the requesting user's records.
+    """
+
+    pagination_class = CatalogCursorPagination
+
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+
+class LicenseTypeViewSet(viewsets.ModelViewSet):
+    queryset = LicenseType.objects.all()
+    serializer_class = LicenseTypeSerializer
+    pagination_class = CatalogCursorPagination
+    permission_classes = [permissions.IsAuthenticated, IsStaffOrReadOnly]
+
+
+def usage_report_params(request):
+    serializer = UsageReportSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+class AssetSourceViewSet(CachedLookupsMixin, OwnedModelViewSet):
+    queryset = AssetSource.objects.select_related("owner")
+    serializer_class = AssetSourceSerializer
+    permission_type_map = {
+        **AutoPermissionViewSetMixin.permission_type_map,
+        "usage": None,
+    }
+
+    def attach_lookups(self, objects):
+        attach_license_types(objects)
+
+    @action(detail=False)
+    def usage(self, request):
+        """
+        Uses and seconds used per source, for the months from ``start`` to
+        ``end``.
+        """
+        params = usage_report_params(request)
+        rows = source_usage(request.user, params.get("start"), params.get("end"))
+        return Response(
+            [
+                {
+                    "source": row["source"].pk,
+                    "name": row["source"].name,
+                    "uses": row["uses"],
+                    "seconds": row["seconds"],
+                }
+                for row in rows
+            ]
+        )
+
+
+class ArtistViewSet(OwnedModelViewSet):
+    queryset = Artist.objects.select_related("owner")
+    serializer_class = ArtistSerializer
+
+
+class CollectionViewSet(OwnedModelViewSet):
+    queryset = Collection.objects.select_related("album_artist", "owner")
+    serializer_class = CollectionSerializer
+
+
+class ProductionViewSet(OwnedModelViewSet):
+    queryset = Production.objects.select_related("owner")
+    serializer_class = ProductionSerializer
+    permission_type_map = {
+        **AutoPermissionViewSetMixin.permission_type_map,
+        "cues": "change",
+    }
+
+    @action(detail=True, methods=["get", "post"])
+    def cues(self, request, pk=None):
+        """
+        List the production's cue sheet, or append a list of cues to it.
+        """
+        production = self.get_object()
+        if request.method == "GET":
+            return Response(
+                AssetUsageSerializer(production.usages.all(), many=True).data
+            )
+        serializer = CueSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        cues = [serializer.child.to_cue(data) for data in serializer.validated_data]
+        try:
+            usages = record_usage(production, cues)
+        except UsageError as e:
+            raise serializers.ValidationError(str(e))
+        return Response(
+            AssetUsageSerializer(usages, many=True).data, status=status.HTTP_201_CREATED
+        )
+
+
+class AudioAssetViewSet(CachedLookupsMixin, OwnedModelViewSet):
+    queryset = AudioAsset.objects.select_related(
+        "artist", "collection", "owner"
+    ).prefetch_related("tags")
+    serializer_class = AudioAssetSerializer
+    permission_type_map = {
+        **AutoPermissionViewSetMixin.permission_type_map,
+        "search": None,
+        "facets": None,
+        "export": None,
+        "credits": None,
+        "by_digest": None,
+        "most_used": None,
+        "never_used": None,
+        "retire": None,
+        "restore": None,
+        "similar": "view",
+        "alternatives": "view",
+        "download": "view",
+        "waveform": "view",
+    }
+
+    def attach_lookups(self, objects):
+        attach_sources(objects)
+
+    def get_asset_filter(self):
+        serializer = AssetFilterSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.to_filter()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "export"):
+            queryset = filter_assets(queryset, self.get_asset_filter())
+        elif self.action == "waveform":
+            # Renditions are found by the digests of the asset's files.
+            queryset = (
+                queryset.select_related(None)
+                .prefetch_related(None)
+                .only("pk", "owner", "file")
+            )
+        return queryset
+
+    @action(detail=False, pagination_class=SearchPagination)
+    def search(self, request):
+        """
+        Search assets by title, credits, and tags, best matches first.
+        """
+        results = search_assets(
+            request.user, request.query_params.get("q", ""), self.get_queryset()
+        )
+        page = self.paginate_queryset(results)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def facets(self, request):
+        """
+        Count the matching assets per type, BPM, loudness, duration, and tag.
+
+        Accepts the same filters as the listing.
+        """
+        return Response(asset_facets(request.user, self.get_asset_filter()))
+
+    @action(detail=False)
+    def export(self, request):
+        """
+        Stream the matching assets as CSV, or JSON Lines with
+        ``?file_format=jsonl``.
+
+        Accepts the same filters as the listing. Unfiltered exports also
+        include the user's artists, collections, and sources that no asset
+        references, so the whole catalog can be imported elsewhere.
+        """
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in FORMATS:
+            raise serializers.ValidationError(
+                {"file_format": f"Must be one of {', '.join(FORMATS)}."}
+            )
+        filtered = not request.query_params.keys().isdisjoint(
+            AssetFilterSerializer().fields
+        )
+        response = StreamingHttpResponse(
+            export_catalog(
+                self.filter_queryset(self.get_queryset()),
+                file_format,
+                owner=None if filtered else request.user,
+            ),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="assets.{file_format}"'
+        return response
+
+    @action(detail=False)
+    def credits(self, request):
+        """
+        Render credits for a comma separated list of asset ``ids``, in cue
+        order, as text, Markdown, and HTML.
+        """
+        try:
+            ids = [
+                int(pk) for pk in request.query_params.get("ids", "").split(",") if pk
+            ]
+        except ValueError:
+            raise serializers.ValidationError(
+                {"ids": "Must be a comma separated list of asset ids."}
+            )
+        return Response(build_credits(request.user, ids).as_dict())
+
+    @action(detail=False, url_path="by-digest/(?P<digest>[^/.]+)")
+    def by_digest(self, request, digest=None):
+        """
+        Look an asset up by the SHA1 digest of its file.
+        """
+        asset = get_object_or_404(self.get_queryset(), digest=digest)
+        return Response(self.get_serializer(asset).data)
+
+    @action(detail=False, methods=["post"])
+    def retire(self, request):
+        """
+        Retire a list of assets by ``ids``, hiding them from the catalog.
+        """
+        serializer = AssetIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        retired = retire_assets(
+            self.get_queryset().filter(pk__in=serializer.validated_data["ids"])
+        )
+        return Response({"retired": retired})
+
+    @action(detail=False, methods=["post"])
+    def restore(self, request):
+        """
+        Put a list of retired or archived assets back in the catalog, by
+        ``ids``. Archived assets whose digest is in use again are reported as
+        ``conflicts`` and stay archived.
+        """
+        serializer = AssetIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = restore_assets(
+            serializer.validated_data["ids"], owner_ids=[request.user.pk]
+        )
+        return Response(
+            {
+                "unretired": result.unretired,
+                "unarchived": result.unarchived,
+                "conflicts": result.conflicts,
+            }
+        )
+
+    @action(detail=False, url_path="most-used")
+    def most_used(self, request):
+        """
+        The most used assets for the months from ``start`` to ``end``.
+        """
+        params = usage_report_params(request)
+        rows = most_used_assets(
+            request.user, params.get("start"), params.get("end"), params["limit"]
+        )
+        return Response(
+            [
+                {
+                    "asset": row["asset"].pk,
+                    "title": row["asset"].title,
+                    "uses": row["uses"],
+                    "seconds": row["seconds"],
+                }
+                for row in rows
+            ]
+        )
+
+    @action(detail=False, url_path="never-used")
+    def never_used(self, request):
+        """
+        Assets that have never been used in a production.
+        """
+        page = self.paginate_queryset(
+            never_used_assets(request.user, self.get_queryset())
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """
+        Assets that are likely the same recording as this one, by acoustic
+        fingerprint, with the share of fingerprint hashes they have in common.
+        """
+        try:
+            min_similarity = float(
+                request.query_params.get("min_similarity", DEFAULT_MIN_SIMILARITY)
+            )
+        except ValueError:
+            raise serializers.ValidationError({"min_similarity": "Must be a number."})
+        matches = similar_assets(
+            self.get_object(), super().get_queryset(), min_similarity
+        )
+        return Response(
+            [
+                {"similarity": similarity, **self.get_serializer(asset).data}
+                for asset, similarity in matches
+            ]
+        )
+
+    @action(detail=True)
+    def alternatives(self, request, pk=None):
+        """
+        Up to ``limit`` assets most like this one by BPM, loudness, duration,
+        type, and tags, nearest first, with their distance.
+        """
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_ALTERNATIVES:
+            raise serializers.ValidationError(
+                {"limit": f"Must be a number from 1 to {MAX_ALTERNATIVES}."}
+            )
+        matches = find_alternatives(self.get_object(), super().get_queryset(), limit)
+        return Response(
+            [
+                {"distance": distance, **self.get_serializer(asset).data}
+                for asset, distance in matches
+            ]
+        )
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        """
+        The asset's uploaded file. Accepts a ``Range`` header.
+        """
+        asset = self.get_object()
+        if not asset.file:
+            raise Http404("The asset has no uploaded file.")
+        return file_response(request, asset)
+
+    @action(detail=True)
+    def waveform(self, request, pk=None):
+        """
+        Waveform peaks as little endian float16 ``min, max`` pairs, one per
+        ``samples_per_peak`` frames of audio.
+
+        Computed on first request and cached on disk.
+        """
+        try:
+            samples_per_peak = int(
+                request.query_params.get("samples_per_peak", LEVELS[1])
+            )
+        except ValueError:
+            samples_per_peak = None
+        if samples_per_peak not in LEVELS:
+            raise serializers.ValidationError(
+                {"samples_per_peak": f"Must be one of {', '.join(map(str, LEVELS))}."}
+            )
+        try:
+            path, info = get_waveform(self.get_object(), samples_per_peak)
+        except WaveformUnavailable as e:
+            raise Http404(str(e))
+        response = FileResponse(
+            open(path, "rb"), content_type="application/octet-stream"
+        )
+        response["X-Waveform-Sample-Rate"] = info.samplerate
+        response["X-Waveform-Samples-Per-Peak"] = samples_per_peak
+        response["X-Waveform-Frames"] = info.frames
+        response["Cache-Control"] = "private, max-age=86400"
+        return response
+
+
+class AssetUploadViewSet(
+    AutoPermissionViewSetMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Upload asset files in resumable chunks. Start an upload with the file's
+    ``filename`` and ``size``, and optionally the ``asset`` it's for, then
+    ``PUT`` its bytes to ``chunk/``. Deleting an upload abandons it.
+    """
+
+    queryset = AssetUpload.objects.select_related("owner")
+    serializer_class = AssetUploadSerializer
+    pagination_class = CatalogCursorPagination
+    permission_type_map = {
+        **AutoPermissionViewSetMixin.permission_type_map,
+        "chunk": "change",
+    }
+
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+    @action(detail=True, methods=["put"])
+    def chunk(self, request, pk=None):
+        """
+        Append the request body to the upload, streamed to disk. A
+        ``Content-Range: bytes <start>-<end>/<size>`` header says where it
+        goes, and without one it continues from the upload's ``offset``.
+
+        Responds with the upload, which has an ``asset`` once complete, or
+        with 409 if the chunk doesn't start at its ``offset``.
+        """
+        upload = self.get_object()
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        start = upload.offset
+        header = request.headers.get("Content-Range")
+        if header:
+            match = CONTENT_RANGE_PATTERN.match(header)
+            if (
+                match is None
+                or int(match[2]) - int(match[1]) + 1 != length
+                or (match[3] != "*" and int(match[3]) != upload.size)
+            ):
+                raise serializers.ValidationError(
+                    {
+                        "Content-Range": "Must be bytes <start>-<end>/<size>, "
+                        "matching the length of the body and the upload's size."
+                    }
+                )
+            start = int(match[1])
+        try:
+            received = write_chunk(upload, request.stream, start, length)
+        except UploadOffsetMismatch:
+            return Response(
+                self.get_serializer(upload).data, status=status.HTTP_409_CONFLICT
+            )
+        except UploadError as e:
+            raise serializers.ValidationError({"detail": str(e)})
+        data = self.get_serializer(upload).data
+        if received < length:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+
+class ArchivedAudioAssetViewSet(
+    AutoPermissionViewSetMixin, viewsets.ReadOnlyModelViewSet
+):
+    """
+    Archived assets, by id or digest. Restore them with ``assets/restore/``.
+    """
+
+    queryset = ArchivedAudioAsset.objects.select_related("artist")
+    serializer_class = ArchivedAudioAssetSerializer
+    pagination_class = CatalogCursorPagination
+    permission_type_map = {
+        **AutoPermissionViewSetMixin.permission_type_map,
+        "by_digest": None,
+    }
+
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+    @action(detail=False, url_path="by-digest/(?P<digest>[^/.]+)")
+    def by_digest(self, request, digest=None):
+        """
+        Look an archived asset up by the SHA1 digest of its file.
+        """
+        asset = get_object_or_404(self.get_queryset(), digest=digest)
+        return Response(self.get_serializer(asset).data)
+
+
+class JobViewSet(
+    AutoPermissionViewSetMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Queue jobs and poll their progress. Jobs are run by ``run_job_worker``.
+    """
+
+    queryset = Job.objects.select_related("owner")
+    serializer_class = JobSerializer
+    pagination_class = CatalogCursorPagination
+
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+    def perform_create(self, serializer):
+        handler = get_handler(serializer.validated_data["kind"])
+        if handler.staff_only and not self.request.user.is_staff:
+            raise PermissionDenied(f"Only staff can queue {handler.kind} jobs.")
+        serializer.save()
@@ -0,0 +1,311 @@
+"""
+Waveform peaks for drawing an asset's waveform without its audio.
+
+A waveform rendition is the minimum and maximum sample, across channels, of
+each run of ``samples_per_peak`` frames. Renditions are computed at several
+resolutions in one pass over the file: the finest from the samples, and each
+coarser one by merging groups of `LEVEL_FACTOR` peaks of the one before.
+
+Each resolution is stored as a little endian float16 file of interleaved
+``min, max`` pairs, under ``MEDIA_ROOT`` in a directory named after the
+file's digest, so assets with the same audio share renditions and a changed
+file gets new ones. The digest is the one the scanner or upload computed from
+the file, never the asset's editable ``digest``, so nobody can name a
+directory outside the cache or be served peaks of audio they don't have.
+Files are written on first request and served as is, which lets the web
+server send them without copying them through Python. The cache is trimmed
+to a size with the ``prune_waveforms`` command, least recently served first.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+
+from django.conf import settings
+
+from .analysis import (
+    DECODE_ERRORS,
+    DEFAULT_BLOCK_FRAMES,
+    _Framer,
+    iter_audio_blocks,
+    require_numpy,
+)
+from .instrumentation import instrumented
+from .models import AudioAsset
+from .scanner import StrPath
+from .storage import is_digest
+
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None
+
+BASE_SAMPLES_PER_PEAK = 256
+LEVEL_FACTOR = 4
+LEVELS = tuple(BASE_SAMPLES_PER_PEAK * LEVEL_FACTOR**i for i in range(5))
+DTYPE = "<f2"
+INFO_FILENAME = "info.json"
+# Serving a rendition marks it as used at most this often, in seconds.
+TOUCH_INTERVAL = 60 * 60
+
+
+class WaveformUnavailable(Exception):
+    """
+    Raised when an asset has no audio file to compute a waveform from.
+    """
+
+
+@dataclass
+class WaveformInfo:
+    """
+    Properties of the audio a waveform was computed from.
+    """
+
+    samplerate: int
+    channels: int
+    frames: int
+
+
+def waveform_root() -> str:
+    return os.path.join(
+        settings.MEDIA_ROOT,
+        getattr(settings, "AUDIO_ASSET_MANAGER_WAVEFORM_DIR", "waveforms"),
+    )
+
+
+def waveform_dir(digest: str) -> str:
+    """
+    Directory holding the renditions for a digest.
+
+    Args:
+        digest: SHA1 digest of the audio file.
+
+    Returns:
+        The directory's path.
+
+    Raises:
+        ValueError: If the digest isn't 40 lowercase hexadecimal characters.
+    """
+    if not is_digest(digest):
+        raise ValueError(f"Invalid digest {digest!r}.")
+    return os.path.join(waveform_root(), digest[:2], digest)
+
+
+def rendition_path(digest: str, samples_per_peak: int) -> str:
+    return os.path.join(waveform_dir(digest), f"{samples_per_peak}.f16")
+
+
+def _merge(peaks: Any, factor: int) -> Any:
+    """
+    Merge groups of ``factor`` ``(min, max)`` rows into one.
+    """
+    padding = -len(peaks) % factor
+    if padding:
+        fill = np.array([[np.inf, -np.inf]] * padding, dtype=peaks.dtype)
+        peaks = np.concatenate([peaks, fill])
+    groups = peaks.reshape(-1, factor, 2)
+    return np.stack([groups[:, :, 0].min(axis=1), groups[:, :, 1].max(axis=1)], 1)
+
+
+def compute_waveform(
+    path: StrPath, block_frames: int = DEFAULT_BLOCK_FRAMES
+) -> Tuple[WaveformInfo, Dict[int, Any]]:
+    """
+    Compute waveform peaks at every resolution in `LEVELS`.
+
+    Args:
+        path: Path to the audio file.
+        block_frames: Number of frames to decode at a time.
+
+    Returns:
+        The `WaveformInfo` and a dict of samples per peak to float32 arrays
+        shaped ``(peaks, 2)`` of minimum and maximum.
+    """
+    info, blocks = iter_audio_blocks(path, block_frames=block_frames)
+    framer = _Framer(BASE_SAMPLES_PER_PEAK)
+    chunks: List[Any] = []
+    frames = 0
+    for block in blocks:
+        frames += len(block)
+        extremes = framer.feed(np.stack([block.min(axis=1), block.max(axis=1)], 1))
+        if len(extremes):
+            chunks.append(
+                np.stack(
+                    [extremes[:, :, 0].min(axis=1), extremes[:, :, 1].max(axis=1)], 1
+                )
+            )
+    remainder = framer.remainder
+    if remainder is not None and len(remainder):
+        chunks.append(
+            np.array([[remainder[:, 0].min(), remainder[:, 1].max()]], dtype=np.float32)
+        )
+    peaks = np.concatenate(chunks) if chunks else np.zeros((0, 2), dtype=np.float32)
+    renditions = {LEVELS[0]: peaks}
+    for previous, samples_per_peak in zip(LEVELS, LEVELS[1:]):
+        renditions[samples_per_peak] = _merge(renditions[previous], LEVEL_FACTOR)
+    return WaveformInfo(info.samplerate, info.channels, frames), renditions
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def write_waveform(digest: str, source: StrPath) -> WaveformInfo:
+    """
+    Compute and store every rendition of a file.
+
+    Each file is written to a temporary name and renamed into place, so
+    concurrent requests never read a partial rendition.
+    """
+    require_numpy()
+    info, renditions = compute_waveform(source)
+    directory = waveform_dir(digest)
+    os.makedirs(directory, exist_ok=True)
+    for samples_per_peak, peaks in renditions.items():
+        _write_atomic(
+            rendition_path(digest, samples_per_peak), peaks.astype(DTYPE).tobytes()
+        )
+    # Written last: a directory with info has every rendition.
+    _write_atomic(
+        os.path.join(directory, INFO_FILENAME),
+        json.dumps(asdict(info)).encode(),
+    )
+    return info
+
+
+def read_info(digest: str) -> Optional[WaveformInfo]:
+    path = os.path.join(waveform_dir(digest), INFO_FILENAME)
+    try:
+        with open(path) as file:
+            return WaveformInfo(**json.load(file))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _touch(digest: str) -> None:
+    path = os.path.join(waveform_dir(digest), INFO_FILENAME)
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:  # pragma: nocover
+        pass
+
+
+def _sources(asset: AudioAsset) -> Iterator[Tuple[str, str]]:
+    """
+    An asset's files with the digests computed from them: its uploaded file,
+    if it's in a storage on this machine, then its scanned files.
+    """
+    if asset.file:
+        try:
+            # Uploads are stored under the digest of their content.
+            yield asset.file.path, os.path.basename(asset.file.name)
+        except NotImplementedError:
+            pass
+    yield from asset.scan_entries.order_by("pk").values_list("path", "digest")
+
+
+def get_waveform(asset: AudioAsset, samples_per_peak: int) -> Tuple[str, WaveformInfo]:
+    """
+    Find an asset's rendition, computing the asset's renditions if needed.
+
+    Args:
+        asset: Asset to draw.
+        samples_per_peak: One of `LEVELS`.
+
+    Returns:
+        The path of the rendition and the `WaveformInfo` of its audio.
+
+    Raises:
+        ValueError: If ``samples_per_peak`` isn't one of `LEVELS`.
+        WaveformUnavailable: If the asset has no scanned or uploaded file on
+            disk, or its file can't be decoded.
+    """
+    if samples_per_peak not in LEVELS:
+        raise ValueError(f"samples_per_peak must be one of {LEVELS}.")
+    sources = [(path, digest) for path, digest in _sources(asset) if is_digest(digest)]
+    for _path, digest in sources:
+        info = read_info(digest)
+        if info is not None:
+            _touch(digest)
+            return rendition_path(digest, samples_per_peak), info
+    source = next((source for source in sources if os.path.exists(source[0])), None)
+    if source is None:
+        raise WaveformUnavailable("The asset's file can't be found.")
+    path, digest = source
+    try:
+        info = write_waveform(digest, path)
+    except DECODE_ERRORS as e:
+        raise WaveformUnavailable(f"The asset's file can't be decoded: {e}")
+    return rendition_path(digest, samples_per_peak), info
+
+
+def load_rendition(path: StrPath) -> Any:
+    """
+    Read a stored rendition back as an array shaped ``(peaks, 2)``.
+    """
+    require_numpy()
+    return np.fromfile(path, dtype=DTYPE).reshape(-1, 2)
+
+
+@dataclass
+class PruneResult:
+    """
+    Summary of a cache trim.
+    """
+
+    removed: int = 0
+    freed: int = 0
+    remaining: int = 0
+
+
+@instrumented
+def prune_waveforms(max_bytes: int) -> PruneResult:
+    """
+    Remove the least recently served renditions until the cache fits.
+
+    All of a digest's renditions are removed together.
+
+    Args:
+        max_bytes: Size to trim the cache to.
+
+    Returns:
+        A `PruneResult` summarizing the trim.
+    """
+    entries = []
+    total = 0
+    root = waveform_root()
+    for prefix in os.scandir(root) if os.path.isdir(root) else []:
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            if not entry.is_dir():
+                continue
+            size, used = 0, 0.0
+            for file in os.scandir(entry.path):
+                stat = file.stat()
+                size += stat.st_size
+                used = max(used, stat.st_mtime)
+            entries.append((used, size, entry.path))
+            total += size
+    result = PruneResult()
+    for _used, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        result.removed += 1
+        result.freed += size
+    result.remaining = total
+    return result
@@ -1 +1,221 @@
 # Add your test configuration and fixtures to autoload here.
+import pytest
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="producer", password="s3cret-pass"
+    )
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        username="other", password="s3cret-pass"
+    )
+
+
+@pytest.fixture
+def api_client(user):
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def media_root(tmp_path, settings):
+    # For tests that write uploads, waveforms, or indexes under MEDIA_ROOT.
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture
+def write_wave():
+    # Writes float samples, shaped (frames,) or (frames, channels), as PCM.
+    import wave
+
+    import numpy as np
+
+    def write(path, samples, rate, sample_width=2):
+        samples = np.clip(samples, -1, 1)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        if sample_width == 2:
+            data = (samples * 32767).astype("<i2").tobytes()
+        else:
+            ints = (samples * 8388607).astype("<i4")
+            data = ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        with wave.open(str(path), "wb") as f:
+            f.setnchannels(samples.shape[1])
+            f.setsampwidth(sample_width)
+            f.setframerate(rate)
+            f.writeframes(data)
+
+    return write
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Primary keys are reused between tests, so cached values keyed on them
+    # mustn't leak from one test into the next.
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def query_budget():
+    # Fails the test if a block makes more queries than it's declared to.
+    from audio_asset_manager.testing import query_budget
+
+    return query_budget
+
+
+# The benchmark suite, in tests/test_benchmark_suite.py, only runs when given
+# catalog sizes, and then on its own: its catalogs are committed for the whole
+# session, which other tests don't expect. Its options, fixtures, and marker
+# are prefixed with "catalog" so they don't clash with pytest-benchmark's.
+BENCHMARK_OWNERS = 4
+BENCHMARK_OWNER_ASSETS = 1000
+benchmark_results_key = pytest.StashKey[list]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("catalog benchmarks")
+    group.addoption(
+        "--catalog-bench-sizes",
+        default="",
+        help="Comma separated catalog sizes to run the benchmark suite at, e.g. "
+        "10000,100000,1000000. The suite is skipped without them.",
+    )
+    group.addoption(
+        "--catalog-bench-baseline",
+        default="benchmarks/baseline.json",
+        help="Baseline file to compare benchmark results with.",
+    )
+    group.addoption(
+        "--catalog-bench-save",
+        action="store_true",
+        help="Write the results to the baseline file instead of comparing.",
+    )
+    group.addoption(
+        "--catalog-bench-tolerance",
+        type=float,
+        default=0.5,
+        help="Share by which a median may be slower than its baseline.",
+    )
+    group.addoption(
+        "--catalog-bench-runs",
+        type=int,
+        default=5,
+        help="Number of times to run each benchmarked scenario.",
+    )
+
+
+def _benchmark_sizes(config):
+    return [
+        int(size) for size in config.getoption("catalog_bench_sizes").split(",") if size
+    ]
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "catalog_benchmark: part of the benchmark suite, see --catalog-bench-sizes",
+    )
+    config.stash[benchmark_results_key] = []
+
+
+def pytest_generate_tests(metafunc):
+    if "catalog_bench_size" in metafunc.fixturenames:
+        sizes = _benchmark_sizes(metafunc.config) or [
+            pytest.param(0, marks=pytest.mark.skip(reason="No --catalog-bench-sizes"))
+        ]
+        metafunc.parametrize("catalog_bench_size", sizes, scope="session")
+
+
+def pytest_collection_modifyitems(config, items):
+    if _benchmark_sizes(config):
+        skip = pytest.mark.skip(reason="Runs without --catalog-bench-sizes")
+        for item in items:
+            if "catalog_benchmark" not in item.keywords:
+                item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def catalog_bench_db(django_db_setup, django_db_blocker):
+    # The catalogs are committed, so empty the database once the session is
+    # over. Otherwise --reuse-db would hand them to the next run.
+    from django.core.management import call_command
+
+    yield
+    with django_db_blocker.unblock():
+        call_command("flush", interactive=False, verbosity=0)
+
+
+@pytest.fixture(scope="session")
+def catalog_bench_owner(catalog_bench_size, catalog_bench_db, django_db_blocker):
+    # Sizes run smallest first, each topping up the previous catalog.
+    from audio_asset_manager.synthetic import generate_owners
+
+    with django_db_blocker.unblock():
+        generate_owners(BENCHMARK_OWNERS, BENCHMARK_OWNER_ASSETS, max_tags=5)
+        (owner,) = generate_owners(
+            1, catalog_bench_size, prefix="benchmark", max_tags=5
+        )
+    return owner
+
+
+@pytest.fixture
+def catalog_benchmark(request):
+    # Times a scenario, and fails if it regressed from the baseline.
+    from audio_asset_manager.benchmarks import (
+        BenchmarkBaseline,
+        BenchmarkResult,
+        measure,
+    )
+
+    config = request.config
+    baseline = BenchmarkBaseline.load(config.getoption("catalog_bench_baseline"))
+
+    def run(scenario, size):
+        timing = measure(scenario.run, runs=config.getoption("catalog_bench_runs"))
+        result = BenchmarkResult(
+            scenario.name, size, timing.median, timing.best, timing.queries
+        )
+        config.stash[benchmark_results_key].append(result)
+        if not config.getoption("catalog_bench_save"):
+            problems = baseline.regressions(
+                result, config.getoption("catalog_bench_tolerance")
+            )
+            if problems:
+                pytest.fail("\n".join(problems), pytrace=False)
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(benchmark_results_key, [])
+    if not results:
+        return
+    terminalreporter.section("benchmarks")
+    for result in results:
+        terminalreporter.write_line(
+            f"{result.key}: median {result.median:.2f} ms, best {result.best:.2f} ms, "
+            f"{result.queries} queries"
+        )
+    if config.getoption("catalog_bench_save"):
+        from audio_asset_manager.benchmarks import BenchmarkBaseline
+
+        path = config.getoption("catalog_bench_baseline")
+        baseline = BenchmarkBaseline.load(path)
+        for result in results:
+            baseline.update(result)
+        baseline.save(path)
+        terminalreporter.write_line(f"Saved the results to {path}.")
@@ -0,0 +1,79 @@
+import pytest
+from django.contrib import admin
+from django.test import RequestFactory
+from django.urls import reverse
+
+from audio_asset_manager.admin import EstimatedCountPaginator, estimated_count
+from audio_asset_manager.archive import archive_retired_assets
+from audio_asset_manager.models import (
+    ArchivedAudioAsset,
+    Artist,
+    AudioAsset,
+    Collection,
+)
+from audio_asset_manager.synthetic import generate_catalog
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def staff_user(user):
+    user.is_staff = True
+    user.is_superuser = True
+    user.save()
+    return user
+
+
+def test_changelist_queries_dont_grow_with_page_size(
+    client, staff_user, django_assert_max_num_queries
+):
+    url = reverse("admin:audio_asset_manager_audioasset_changelist")
+    client.force_login(staff_user)
+    generate_catalog(staff_user, 5)
+    client.get(url)
+    with django_assert_max_num_queries(12) as small:
+        assert client.get(url).status_code == 200
+    generate_catalog(staff_user, 60, seed=1)
+    with django_assert_max_num_queries(len(small.captured_queries)):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert response.context["cl"].result_count == 65
+
+
+def test_estimated_count_falls_back_to_exact_count(user):
+    generate_catalog(user, 12)
+    queryset = AudioAsset.objects.all().order_by("pk")
+    assert estimated_count(queryset) is None
+    assert EstimatedCountPaginator(queryset, 5).count == 12
+
+
+def test_related_choices_are_limited_to_owner(user, other_user):
+    mine = Artist.objects.create(owner=user, name="Mine")
+    Artist.objects.create(owner=other_user, name="Theirs")
+    model_admin = admin.site._registry[Collection]
+    request = RequestFactory().get("/")
+    request.user = user
+    field = model_admin.formfield_for_foreignkey(
+        Collection._meta.get_field("album_artist"), request
+    )
+    assert list(field.queryset) == [mine]
+    assert "album_artist" in model_admin.autocomplete_fields
+
+
+def test_retire_and_restore_actions(client, staff_user):
+    generate_catalog(staff_user, 5)
+    client.force_login(staff_user)
+    ids = list(AudioAsset.objects.values_list("pk", flat=True)[:2])
+    response = client.post(
+        reverse("admin:audio_asset_manager_audioasset_changelist"),
+        {"action": "retire_selected", "_selected_action": ids},
+    )
+    assert response.status_code == 302
+    assert AudioAsset.objects.count() == 3
+    archive_retired_assets()
+    url = reverse("admin:audio_asset_manager_archivedaudioasset_changelist")
+    response = client.get(url)
+    assert response.context["cl"].result_count == 2
+    client.post(url, {"action": "restore_selected", "_selected_action": ids[:1]})
+    assert AudioAsset.objects.count() == 4
+    assert ArchivedAudioAsset.objects.count() == 1
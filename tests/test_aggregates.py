@@ -0,0 +1,146 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Avg, Count, Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.aggregates import refresh_asset_aggregates
+from audio_asset_manager.models import Artist, AudioAsset, Collection
+from audio_asset_manager.synthetic import generate_catalog
+from audio_asset_manager.transfer import import_catalog
+
+pytestmark = pytest.mark.django_db
+
+
+def expected_totals(model):
+    return {
+        record.pk: (record.count, record.duration or 0, record.loudness)
+        for record in model.objects.annotate(
+            count=Count("audioasset"),
+            duration=Sum("audioasset__duration"),
+            loudness=Avg("audioasset__loudness"),
+        )
+    }
+
+
+def stored_totals(model):
+    return {
+        record.pk: (
+            record.asset_count,
+            record.total_duration,
+            record.average_loudness,
+        )
+        for record in model.objects.all()
+    }
+
+
+def assert_totals_match():
+    for model in (Artist, Collection):
+        stored = stored_totals(model)
+        for pk, (count, duration, loudness) in expected_totals(model).items():
+            assert stored[pk][:2] == (count, duration)
+            assert stored[pk][2] == pytest.approx(loudness)
+
+
+def test_totals_follow_asset_changes(user):
+    artist = Artist.objects.create(owner=user, name="Kai Engel")
+    album = Collection.objects.create(
+        owner=user, title="Moonlight", album_artist=artist
+    )
+    other = Collection.objects.create(owner=user, title="Daylight")
+    first = AudioAsset.objects.create(
+        owner=user, title="One", artist=artist, collection=album, duration=100
+    )
+    AudioAsset.objects.create(
+        owner=user,
+        title="Two",
+        artist=artist,
+        collection=album,
+        duration=50,
+        loudness=-14,
+    )
+    album.refresh_from_db()
+    assert (album.asset_count, album.total_duration) == (2, 150)
+    assert album.average_loudness == -14
+
+    # Re-measured, then moved to another collection.
+    first = AudioAsset.objects.get(pk=first.pk)
+    first.loudness = -18
+    first.save()
+    album.refresh_from_db()
+    assert album.average_loudness == -16
+    first.collection = other
+    first.save(update_fields=["collection"])
+    album.refresh_from_db()
+    other.refresh_from_db()
+    assert (album.asset_count, album.total_duration) == (1, 50)
+    assert (other.asset_count, other.total_duration) == (1, 100)
+    assert_totals_match()
+
+    # A stale copy of the artist doesn't write its totals back.
+    artist.name = "Kai"
+    artist.save()
+    artist.refresh_from_db()
+    assert (artist.name, artist.asset_count) == ("Kai", 2)
+
+    first.delete()
+    other.refresh_from_db()
+    assert (other.asset_count, other.total_duration, other.average_loudness) == (
+        0,
+        0,
+        None,
+    )
+    assert_totals_match()
+
+
+def test_bulk_paths_recompute(user, other_user):
+    generate_catalog(user, 60, batch_size=25)
+    import_catalog(
+        other_user,
+        [
+            {
+                "title": f"Track {i}",
+                "artist": f"Artist {i % 3}",
+                "collection": f"Album {i % 5}",
+                "duration": i,
+                "loudness": -10 - i % 7,
+            }
+            for i in range(40)
+        ],
+        batch_size=15,
+    )
+    assert_totals_match()
+    assets = AudioAsset.objects.filter(owner=user)
+    assets.update(duration=10, loudness=None)
+    refresh_asset_aggregates(assets.values_list("pk", flat=True))
+    assert_totals_match()
+
+
+def test_rebuild_command(user, capsys):
+    generate_catalog(user, 30)
+    Artist.objects.update(asset_count=0, total_duration=0)
+    Collection.objects.update(loudness_sum=0, loudness_count=0)
+    call_command("rebuild_asset_aggregates", "--owner", user.username)
+    assert "Recomputed" in capsys.readouterr().out
+    assert_totals_match()
+
+
+def test_collection_listing_does_not_read_assets(user):
+    generate_catalog(user, 30)
+    client = APIClient()
+    client.force_authenticate(user)
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(reverse("audio_asset_manager:collection-list"))
+    assert response.status_code == 200
+    assert all(
+        AudioAsset._meta.db_table not in query["sql"]
+        for query in context.captured_queries
+    )
+    result = response.data["results"][0]
+    collection = Collection.objects.get(pk=result["id"])
+    assert result["asset_count"] == collection.audioasset_set.count()
+    assert result["average_loudness"] == pytest.approx(
+        collection.audioasset_set.aggregate(value=Avg("loudness"))["value"]
+    )
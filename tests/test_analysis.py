@@ -0,0 +1,83 @@
+import pytest
+from django.core.management import call_command
+
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.scanner import scan_library
+
+np = pytest.importorskip("numpy")
+
+from audio_asset_manager.analysis import analyze_assets, analyze_file  # noqa: E402
+
+RATE = 44100
+
+
+def sine(seconds, amplitude, frequency=997):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return amplitude * np.sin(2 * np.pi * frequency * t)
+
+
+def click_track(seconds, bpm):
+    samples = np.zeros(int(seconds * RATE))
+    click = sine(0.03, 0.8, 1500) * np.hanning(int(0.03 * RATE))
+    interval = int(RATE * 60 / bpm)
+    for start in range(0, len(samples) - len(click), interval):
+        samples[start : start + len(click)] += click
+    return samples
+
+
+@pytest.mark.parametrize("sample_width", [2, 3])
+def test_analyze_file_sine_loudness(tmp_path, write_wave, sample_width):
+    path = tmp_path / "tone.wav"
+    # A full scale 1 kHz sine in one channel reads -3.01 LUFS per BS.1770.
+    write_wave(path, sine(5, 0.5), RATE, sample_width=sample_width)
+    analysis = analyze_file(path, block_frames=10000)
+    assert analysis.duration == pytest.approx(5, abs=0.01)
+    assert analysis.loudness == pytest.approx(-3.01 - 6.02, abs=0.1)
+
+
+def test_analyze_file_stereo_and_silence(tmp_path, write_wave):
+    stereo = tmp_path / "stereo.wav"
+    write_wave(stereo, np.stack([sine(3, 0.5), sine(3, 0.5)], axis=1), RATE)
+    assert analyze_file(stereo).loudness == pytest.approx(-6.02, abs=0.1)
+    silent = tmp_path / "silent.wav"
+    write_wave(silent, np.zeros(RATE * 3), RATE)
+    analysis = analyze_file(silent)
+    assert analysis.loudness is None
+    assert analysis.bpm is None
+
+
+@pytest.mark.parametrize("bpm", [90, 128])
+def test_analyze_file_bpm(tmp_path, write_wave, bpm):
+    path = tmp_path / "clicks.wav"
+    write_wave(path, click_track(20, bpm), RATE)
+    assert analyze_file(path).bpm == pytest.approx(bpm, abs=1)
+
+
+@pytest.mark.django_db
+def test_analyze_command_updates_assets(tmp_path, write_wave, user):
+    write_wave(tmp_path / "clicks.wav", click_track(12, 120), RATE)
+    (tmp_path / "broken.wav").write_bytes(b"not a wave file")
+    scan_library(tmp_path, user, workers=1)
+    call_command("analyze_audio_assets", owner=user.username, workers=1)
+    asset = AudioAsset.objects.get(title="clicks")
+    assert asset.duration == 12
+    assert asset.bpm == pytest.approx(120, abs=1)
+    assert asset.loudness is not None
+    assert AudioAsset.objects.get(title="broken").loudness is None
+
+
+def test_corrupt_files_are_counted_as_errors(tmp_path, write_wave, user, monkeypatch):
+    write_wave(tmp_path / "clicks.wav", click_track(2, 120), RATE)
+    write_wave(tmp_path / "corrupt.wav", click_track(2, 90), RATE)
+    scan_library(tmp_path, user, workers=1)
+
+    def decode(path, **kwargs):
+        if path.endswith("corrupt.wav"):
+            raise RuntimeError("Error in file: unexpected end of data.")
+        return real_analyze_file(path, **kwargs)
+
+    real_analyze_file = analyze_file
+    monkeypatch.setattr("audio_asset_manager.analysis.analyze_file", decode)
+    result = analyze_assets(AudioAsset.objects.filter(owner=user), workers=1)
+    assert (result.analyzed, result.errors) == (1, 1)
+    assert AudioAsset.objects.get(title="clicks").duration == 2
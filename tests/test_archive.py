@@ -0,0 +1,228 @@
+import datetime
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.archive import (
+    archive_retired_assets,
+    restore_assets,
+    retire_assets,
+)
+from audio_asset_manager.credits import build_credits
+from audio_asset_manager.models import (
+    ArchivedAudioAsset,
+    Artist,
+    AssetSearchDocument,
+    AssetUsage,
+    AssetUsageMonth,
+    AudioAsset,
+    Production,
+    ScanIndexEntry,
+    TaggedAudioAsset,
+)
+from audio_asset_manager.scanner import scan_library
+from audio_asset_manager.usage import Cue, most_used_assets, record_usage
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def catalog(user):
+    kai = Artist.objects.create(owner=user, name="Kai Engel")
+    assets = []
+    for i in range(10):
+        asset = AudioAsset.objects.create(
+            owner=user, title=f"Track {i}", artist=kai, duration=10, digest=f"d{i}"
+        )
+        asset.tags.add("ambient", f"mood-{i % 2}")
+        assets.append(asset)
+    episode = Production.objects.create(owner=user, title="Ep 1")
+    record_usage(
+        episode, [Cue(asset.pk, used_on=datetime.date(2026, 7, 1)) for asset in assets]
+    )
+    return {"artist": kai, "assets": assets, "episode": episode}
+
+
+def retire_and_archive(assets):
+    retire_assets(AudioAsset.objects.filter(pk__in=[asset.pk for asset in assets]))
+    return archive_retired_assets(batch_size=4)
+
+
+def test_retired_assets_leave_the_catalog(user, catalog):
+    kai, assets = catalog["artist"], catalog["assets"]
+    assert retire_assets(AudioAsset.objects.filter(pk__in=[assets[0].pk])) == 1
+    assert retire_assets(AudioAsset.all_objects.filter(pk=assets[0].pk)) == 0
+    assert not AudioAsset.objects.filter(pk=assets[0].pk).exists()
+    assert AudioAsset.all_objects.get(pk=assets[0].pk).retired_at is not None
+    assert not AssetSearchDocument.objects.filter(asset_id=assets[0].pk).exists()
+    kai.refresh_from_db()
+    assert (kai.asset_count, kai.total_duration) == (9, 90)
+
+    # Saving a retired asset doesn't count it again.
+    retired = AudioAsset.all_objects.get(pk=assets[0].pk)
+    retired.duration = 100
+    retired.save()
+    kai.refresh_from_db()
+    assert (kai.asset_count, kai.total_duration) == (9, 90)
+
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get(reverse("audio_asset_manager:audioasset-list"))
+    assert len(response.json()["results"]) == 9
+    response = client.get(
+        reverse("audio_asset_manager:audioasset-search"), {"q": "Track"}
+    )
+    assert response.json()["count"] == 9
+
+
+def test_archive_moves_assets_out_of_the_table(user, catalog):
+    assets = catalog["assets"]
+    archived = assets[:9]
+    assert retire_and_archive(archived) == 9
+    ids = {asset.pk for asset in archived}
+    assert list(AudioAsset.all_objects.values_list("pk", flat=True)) == [assets[9].pk]
+    assert set(ArchivedAudioAsset.objects.values_list("pk", flat=True)) == ids
+    record = ArchivedAudioAsset.objects.get(pk=assets[0].pk)
+    assert (record.title, record.digest, record.artist_id) == (
+        "Track 0",
+        "d0",
+        catalog["artist"].pk,
+    )
+    assert record.tags == ["ambient", "mood-0"]
+    assert not TaggedAudioAsset.objects.filter(content_object_id__in=ids).exists()
+    assert not AssetSearchDocument.objects.filter(asset_id__in=ids).exists()
+    # The assets were deleted without cascades, yet nothing refers to them.
+    connection.check_constraints()
+    catalog["artist"].refresh_from_db()
+    assert catalog["artist"].asset_count == 1
+    # Usage history is kept, and still reported.
+    assert AssetUsage.objects.count() == AssetUsageMonth.objects.count() == 10
+    report = most_used_assets(user)
+    assert {row["asset"].title for row in report} == {f"Track {i}" for i in range(10)}
+
+    # Old cue sheets are still credited.
+    cue_sheet = list(
+        catalog["episode"].usages.values_list("asset_id", flat=True).order_by("pk")
+    )
+    text = build_credits(user, cue_sheet).render("text")
+    assert text.count("by Kai Engel") == 10
+    assert archive_retired_assets() == 0
+
+
+def test_archive_only_old_retirements_of_owners(user, other_user, catalog):
+    theirs = AudioAsset.objects.create(owner=other_user, title="Theirs")
+    retire_assets(AudioAsset.objects.all())
+    assert archive_retired_assets(owner_ids=[user.pk], retired_before=None) == 10
+    assert AudioAsset.all_objects.get().pk == theirs.pk
+    later = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+    assert archive_retired_assets(retired_before=later) == 0
+
+
+def test_restore_from_both_tiers(user, catalog):
+    kai, assets = catalog["artist"], catalog["assets"]
+    retire_and_archive(assets[:5])
+    retire_assets(AudioAsset.objects.filter(pk=assets[5].pk))
+    # A new asset took over one of the archived digests.
+    AudioAsset.objects.create(owner=user, title="Again", digest="d0")
+
+    result = restore_assets([asset.pk for asset in assets[:6]], owner_ids=[user.pk])
+    assert (result.unretired, result.unarchived, result.conflicts) == (
+        1,
+        4,
+        [assets[0].pk],
+    )
+    assert list(ArchivedAudioAsset.objects.values_list("pk", flat=True)) == [
+        assets[0].pk
+    ]
+    restored = AudioAsset.objects.get(pk=assets[1].pk)
+    assert restored.title == "Track 1"
+    assert sorted(restored.tags.names()) == ["ambient", "mood-1"]
+    assert AssetSearchDocument.objects.filter(asset_id=restored.pk).exists()
+    kai.refresh_from_db()
+    assert kai.asset_count == 9
+
+
+def test_restore_keeps_one_of_the_same_digest(user, catalog):
+    assets = catalog["assets"]
+    retire_and_archive(assets[:1])
+    again = AudioAsset.objects.create(owner=user, title="Again", digest="d0")
+    retire_and_archive([again])
+
+    result = restore_assets([assets[0].pk, again.pk])
+    assert (result.unarchived, result.conflicts) == (1, [again.pk])
+    assert AudioAsset.objects.get(digest="d0").pk == assets[0].pk
+
+
+def test_scan_skips_archived_files(tmp_path, user):
+    (tmp_path / "a.wav").write_bytes(b"a")
+    (tmp_path / "b.wav").write_bytes(b"b")
+    scan_library(tmp_path, user, workers=1)
+    asset = AudioAsset.objects.get(filename="a.wav")
+    retire_and_archive([asset])
+    ScanIndexEntry.objects.all().delete()
+    result = scan_library(tmp_path, user, workers=1)
+    assert (result.created, result.skipped, result.archived) == (0, 1, 1)
+    assert AudioAsset.objects.count() == 1
+
+
+def test_archive_api(user, other_user, catalog):
+    assets = catalog["assets"]
+    client = APIClient()
+    client.force_authenticate(user)
+    other = APIClient()
+    other.force_authenticate(other_user)
+    retire_url = reverse("audio_asset_manager:audioasset-retire")
+    restore_url = reverse("audio_asset_manager:audioasset-restore")
+    ids = [asset.pk for asset in assets[:3]]
+    assert other.post(retire_url, {"ids": ids}, format="json").json() == {"retired": 0}
+    assert client.post(retire_url, {"ids": ids}, format="json").json() == {"retired": 3}
+    assert client.post(retire_url, {"ids": []}, format="json").status_code == 400
+    archive_retired_assets()
+
+    list_url = reverse("audio_asset_manager:archivedaudioasset-list")
+    assert len(client.get(list_url).json()["results"]) == 3
+    assert other.get(list_url).json()["results"] == []
+    by_digest = reverse(
+        "audio_asset_manager:archivedaudioasset-by-digest", kwargs={"digest": "d1"}
+    )
+    response = client.get(by_digest)
+    assert (response.json()["id"], response.json()["tags"]) == (
+        assets[1].pk,
+        ["ambient", "mood-1"],
+    )
+    assert other.get(by_digest).status_code == 404
+    detail = reverse(
+        "audio_asset_manager:archivedaudioasset-detail", kwargs={"pk": assets[2].pk}
+    )
+    assert client.get(detail).json()["title"] == "Track 2"
+
+    assert other.post(restore_url, {"ids": ids}, format="json").json() == {
+        "unretired": 0,
+        "unarchived": 0,
+        "conflicts": [],
+    }
+    assert client.post(restore_url, {"ids": ids}, format="json").json() == {
+        "unretired": 0,
+        "unarchived": 3,
+        "conflicts": [],
+    }
+    assert AudioAsset.objects.count() == 10
+
+
+def test_commands(user, catalog, capsys):
+    retire_assets(AudioAsset.objects.all())
+    call_command("archive_audio_assets", "--owner", user.username, "--older-than", "1")
+    assert "Archived 0 assets." in capsys.readouterr().out
+    call_command("archive_audio_assets", "--owner", user.username)
+    assert "Archived 10 assets." in capsys.readouterr().out
+    call_command("restore_audio_assets", str(catalog["assets"][0].pk))
+    assert "Restored 0 retired and 1 archived assets." in capsys.readouterr().out
+    call_command("restore_audio_assets", "--owner", user.username)
+    assert "Restored 0 retired and 9 archived assets." in capsys.readouterr().out
+    with pytest.raises(CommandError):
+        call_command("restore_audio_assets")
+    with pytest.raises(CommandError):
+        call_command("archive_audio_assets", "--owner", "nobody")
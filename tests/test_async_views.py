@@ -0,0 +1,144 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from audio_asset_manager.instrumentation import API, metrics
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.synthetic import generate_catalog
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def asset(user):
+    generate_catalog(user, 20, max_tags=4)
+    asset = AudioAsset.objects.for_user(user).exclude(tags=None).order_by("pk")[0]
+    asset.title = "Night Drive"
+    asset.save()
+    return asset
+
+
+@pytest.fixture
+def clients(user):
+    sync_client = APIClient()
+    sync_client.force_authenticate(user)
+    async_client = AsyncClient()
+    async_client.force_login(user)
+    return sync_client, async_client
+
+
+def get(client, url, data=None, **extra):
+    async def request():
+        return await client.get(url, data or {}, **extra)
+
+    return async_to_sync(request)()
+
+
+def normalized(data):
+    # Tags come back in any order, and page links point at each view.
+    if isinstance(data, dict):
+        return {
+            key: sorted(value) if key == "tags" else normalized(value)
+            for key, value in data.items()
+            if key not in ("next", "previous")
+        }
+    if isinstance(data, list):
+        return [normalized(item) for item in data]
+    return data
+
+
+def test_async_views_match_the_api(asset, clients):
+    sync_client, async_client = clients
+    ids = ",".join(
+        str(pk)
+        for pk in AudioAsset.objects.order_by("-pk").values_list("pk", flat=True)
+    )
+    pairs = [
+        ("audioasset-detail", "async-asset-detail", {"pk": asset.pk}, {}),
+        (
+            "audioasset-by-digest",
+            "async-asset-by-digest",
+            {"digest": asset.digest},
+            {},
+        ),
+        ("audioasset-search", "async-asset-search", {}, {"q": "nigh"}),
+        ("audioasset-search", "async-asset-search", {}, {"q": "a", "page_size": 2}),
+        ("audioasset-credits", "async-asset-credits", {}, {"ids": ids}),
+        ("artist-detail", "async-artist-detail", {"pk": asset.artist_id}, {}),
+        (
+            "collection-detail",
+            "async-collection-detail",
+            {"pk": asset.collection_id},
+            {},
+        ),
+    ]
+    for sync_name, async_name, kwargs, params in pairs:
+        expected = sync_client.get(
+            reverse(f"audio_asset_manager:{sync_name}", kwargs=kwargs), params
+        )
+        response = get(
+            async_client,
+            reverse(f"audio_asset_manager:{async_name}", kwargs=kwargs),
+            params,
+        )
+        assert response.status_code == expected.status_code == 200, async_name
+        assert normalized(response.json()) == normalized(expected.json()), async_name
+    assert response.json()["album_artist_name"]
+    page = get(
+        async_client,
+        reverse("audio_asset_manager:async-asset-search"),
+        {"q": "a", "page_size": 2, "page": 2},
+    ).json()
+    assert "page=" not in page["previous"]
+
+
+def test_async_views_check_ownership(asset, other_user, clients):
+    _sync_client, async_client = clients
+    url = reverse("audio_asset_manager:async-asset-detail", args=[asset.pk])
+    assert get(async_client, url).json()["title"] == "Night Drive"
+    assert get(AsyncClient(), url).status_code == 403
+    other = AsyncClient()
+    other.force_login(other_user)
+    assert get(other, url).status_code == 404
+    digest_url = reverse(
+        "audio_asset_manager:async-asset-by-digest", args=[asset.digest]
+    )
+    assert get(other, digest_url).status_code == 404
+    artist_url = reverse(
+        "audio_asset_manager:async-artist-detail", args=[asset.artist_id]
+    )
+    assert get(other, artist_url).status_code == 404
+    credits_url = reverse("audio_asset_manager:async-asset-credits")
+    assert get(other, credits_url, {"ids": str(asset.pk)}).json() == {
+        "text": "",
+        "markdown": "",
+        "html": "",
+    }
+    assert get(async_client, credits_url, {"ids": "1,x"}).status_code == 400
+    search_url = reverse("audio_asset_manager:async-asset-search")
+    assert get(async_client, search_url, {"q": "night", "page": 3}).status_code == 404
+
+    token = Token.objects.create(user=other_user)
+    response = get(AsyncClient(), url, headers={"Authorization": f"Token {token.key}"})
+    assert response.status_code == 404
+    response = get(AsyncClient(), url, headers={"Authorization": "Token wrong"})
+    assert response.status_code == 403
+
+    async def post():
+        return await async_client.post(url)
+
+    assert async_to_sync(post)().status_code == 405
+
+
+def test_async_views_are_instrumented(asset, clients):
+    _sync_client, async_client = clients
+    metrics.reset()
+    url = reverse("audio_asset_manager:async-asset-detail", args=[asset.pk])
+    assert get(async_client, url).status_code == 200
+    series = metrics.snapshot()[(API, "audio_asset_manager:async-asset-detail")]
+    # Session, user, asset, and tags; the source comes from the lookup cache.
+    assert series["queries"] >= 4
+    metrics.reset()
@@ -0,0 +1,35 @@
+"""
+The benchmark suite: the app's hot paths timed against synthetic catalogs.
+
+Skipped unless given catalog sizes, and run on its own then::
+
+    pytest tests/test_benchmark_suite.py --catalog-bench-sizes 10000,100000 \
+        --catalog-bench-save
+    pytest tests/test_benchmark_suite.py --catalog-bench-sizes 10000,100000
+
+The first run saves a baseline, and later runs fail on scenarios that make
+more queries or got slower than it by more than ``--catalog-bench-tolerance``.
+"""
+import pytest
+
+from audio_asset_manager.benchmarks import suite_scenarios
+
+pytestmark = [pytest.mark.catalog_benchmark, pytest.mark.django_db]
+
+SCENARIOS = [
+    "admin changelist",
+    "API listing",
+    "API filtering",
+    "search",
+    "credits",
+    "export",
+    "import",
+]
+
+
+@pytest.mark.parametrize("name", SCENARIOS)
+def test_scenario(catalog_benchmark, catalog_bench_owner, catalog_bench_size, name):
+    result = catalog_benchmark(
+        suite_scenarios(catalog_bench_owner)[name], catalog_bench_size
+    )
+    assert result.queries > 0
@@ -0,0 +1,130 @@
+import pytest
+from django.core.management import call_command
+
+from audio_asset_manager.benchmarks import (
+    BenchmarkBaseline,
+    BenchmarkResult,
+    asgi_read_endpoints,
+    measure_asgi_throughput,
+    sequential_scans,
+    session_cookie,
+)
+from audio_asset_manager.models import Artist, AudioAsset, Collection, TaggedAudioAsset
+from audio_asset_manager.synthetic import generate_catalog, generate_owners
+
+
+def test_sequential_scans_postgresql():
+    plan = (
+        "Limit  (cost=0.42..8.44 rows=1 width=8)\n"
+        "  ->  Seq Scan on audio_asset_manager_audioasset  (cost=0.00..18.10)\n"
+        "  ->  Index Scan using asset_owner_created_idx on audio_asset_manager_artist"
+    )
+    assert sequential_scans(plan, "postgresql") == ["audio_asset_manager_audioasset"]
+
+
+def test_sequential_scans_sqlite():
+    plan = (
+        "2 0 0 SCAN audio_asset_manager_audioasset\n"
+        "4 0 0 SCAN audio_asset_manager_artist USING INDEX artist_owner_created_idx\n"
+        "6 0 0 SEARCH audio_asset_manager_collection USING INTEGER PRIMARY KEY"
+    )
+    assert sequential_scans(plan, "sqlite") == ["audio_asset_manager_audioasset"]
+
+
+@pytest.mark.django_db
+def test_generate_catalog(user):
+    catalog = generate_catalog(user, 120, batch_size=50)
+    assert catalog.assets == 120
+    assert AudioAsset.objects.for_user(user).count() == 120
+    assert Artist.objects.for_user(user).count() == catalog.artists
+    assert Collection.objects.for_user(user).count() == catalog.collections
+    tagged = generate_catalog(user, 50, max_tags=3, seed=1)
+    assert TaggedAudioAsset.objects.count() == tagged.tags > 0
+
+
+@pytest.mark.django_db
+def test_generate_owners():
+    owners = generate_owners(3, 20, batch_size=10)
+    assert [owner.username for owner in owners] == [
+        "synthetic-0",
+        "synthetic-1",
+        "synthetic-2",
+    ]
+    assert not owners[0].has_usable_password()
+    # Existing owners are topped up.
+    generate_owners(2, 30)
+    counts = [AudioAsset.objects.for_user(owner).count() for owner in owners]
+    assert counts == [30, 30, 20]
+
+
+def test_benchmark_baseline(tmp_path):
+    path = str(tmp_path / "benchmarks" / "baseline.json")
+    baseline = BenchmarkBaseline.load(path)
+    result = BenchmarkResult("search", 1000, median=10.0, best=9.0, queries=4)
+    assert baseline.regressions(result) == []
+    baseline.update(result)
+    baseline.save(path)
+
+    baseline = BenchmarkBaseline.load(path)
+    assert baseline.regressions(result) == []
+    slower = BenchmarkResult("search", 1000, median=17.5, best=9.0, queries=5)
+    assert baseline.regressions(slower) == [
+        "search @ 1000: 5 queries, baseline 4",
+        "search @ 1000: median 17.50 ms, baseline 10.00 ms (allowed 17.00 ms)",
+    ]
+    assert baseline.regressions(slower, tolerance=1) == [
+        "search @ 1000: 5 queries, baseline 4"
+    ]
+    assert baseline.regressions(BenchmarkResult("search", 10, 99.0, 99.0, 99)) == []
+
+
+@pytest.mark.django_db
+def test_benchmark_command(user, capsys):
+    call_command(
+        "benchmark_asset_queries",
+        assets=30,
+        owner=user.username,
+        runs=1,
+        asgi_requests=0,
+    )
+    output = capsys.readouterr().out
+    assert "== admin changelist ==" in output
+    assert "== API listing ==" in output
+    assert "2 saved per page" in output
+    assert "tag query (taggit filters):" in output
+    assert AudioAsset.objects.for_user(user).count() == 30
+
+
+@pytest.mark.django_db(transaction=True)
+def test_asgi_throughput(user, capsys):
+    # ASGI requests run in threads of their own, so they need committed data.
+    generate_catalog(user, 30)
+    cookie = session_cookie(user)
+    endpoints = asgi_read_endpoints(user)
+    assert [endpoint.name for endpoint in endpoints] == [
+        "asset by id",
+        "asset by digest",
+        "search",
+        "credits",
+        "artist",
+        "collection",
+    ]
+    for endpoint in endpoints:
+        for path in (endpoint.sync_path, endpoint.async_path):
+            result = measure_asgi_throughput(
+                path, cookie, endpoint.query, requests=6, concurrency=3
+            )
+            assert (result.requests, result.failures) == (6, 0), path
+            assert result.per_second > 0
+    call_command(
+        "benchmark_asset_queries",
+        assets=30,
+        owner=user.username,
+        runs=1,
+        asgi_requests=4,
+        concurrency=2,
+    )
+    output = capsys.readouterr().out
+    assert "== ASGI reads, 2 concurrent ==" in output
+    assert "asset by digest: sync" in output
+    assert "failed" not in output
@@ -0,0 +1,130 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.credits import build_credits
+from audio_asset_manager.models import Artist, AssetSource, AudioAsset, LicenseType
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def cue_sheet(user, other_user):
+    cc_by = LicenseType.objects.create(
+        name="CC-BY 4.0",
+        url="https://creativecommons.org/licenses/by/4.0/",
+        include_license_in_credits=True,
+    )
+    stock = LicenseType.objects.create(name="Stock")
+    free_music = AssetSource.objects.create(
+        owner=user, name="Free Music Archive", license_type=cc_by
+    )
+    audiio = AssetSource.objects.create(
+        owner=user, name="Audiio", license_type=stock, source_credit_text="/ via Audiio"
+    )
+    kai = Artist.objects.create(owner=user, name="Kai Engel")
+    lena = Artist.objects.create(owner=user, name="Lena & The *Stars*")
+    cues = [
+        AudioAsset.objects.create(
+            owner=user,
+            title="Moonlight Reprise",
+            artist=kai,
+            source=free_music,
+            credit_link="https://example.com/moonlight",
+        ),
+        AudioAsset.objects.create(
+            owner=user,
+            title="Sting",
+            artist=lena,
+            source=audiio,
+            explicit_credit_required=False,
+        ),
+        AudioAsset.objects.create(
+            owner=user,
+            title="Bed",
+            artist=kai,
+            source=audiio,
+            explicit_credit_required=False,
+        ),
+        AudioAsset.objects.create(owner=user, title="Homemade Whoosh", artist=None),
+        AudioAsset.objects.create(owner=other_user, title="Not Mine"),
+    ]
+    return [asset.pk for asset in cues]
+
+
+def test_credits_render_in_every_format(user, cue_sheet):
+    credits = build_credits(user, cue_sheet + cue_sheet[:1])
+    assert credits.render("text") == (
+        '"Moonlight Reprise (https://example.com/moonlight)" by Kai Engel. '
+        "Licensed under CC-BY 4.0 (https://creativecommons.org/licenses/by/4.0/).\n"
+        '"Homemade Whoosh".\n'
+        "\n"
+        "Additional audio from Audiio by Lena & The *Stars*, Kai Engel / via Audiio."
+    )
+    markdown = credits.render("markdown")
+    assert markdown.splitlines()[0] == (
+        '- "[Moonlight Reprise](https://example.com/moonlight)" by Kai Engel. '
+        "Licensed under [CC-BY 4.0](https://creativecommons.org/licenses/by/4.0/)."
+    )
+    assert "Lena & The \\*Stars\\*" in markdown
+    html = credits.render("html")
+    assert html.startswith(
+        '<ul><li>&ldquo;<a href="https://example.com/moonlight">Moonlight Reprise'
+        "</a>&rdquo; by Kai Engel."
+    )
+    assert "Lena &amp; The *Stars*" in html
+    assert html.count("<ul>") == 2
+
+
+@pytest.mark.parametrize(
+    "url, markdown, html",
+    [
+        (
+            "https://example.com/a_(b)?c=1&d=2",
+            "[Theme](https://example.com/a_%28b%29?c=1&d=2)",
+            '<a href="https://example.com/a_(b)?c=1&amp;d=2">Theme</a>',
+        ),
+        ('https://example.com/"><b>', None, '<a href="https://example.com/&quot;'),
+        ("javascript:alert(1)", "Theme", "Theme"),
+        ("data:text/html,<b>", "Theme", "Theme"),
+    ],
+)
+def test_credit_links_are_safe(user, url, markdown, html):
+    asset = AudioAsset.objects.create(owner=user, title="Theme", credit_link=url)
+    credits = build_credits(user, [asset.pk])
+    if markdown is not None:
+        assert credits.render("markdown") == f'- "{markdown}".'
+    assert credits.render("html").startswith(f"<ul><li>&ldquo;{html}")
+
+
+def test_credits_use_fixed_queries_and_cached_fragments(
+    user, cue_sheet, django_assert_num_queries
+):
+    # The assets, and the archive for the one that isn't the user's.
+    with django_assert_num_queries(2):
+        first = build_credits(user, cue_sheet)
+    with django_assert_num_queries(2):
+        assert build_credits(user, cue_sheet) == first
+    with django_assert_num_queries(1):
+        build_credits(user, cue_sheet[:-1])
+    asset = AudioAsset.objects.get(pk=cue_sheet[0])
+    asset.title = "Moonlight Encore"
+    asset.save()
+    license_type = asset.source.license_type
+    license_type.include_license_in_credits = False
+    license_type.save()
+    text = build_credits(user, cue_sheet).render("text")
+    assert text.startswith(
+        '"Moonlight Encore (https://example.com/moonlight)" by Kai Engel.\n'
+    )
+
+
+def test_credits_api(user, cue_sheet):
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse("audio_asset_manager:audioasset-credits")
+    response = client.get(url, {"ids": ",".join(str(pk) for pk in cue_sheet)})
+    assert response.status_code == 200
+    assert set(response.data) == {"text", "markdown", "html"}
+    assert "Not Mine" not in response.data["text"]
+    assert client.get(url, {"ids": "1,two"}).status_code == 400
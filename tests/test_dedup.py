@@ -0,0 +1,47 @@
+import pytest
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+
+from audio_asset_manager.dedup import find_duplicate_assets
+from audio_asset_manager.managers import query_param_chunk_size
+from audio_asset_manager.models import AudioAsset
+
+pytestmark = pytest.mark.django_db
+
+
+def test_digest_unique_per_owner(user, other_user):
+    AudioAsset.objects.create(owner=user, title="One", digest="abc")
+    AudioAsset.objects.create(owner=other_user, title="One", digest="abc")
+    AudioAsset.objects.create(owner=user, title="No digest")
+    AudioAsset.objects.create(owner=user, title="No digest either")
+    with pytest.raises(IntegrityError), transaction.atomic():
+        AudioAsset.objects.create(owner=user, title="Two", digest="abc")
+
+
+def test_lookup_digests_chunks_queries(user, other_user, django_assert_num_queries):
+    chunk_size = query_param_chunk_size("default")
+    count = chunk_size + 10
+    AudioAsset.objects.bulk_create(
+        AudioAsset(owner=user, title=f"Asset {i}", digest=f"{i:040d}")
+        for i in range(count)
+    )
+    AudioAsset.objects.create(owner=other_user, title="Theirs", digest=f"{0:040d}")
+    wanted = [f"{i:040d}" for i in range(0, count, 2)] + ["missing"] * 5
+    with django_assert_num_queries(2 if chunk_size < len(set(wanted)) else 1):
+        found = AudioAsset.objects.filter(owner=user).lookup_digests(wanted)
+    assert len(found) == len(range(0, count, 2))
+    assert all(asset.owner_id == user.pk for asset in found.values())
+
+
+def test_find_duplicate_assets(user, other_user, capsys):
+    first = AudioAsset.objects.create(owner=user, title="Mine", digest="abc")
+    second = AudioAsset.objects.create(owner=other_user, title="Theirs", digest="abc")
+    AudioAsset.objects.create(owner=user, title="Unique", digest="def")
+    assert find_duplicate_assets() == {"abc": [first, second]}
+    assert find_duplicate_assets(AudioAsset.objects.filter(owner=user)) == {
+        "abc": [first, second]
+    }
+    assert find_duplicate_assets(AudioAsset.objects.filter(digest="def")) == {}
+    call_command("find_duplicate_assets", "--owner", user.username)
+    out = capsys.readouterr().out
+    assert "Theirs" in out and "Found 1 duplicated digests." in out
@@ -0,0 +1,118 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.facets import AssetFilter, asset_facets, filter_assets
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.synthetic import generate_catalog
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def catalog(user, other_user):
+    specs = [
+        ("Slow", "MU", 72, -18.2, 200, ["chill", "piano"]),
+        ("Mid", "MU", 118, -14.4, 150, ["chill"]),
+        ("Fast", "MU", 124, -13.6, 95, ["upbeat"]),
+        ("Whoosh", "SFX", None, -20.0, 2, []),
+    ]
+    assets = {}
+    for title, asset_type, bpm, loudness, duration, tags in specs:
+        asset = AudioAsset.objects.create(
+            owner=user,
+            title=title,
+            asset_type=asset_type,
+            bpm=bpm,
+            loudness=loudness,
+            duration=duration,
+        )
+        asset.tags.add(*tags)
+        assets[title] = asset
+    AudioAsset.objects.create(owner=other_user, title="Theirs", bpm=120)
+    return assets
+
+
+def titles(queryset):
+    return sorted(queryset.values_list("title", flat=True))
+
+
+def test_filter_assets(user, catalog):
+    mine = AudioAsset.objects.for_user(user)
+    assert titles(filter_assets(mine, AssetFilter(bpm_min=110, bpm_max=130))) == [
+        "Fast",
+        "Mid",
+    ]
+    assert titles(filter_assets(mine, AssetFilter(loudness_target=-14))) == [
+        "Fast",
+        "Mid",
+    ]
+    assert titles(filter_assets(mine, AssetFilter(duration_max=100))) == [
+        "Fast",
+        "Whoosh",
+    ]
+    assert titles(filter_assets(mine, AssetFilter(tags=["chill", "piano"]))) == ["Slow"]
+    assert titles(filter_assets(mine, AssetFilter(asset_types=["SFX"]))) == ["Whoosh"]
+
+
+def test_facet_counts(user, catalog, django_assert_max_num_queries):
+    with django_assert_max_num_queries(7):
+        facets = asset_facets(user)
+    assert facets["count"] == 4
+    assert facets["asset_type"] == [
+        {"value": "MU", "count": 3},
+        {"value": "SFX", "count": 1},
+    ]
+    assert facets["bpm"] == [
+        {"min": 70, "max": 80, "count": 1},
+        {"min": 110, "max": 120, "count": 1},
+        {"min": 120, "max": 130, "count": 1},
+    ]
+    assert [bucket["min"] for bucket in facets["loudness"]] == [-20, -19, -15, -14]
+    assert facets["duration"] == [
+        {"min": 0, "max": 30, "count": 1},
+        {"min": 60, "max": 120, "count": 1},
+        {"min": 120, "max": 180, "count": 1},
+        {"min": 180, "max": 300, "count": 1},
+    ]
+    assert facets["tags"] == [
+        {"value": "chill", "count": 2},
+        {"value": "piano", "count": 1},
+        {"value": "upbeat", "count": 1},
+    ]
+    filtered = asset_facets(user, AssetFilter(tags=["chill"]))
+    assert filtered["count"] == 2
+    assert filtered["tags"][0] == {"value": "chill", "count": 2}
+
+
+def test_facets_are_cached_until_assets_change(
+    user, catalog, django_assert_num_queries
+):
+    asset_facets(user)
+    with django_assert_num_queries(0):
+        assert asset_facets(user)["count"] == 4
+    catalog["Whoosh"].tags.add("transition")
+    assert {"value": "transition", "count": 1} in asset_facets(user)["tags"]
+    catalog["Whoosh"].delete()
+    assert asset_facets(user)["count"] == 3
+    generate_catalog(user, 5)
+    assert asset_facets(user)["count"] == 8
+
+
+def test_facets_api(user, catalog):
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get(
+        reverse("audio_asset_manager:audioasset-facets"), {"asset_type": "MU"}
+    )
+    assert response.status_code == 200
+    assert response.data["count"] == 3
+    response = client.get(
+        reverse("audio_asset_manager:audioasset-list"),
+        {"tag": ["chill", "piano"], "bpm_max": 100},
+    )
+    assert [asset["title"] for asset in response.data["results"]] == ["Slow"]
+    response = client.get(
+        reverse("audio_asset_manager:audioasset-list"), {"bpm_min": 130, "bpm_max": 90}
+    )
+    assert response.status_code == 400
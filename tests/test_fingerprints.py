@@ -0,0 +1,117 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.models import AssetFingerprint, AudioAsset, FingerprintHash
+from audio_asset_manager.scanner import scan_library
+
+np = pytest.importorskip("numpy")
+
+from audio_asset_manager.fingerprints import (  # noqa: E402
+    FINGERPRINT_SIZE,
+    find_similar_clusters,
+    fingerprint_assets,
+    fingerprint_file,
+    similar_assets,
+    stale_fingerprints,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def melody(seed, seconds, rate=22050, note_seconds=0.25):
+    rng = np.random.default_rng(seed)
+    notes = []
+    for frequency in rng.uniform(200, 3000, int(seconds / note_seconds)):
+        t = np.arange(int(note_seconds * rate)) / rate
+        notes.append(0.5 * np.sin(2 * np.pi * frequency * t) * np.hanning(len(t)))
+    return np.concatenate(notes)
+
+
+@pytest.fixture
+def library(tmp_path, write_wave):
+    track = melody(1, 20)
+    write_wave(tmp_path / "track.wav", track, 22050)
+    # The same track resampled, quieter, slightly noisy, and with another tail.
+    rate = 16000
+    positions = np.arange(int(len(track) * rate / 22050)) * 22050 / rate
+    resampled = np.interp(positions, np.arange(len(track)), track) * 0.6
+    noise = np.random.default_rng(5).normal(0, 0.002, len(resampled))
+    tail = melody(3, 5, rate=rate)
+    write_wave(
+        tmp_path / "track (radio edit).wav",
+        np.concatenate([resampled + noise, tail]),
+        rate,
+    )
+    write_wave(tmp_path / "other.wav", melody(2, 20), 22050)
+    return tmp_path
+
+
+def test_fingerprint_file(library):
+    values = fingerprint_file(library / "track.wav")
+    assert len(values) == FINGERPRINT_SIZE
+    assert values == sorted(set(values))
+    assert fingerprint_file(library / "track.wav") == values
+
+
+def test_near_duplicates_are_matched(library, user, other_user):
+    scan_library(library, user, workers=1)
+    assert stale_fingerprints(AudioAsset.objects.all()).count() == 3
+    result = fingerprint_assets(AudioAsset.objects.all(), workers=1)
+    assert result.fingerprinted == 3
+    assert FingerprintHash.objects.count() == 3 * FINGERPRINT_SIZE
+    assert stale_fingerprints(AudioAsset.objects.all()).count() == 0
+
+    track = AudioAsset.objects.get(title="track")
+    edit = AudioAsset.objects.get(title="track (radio edit)")
+    matches = similar_assets(track)
+    assert [asset for asset, _similarity in matches] == [edit]
+    assert matches[0][1] > 0.5
+    assert similar_assets(track, AudioAsset.objects.filter(owner=other_user)) == []
+    assert [set(cluster) for cluster in find_similar_clusters()] == [{track, edit}]
+
+
+def test_corrupt_files_are_counted_as_errors(library, user, monkeypatch):
+    scan_library(library, user, workers=1)
+
+    def decode(path, **kwargs):
+        if path.endswith("other.wav"):
+            raise RuntimeError("Error in file: unexpected end of data.")
+        return real_fingerprint_file(path, **kwargs)
+
+    real_fingerprint_file = fingerprint_file
+    monkeypatch.setattr("audio_asset_manager.fingerprints.fingerprint_file", decode)
+    result = fingerprint_assets(AudioAsset.objects.all(), workers=1)
+    assert (result.fingerprinted, result.errors) == (2, 1)
+    assert list(
+        stale_fingerprints(AudioAsset.objects.all()).values_list("title", flat=True)
+    ) == ["other"]
+
+
+def test_fingerprints_follow_digest_changes(library, user):
+    scan_library(library, user, workers=1)
+    fingerprint_assets(AudioAsset.objects.all(), workers=1)
+    AudioAsset.objects.filter(title="other").update(digest="changed")
+    stale = stale_fingerprints(AudioAsset.objects.all())
+    assert list(stale.values_list("title", flat=True)) == ["other"]
+    fingerprint_assets(stale, workers=1)
+    assert AssetFingerprint.objects.get(asset__title="other").digest == "changed"
+    assert FingerprintHash.objects.count() == 3 * FINGERPRINT_SIZE
+
+
+def test_similar_assets_api_and_command(library, user, other_user, capsys):
+    scan_library(library, user, workers=1)
+    call_command("fingerprint_audio_assets", "--workers", "1")
+    call_command("find_similar_assets", "--owner", user.username)
+    assert "Found 1 clusters of similar assets." in capsys.readouterr().out
+
+    track = AudioAsset.objects.get(title="track")
+    url = reverse("audio_asset_manager:audioasset-similar", args=[track.pk])
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert [match["title"] for match in response.data] == ["track (radio edit)"]
+    client.force_authenticate(other_user)
+    assert client.get(url).status_code == 404
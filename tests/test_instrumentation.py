@@ -0,0 +1,123 @@
+import logging
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.instrumentation import (
+    ADMIN,
+    API,
+    BULK,
+    COMMAND,
+    instrument,
+    metrics,
+    render_prometheus,
+)
+from audio_asset_manager.synthetic import generate_catalog
+from audio_asset_manager.testing import QueryBudgetExceeded
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_instrument_records_queries_and_time(user, caplog):
+    with caplog.at_level(logging.INFO, "audio_asset_manager.instrumentation"):
+        with instrument("probe") as stats:
+            get_user_model().objects.count()
+            get_user_model().objects.count()
+    assert stats.queries == 2
+    assert 0 < stats.db_time <= stats.wall_time
+    series = metrics.snapshot()[(BULK, "probe")]
+    assert (series["count"], series["queries"], series["errors"]) == (1, 2, 0)
+    (log,) = caplog.records
+    assert "name=probe kind=bulk queries=2" in log.getMessage()
+    assert log.operation["queries"] == 2
+
+    with pytest.raises(ZeroDivisionError):
+        with instrument("probe"):
+            1 / 0
+    assert metrics.snapshot()[(BULK, "probe")]["errors"] == 1
+
+
+def test_instrumentation_can_be_turned_off(user, settings):
+    settings.AUDIO_ASSET_MANAGER_INSTRUMENTATION = False
+    with instrument("probe") as stats:
+        get_user_model().objects.count()
+    generate_catalog(user, 2)
+    assert stats.queries == 0
+    assert metrics.snapshot() == {}
+
+
+def test_entry_points_are_recorded(client, user):
+    client.force_login(user)
+    assert client.get(reverse("audio_asset_manager:audioasset-list")).status_code == 200
+    user.is_staff = user.is_superuser = True
+    user.save()
+    url = reverse("admin:audio_asset_manager_audioasset_changelist")
+    assert client.get(url).status_code == 200
+    # Views outside the app aren't recorded.
+    client.get(reverse("admin:index"))
+    generate_catalog(user, 3)
+    call_command("rebuild_asset_aggregates")
+    recorded = metrics.snapshot()
+    assert set(recorded) == {
+        (API, "audio_asset_manager:audioasset-list"),
+        (ADMIN, "audio_asset_manager_audioasset_changelist"),
+        (BULK, "generate_catalog"),
+        (COMMAND, "rebuild_asset_aggregates"),
+        (BULK, "rebuild_aggregates"),
+    }
+    for series in recorded.values():
+        assert series["count"] == 1
+        assert series["queries"] > 0
+
+
+def test_prometheus_endpoint(user, settings):
+    with instrument('odd "name"'):
+        pass
+    text = render_prometheus()
+    labels = 'kind="bulk",operation="odd \\"name\\""'
+    assert f"audio_asset_manager_operations_total{{{labels}}} 1" in text
+    assert f"audio_asset_manager_operation_queries_total{{{labels}}} 0" in text
+    assert (
+        f'audio_asset_manager_operation_duration_seconds_bucket{{{labels},le="+Inf"}} 1'
+        in text
+    )
+
+    url = reverse("audio_asset_manager:metrics")
+    client = APIClient()
+    assert client.get(url).status_code == 403
+    client.force_login(user)
+    assert client.get(url).status_code == 403
+    user.is_staff = True
+    user.save()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert b"audio_asset_manager_operations_total" in response.content
+
+    settings.AUDIO_ASSET_MANAGER_METRICS_TOKEN = "s3cret"
+    anonymous = APIClient()
+    assert anonymous.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code == 403
+    assert anonymous.get(url, HTTP_AUTHORIZATION="Bearer s3cret").status_code == 200
+
+
+def test_query_budget(user, query_budget):
+    with query_budget(1) as stats:
+        get_user_model().objects.count()
+    assert stats.queries == 1
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with query_budget(1, "two counts"):
+            get_user_model().objects.count()
+            get_user_model().objects.filter(pk=user.pk).exists()
+    message = str(error.value)
+    assert message.startswith("two counts made 2 queries, over its budget of 1:")
+    assert "2. SELECT" in message
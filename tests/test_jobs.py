@@ -0,0 +1,172 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from audio_asset_manager import jobs
+from audio_asset_manager.models import AudioAsset, Job
+from audio_asset_manager.transfer import export_catalog
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def counting_job():
+    calls = []
+
+    @jobs.register_job("count")
+    def count(job, progress):
+        if job.params.get("fail"):
+            raise RuntimeError("boom")
+        for i in range(job.params["to"]):
+            progress(i + 1, job.params["to"])
+        calls.append(job.pk)
+        return {"counted": job.params["to"]}
+
+    yield calls
+    del jobs._handlers["count"]
+
+
+def test_enqueue_rejects_unknown_kinds(user):
+    with pytest.raises(jobs.JobError):
+        jobs.enqueue(user, "nope")
+
+
+def test_enqueue_validates_params(user, settings):
+    settings.AUDIO_ASSET_MANAGER_JOB_MAX_WORKERS = 4
+    job = jobs.enqueue(user, "analyze", ids=["3"], workers=4)
+    assert job.params == {"ids": [3], "workers": 4, "force": False}
+    for kind, params in [
+        ("analyze", {"workers": 5}),
+        ("fingerprint", {"workers": 0}),
+        ("scan", {}),
+        ("import", {"path": "catalog.xml", "file_format": "xml"}),
+    ]:
+        with pytest.raises(jobs.JobError, match="Invalid parameters"):
+            jobs.enqueue(user, kind, **params)
+
+
+def test_requeued_jobs_keep_their_new_worker(user):
+    @jobs.register_job("lost")
+    def lost(job, progress):
+        # Meanwhile the job was requeued and claimed by another worker.
+        Job.objects.filter(pk=job.pk).update(worker="b", progress_current=1)
+        progress(5, 10)
+        return "done"
+
+    try:
+        job = jobs.enqueue(user, "lost")
+        jobs.claim_jobs(1, "a")
+        assert jobs.execute_job(job.pk) == Job.Statuses.RUNNING
+    finally:
+        del jobs._handlers["lost"]
+    job.refresh_from_db()
+    assert (job.status, job.worker, job.result) == (Job.Statuses.RUNNING, "b", None)
+    assert job.progress_current == 1
+
+
+def test_claimed_jobs_are_not_claimed_again(user, counting_job):
+    first = jobs.enqueue(user, "count", to=1)
+    second = jobs.enqueue(user, "count", to=1)
+    assert [job.pk for job in jobs.claim_jobs(1, "a")] == [first.pk]
+    assert [job.pk for job in jobs.claim_jobs(5, "b")] == [second.pk]
+    assert jobs.claim_jobs(5, "c") == []
+    first.refresh_from_db()
+    assert first.status == Job.Statuses.RUNNING
+    assert first.worker == "a"
+    assert first.attempts == 1
+
+
+def test_worker_runs_jobs_and_records_results(user, counting_job):
+    done = jobs.enqueue(user, "count", to=3)
+    failed = jobs.enqueue(user, "count", fail=True)
+    assert jobs.run_worker(once=True) == 2
+    done.refresh_from_db()
+    assert done.status == Job.Statuses.SUCCEEDED
+    assert done.result == {"counted": 3}
+    assert (done.progress_current, done.progress_total) == (1, 3)
+    assert done.progress == 1.0
+    failed.refresh_from_db()
+    assert failed.status == Job.Statuses.FAILED
+    assert "RuntimeError: boom" in failed.error
+    assert failed.finished_at is not None
+
+
+def test_worker_only_runs_requested_kinds(user, counting_job):
+    jobs.enqueue(user, "count", to=1)
+    other = jobs.enqueue(user, "analyze")
+    call_command("run_job_worker", "--once", "--kind", "count")
+    assert len(counting_job) == 1
+    other.refresh_from_db()
+    assert other.status == Job.Statuses.PENDING
+
+
+def test_stale_jobs_are_requeued_then_failed(user, counting_job, settings):
+    settings.AUDIO_ASSET_MANAGER_JOB_MAX_ATTEMPTS = 2
+    job = jobs.enqueue(user, "count", to=1)
+    for status in (Job.Statuses.PENDING, Job.Statuses.FAILED):
+        jobs.claim_jobs(1, "lost")
+        Job.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        assert jobs.requeue_stale_jobs() == 1
+        job.refresh_from_db()
+        assert job.status == status
+
+
+def test_scan_and_import_jobs(tmp_path, user, other_user):
+    (tmp_path / "kick.wav").write_bytes(b"kick" * 100)
+    scan = jobs.enqueue(user, "scan", path=str(tmp_path))
+    jobs.run_worker(once=True)
+    scan.refresh_from_db()
+    assert scan.status == Job.Statuses.SUCCEEDED, scan.error
+    assert scan.result["created"] == 1
+
+    path = tmp_path / "catalog.jsonl"
+    path.write_text(
+        "".join(export_catalog(AudioAsset.objects.filter(owner=user), "jsonl"))
+    )
+    job = jobs.enqueue(other_user, "import", path=str(path))
+    jobs.run_worker(once=True)
+    job.refresh_from_db()
+    assert job.status == Job.Statuses.SUCCEEDED, job.error
+    assert job.result == {"created": 1, "skipped": 0}
+    assert AudioAsset.objects.filter(owner=other_user, title="kick").exists()
+
+
+def test_job_api(api_client, user, other_user, counting_job):
+    url = reverse("audio_asset_manager:job-list")
+    response = api_client.post(
+        url, {"kind": "count", "params": {"to": 2}}, format="json"
+    )
+    assert response.status_code == 201
+    assert response.data["status"] == Job.Statuses.PENDING
+    detail = reverse("audio_asset_manager:job-detail", args=[response.data["id"]])
+    jobs.run_worker(once=True)
+    response = api_client.get(detail)
+    assert response.data["status"] == Job.Statuses.SUCCEEDED
+    assert response.data["progress"] == 1.0
+    assert response.data["result"] == {"counted": 2}
+
+    other = APIClient()
+    other.force_authenticate(other_user)
+    assert other.get(detail).status_code == 404
+    assert api_client.post(url, {"kind": "nope"}, format="json").status_code == 400
+    response = api_client.post(
+        url, {"kind": "analyze", "params": {"workers": 10**6}}, format="json"
+    )
+    assert response.status_code == 400
+    assert "workers" in response.json()["params"]
+    assert api_client.delete(detail).status_code == 405
+
+
+def test_job_api_restricts_server_paths_to_staff(api_client, user):
+    url = reverse("audio_asset_manager:job-list")
+    data = {"kind": "scan", "params": {"path": "/"}}
+    assert api_client.post(url, data, format="json").status_code == 403
+    user.is_staff = True
+    user.save()
+    assert api_client.post(url, data, format="json").status_code == 201
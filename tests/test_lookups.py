@@ -0,0 +1,91 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.lookups import (
+    asset_sources,
+    attach_sources,
+    invalidate_lookups,
+    license_types,
+)
+from audio_asset_manager.models import Artist, AssetSource, AudioAsset, LicenseType
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def source(user):
+    license_type = LicenseType.objects.create(name="CC-BY")
+    return AssetSource.objects.create(
+        owner=user, name="Audiio", license_type=license_type
+    )
+
+
+def test_lookups_are_cached(source, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        assert asset_sources.get(source.pk).name == "Audiio"
+    with django_assert_num_queries(0):
+        found = asset_sources.get_many([source.pk, None])
+    assert list(found) == [source.pk]
+    # Copies: changing one doesn't change the cached row.
+    found[source.pk].name = "Changed"
+    assert asset_sources.get(source.pk).name == "Audiio"
+    # Other processes fill their LRU from the shared cache.
+    asset_sources._local.clear()
+    with django_assert_num_queries(0):
+        assert asset_sources.get(source.pk).name == "Audiio"
+    # Losing the shared cache loses the version, and with it the LRU.
+    cache.clear()
+    with django_assert_num_queries(1):
+        assert asset_sources.get(source.pk).name == "Audiio"
+
+
+def test_signals_invalidate(source):
+    license_type = source.license_type
+    assert license_types.get(license_type.pk).name == "CC-BY"
+    license_type.name = "CC-BY 4.0"
+    license_type.save()
+    assert license_types.get(license_type.pk).name == "CC-BY 4.0"
+    assert asset_sources.get(source.pk).license_type_id == license_type.pk
+    license_type.delete()
+    assert license_types.get(license_type.pk) is None
+    assert asset_sources.get(source.pk).license_type_id is None
+    AssetSource.objects.filter(pk=source.pk).update(name="Renamed")
+    assert asset_sources.get(source.pk).name == "Audiio"
+    invalidate_lookups(AssetSource)
+    assert asset_sources.get(source.pk).name == "Renamed"
+
+
+def test_attach_sources(source, user, django_assert_num_queries):
+    AudioAsset.objects.create(owner=user, title="One", source=source)
+    AudioAsset.objects.create(owner=user, title="Two")
+    assets = list(AudioAsset.objects.order_by("pk"))
+    with django_assert_num_queries(2):
+        attach_sources(assets)
+    with django_assert_num_queries(0):
+        assert assets[0].source.license_type.name == "CC-BY"
+        assert assets[1].source is None
+
+
+def test_api_validates_sources_from_cache(source, user, other_user):
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse("audio_asset_manager:audioasset-list")
+    response = client.post(url, {"title": "Mine", "source": source.pk})
+    assert response.status_code == 201
+    assert response.data["license_type_name"] == "CC-BY"
+    for value in (0, "x"):
+        response = client.post(url, {"title": "Missing", "source": value})
+        assert response.status_code == 400
+    client.force_authenticate(other_user)
+    response = client.post(url, {"title": "Theirs", "source": source.pk})
+    assert response.status_code == 400
+
+    # Superusers get the same answer from the cache as from a query.
+    other_user.is_superuser = other_user.is_staff = True
+    other_user.save()
+    artist = Artist.objects.create(owner=user, name="Kai Engel")
+    for field, value in (("source", source.pk), ("artist", artist.pk)):
+        response = client.post(url, {"title": "Theirs", field: value})
+        assert response.status_code == 400, field
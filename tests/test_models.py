@@ -1,5 +1,31 @@
 # Add tests for your models here.
+import pytest
+from django.contrib.auth.models import AnonymousUser
+
+from audio_asset_manager.models import Artist, AudioAsset
 
 
 def test_my_fave_model():
     assert True
+
+
+@pytest.mark.django_db
+def test_for_user_filters_by_owner(user, other_user, django_assert_num_queries):
+    mine = AudioAsset.objects.create(owner=user, title="Mine")
+    AudioAsset.objects.create(owner=other_user, title="Theirs")
+    Artist.objects.create(owner=other_user, name="Theirs")
+    with django_assert_num_queries(1):
+        assert list(AudioAsset.objects.for_user(user)) == [mine]
+    assert not Artist.objects.for_user(user).exists()
+    assert not AudioAsset.objects.for_user(AnonymousUser()).exists()
+
+
+@pytest.mark.django_db
+def test_owner_permissions_do_not_load_owner(
+    user, other_user, django_assert_num_queries
+):
+    asset = AudioAsset.objects.create(owner=user, title="Mine")
+    asset = AudioAsset.objects.get(pk=asset.pk)
+    with django_assert_num_queries(0):
+        assert user.has_perm("audio_asset_manager.change_audioasset", asset)
+        assert not other_user.has_perm("audio_asset_manager.change_audioasset", asset)
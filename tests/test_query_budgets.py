@@ -0,0 +1,50 @@
+"""
+Query budgets for the API's read endpoints.
+
+Each endpoint is requested against a catalog with many rows per page, so a
+query per row would blow its budget.
+"""
+import pytest
+from django.urls import reverse
+
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.synthetic import generate_catalog
+
+pytestmark = pytest.mark.django_db
+
+BUDGETS = [
+    ("audioasset-list", {}, 4),
+    ("audioasset-list", {"tag_query": "ambient OR piano"}, 5),
+    ("audioasset-search", {"q": "night"}, 6),
+    ("audioasset-facets", {}, 2),
+    ("audioasset-credits", None, 3),
+    ("audioasset-detail", None, 6),
+    ("assetsource-list", {}, 3),
+    ("artist-list", {}, 3),
+    ("collection-list", {}, 3),
+    ("production-list", {}, 3),
+    ("licensetype-list", {}, 3),
+]
+
+
+@pytest.fixture(autouse=True)
+def catalog(user):
+    generate_catalog(user, 40, sources=4, max_tags=4)
+
+
+@pytest.mark.parametrize("view,params,budget", BUDGETS)
+def test_endpoint_query_budget(api_client, user, query_budget, view, params, budget):
+    assets = AudioAsset.objects.for_user(user).order_by("pk")
+    args = []
+    if view == "audioasset-detail":
+        args = [assets.first().pk]
+    elif view == "audioasset-credits":
+        params = {
+            "ids": ",".join(str(pk) for pk in assets.values_list("pk", flat=True))
+        }
+    url = reverse(f"audio_asset_manager:{view}", args=args)
+    # Warm the lookup cache, which a running site would have done.
+    assert api_client.get(url, params).status_code == 200
+    with query_budget(budget, view):
+        response = api_client.get(url, params)
+    assert response.status_code == 200
@@ -0,0 +1,128 @@
+import hashlib
+
+import pytest
+from django.core.management import call_command
+
+from audio_asset_manager.models import AudioAsset, ScanIndexEntry
+from audio_asset_manager.scanner import hash_file, iter_audio_files, scan_library
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def library(tmp_path):
+    (tmp_path / "drums").mkdir()
+    (tmp_path / "drums" / "kick.wav").write_bytes(b"kick" * 1000)
+    (tmp_path / "drums" / "snare.flac").write_bytes(b"snare" * 1000)
+    (tmp_path / "pad.WAV").write_bytes(b"pad" * 1000)
+    (tmp_path / "pad copy.wav").write_bytes(b"pad" * 1000)
+    (tmp_path / "notes.txt").write_text("not audio")
+    return tmp_path
+
+
+def test_hash_file_matches_hashlib(tmp_path):
+    path = tmp_path / "file.wav"
+    data = bytes(range(256)) * 100
+    path.write_bytes(data)
+    assert hash_file(path, chunk_size=7) == hashlib.sha1(data).hexdigest()  # nosec
+
+
+def test_iter_audio_files_filters_extensions(library):
+    names = sorted(p.rsplit("/", 1)[1] for p, _stat in iter_audio_files(library))
+    assert names == ["kick.wav", "pad copy.wav", "pad.WAV", "snare.flac"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_scan_library_creates_assets(library, user, workers):
+    result = scan_library(library, user, workers=workers, batch_size=2)
+    assert result.scanned == 4
+    assert result.created == 3
+    assert result.skipped == 1
+    assert AudioAsset.objects.filter(owner=user).count() == 3
+    kick = AudioAsset.objects.get(title="kick")
+    assert kick.filename == "drums/kick.wav"
+    assert kick.digest == hashlib.sha1(b"kick" * 1000).hexdigest()  # nosec
+
+
+def test_scan_skips_digests_added_without_index(library, user):
+    scan_library(library, user, workers=1)
+    ScanIndexEntry.objects.all().delete()
+    result = scan_library(library, user, workers=1)
+    assert result.created == 0
+    assert result.skipped == 4
+    assert ScanIndexEntry.objects.filter(owner=user).count() == 4
+
+
+def test_scan_command(library, user):
+    call_command("scan_audio_library", str(library), owner=user.username, workers=1)
+    assert AudioAsset.objects.filter(owner=user).count() == 3
+
+
+def test_rescan_does_not_read_unchanged_files(library, user, monkeypatch):
+    scan_library(library, user, workers=1)
+    assert ScanIndexEntry.objects.filter(owner=user).count() == 4
+
+    def fail(*args, **kwargs):  # pragma: nocover
+        raise AssertionError("Unchanged files should not be hashed.")
+
+    monkeypatch.setattr("audio_asset_manager.scanner.hash_file", fail)
+    result = scan_library(library, user, workers=1)
+    assert result.unchanged == 4
+    assert result.created == 0
+
+
+def test_rescan_detects_renames(library, user):
+    scan_library(library, user, workers=1)
+    kick = AudioAsset.objects.get(title="kick")
+    (library / "drums" / "kick.wav").rename(library / "kick-renamed.wav")
+    result = scan_library(library, user, workers=1)
+    assert result.renamed == 1
+    assert result.created == 0
+    assert result.missing == 0
+    kick.refresh_from_db()
+    assert kick.filename == "kick-renamed.wav"
+    assert AudioAsset.objects.filter(owner=user).count() == 3
+    assert kick.scan_entries.get().path == str(library / "kick-renamed.wav")
+
+
+def test_rescan_updates_changed_and_deleted_files(library, user):
+    scan_library(library, user, workers=1)
+    snare = AudioAsset.objects.get(title="snare")
+    (library / "drums" / "snare.flac").write_bytes(b"new snare" * 1000)
+    (library / "drums" / "kick.wav").unlink()
+    result = scan_library(library, user, workers=1)
+    assert result.updated == 1
+    assert result.missing == 1
+    snare.refresh_from_db()
+    assert snare.digest == hashlib.sha1(b"new snare" * 1000).hexdigest()  # nosec
+    assert ScanIndexEntry.objects.filter(owner=user).count() == 3
+    assert AudioAsset.objects.filter(owner=user).count() == 3
+
+
+def test_scan_keeps_entries_of_unreadable_files(library, user, monkeypatch):
+    scan_library(library, user, workers=1)
+    (library / "drums" / "snare.flac").write_bytes(b"new snare" * 1000)
+
+    def locked(path, **kwargs):
+        if path.endswith("snare.flac"):
+            raise OSError("The file is locked.")
+        return hash_file(path, **kwargs)
+
+    monkeypatch.setattr("audio_asset_manager.scanner.hash_file", locked)
+    result = scan_library(library, user, workers=1)
+    assert result.errors == 1
+    assert result.missing == 0
+    assert ScanIndexEntry.objects.filter(path__endswith="snare.flac").exists()
+
+
+def test_interrupted_scan_keeps_written_batches(library, user, monkeypatch):
+    def crash(path, **kwargs):
+        if path.endswith("kick.wav"):
+            raise RuntimeError("The scan was interrupted.")
+        return hash_file(path, **kwargs)
+
+    monkeypatch.setattr("audio_asset_manager.scanner.hash_file", crash)
+    with pytest.raises(RuntimeError):
+        scan_library(library, user, workers=1, batch_size=1)
+    assert AudioAsset.objects.filter(owner=user, title__startswith="pad").exists()
+    assert ScanIndexEntry.objects.filter(owner=user).count() == 2
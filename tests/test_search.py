@@ -0,0 +1,124 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.models import (
+    Artist,
+    AssetSearchDocument,
+    AssetSource,
+    AudioAsset,
+    Collection,
+)
+from audio_asset_manager.search import search_assets, search_terms
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def catalog(user, other_user):
+    artist = Artist.objects.create(owner=user, name="Midnight Drive")
+    collection = Collection.objects.create(
+        owner=user, title="Neon Nights", album_artist=artist
+    )
+    rain = AudioAsset.objects.create(owner=user, title="Rain on Glass")
+    rain.tags.add("weather", "ambient")
+    highway = AudioAsset.objects.create(
+        owner=user, title="Highway", artist=artist, collection=collection
+    )
+    highway.tags.add("synthwave")
+    neon = AudioAsset.objects.create(owner=user, title="Neon Rain", artist=artist)
+    AudioAsset.objects.create(owner=other_user, title="Rain Forest")
+    return {"rain": rain, "highway": highway, "neon": neon, "artist": artist}
+
+
+def test_search_terms_drop_query_syntax():
+    assert search_terms('Rain* OR "glass" -NEAR(x)') == [
+        "rain",
+        "or",
+        "glass",
+        "near",
+        "x",
+    ]
+
+
+def test_search_ranks_title_matches_first(user, catalog):
+    results = search_assets(user, "neon")
+    assert results.count() == 2
+    assert [asset.title for asset in results[:10]] == ["Neon Rain", "Highway"]
+
+
+def test_search_matches_prefixes_credits_and_tags(user, catalog):
+    assert [asset.title for asset in search_assets(user, "midn hig")[:10]] == [
+        "Highway"
+    ]
+    assert [asset.title for asset in search_assets(user, "synth")[:10]] == ["Highway"]
+
+
+def test_search_is_limited_to_owner(user, other_user, catalog):
+    assert [asset.title for asset in search_assets(other_user, "rain")[:10]] == [
+        "Rain Forest"
+    ]
+    assert search_assets(user, "forest").count() == 0
+    assert search_assets(user, "  ").count() == 0
+
+
+def test_search_is_limited_to_queryset(user, catalog):
+    # The filter applies before the page is taken, so pages aren't short.
+    results = search_assets(
+        user, "rain", AudioAsset.objects.filter(title__startswith="Neon")
+    )
+    assert results.count() == 1
+    assert [asset.title for asset in results[:1]] == ["Neon Rain"]
+
+
+def test_search_documents_follow_changes(user, catalog):
+    catalog["artist"].name = "Daybreak"
+    catalog["artist"].save()
+    assert search_assets(user, "midnight").count() == 0
+    assert search_assets(user, "daybreak").count() == 2
+    catalog["rain"].tags.remove("weather")
+    assert search_assets(user, "weather").count() == 0
+    catalog["neon"].delete()
+    assert search_assets(user, "rain").count() == 1
+
+
+def test_search_documents_follow_deleted_credits(user, catalog):
+    source = AssetSource.objects.create(owner=user, name="Stock House")
+    catalog["rain"].source = source
+    catalog["rain"].save()
+    assert search_assets(user, "stock").count() == 1
+    source.delete()
+    assert search_assets(user, "stock").count() == 0
+    assert search_assets(user, "rain").count() == 2
+
+    # The album artist's collection goes with them, and so does their asset.
+    other = Artist.objects.create(owner=user, name="Session Band")
+    catalog["highway"].artist = other
+    catalog["highway"].save()
+    catalog["artist"].delete()
+    assert search_assets(user, "neon").count() == 0
+    assert [asset.title for asset in search_assets(user, "session")[:10]] == ["Highway"]
+
+    # Everything goes, whatever order the owner's records are deleted in.
+    user.delete()
+    assert not AssetSearchDocument.objects.filter(owner_id=user.pk).exists()
+
+
+def test_rebuild_search_index(user, catalog):
+    AssetSearchDocument.objects.all().delete()
+    assert search_assets(user, "rain").count() == 0
+    call_command("rebuild_search_index")
+    assert search_assets(user, "rain").count() == 2
+
+
+def test_search_api(user, catalog, django_assert_max_num_queries):
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse("audio_asset_manager:audioasset-search")
+    with django_assert_max_num_queries(6):
+        response = client.get(url, {"q": "neon", "page_size": 1})
+    assert response.status_code == 200
+    assert response.data["count"] == 2
+    assert [asset["title"] for asset in response.data["results"]] == ["Neon Rain"]
+    assert response.data["next"]
@@ -0,0 +1,142 @@
+import os
+import struct
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.archive import retire_assets
+from audio_asset_manager.models import AssetFeatures, AudioAsset
+
+np = pytest.importorskip("numpy")
+
+from audio_asset_manager.similarity import (  # noqa: E402
+    DIMENSIONS,
+    SimilarityIndex,
+    clear_indexes,
+    find_alternatives,
+    get_index,
+    index_path,
+    rebuild_similarity_index,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes(media_root):
+    clear_indexes()
+    yield
+    clear_indexes()
+
+
+def create(owner, title, tags=(), **fields):
+    fields = {"bpm": 120, "loudness": -14, "duration": 180, **fields}
+    asset = AudioAsset.objects.create(owner=owner, title=title, **fields)
+    asset.tags.add(*tags)
+    return asset
+
+
+@pytest.fixture
+def catalog(user, other_user):
+    return {
+        "pulled": create(user, "Pulled", ["ambient", "calm"]),
+        "close": create(user, "Close", ["ambient", "calm"], bpm=124, duration=170),
+        "faster": create(user, "Faster", ["ambient", "calm"], bpm=170),
+        "retagged": create(user, "Retagged", ["rock", "drums"]),
+        "effect": create(user, "Door", ["door"], asset_type="sfx", duration=2),
+        "theirs": create(other_user, "Theirs", ["ambient", "calm"]),
+    }
+
+
+def vector(asset):
+    return struct.unpack(
+        f"<{DIMENSIONS}f", AssetFeatures.objects.get(asset=asset).vector
+    )
+
+
+def test_vectors_follow_assets(catalog):
+    pulled = catalog["pulled"]
+    assert AssetFeatures.objects.count() == 6
+    before = vector(pulled)
+    pulled.tags.add("piano")
+    tagged = vector(pulled)
+    assert tagged != before
+    pulled.bpm = 90
+    pulled.save()
+    assert vector(pulled)[0] < tagged[0]
+    assert vector(catalog["close"]) == vector(
+        create(pulled.owner, "Copy", ["ambient", "calm"], bpm=124, duration=170)
+    )
+
+
+def test_alternatives_are_nearest_first(user, catalog):
+    matches = find_alternatives(catalog["pulled"], limit=10)
+    assert [asset.title for asset, _distance in matches] == [
+        "Close",
+        "Faster",
+        "Retagged",
+        "Door",
+    ]
+    distances = [distance for _asset, distance in matches]
+    assert distances == sorted(distances) and distances[0] > 0
+    assert len(find_alternatives(catalog["pulled"], limit=2)) == 2
+
+
+def test_removed_assets_drop_out(user, catalog):
+    find_alternatives(catalog["pulled"])
+    catalog["close"].delete()
+    retire_assets(AudioAsset.objects.filter(pk=catalog["faster"].pk))
+    matches = find_alternatives(catalog["pulled"], limit=2)
+    assert [asset.title for asset, _distance in matches] == ["Retagged", "Door"]
+    index = get_index(user.pk)
+    assert np.isinf(index.norms[: index.size]).sum() == 2
+
+
+def test_index_is_saved_and_caught_up(user, catalog):
+    assert rebuild_similarity_index([user.pk]).vectors == 5
+    assert os.path.exists(index_path(user.pk))
+
+    clear_indexes()
+    index = SimilarityIndex.load(user.pk)
+    assert isinstance(index.vectors, np.memmap)
+    assert index.size == 5
+    create(user, "Later", ["ambient", "calm"], bpm=121)
+    assert index.sync() == 1
+    assert index.sync() == 0
+    assert index.size == 6
+    matches = index.search(np.asarray(index.vectors[0]), 2, exclude=None)
+    assert matches[0] == (int(index.rows["id"][0]), 0.0)
+
+    # Files saved with another layout are ignored.
+    np.save(index_path(user.pk), np.zeros((5, DIMENSIONS + 1), "<f4"))
+    assert SimilarityIndex.load(user.pk).size == 0
+    clear_indexes()
+    assert find_alternatives(catalog["pulled"], limit=1)[0][0].title == "Later"
+
+
+def test_alternatives_api(user, other_user, catalog):
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse(
+        "audio_asset_manager:audioasset-alternatives",
+        kwargs={"pk": catalog["pulled"].pk},
+    )
+    response = client.get(url, {"limit": 2})
+    assert [row["title"] for row in response.json()] == ["Close", "Faster"]
+    assert response.json()[0]["distance"] > 0
+    assert client.get(url, {"limit": 0}).status_code == 400
+    assert client.get(url, {"limit": "many"}).status_code == 400
+    other = APIClient()
+    other.force_authenticate(other_user)
+    assert other.get(url).status_code == 404
+
+
+def test_command(user, catalog, capsys):
+    AssetFeatures.objects.all().delete()
+    call_command("rebuild_similarity_index", "--owner", user.username)
+    assert "Computed 5 feature vectors for 1 owners." in capsys.readouterr().out
+    assert AssetFeatures.objects.count() == 5
+    with pytest.raises(CommandError):
+        call_command("rebuild_similarity_index", "--owner", "nobody")
@@ -0,0 +1,83 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.tagquery import (
+    And,
+    Not,
+    Or,
+    TagQueryError,
+    TagTerm,
+    filter_by_tag_query,
+    parse_tag_query,
+)
+
+TAGS = {
+    "Rain": {"ambient", "piano"},
+    "Storm": {"ambient", "piano", "vocals"},
+    "Dawn": {"ambient", "strings"},
+    "Drive": {"synth", "vocals"},
+    "Loop": {"lo fi"},
+    "Silence": set(),
+}
+
+
+def test_parse_precedence():
+    assert parse_tag_query("a OR b c AND NOT d") == Or(
+        (TagTerm("a"), And((TagTerm("b"), TagTerm("c"), Not(TagTerm("d")))))
+    )
+    assert parse_tag_query('(a or "lo fi") and not not b') == And(
+        (Or((TagTerm("a"), TagTerm("lo fi"))), Not(Not(TagTerm("b"))))
+    )
+    assert parse_tag_query('"AND"') == TagTerm("AND")
+
+
+@pytest.mark.parametrize(
+    "query", ["", "  ", "a AND", "(a OR b", "a)", "NOT", 'a "b', "x" * 1001]
+)
+def test_parse_errors(query):
+    with pytest.raises(TagQueryError):
+        parse_tag_query(query)
+
+
+@pytest.fixture
+def assets(user, other_user):
+    for title, tags in TAGS.items():
+        asset = AudioAsset.objects.create(owner=user, title=title)
+        asset.tags.add(*tags)
+    AudioAsset.objects.create(owner=other_user, title="Theirs").tags.add("ambient")
+    return AudioAsset.objects.for_user(user)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("ambient", {"Rain", "Storm", "Dawn"}),
+        ("ambient AND piano AND NOT vocals", {"Rain"}),
+        ("ambient piano", {"Rain", "Storm"}),
+        ("piano OR strings OR synth", {"Rain", "Storm", "Dawn", "Drive"}),
+        ("(piano OR strings) AND NOT (vocals OR synth)", {"Rain", "Dawn"}),
+        ("NOT ambient", {"Drive", "Loop", "Silence"}),
+        ('"lo fi" OR unknown', {"Loop"}),
+        ("ambient AND unknown", set()),
+        ("NOT unknown", set(TAGS)),
+        ("vocals AND NOT (ambient AND piano)", {"Drive"}),
+    ],
+)
+def test_filter_by_tag_query(assets, query, expected):
+    titles = set(filter_by_tag_query(assets, query).values_list("title", flat=True))
+    assert titles == expected
+
+
+@pytest.mark.django_db
+def test_tag_query_api(assets, user):
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse("audio_asset_manager:audioasset-list")
+    response = client.get(url, {"tag_query": "ambient AND NOT piano"})
+    assert [asset["title"] for asset in response.data["results"]] == ["Dawn"]
+    response = client.get(url, {"tag_query": "ambient AND ("})
+    assert response.status_code == 400
+    assert "tag_query" in response.data
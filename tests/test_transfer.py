@@ -0,0 +1,207 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+from taggit.models import Tag
+
+from audio_asset_manager.models import (
+    Artist,
+    AssetSource,
+    AudioAsset,
+    Collection,
+    LicenseType,
+)
+from audio_asset_manager.search import search_assets
+from audio_asset_manager.transfer import (
+    CatalogFormatError,
+    export_catalog,
+    import_catalog,
+    read_catalog,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def catalog(user):
+    license_type = LicenseType.objects.create(
+        name="CC-BY", url="https://example.com/cc-by", include_license_in_credits=True
+    )
+    source = AssetSource.objects.create(
+        owner=user,
+        name="Audiio",
+        license_type=license_type,
+        source_credit_text="/ via Audiio",
+    )
+    artist = Artist.objects.create(owner=user, name="Midnight Drive")
+    collection = Collection.objects.create(
+        owner=user, title="Neon Nights", album_artist=artist
+    )
+    for i in range(5):
+        asset = AudioAsset.objects.create(
+            owner=user,
+            title=f"Track {i}",
+            artist=artist,
+            collection=collection,
+            source=source,
+            digest=f"{i:040d}",
+            explicit_credit_required=bool(i % 2),
+            duration=100 + i,
+            bpm=120 if i else None,
+            loudness=-14.5,
+        )
+        asset.tags.add("synthwave", "night drive, slow")
+    AudioAsset.objects.create(owner=user, title="Bare", asset_type="SFX")
+
+
+def graph(owner):
+    return [
+        (
+            asset.asset_type,
+            asset.title,
+            asset.artist and asset.artist.name,
+            asset.collection and asset.collection.title,
+            asset.collection and asset.collection.album_artist.name,
+            asset.source and asset.source.name,
+            asset.source and asset.source.license_type.name,
+            asset.digest,
+            asset.explicit_credit_required,
+            asset.duration,
+            asset.bpm,
+            asset.loudness,
+            sorted(asset.tags.names()),
+        )
+        for asset in AudioAsset.objects.filter(owner=owner).order_by("title")
+    ]
+
+
+@pytest.mark.parametrize("file_format", ["csv", "jsonl"])
+def test_export_import_round_trip(user, other_user, catalog, file_format):
+    exported = "".join(
+        export_catalog(AudioAsset.objects.filter(owner=user), file_format, chunk_size=2)
+    )
+    rows = read_catalog(io.StringIO(exported, newline=""), file_format)
+    result = import_catalog(other_user, rows, batch_size=4)
+    assert (result.created, result.skipped) == (6, 0)
+    assert graph(other_user) == graph(user)
+    assert Artist.objects.filter(owner=other_user).count() == 1
+    assert Collection.objects.filter(owner=other_user).count() == 1
+    assert AssetSource.objects.filter(owner=other_user).count() == 1
+    assert LicenseType.objects.count() == 1
+    assert search_assets(other_user, "neon").count() == 5
+    rows = read_catalog(io.StringIO(exported, newline=""), file_format)
+    again = import_catalog(other_user, rows)
+    assert (again.created, again.skipped) == (1, 5)
+
+
+def test_import_uses_a_fixed_number_of_queries(
+    other_user, django_assert_max_num_queries
+):
+    rows = [
+        {
+            "title": f"Track {i}",
+            "artist": f"Artist {i % 3}",
+            "collection": f"Album {i % 5}",
+            "collection_artist": "Various Artists",
+            "source": "Audiio",
+            "license_type": "CC-BY",
+            "tags": ["ambient", f"tag {i % 4}"],
+        }
+        for i in range(200)
+    ]
+    # New tags are created one at a time, other records per batch.
+    for name in ["ambient", "tag 0", "tag 1", "tag 2", "tag 3"]:
+        Tag.objects.create(name=name)
+    # Feature vectors take three more queries per batch, after the import.
+    with django_assert_max_num_queries(36):
+        result = import_catalog(other_user, rows, batch_size=100)
+    assert result.created == 200
+    assert Collection.objects.filter(owner=other_user).count() == 5
+    assert (
+        AudioAsset.objects.filter(owner=other_user, tags__name="ambient").count() == 200
+    )
+
+
+@pytest.mark.parametrize(
+    "invalid",
+    [
+        {"bpm": "fast"},
+        {"bpm": "-120"},
+        {"duration": -1},
+        {"duration": 2**31},
+        {"loudness": "nan"},
+        {"credit_link": "javascript:alert(1)"},
+        {"source": "Audiio", "source_url": "not a url"},
+        {"source": "Audiio", "source_credit_text": "x" * 51},
+        {"title": "x" * 251},
+        {"artist": 7},
+        {"tags": ["x" * 101]},
+        {"digest": "../../escaped"},
+        {"digest": "A" * 40},
+    ],
+)
+def test_invalid_rows_import_nothing(other_user, invalid):
+    rows = [{"title": "Fine"}, {"title": "Broken", **invalid}]
+    with pytest.raises(CatalogFormatError, match="Row 2"):
+        import_catalog(other_user, rows)
+    assert not AudioAsset.objects.filter(owner=other_user).exists()
+    assert not AssetSource.objects.filter(owner=other_user).exists()
+
+
+def test_export_includes_unreferenced_records(user, other_user, catalog):
+    unused_license = LicenseType.objects.create(name="CC0")
+    AssetSource.objects.create(
+        owner=user, name="Field recordings", license_type=unused_license
+    )
+    solo = Artist.objects.create(owner=user, name="Solo")
+    Collection.objects.create(owner=user, title="Demos", album_artist=solo)
+    Artist.objects.create(owner=user, name="Nobody")
+    exported = "".join(
+        export_catalog(AudioAsset.objects.filter(owner=user), "csv", owner=user)
+    )
+    result = import_catalog(other_user, read_catalog(io.StringIO(exported), "csv"))
+    assert (result.created, result.skipped) == (6, 0)
+    assert graph(other_user) == graph(user)
+    assert sorted(
+        Artist.objects.filter(owner=other_user).values_list("name", flat=True)
+    ) == ["Midnight Drive", "Nobody", "Solo"]
+    assert Collection.objects.get(
+        owner=other_user, title="Demos"
+    ).album_artist.name == ("Solo")
+    assert (
+        AssetSource.objects.get(owner=other_user, name="Field recordings").license_type
+        == unused_license
+    )
+
+    # So do unfiltered API exports: the assets, then a row for each record.
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse("audio_asset_manager:audioasset-export")
+    assert len(b"".join(client.get(url).streaming_content).splitlines()) == 10
+
+
+def test_catalog_commands(user, other_user, catalog, tmp_path, capsys):
+    path = tmp_path / "catalog.jsonl"
+    call_command(
+        "export_catalog", "--owner", "producer", "--format", "jsonl", "-o", path
+    )
+    call_command("import_catalog", str(path), "--owner", "other")
+    assert "Imported 6 assets" in capsys.readouterr().out
+    assert graph(other_user) == graph(user)
+
+
+def test_export_api_streams(user, catalog):
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.get(
+        reverse("audio_asset_manager:audioasset-export"), {"asset_type": "SFX"}
+    )
+    assert response.status_code == 200
+    assert response.streaming
+    assert response["Content-Type"] == "text/csv"
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert lines[0].startswith("asset_type,title,")
+    assert lines[1].startswith("SFX,Bare,")
+    assert len(lines) == 2
@@ -0,0 +1,298 @@
+import datetime
+import hashlib
+import io
+import os
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from audio_asset_manager import uploads
+from audio_asset_manager.archive import (
+    archive_retired_assets,
+    restore_assets,
+    retire_assets,
+)
+from audio_asset_manager.models import ArchivedAudioAsset, AssetUpload, AudioAsset
+from audio_asset_manager.storage import asset_storage, check_asset_storage, content_path
+from audio_asset_manager.uploads import (
+    UploadError,
+    UploadOffsetMismatch,
+    partial_path,
+    write_chunk,
+)
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("media_root")]
+
+CONTENT = bytes(range(256)) * 40
+DIGEST = hashlib.sha1(CONTENT).hexdigest()  # nosec
+
+
+def api(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def start(client, **data):
+    response = client.post(
+        reverse("audio_asset_manager:assetupload-list"),
+        {"filename": "Theme.wav", "size": len(CONTENT), **data},
+        format="json",
+    )
+    assert response.status_code == 201, response.json()
+    return response.json()
+
+
+def send(client, upload, first, last, **headers):
+    return client.put(
+        reverse("audio_asset_manager:assetupload-chunk", kwargs={"pk": upload["id"]}),
+        CONTENT[first:last],
+        content_type="application/octet-stream",
+        **headers,
+    )
+
+
+def upload_file(user, **fields):
+    upload = AssetUpload.objects.create(
+        owner=user, filename="Theme.wav", size=len(CONTENT), **fields
+    )
+    write_chunk(upload, io.BytesIO(CONTENT), 0, len(CONTENT))
+    return upload
+
+
+def test_chunked_upload(user):
+    client = api(user)
+    upload = start(client)
+    response = send(client, upload, 0, 4000, HTTP_CONTENT_RANGE="bytes 0-3999/10240")
+    assert response.status_code == 200
+    assert response.json()["offset"] == 4000
+    assert os.path.getsize(partial_path(AssetUpload.objects.get())) == 4000
+
+    # A repeated chunk is refused, with where to carry on from.
+    response = send(client, upload, 0, 4000, HTTP_CONTENT_RANGE="bytes 0-3999/10240")
+    assert response.status_code == 409
+    assert response.json()["offset"] == 4000
+    response = send(client, upload, 4000, 5000, HTTP_CONTENT_RANGE="bytes 4000-4998/*")
+    assert response.status_code == 400
+
+    # The size has to be the upload's.
+    response = send(client, upload, 4000, 5000, HTTP_CONTENT_RANGE="bytes 4000-4999/99")
+    assert response.status_code == 400
+
+    # Without a Content-Range, the body continues from the offset.
+    response = send(client, upload, 4000, len(CONTENT))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["offset"] == len(CONTENT) and data["completed"]
+    asset = AudioAsset.objects.get(pk=data["asset"])
+    assert (asset.title, asset.filename, asset.digest) == ("Theme", "Theme.wav", DIGEST)
+    assert asset.file.name == content_path(DIGEST)
+    with asset.file.open("rb") as file:
+        assert file.read() == CONTENT
+    assert not os.path.exists(partial_path(AssetUpload.objects.get()))
+    assert send(client, upload, 0, 10).status_code == 400
+
+
+def test_resume_in_another_process(user):
+    upload = AssetUpload.objects.create(
+        owner=user, filename="Theme.wav", size=len(CONTENT)
+    )
+    assert write_chunk(upload, io.BytesIO(CONTENT[:3000]), 0, 3000) == 3000
+    # A dropped connection keeps what arrived.
+    assert write_chunk(upload, io.BytesIO(CONTENT[3000:3500]), 3000, 2000) == 500
+    with pytest.raises(UploadOffsetMismatch) as raised:
+        write_chunk(upload, io.BytesIO(CONTENT[3000:]), 3000, len(CONTENT) - 3000)
+    assert raised.value.offset == 3500
+    with pytest.raises(UploadError):
+        write_chunk(upload, io.BytesIO(CONTENT), 3500, len(CONTENT))
+
+    # Another process has no hash in progress, and rehashes the partial file.
+    uploads._hashes.clear()
+    write_chunk(upload, io.BytesIO(CONTENT[3500:]), 3500, len(CONTENT) - 3500)
+    assert upload.asset.digest == DIGEST
+
+
+def test_chunks_are_streamed_outside_the_lock(user):
+    upload = AssetUpload.objects.create(
+        owner=user, filename="Theme.wav", size=len(CONTENT)
+    )
+
+    class Racing(io.BytesIO):
+        # Another request sends the same chunk while this one is streaming.
+        def read(self, size=-1):
+            if not self.tell():
+                write_chunk(
+                    AssetUpload.objects.get(pk=upload.pk),
+                    io.BytesIO(CONTENT[:3000]),
+                    0,
+                    3000,
+                )
+            return super().read(size)
+
+    with pytest.raises(UploadOffsetMismatch) as raised:
+        write_chunk(upload, Racing(CONTENT[:3000]), 0, 3000)
+    assert raised.value.offset == 3000
+    with open(partial_path(upload), "rb") as file:
+        assert file.read() == CONTENT[:3000]
+    assert os.listdir(os.path.dirname(partial_path(upload))) == [f"{upload.pk}.part"]
+
+
+def test_failed_stores_keep_the_partial_file(user, monkeypatch):
+    upload = AssetUpload.objects.create(
+        owner=user, filename="Theme.wav", size=len(CONTENT)
+    )
+
+    def fail(*args, **kwargs):
+        raise OSError("The storage is unavailable.")
+
+    storage = asset_storage()
+    monkeypatch.setattr(storage, "save", fail)
+    with pytest.raises(OSError):
+        write_chunk(upload, io.BytesIO(CONTENT), 0, len(CONTENT))
+    assert os.path.getsize(partial_path(upload)) == len(CONTENT)
+    monkeypatch.undo()
+
+    # Finishing again, with an empty chunk at the end, stores it.
+    upload.refresh_from_db()
+    assert upload.completed is None
+    assert write_chunk(upload, io.BytesIO(b""), len(CONTENT), 0) == 0
+    assert upload.asset.digest == DIGEST
+    assert not os.path.exists(partial_path(upload))
+
+
+def test_identical_files_are_stored_once(user, other_user):
+    first = upload_file(user).asset
+    second = upload_file(other_user).asset
+    assert first.pk != second.pk
+    assert first.file.name == second.file.name
+    storage = asset_storage()
+    assert storage.listdir(os.path.dirname(content_path(DIGEST)))[1] == [DIGEST]
+
+    # Uploading it again gives it to the same asset.
+    assert upload_file(user).asset == first
+    assert AudioAsset.objects.filter(owner=user).count() == 1
+
+
+def test_upload_for_an_asset(user, other_user):
+    asset = AudioAsset.objects.create(owner=user, title="Theme")
+    client = api(user)
+    upload = start(client, asset=asset.pk)
+    assert send(client, upload, 0, len(CONTENT)).status_code == 200
+    asset.refresh_from_db()
+    assert asset.digest == DIGEST and asset.file
+
+    # Other users' assets can't be uploaded to.
+    response = api(other_user).post(
+        reverse("audio_asset_manager:assetupload-list"),
+        {"filename": "Theme.wav", "size": 10, "asset": asset.pk},
+        format="json",
+    )
+    assert response.status_code == 400 and "asset" in response.json()
+
+    # The digest already belongs to another of the owner's assets.
+    other = AudioAsset.objects.create(owner=user, title="Other")
+    upload = start(client, asset=other.pk)
+    response = send(client, upload, 0, len(CONTENT))
+    assert response.status_code == 400
+    assert AssetUpload.objects.get(pk=upload["id"]).completed is None
+
+
+def test_upload_limits(user, other_user, settings):
+    client = api(user)
+    settings.AUDIO_ASSET_MANAGER_MAX_UPLOAD_SIZE = 100
+    response = client.post(
+        reverse("audio_asset_manager:assetupload-list"),
+        {"filename": "Theme.wav", "size": 101},
+        format="json",
+    )
+    assert response.status_code == 400
+    settings.AUDIO_ASSET_MANAGER_MAX_UPLOAD_SIZE = len(CONTENT)
+    upload = start(client)
+    assert send(api(other_user), upload, 0, 10).status_code == 404
+    listed = client.get(reverse("audio_asset_manager:assetupload-list")).json()
+    assert [row["id"] for row in listed["results"]] == [upload["id"]]
+
+
+def test_download(user, other_user):
+    asset = upload_file(user).asset
+    client = api(user)
+    url = reverse("audio_asset_manager:audioasset-download", kwargs={"pk": asset.pk})
+    response = client.get(url)
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == CONTENT
+    assert response["Accept-Ranges"] == "bytes"
+    assert response["ETag"] == f'"{DIGEST}"'
+    assert 'filename="Theme.wav"' in response["Content-Disposition"]
+
+    response = client.get(url, HTTP_RANGE="bytes=100-199")
+    assert response.status_code == 206
+    assert response["Content-Range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert b"".join(response.streaming_content) == CONTENT[100:200]
+    response = client.get(url, HTTP_RANGE="bytes=-10")
+    assert b"".join(response.streaming_content) == CONTENT[-10:]
+    response = client.get(url, HTTP_RANGE=f"bytes={len(CONTENT)}-")
+    assert response.status_code == 416
+    assert response["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+    assert api(other_user).get(url).status_code == 404
+    empty = AudioAsset.objects.create(owner=user, title="Empty")
+    url = reverse("audio_asset_manager:audioasset-download", kwargs={"pk": empty.pk})
+    assert client.get(url).status_code == 404
+
+
+def test_download_with_sendfile(user, settings):
+    asset = upload_file(user).asset
+    url = reverse("audio_asset_manager:audioasset-download", kwargs={"pk": asset.pk})
+    settings.AUDIO_ASSET_MANAGER_SENDFILE_HEADER = "X-Sendfile"
+    response = api(user).get(url)
+    assert response["X-Sendfile"] == asset.file.path
+    assert response.content == b""
+    settings.AUDIO_ASSET_MANAGER_SENDFILE_HEADER = "X-Accel-Redirect"
+    settings.AUDIO_ASSET_MANAGER_SENDFILE_PREFIX = "/protected/"
+    response = api(user).get(url)
+    assert response["X-Accel-Redirect"] == "/protected/" + content_path(DIGEST)
+
+
+def test_files_survive_archiving(user):
+    asset = upload_file(user).asset
+    retire_assets(AudioAsset.objects.filter(pk=asset.pk))
+    assert archive_retired_assets(retired_before=None) == 1
+    archived = ArchivedAudioAsset.objects.get(pk=asset.pk)
+    assert archived.file.name == content_path(DIGEST)
+    with pytest.raises(UploadError):
+        upload_file(user)
+    # Nor can the file be uploaded to an existing asset.
+    target = AudioAsset.objects.create(owner=user, title="Target")
+    with pytest.raises(UploadError, match="archived"):
+        upload_file(user, asset=target)
+    assert restore_assets([asset.pk]).restored == 1
+    assert AudioAsset.objects.get(pk=asset.pk).file.name == content_path(DIGEST)
+
+
+def test_prune_command(user, capsys):
+    stale = AssetUpload.objects.create(owner=user, filename="a.wav", size=100)
+    write_chunk(stale, io.BytesIO(CONTENT[:10]), 0, 10)
+    AssetUpload.objects.filter(pk=stale.pk).update(
+        modified=timezone.now() - datetime.timedelta(hours=30)
+    )
+    fresh = AssetUpload.objects.create(owner=user, filename="b.wav", size=100)
+    upload_file(user)
+    call_command("prune_asset_uploads")
+    assert "Deleted 1 abandoned uploads." in capsys.readouterr().out
+    assert not AssetUpload.objects.filter(pk=stale.pk).exists()
+    assert not os.path.exists(partial_path(stale))
+    assert AssetUpload.objects.count() == 2
+    assert AssetUpload.objects.filter(pk=fresh.pk).exists()
+    with pytest.raises(CommandError):
+        call_command("prune_asset_uploads", "--older-than", "-1")
+
+
+def test_public_storage_warning(settings):
+    assert [warning.id for warning in check_asset_storage(None)] == [
+        "audio_asset_manager.W001"
+    ]
+    settings.AUDIO_ASSET_MANAGER_STORAGE = "default"
+    assert check_asset_storage(None) == []
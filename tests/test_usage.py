@@ -0,0 +1,170 @@
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.models import (
+    AssetSource,
+    AssetUsage,
+    AssetUsageMonth,
+    AudioAsset,
+    Production,
+    SourceUsageMonth,
+)
+from audio_asset_manager.usage import (
+    Cue,
+    UsageError,
+    delete_usage,
+    most_used_assets,
+    never_used_assets,
+    record_usage,
+    source_usage,
+)
+
+pytestmark = pytest.mark.django_db
+
+JULY = datetime.date(2026, 7, 14)
+AUGUST = datetime.date(2026, 8, 2)
+
+
+@pytest.fixture
+def library(user):
+    audiio = AssetSource.objects.create(owner=user, name="Audiio")
+    epidemic = AssetSource.objects.create(owner=user, name="Epidemic")
+    return {
+        "theme": AudioAsset.objects.create(
+            owner=user, title="Theme", source=audiio, duration=30
+        ),
+        "bed": AudioAsset.objects.create(
+            owner=user, title="Bed", source=epidemic, duration=120
+        ),
+        "sting": AudioAsset.objects.create(owner=user, title="Sting", duration=3),
+        "unused": AudioAsset.objects.create(owner=user, title="Unused"),
+        "audiio": audiio,
+        "epidemic": epidemic,
+    }
+
+
+def test_record_usage_maintains_rollups(user, library):
+    episode = Production.objects.create(owner=user, title="Ep 1", air_date=JULY)
+    theme, bed, sting = library["theme"], library["bed"], library["sting"]
+    record_usage(episode, [Cue(theme.pk), Cue(bed.pk, seconds=45), Cue(theme.pk)])
+    record_usage(episode, [Cue(sting.pk), Cue(bed.pk, used_on=AUGUST)])
+    assert list(episode.usages.values_list("position", flat=True)) == [1, 2, 3, 4, 5]
+    assert sorted(
+        AssetUsageMonth.objects.values_list("asset_id", "month", "uses", "seconds")
+    ) == [
+        (theme.pk, datetime.date(2026, 7, 1), 2, 60),
+        (bed.pk, datetime.date(2026, 7, 1), 1, 45),
+        (bed.pk, datetime.date(2026, 8, 1), 1, 120),
+        (sting.pk, datetime.date(2026, 7, 1), 1, 3),
+    ]
+    assert sorted(
+        SourceUsageMonth.objects.values_list("source__name", "month", "uses", "seconds")
+    ) == [
+        ("Audiio", datetime.date(2026, 7, 1), 2, 60),
+        ("Epidemic", datetime.date(2026, 7, 1), 1, 45),
+        ("Epidemic", datetime.date(2026, 8, 1), 1, 120),
+    ]
+
+
+def test_record_usage_rejects_other_users_assets(user, other_user, library):
+    episode = Production.objects.create(owner=other_user, title="Theirs")
+    with pytest.raises(UsageError):
+        record_usage(episode, [Cue(library["theme"].pk)])
+    assert not AssetUsage.objects.exists()
+
+
+def test_reports(user, library, django_assert_max_num_queries):
+    first = Production.objects.create(owner=user, title="Ep 1", air_date=JULY)
+    second = Production.objects.create(owner=user, title="Ep 2", air_date=AUGUST)
+    theme, bed, sting = library["theme"], library["bed"], library["sting"]
+    record_usage(first, [Cue(theme.pk), Cue(bed.pk), Cue(sting.pk)])
+    record_usage(second, [Cue(theme.pk), Cue(bed.pk, seconds=10), Cue(theme.pk)])
+    with django_assert_max_num_queries(2):
+        rows = most_used_assets(user, JULY, AUGUST, limit=2)
+    assert [(row["asset"], row["uses"], row["seconds"]) for row in rows] == [
+        (theme, 3, 90),
+        (bed, 2, 130),
+    ]
+    august = most_used_assets(user, AUGUST, AUGUST)
+    assert [(row["asset"].title, row["uses"]) for row in august] == [
+        ("Theme", 2),
+        ("Bed", 1),
+    ]
+    assert [
+        (row["source"].name, row["seconds"]) for row in source_usage(user, JULY, AUGUST)
+    ] == [("Epidemic", 130), ("Audiio", 90)]
+    assert list(never_used_assets(user)) == [library["unused"]]
+
+
+def test_deleting_usage_updates_rollups(user, library):
+    first = Production.objects.create(owner=user, title="Ep 1", air_date=JULY)
+    second = Production.objects.create(owner=user, title="Ep 2", air_date=JULY)
+    theme, bed = library["theme"], library["bed"]
+    record_usage(first, [Cue(theme.pk), Cue(bed.pk)])
+    record_usage(second, [Cue(theme.pk)])
+    first.delete()
+    assert list(AssetUsageMonth.objects.values_list("asset_id", "uses")) == [
+        (theme.pk, 1)
+    ]
+    assert list(SourceUsageMonth.objects.values_list("source__name", "seconds")) == [
+        ("Audiio", 30)
+    ]
+    assert delete_usage(second.usages.all()) == 1
+    assert not AssetUsageMonth.objects.exists()
+    assert not SourceUsageMonth.objects.exists()
+    assert theme in never_used_assets(user)
+
+
+def test_rebuild_usage_rollups(user, library):
+    episode = Production.objects.create(owner=user, title="Ep 1", air_date=JULY)
+    record_usage(episode, [Cue(library["theme"].pk), Cue(library["bed"].pk)])
+    expected = list(AssetUsageMonth.objects.values_list("asset_id", "uses", "seconds"))
+    AssetUsageMonth.objects.update(uses=100)
+    SourceUsageMonth.objects.all().delete()
+    call_command("rebuild_usage_rollups", "--owner", "producer")
+    assert (
+        list(AssetUsageMonth.objects.values_list("asset_id", "uses", "seconds"))
+        == expected
+    )
+    assert SourceUsageMonth.objects.count() == 2
+
+
+def test_usage_api(user, library):
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.post(
+        reverse("audio_asset_manager:production-list"),
+        {"title": "Ep 1", "air_date": "2026-07-14"},
+    )
+    assert response.status_code == 201
+    cues_url = reverse(
+        "audio_asset_manager:production-cues", kwargs={"pk": response.data["id"]}
+    )
+    response = client.post(
+        cues_url,
+        [{"asset": library["theme"].pk}, {"asset": library["bed"].pk, "seconds": 20}],
+        format="json",
+    )
+    assert response.status_code == 201
+    assert [cue["position"] for cue in response.data] == [1, 2]
+    assert len(client.get(cues_url).data) == 2
+    assert client.post(cues_url, [{"asset": 999}], format="json").status_code == 400
+    response = client.get(
+        reverse("audio_asset_manager:audioasset-most-used"),
+        {"start": "2026-07-01", "end": "2026-09-30"},
+    )
+    assert [row["title"] for row in response.data] == ["Theme", "Bed"]
+    response = client.get(reverse("audio_asset_manager:assetsource-usage"))
+    assert [(row["name"], row["seconds"]) for row in response.data] == [
+        ("Audiio", 30),
+        ("Epidemic", 20),
+    ]
+    response = client.get(reverse("audio_asset_manager:audioasset-never-used"))
+    assert [asset["title"] for asset in response.data["results"]] == [
+        "Unused",
+        "Sting",
+    ]
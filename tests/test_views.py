@@ -1 +1,147 @@
-# Add tests for your views here.
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.models import (
+    Artist,
+    AssetSource,
+    AudioAsset,
+    Collection,
+    LicenseType,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def make_assets(owner, count, prefix="Track"):
+    license_type = LicenseType.objects.create(name="CC-BY")
+    source = AssetSource.objects.create(
+        owner=owner, name="Audiio", license_type=license_type
+    )
+    artist = Artist.objects.create(owner=owner, name="Artist")
+    collection = Collection.objects.create(
+        owner=owner, title="Album", album_artist=artist
+    )
+    assets = []
+    for i in range(count):
+        asset = AudioAsset.objects.create(
+            owner=owner,
+            title=f"{prefix} {i}",
+            artist=artist,
+            collection=collection,
+            source=source,
+        )
+        asset.tags.add("ambient", f"tag-{i}")
+        assets.append(asset)
+    return assets
+
+
+def test_api_requires_authentication():
+    response = APIClient().get(reverse("audio_asset_manager:audioasset-list"))
+    assert response.status_code == 403
+
+
+def test_asset_list_uses_fixed_number_of_queries(
+    api_client, user, django_assert_num_queries, django_assert_max_num_queries
+):
+    url = reverse("audio_asset_manager:audioasset-list")
+    make_assets(user, 3)
+    # Sources and license types come from the lookup cache once it's warm.
+    api_client.get(url)
+    with django_assert_max_num_queries(4) as small:
+        response = api_client.get(url)
+    assert len(response.data["results"]) == 3
+    # Read now: each request resets the connection's query log.
+    num_queries = len(small.captured_queries)
+    make_assets(user, 20, prefix="More")
+    api_client.get(url)
+    with django_assert_num_queries(num_queries):
+        response = api_client.get(url)
+    assert len(response.data["results"]) == 23
+    result = response.data["results"][-1]
+    assert result["artist_name"] == "Artist"
+    assert result["license_type_name"] == "CC-BY"
+    assert sorted(result["tags"]) == ["ambient", "tag-0"]
+
+
+def test_asset_list_is_paginated_by_cursor(api_client, user):
+    make_assets(user, 5)
+    url = reverse("audio_asset_manager:audioasset-list")
+    response = api_client.get(url, {"page_size": 2})
+    assert len(response.data["results"]) == 2
+    assert "cursor=" in response.data["next"]
+    response = api_client.get(response.data["next"])
+    assert len(response.data["results"]) == 2
+
+
+def test_asset_list_only_shows_owned_assets(api_client, user, other_user):
+    make_assets(user, 2)
+    theirs = make_assets(other_user, 2, prefix="Theirs")
+    response = api_client.get(reverse("audio_asset_manager:audioasset-list"))
+    assert {r["title"] for r in response.data["results"]} == {"Track 0", "Track 1"}
+    response = api_client.get(
+        reverse("audio_asset_manager:audioasset-detail", args=[theirs[0].pk])
+    )
+    assert response.status_code == 404
+
+
+def test_create_asset(api_client, user, other_user):
+    artist = Artist.objects.create(owner=user, name="Mine")
+    their_artist = Artist.objects.create(owner=other_user, name="Theirs")
+    url = reverse("audio_asset_manager:audioasset-list")
+    response = api_client.post(
+        url, {"title": "New", "artist": their_artist.pk, "tags": ["piano"]}
+    )
+    assert response.status_code == 400
+    response = api_client.post(
+        url, {"title": "New", "artist": artist.pk, "tags": ["piano"]}
+    )
+    assert response.status_code == 201
+    asset = AudioAsset.objects.get(pk=response.data["id"])
+    assert asset.owner == user
+    assert list(asset.tags.names()) == ["piano"]
+    response = api_client.post(url, {"title": "Copy", "digest": "abc"})
+    assert response.status_code == 400
+    assert "digest" in response.data
+    response = api_client.post(url, {"title": "Copy", "digest": "a" * 40})
+    assert response.status_code == 201
+    response = api_client.post(url, {"title": "Copy", "digest": "a" * 40})
+    assert response.status_code == 400
+    assert "digest" in response.data
+
+
+def test_update_and_delete_asset(api_client, user):
+    asset = make_assets(user, 1)[0]
+    url = reverse("audio_asset_manager:audioasset-detail", args=[asset.pk])
+    response = api_client.patch(url, {"bpm": 120})
+    assert response.status_code == 200
+    asset.refresh_from_db()
+    assert asset.bpm == 120
+    assert api_client.delete(url).status_code == 204
+    assert not AudioAsset.objects.filter(pk=asset.pk).exists()
+
+
+def test_license_types_are_read_only_for_non_staff(api_client, user):
+    LicenseType.objects.create(name="CC0")
+    url = reverse("audio_asset_manager:licensetype-list")
+    response = api_client.get(url)
+    assert [r["name"] for r in response.data["results"]] == ["CC0"]
+    assert api_client.post(url, {"name": "Custom"}).status_code == 403
+    user.is_staff = True
+    user.save()
+    assert api_client.post(url, {"name": "Custom"}).status_code == 201
+
+
+@pytest.mark.parametrize(
+    "url_name,data",
+    [
+        ("assetsource-list", {"name": "Source"}),
+        ("artist-list", {"name": "Artist"}),
+        ("collection-list", {"title": "Collection"}),
+    ],
+)
+def test_create_owned_records(api_client, user, url_name, data):
+    response = api_client.post(reverse(f"audio_asset_manager:{url_name}"), data)
+    assert response.status_code == 201
+    response = api_client.get(reverse(f"audio_asset_manager:{url_name}"))
+    assert len(response.data["results"]) == 1
@@ -0,0 +1,134 @@
+import os
+import wave
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from audio_asset_manager.models import AudioAsset
+from audio_asset_manager.scanner import scan_library
+
+np = pytest.importorskip("numpy")
+
+from audio_asset_manager.waveforms import (  # noqa: E402
+    LEVELS,
+    WaveformUnavailable,
+    get_waveform,
+    load_rendition,
+    prune_waveforms,
+    waveform_dir,
+)
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("media_root")]
+
+RATE = 8000
+
+
+@pytest.fixture
+def asset(tmp_path, user):
+    library = tmp_path / "library"
+    library.mkdir()
+    # A stereo ramp: the left channel rises, the right falls.
+    ramp = np.linspace(-1, 1, RATE * 3, endpoint=False)
+    samples = np.stack([ramp, -ramp * 0.5], 1)
+    with wave.open(str(library / "ramp.wav"), "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes((samples * 32767).astype("<i2").tobytes())
+    scan_library(library, user, workers=1)
+    return AudioAsset.objects.get(title="ramp")
+
+
+def test_renditions_are_computed_once(asset):
+    path, info = get_waveform(asset, LEVELS[0])
+    assert (info.samplerate, info.channels, info.frames) == (RATE, 2, RATE * 3)
+    peaks = load_rendition(path)
+    assert len(peaks) == -(-RATE * 3 // LEVELS[0])
+    # The first peak covers the start of both channels' ramps.
+    assert peaks[0, 0] == pytest.approx(-1, abs=1e-3)
+    assert peaks[0, 1] == pytest.approx(0.5, abs=1e-3)
+    coarse = load_rendition(get_waveform(asset, LEVELS[-1])[0])
+    assert len(coarse) == 1
+    assert coarse[0] == pytest.approx([-1, 1], abs=1e-3)
+
+    os.remove(asset.scan_entries.get().path)
+    # Served from the cache without the source file.
+    assert get_waveform(asset, LEVELS[1])[0].startswith(waveform_dir(asset.digest))
+
+
+def test_waveform_unavailable(user):
+    asset = AudioAsset.objects.create(owner=user, title="No file", digest="abc")
+    with pytest.raises(WaveformUnavailable):
+        get_waveform(asset, LEVELS[0])
+    with pytest.raises(ValueError):
+        get_waveform(asset, 3)
+
+
+def test_waveforms_use_the_files_digest(asset, other_user, tmp_path):
+    with pytest.raises(ValueError):
+        waveform_dir("../../escaped/pwn")
+    asset.digest = "../../escaped/pwn"
+    asset.save()
+    path, _info = get_waveform(asset, LEVELS[0])
+    assert path.startswith(waveform_dir(asset.scan_entries.get().digest))
+    assert not (tmp_path / "escaped").exists()
+
+    # Another owner can't claim the digest to read the cached peaks.
+    other = AudioAsset.objects.create(
+        owner=other_user, title="Claimed", digest=asset.scan_entries.get().digest
+    )
+    with pytest.raises(WaveformUnavailable):
+        get_waveform(other, LEVELS[0])
+
+
+def test_corrupt_files_are_unavailable(asset, monkeypatch):
+    def decode(digest, path):
+        raise RuntimeError("Error in file: unexpected end of data.")
+
+    monkeypatch.setattr("audio_asset_manager.waveforms.write_waveform", decode)
+    with pytest.raises(WaveformUnavailable, match="can't be decoded"):
+        get_waveform(asset, LEVELS[0])
+
+
+def test_prune_waveforms(asset, other_user, capsys):
+    other = AudioAsset.objects.create(owner=other_user, title="Copy", digest="f" * 40)
+    other.scan_entries.create(
+        owner=other_user,
+        path=asset.scan_entries.get().path,
+        size=0,
+        mtime_ns=0,
+        digest=other.digest,
+    )
+    get_waveform(asset, LEVELS[0])
+    get_waveform(other, LEVELS[0])
+    directory = waveform_dir(asset.digest)
+    for name in os.listdir(directory):
+        os.utime(os.path.join(directory, name), (0, 0))
+    size = sum(
+        os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+    )
+    result = prune_waveforms(size)
+    assert (result.removed, result.freed, result.remaining) == (1, size, size)
+    assert not os.path.exists(directory)
+    assert os.path.exists(waveform_dir(other.digest))
+    call_command("prune_waveforms", "--max-size", "0")
+    assert "Removed 1 cached waveforms" in capsys.readouterr().out
+    assert not os.path.exists(waveform_dir(other.digest))
+
+
+def test_waveform_api(asset, user, other_user, django_assert_max_num_queries):
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse("audio_asset_manager:audioasset-waveform", args=[asset.pk])
+    response = client.get(url, {"samples_per_peak": LEVELS[0]})
+    assert response.status_code == 200
+    assert response["X-Waveform-Sample-Rate"] == str(RATE)
+    body = b"".join(response.streaming_content)
+    assert len(body) == -(-RATE * 3 // LEVELS[0]) * 2 * 2
+    with django_assert_max_num_queries(5):
+        assert client.get(url).status_code == 200
+    assert client.get(url, {"samples_per_peak": 7}).status_code == 400
+    client.force_authenticate(other_user)
+    assert client.get(url).status_code == 404